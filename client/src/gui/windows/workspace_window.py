@@ -180,11 +180,12 @@ class WorkspaceWindow(BaseWindow):
         self._stage_layout.addLayout(row)
         self._stage_widgets[stage_name] = (lbl_name, combo)
 
-    def update_stage_row_project_names(self, stage_name: str, project_names: list[str]):
+    def update_stage_row_project_names(self, stage_name: str, project_names: list[str], count: int = None):
         """
         Обновляет список проектов для строки этапа.
         :param stage_name: Название этапа.
         :param project_names: Новый список названий проектов.
+        :param count: Число проектов. По умолчанию - число названий в project_names.
         """
         from PySide6.QtWidgets import QSizePolicy
 
@@ -194,7 +195,8 @@ class WorkspaceWindow(BaseWindow):
             combo.clear()
             combo.addItems(project_names if project_names else ["Нет проектов"])
             # Обновляем label с количеством
-            count = len(project_names) if project_names else 0
+            if count is None:
+                count = len(project_names) if project_names else 0
             lbl_name.setText(f"<b>{stage_name}</b>: {count} проектов")
 
             # Убедимся, что настройки размера сохранены
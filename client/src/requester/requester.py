@@ -13,6 +13,9 @@ import typing as tp
 import asyncio
 import threading
 import functools
+import contextlib
+import contextvars
+import concurrent.futures
 from pathlib import Path
 
 import client.src.requester.errors as err
@@ -28,6 +31,8 @@ logger = config_logger(__name__, CLIENT, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZ
 
 CHECK_TIME = True
 request_time_handler = RequestsTimeHandler(Path(project_root() / 'log' / 'requests_time.txt'))
+# Место запроса в пакете (Requester.batch) для корутины запроса. Задаётся в задаче корутины
+batch_slot: contextvars.ContextVar[BatchSlot | None] = contextvars.ContextVar('batch_slot', default=None)
 
 
 def run_loop(loop: asyncio.AbstractEventLoop):
@@ -47,7 +52,11 @@ def synchronized_request(func) -> tp.Callable[..., Request]:
             thread.start()
             time.sleep(0.1)
 
-        future = asyncio.run_coroutine_threadsafe(func(*args, **kwargs), loop)
+        coroutine = func(*args, **kwargs)
+        batch = getattr(args[0], '_batch', None)
+        if batch is not None:  # Запрос создан внутри Requester.batch()
+            coroutine = batch.join(coroutine)
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
 
         request = Request(future, loop)
         if CHECK_TIME:  # Замер времени выполнения
@@ -79,6 +88,7 @@ class Requester(IRequests):
         if self._request_limit is None:  # / 1000, т.к. TimeoutList принимает в секундах, а нам приходят миллисекунды
             self._request_limit = 100
         self._requests: TimeoutList[InternalRequest] = TimeoutList(self._timeout // 1000, max_length=100)
+        self._batch: RequestsBatch | None = None
 
     @staticmethod
     def _prepare_response(response: ServerResponse, request: InternalRequest):
@@ -123,9 +133,32 @@ class Requester(IRequests):
 
     @staticmethod
     def create_group(*requests) -> RequestsGroup:
-        """Возвращает группу запросов RequestsGroup."""
+        """
+        Возвращает группу запросов RequestsGroup. Чтобы группа была отправлена одним HTTP-запросом, запросы группы
+        создаются внутри batch().
+        """
         return RequestsGroup(*requests)
 
+    @contextlib.contextmanager
+    def batch(self) -> tp.Iterator[RequestsBatch]:
+        """
+        Пакет запросов: запросы, созданные внутри контекста, отправляются одним запросом к /batch (по
+        CommonStruct.max_batch_requests подзапросов) после выхода из контекста. В пакет попадает первый HTTP-запрос
+        каждого запроса, следующие страницы последовательности запросов (_prepare_requests_sequence) отправляются
+        отдельно. Пакет аутентифицируется заголовками первого запроса.
+
+            with requester.batch():
+                tasks, events = requester.get_ws_tasks_by_user(...), requester.get_personal_daily_events(...)
+            group = requester.create_group(tasks, events)
+        """
+        batch = RequestsBatch(self._server, self._struct.max_batch_requests)
+        self._batch = batch
+        try:
+            yield batch
+        finally:
+            self._batch = None
+            batch.close()
+
     async def _choose_request_type(self, request: InternalRequest, limit: int | None) -> Response:
         try:
             if not limit:  # Если лимит не установлен
@@ -141,8 +174,10 @@ class Requester(IRequests):
 
     async def _prepare_requests_sequence(self, request: InternalRequest, limit: int | None):
         """
-        Посылает запросы на URL переданного запроса, меняя их offset до тех пор, пока не будут получены все записи
-        или не будет достигнут limit.
+        Посылает запросы на URL переданного запроса, пока не будут получены все записи или не будет достигнут limit.
+        Если offset не задан, используется keyset-пагинация: первый запрос отправляется с after_id = 0, следующие - с
+        курсором next_cursor из предыдущего ответа. Если сервер не вернул курсор (или задан offset), меняется offset.
+        Получение прекращается, если страница меньше лимита запроса (записей больше нет).
         Предназначен для запросов, в ответ на которые API отдаёт список записей. Для других запросов корректного
         результата не будет.
 
@@ -154,14 +189,22 @@ class Requester(IRequests):
 
         if not request.offset:
             request.set_offset(0)
+            request.set_after_id(0)  # Первая страница keyset-пагинации
         offset = request.offset
         try:
             response = await self._make_request(request)  # Первый запрос
             content = response.content
-        # Запрашиваем данные, пока не превысим лимит или не получим все данные (в этом случае придёт records_left = 0)
-            while response.records_left and (not limit or limit and len(content) < limit):
-                request.set_offset(offset + len(content))  # Прибавляем offset
+            page_size = len(content)
+        # Запрашиваем данные, пока не превысим лимит или не получим все данные (в этом случае придёт records_left = 0
+        # или неполная страница)
+            while (response.records_left and page_size >= self._request_limit
+                   and (not limit or limit and len(content) < limit)):
+                if response.next_cursor:  # Следующая страница по курсору
+                    request.set_cursor(response.next_cursor)
+                else:
+                    request.set_offset(offset + len(content))  # Прибавляем offset
                 response = await self._make_request(request)
+                page_size = len(response.content) if response.content else 0
                 if response.content:
                     content.extend(response.content)
 
@@ -179,29 +222,20 @@ class Requester(IRequests):
             if diff < datetime.timedelta(milliseconds=self._timeout):
                 await asyncio.sleep(diff.microseconds * 1e6)  # Задержка до допустимого времени между запросами
 
+        slot = batch_slot.get()
         try:
-            async with httpx.AsyncClient() as client:
-
-                if request.method == InternalRequest.GET:
-                    result = await client.get(request.path, headers=request.headers, params=request.query_params)
-                elif request.method == InternalRequest.POST:
-                    result = await client.post(request.path, headers=request.headers, params=request.query_params,
-                                               json=request.json)
-                elif request.method == InternalRequest.DELETE:
-                    result = await client.delete(request.path, headers=request.headers, params=request.query_params)
-                elif request.method == InternalRequest.PUT:
-                    result = await client.put(request.path, headers=request.headers, params=request.query_params,
-                                               json=request.json)
-                else:
-                    raise err.RequesterError(f'Unknown method: {request.method}')
-                self._requests.append(request)  # Добавляем запрос в список
+            if slot is not None:  # Запрос отправляется в пакете
+                batch_slot.set(None)
+                result = await slot.submit(request)
+            else:
+                result = await self._send(request)
 
             # Обработка запроса и его возврат в виде Response
             server_response = ServerResponse(result)
             self._prepare_response(server_response, request)
 
             return Response(request, server_response.content, server_response.records_left,
-                            server_response.last_record_num)
+                            server_response.last_record_num, server_response.next_cursor)
         except err.NetworkTimeoutError as e:
             logger.warning(f'Excepted network connection error {e} during making request {str(InternalRequest)}')
             raise e
@@ -212,6 +246,23 @@ class Requester(IRequests):
             logger.warning(f'Excepted network connection error {e} during making request {str(InternalRequest)}')
             raise err.get_network_error(e, request)
 
+    async def _send(self, request: InternalRequest) -> httpx.Response:
+        async with httpx.AsyncClient() as client:
+            if request.method == InternalRequest.GET:
+                result = await client.get(request.path, headers=request.headers, params=request.query_params)
+            elif request.method == InternalRequest.POST:
+                result = await client.post(request.path, headers=request.headers, params=request.query_params,
+                                           json=request.json)
+            elif request.method == InternalRequest.DELETE:
+                result = await client.delete(request.path, headers=request.headers, params=request.query_params)
+            elif request.method == InternalRequest.PUT:
+                result = await client.put(request.path, headers=request.headers, params=request.query_params,
+                                          json=request.json)
+            else:
+                raise err.RequesterError(f'Unknown method: {request.method}')
+            self._requests.append(request)  # Добавляем запрос в список
+        return result
+
     @synchronized_request
     async def make_custom_request(self, request: InternalRequest) -> Response:
         response = await self._make_request(request)
@@ -420,6 +471,51 @@ class Requester(IRequests):
         response = await self._make_request(request)
         return response
 
+    @synchronized_request
+    async def export_workspace(self, workspace_id: int, access_token: str, path: Path, cursor: str = None,
+                               max_retries: int = 3):
+        """
+        Выгружает рабочее пространство в файл path (NDJSON, строка на объект). Строки записываются по мере получения,
+        при обрыве соединения выгрузка продолжается с курсора последней полученной строки (не более max_retries
+        попыток подряд). Если передан cursor, выгрузка продолжается с него и дописывается в файл. Содержимое ответа -
+        число полученных строк.
+        """
+        path_ = f'{self._server}/workspaces/{workspace_id}/export'
+        retries = 0
+        received = 0
+        with open(path, 'a' if cursor else 'w', encoding='utf-8') as file:
+            while True:
+                request = InternalRequest(path_, InternalRequest.GET, query_params={CommonStruct.cursor: cursor},
+                                          headers={'Authorization': access_token})
+                try:
+                    async with httpx.AsyncClient(timeout=None) as client:
+                        async with client.stream('GET', path_, headers=request.headers,
+                                                 params={CommonStruct.cursor: cursor} if cursor else None) as result:
+                            if result.status_code != 200:
+                                await result.aread()
+                                self._prepare_response(ServerResponse(result), request)
+                                raise err.APIError(f'Export has failed with HTTP code {result.status_code}', request)
+                            async for line in result.aiter_lines():
+                                if not line:
+                                    continue
+                                record = json.loads(line)
+                                object_type = record.get(CommonStruct.object_type)
+                                if object_type == CommonStruct.export_end:
+                                    return Response(request, received, 0, received)
+                                if object_type == CommonStruct.export_error:
+                                    break
+                                file.write(line + '\n')
+                                cursor = record[CommonStruct.cursor]
+                                received += 1
+                                retries = 0
+                except (httpx.ConnectError, httpx.ReadError, httpx.RemoteProtocolError) as e:
+                    logger.warning(f'Export of workspace {workspace_id} has been interrupted: {e}. Cursor: {cursor}.')
+
+                retries += 1  # Выгрузка прервана: продолжение с последней полученной строки
+                if retries > max_retries:
+                    raise err.ReadTimeoutError('Export has been interrupted', request)
+                file.flush()
+
     @synchronized_request
     async def get_project_analytics(self, workspace_id: int, project_id: int, access_token: str):
         """Получает аналитику проекта."""
@@ -521,6 +617,23 @@ class Requester(IRequests):
         response = await self._choose_request_type(request, limit)
         return response
 
+    @synchronized_request
+    async def get_agenda(self, user_id: int, access_token: str, date_from: datetime.date,
+                         date_to: datetime.date = None, not_completed: bool = False) -> Response:
+        """
+        Получает повестку пользователя на день date_from или период date_from - date_to: личные задачи и задачи РП,
+        личные мероприятия и мероприятия РП одним ответом {CommonStruct.personal_tasks: [...], ...}.
+        """
+        path = f'{self._server}/users/{user_id}/agenda'
+        request = InternalRequest(path, InternalRequest.GET, headers={'Authorization': access_token},
+                                  query_params={
+                                      CommonStruct.date_from: date_from,
+                                      CommonStruct.date_to: date_to,
+                                      CommonStruct.not_completed: not_completed
+                                  })
+        response = await self._make_request(request)
+        return response
+
     @synchronized_request
     async def get_ws_tasks(self, tasks_ids: list[int], access_token: str, limit: int = None, offset: int = 0) -> Response:
         path = f'{self._server}/ws_tasks'
@@ -716,12 +829,14 @@ class ServerResponse:
             self.message = response_data.get(CommonStruct.message)
             self.records_left = response_data.get(CommonStruct.records_left)
             self.last_record_num = response_data.get(CommonStruct.last_rec_num)
+            self.next_cursor = response_data.get(CommonStruct.next_cursor)
         except (json.JSONDecodeError, AttributeError):
             self.error_id = ErrorCodes.server_error
             self.content = None
             self.message = 'No data in response'
             self.records_left = None
             self.last_record_num = None
+            self.next_cursor = None
 
     def __str__(self):
         return str(self.__dict__)
@@ -735,13 +850,16 @@ class Response:
     :param records_left: число оставшихся записей (для запросов, в ответ на которые возвращается список записей).
     :param last_record_num: номер последней полученной записи
            (для запросов, в ответ на которые возвращается список записей).
+    :param next_cursor: курсор следующей страницы (для запросов с keyset-пагинацией).
     """
 
-    def __init__(self, request: InternalRequest, content: tp.Any, records_left: int, last_record_num: int):
+    def __init__(self, request: InternalRequest, content: tp.Any, records_left: int, last_record_num: int,
+                 next_cursor: str | None = None):
         self.request = request
         self.content = content
         self.records_left = records_left
         self.last_record_num = last_record_num
+        self.next_cursor = next_cursor
 
     def __str__(self):
         return str(self.__dict__)
@@ -797,6 +915,12 @@ class InternalRequest:  # ToDo: переделать в датаклассы
     def set_offset(self, offset: int):
         self.query_params[CommonStruct.offset] = offset
 
+    def set_after_id(self, after_id: int):
+        self.query_params[CommonStruct.after_id] = after_id
+
+    def set_cursor(self, cursor: str):
+        self.query_params[CommonStruct.cursor] = cursor
+
     def __str__(self):
         return str(self.__dict__)
 
@@ -857,6 +981,112 @@ class Request(QObject):
         return self.result()
 
 
+class RequestsBatch:
+    """
+    Пакет запросов (см. Requester.batch). Корутины запросов выполняются в своих циклах событий и потоках: каждая
+    передаёт в пакет свой первый HTTP-запрос и ждёт, пока пакет не будет закрыт и все его корутины не передадут
+    запросы (или не завершатся без запроса). Запрос к /batch отправляет первая дождавшаяся корутина, ответы подзапросов
+    передаются корутинам через concurrent.futures.Future.
+    """
+
+    def __init__(self, server: str, max_requests: int):
+        self._server = server
+        self._max_requests = max_requests
+        self._lock = threading.Lock()
+        self._expected = 0  # Число корутин пакета, ещё не передавших запрос
+        self._closed = False
+        self._sending = False
+        self._ready: concurrent.futures.Future[None] = concurrent.futures.Future()  # Все запросы пакета переданы
+        self._pending: list[tuple[InternalRequest, concurrent.futures.Future[httpx.Response]]] = []
+
+    def join(self, coroutine: tp.Coroutine) -> tp.Coroutine:
+        """Добавляет в пакет корутину запроса, возвращает корутину, выполняющую её в пакете."""
+        with self._lock:
+            if self._closed:
+                return coroutine
+            self._expected += 1
+        return self._run(coroutine)
+
+    async def _run(self, coroutine: tp.Coroutine) -> Response:
+        slot = BatchSlot(self)
+        batch_slot.set(slot)
+        try:
+            return await coroutine
+        finally:
+            if not slot.submitted:  # Корутина завершилась, не передав запрос
+                self._leave()
+
+    def close(self):
+        """Закрывает пакет: новые запросы в него не добавляются."""
+        with self._lock:
+            self._closed = True
+            self._check_ready()
+
+    def _leave(self):
+        with self._lock:
+            self._expected -= 1
+            self._check_ready()
+
+    def _check_ready(self):
+        if self._closed and not self._expected and not self._ready.done():
+            self._ready.set_result(None)
+
+    async def submit(self, request: InternalRequest) -> httpx.Response:
+        """Передаёт HTTP-запрос в пакет и возвращает ответ на него."""
+        future: concurrent.futures.Future[httpx.Response] = concurrent.futures.Future()
+        with self._lock:
+            self._pending.append((request, future))
+            self._expected -= 1
+            self._check_ready()
+        await asyncio.wrap_future(self._ready)
+        with self._lock:
+            sender, self._sending = not self._sending, True
+        if sender:
+            await self._send()
+        return await asyncio.wrap_future(future)
+
+    async def _send(self):
+        for start in range(0, len(self._pending), self._max_requests):
+            chunk = self._pending[start:start + self._max_requests]
+            try:
+                await self._send_chunk(chunk)
+            except Exception as e:  # Ошибка сети - исключение каждого запроса части пакета
+                for _, future in chunk:
+                    if not future.done():
+                        future.set_exception(e)
+
+    async def _send_chunk(self, chunk: list[tuple[InternalRequest, concurrent.futures.Future[httpx.Response]]]):
+        items = []
+        for request, _ in chunk:
+            url = httpx.URL(request.path, params=request.query_params)
+            items.append({CommonStruct.method: request.method, CommonStruct.path: url.path,
+                          CommonStruct.query: url.query.decode(), CommonStruct.body: request.json})
+        async with httpx.AsyncClient() as client:
+            result = await client.post(f'{self._server}/batch', headers=chunk[0][0].headers,
+                                       json={CommonStruct.requests: items})
+
+        content = ServerResponse(result).content
+        if result.status_code != 200 or not isinstance(content, list):
+            for _, future in chunk:  # Ошибка пакета - ответ на каждый его запрос
+                future.set_result(result)
+            return
+        for (_, future), item in zip(chunk, content):
+            status_code, body = item.get(CommonStruct.status_code), item.get(CommonStruct.body)
+            future.set_result(httpx.Response(status_code) if body is None else httpx.Response(status_code, json=body))
+
+
+class BatchSlot:
+    """Место корутины запроса в пакете: в пакет передаётся только первый HTTP-запрос корутины."""
+
+    def __init__(self, batch: RequestsBatch):
+        self._batch = batch
+        self.submitted = False
+
+    async def submit(self, request: InternalRequest) -> httpx.Response:
+        self.submitted = True
+        return await self._batch.submit(request)
+
+
 class RequestsGroup(QObject):
     """Группа запросов. Позволяет отслеживать момент выполнения всех запросов группы."""
     finished = Signal(tp.Any)  # Вызывается при завершении всех запросов группы. Возвращает группу
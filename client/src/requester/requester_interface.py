@@ -1,6 +1,7 @@
 """Интерфейс запросов."""
 from abc import abstractclassmethod, ABC
 import datetime
+from pathlib import Path
 
 import typing as tp
 
@@ -83,6 +84,10 @@ class IRequests(ABC):
     def get_workspace_analytics(self, workspace_id: int, access_token: str):
         pass
 
+    def export_workspace(self, workspace_id: int, access_token: str, path: Path, cursor: str = None,
+                         max_retries: int = 3):
+        pass
+
     def get_project_analytics(self, workspace_id: int, project_id: int, access_token: str):
         pass
 
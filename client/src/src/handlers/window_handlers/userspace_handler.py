@@ -351,32 +351,33 @@ class UserSpaceWindowHandler(BaseWindowHandler):
         access_token = self._model.get_access_token()
 
         if self._data_model.user:
-            personal_daily_events = self._requester.get_personal_daily_events(self._data_model.user.id, access_token,
-                                                                              datetime.date.today())
-            personal_daily_events.finished.connect(lambda request: self._prepare_request(request, self._set_personal_daily_events))
-            self._requests.personal_daily_events_request = personal_daily_events
-
-            personal_many_days_events = self._requester.get_personal_many_days_events(self._data_model.user.id, access_token,
-                                                                                      datetime.date.today())
-            personal_many_days_events.finished.connect(lambda request: self._prepare_request(request, self._set_personal_many_days_events))
-            self._requests.personal_many_days_events_request = personal_many_days_events
-
-            ws_daily_events = self._requester.get_ws_daily_events_by_user(self._data_model.user.id,
-                                                                          self._data_model.user.notified_daily_events,
-                                                                          access_token,
-                                                                          datetime.date.today(),
-                                                                          )
-            ws_daily_events.finished.connect(lambda request: self._prepare_request(request, self._set_ws_daily_events))
-            self._requests.ws_daily_events = ws_daily_events
-
-            ws_many_days_events = self._requester.get_ws_many_days_events_by_user(
-                self._data_model.user.id,
-                self._data_model.user.notified_many_days_events,
-                access_token,
-                datetime.date.today(),
-                    )
-            ws_many_days_events.finished.connect(lambda request: self._prepare_request(request, self._set_ws_many_days_events))
-            self._requests.ws_many_days_event = ws_many_days_events
+            with self._requester.batch():  # Запросы отправляются одним запросом к /batch
+                personal_daily_events = self._requester.get_personal_daily_events(self._data_model.user.id, access_token,
+                                                                                  datetime.date.today())
+                personal_daily_events.finished.connect(lambda request: self._prepare_request(request, self._set_personal_daily_events))
+                self._requests.personal_daily_events_request = personal_daily_events
+
+                personal_many_days_events = self._requester.get_personal_many_days_events(self._data_model.user.id, access_token,
+                                                                                          datetime.date.today())
+                personal_many_days_events.finished.connect(lambda request: self._prepare_request(request, self._set_personal_many_days_events))
+                self._requests.personal_many_days_events_request = personal_many_days_events
+
+                ws_daily_events = self._requester.get_ws_daily_events_by_user(self._data_model.user.id,
+                                                                              self._data_model.user.notified_daily_events,
+                                                                              access_token,
+                                                                              datetime.date.today(),
+                                                                              )
+                ws_daily_events.finished.connect(lambda request: self._prepare_request(request, self._set_ws_daily_events))
+                self._requests.ws_daily_events = ws_daily_events
+
+                ws_many_days_events = self._requester.get_ws_many_days_events_by_user(
+                    self._data_model.user.id,
+                    self._data_model.user.notified_many_days_events,
+                    access_token,
+                    datetime.date.today(),
+                        )
+                ws_many_days_events.finished.connect(lambda request: self._prepare_request(request, self._set_ws_many_days_events))
+                self._requests.ws_many_days_event = ws_many_days_events
 
             group = self._requester.create_group(personal_daily_events, personal_many_days_events, ws_daily_events,
                                                  ws_many_days_events)
@@ -390,14 +391,15 @@ class UserSpaceWindowHandler(BaseWindowHandler):
         access_token = self._model.get_access_token()
 
         if self._data_model.user:
-            personal_tasks = self._requester.get_personal_tasks(self._data_model.user.id, access_token, datetime.date.today(),
+            with self._requester.batch():  # Запросы отправляются одним запросом к /batch
+                personal_tasks = self._requester.get_personal_tasks(self._data_model.user.id, access_token, datetime.date.today(),
+                                                                    not_completed=True)
+                personal_tasks.finished.connect(lambda request_: self._prepare_request(request_, self._set_personal_tasks))
+                ws_tasks = self._requester.get_ws_tasks_by_user(self._data_model.user.id, access_token, datetime.date.today(),
                                                                 not_completed=True)
-            personal_tasks.finished.connect(lambda request_: self._prepare_request(request_, self._set_personal_tasks))
-            ws_tasks = self._requester.get_ws_tasks_by_user(self._data_model.user.id, access_token, datetime.date.today(),
-                                                            not_completed=True)
-            ws_tasks.finished.connect(lambda request_: self._prepare_request(request_, self._set_ws_tasks))
-            self._requests.ws_tasks_request = ws_tasks
-            self._requests.personal_tasks_request = personal_tasks
+                ws_tasks.finished.connect(lambda request_: self._prepare_request(request_, self._set_ws_tasks))
+                self._requests.ws_tasks_request = ws_tasks
+                self._requests.personal_tasks_request = personal_tasks
 
             group = self._requester.create_group(personal_tasks, ws_tasks)
             group.finished.connect(lambda _: self._set_tasks_widget())
@@ -12,7 +12,6 @@ import client.models.common_models as cm
 from common.logger import config_logger, CLIENT
 from client.src.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
 from client.src.gui.sub_widgets.widgets import ProjectWidget
-from common.base import WorkStages
 
 logger = config_logger(__name__, CLIENT, LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL)
 
@@ -60,6 +59,8 @@ class WorkspaceWindowHandler(BaseWindowHandler):
         self._projects: list[cm.Project] = []
         self._participants: list[dict] = []
         self._project_widgets: dict[int, ProjectWidget] = {}  # Виджеты проектов по ID
+        self._project_stage_names: dict[int, str] = {}  # Названия текущих этапов проектов по ID
+        self._stages_distribution: dict[str, int] = {}  # Число проектов на этапах из аналитики РП
         self._roles: dict[int, str] = {
             self.ROLE_MENTOR: "Наставник",
             self.ROLE_STUDENT: "Студент",
@@ -181,37 +182,7 @@ class WorkspaceWindowHandler(BaseWindowHandler):
                 project_id = self._projects[project_index].id
                 self._load_project_analytics(project_id)
                 self._window.clear_stage_distribution()
-
-    def _load_workspace_stages(self):
-        """Загружает распределение проектов по этапам рабочего пространства."""
-        access_token = self._model.get_access_token()
-        self._window.clear_stage_distribution()
-
-        stage_names = [
-            WorkStages.idea_generating_name.value,
-            WorkStages.thesis_proofing_name.value,
-            WorkStages.solution_projecting_name.value,
-            WorkStages.development_name.value,
-            WorkStages.testing_name.value,
-            WorkStages.results_preparation_name.value,
-        ]
-
-        for stage_name in stage_names:
-            request = self._requester.get_workspace_projects(
-                self._workspace_id, access_token, limit=100, offset=0, stage_name=stage_name)
-            request.finished.connect(
-                lambda req, sn=stage_name: self._on_stage_projects_received(req, sn))
-
-    def _on_stage_projects_received(self, request, stage_name: str):
-        """Обработка получения проектов для конкретного этапа."""
-        try:
-            response = request.result()
-            projects = response.content if response.content is not None else []
-            project_names = [p.get('name', 'Без названия') for p in projects]
-            self._window.add_stage_row(stage_name, len(projects), project_names)
-        except Exception as e:
-            logger.error(f"Error loading stage {stage_name}: {e}")
-            self._window.add_stage_row(stage_name, 0, [])
+                self._stages_distribution = {}
 
     def _load_workspace_analytics(self):
         """Загружает аналитику рабочего пространства."""
@@ -295,37 +266,22 @@ class WorkspaceWindowHandler(BaseWindowHandler):
         self._window.set_tasks_distribution_chart(chart_view)
 
     def _update_stages_distribution(self, stages_distribution: dict):
-        """Обновляет распределение проектов по этапам."""
-        # Очищаем текущее отображение
+        """
+        Обновляет распределение проектов по этапам. Число проектов на этапе берётся из аналитики РП, названия
+        проектов группируются по этапам из уже загруженных проектов РП (см. _on_project_stage_data_received).
+        """
         self._window.clear_stage_distribution()
+        self._stages_distribution = dict(stages_distribution)
 
-        # Получаем токен доступа
-        access_token = self._model.get_access_token()
-
-        # Для каждого этапа сначала добавляем строку с количеством, затем делаем запрос проектов
-        for stage_name, count in stages_distribution.items():
-            # Добавляем строку этапа с начальным количеством
-            self._window.add_stage_row(stage_name, count, [])
-
-            # Делаем запрос проектов для этого этапа
-            request = self._requester.get_workspace_projects(
-                self._workspace_id, access_token, limit=100, offset=0, stage_name=stage_name)
-            request.finished.connect(
-                lambda req, sn=stage_name: self._on_stage_projects_received_for_distribution(req, sn))
+        for stage_name, count in self._stages_distribution.items():
+            self._window.add_stage_row(stage_name, count, self._get_stage_project_names(stage_name))
 
         # Добавляем отступ снизу после всех строк этапов
         self._window.add_stage_distribution_spacer()
 
-    def _on_stage_projects_received_for_distribution(self, request, stage_name: str):
-        """Обработка получения проектов для конкретного этапа в распределении."""
-        try:
-            response = request.result()
-            projects = response.content if response.content is not None else []
-            project_names = [p.get('name', 'Без названия') for p in projects]
-            # Находим строку с этим этапом и обновляем её
-            self._window.update_stage_row_project_names(stage_name, project_names)
-        except Exception as e:
-            logger.error(f"Error loading projects for stage {stage_name}: {e}")
+    def _get_stage_project_names(self, stage_name: str) -> list[str]:
+        """Возвращает названия загруженных проектов, текущий этап которых - stage_name."""
+        return [project.name for project in self._projects if self._project_stage_names.get(project.id) == stage_name]
 
     def _on_user_role_received(self, data: dict):
         """
@@ -356,6 +312,7 @@ class WorkspaceWindowHandler(BaseWindowHandler):
             return
 
         self._projects.clear()
+        self._project_stage_names.clear()
         self._window.clear_project_widgets()
         
         # Инициализируем словарь для хранения участников проектов
@@ -467,6 +424,12 @@ class WorkspaceWindowHandler(BaseWindowHandler):
                 stage=f"Этап: {stage_name}"
             )
 
+        # Обновляем строку этапа в распределении проектов по этапам
+        self._project_stage_names[project_id] = stage_name
+        if stage_name in self._stages_distribution:
+            self._window.update_stage_row_project_names(stage_name, self._get_stage_project_names(stage_name),
+                                                        self._stages_distribution[stage_name])
+
     def _update_project_widget(self, project_id: int):
         """
         Обновляет виджет проекта с реальными данными участников.
@@ -44,11 +44,35 @@ class CommonStruct:
     included_date = 'included_date'
     notified_ids = 'notified_ids'
     creator_ids = 'creator_ids'
+    text = 'text'  # Строка поиска
+    prefix = 'prefix'  # Поиск по началу строки (подсказки при вводе)
+    object_type = 'object_type'  # Тип найденного объекта
+    snippet = 'snippet'  # Фрагмент текста найденного объекта с выделенными совпадениями
+    export_end = 'end'  # Тип (object_type) последней строки выгрузки РП: выгрузка завершена
+    export_error = 'error'  # Тип строки выгрузки РП: выгрузка прервана ошибкой, продолжение - с cursor последней строки
+    imported = 'imported'  # Число импортированных строк
+    failed = 'failed'  # Число строк импорта с ошибками
+    errors = 'errors'
+    row = 'row'  # Номер строки импорта
+    requests = 'requests'  # Подзапросы пакета (/batch)
+    method = 'method'
+    path = 'path'
+    query = 'query'
+    body = 'body'
 
     limit = 'limit'
     offset = 'offset'
     last_rec_num = 'last_rec_num'
     records_left = 'records_left'
+    after_id = 'after_id'  # ID последней полученной записи (keyset-пагинация)
+    cursor = 'cursor'  # Непрозрачный курсор следующей страницы (keyset-пагинация)
+    next_cursor = 'next_cursor'
+
+    date_from = 'from'  # Начало периода (включительно)
+    date_to = 'to'  # Конец периода (включительно)
+
+    max_batch_requests = 20  # Максимальное число подзапросов в пакете
+    max_agenda_days = 31  # Максимальная длина периода повестки (дней)
 
     max_login_length = 25
     min_login_length = 5
@@ -61,6 +85,8 @@ class CommonStruct:
     datetime_format = f'{date_format} {time_format}'
     max_name_length = 60  # Максимальная длина названий объектов
     max_description_length = 1000  # Максимальная длина описаний объектов
+    search_limit = 20  # Число результатов поиска по умолчанию
+    max_search_limit = 100  # Максимальное число результатов поиска
 
 
 class TasksStatuses(enum.Enum):
@@ -209,6 +235,8 @@ class DBFields:
     # PersonalTaskEvent's fields
     task = 'task'
     task_id = 'task_id'
+    # WSRole's fields
+    permissions = 'permissions'
 
 
 class ObjectTypes:
@@ -280,6 +308,13 @@ class ErrorCodes(enum.Enum):
     incorrect_not_completed = 37  # Некорректный параметр not_completed
     incorrect_status = 38  # Некорректный статус задачи
     incorrect_creator_ids = 39  # Некорректные ID создателей
+    incorrect_cursor = 40  # Некорректный курсор (cursor, after_id)
+    incorrect_search_text = 41  # Некорректная строка поиска
+    forbidden_access_to_workspace = 42  # Пользователь не является участником РП
+    incorrect_import_format = 43  # Неподдерживаемый формат импорта (Content-Type) или тип импортируемых объектов
+    auth_overloaded = 44  # Очередь проверки паролей заполнена, запрос нужно повторить через Retry-After секунд
+    incorrect_batch = 45  # Некорректный пакет запросов или подзапрос, который нельзя выполнить в пакете
+    incorrect_date_range = 46  # Некорректный период (from, to): конец раньше начала или период длиннее max_agenda_days
 
 
 def check_password(password: str) -> bool:
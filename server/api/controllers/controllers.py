@@ -1,5 +1,6 @@
 """Функции для обработки разных видов запросов."""
 import datetime
+import json
 
 import flask
 from flask import Request, Response
@@ -10,12 +11,13 @@ from common.base import CommonStruct, ErrorCodes, TasksStatuses, DBFields, get_d
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
 from server.database.repository import DataRepository
+from server.database.models.search_index import MIN_TERM_LENGTH
 import server.utils.api_utils as utl
 from server.auth.auth_module import Authenticator, Authorizer
 import server.services.services as services
 from server.database.exceptions import BaseRepoException
-from server.api.controllers.exceptions import (IncorrectParamException, VALUE, MESSAGE, map_repo_to_controller_exc,
-                                               map_service_to_controller_exc)
+from server.api.controllers.exceptions import (IncorrectParamException, VALUE, MESSAGE, ERROR_ID,
+                                               map_repo_to_controller_exc, map_service_to_controller_exc)
 from server.services.exceptions import BaseServiceException
 from server.api.controllers.data_handlers import Bool, Int, Date, DateTime, IntList, String
 from server.data_const import Roles
@@ -27,7 +29,7 @@ class BaseController:
 
     @staticmethod
     def get(request: Request, repo: DataRepository, limit: int = None, offset: int = None,
-            require_last_num: bool = False):
+            require_last_num: bool = False, after_id: int = None):
         pass
 
     @staticmethod
@@ -53,7 +55,7 @@ class WSTaskController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: Request, repo: DataRepository, user_id: int = None, limit: int = None, offset: int = None,
-            require_last_num: bool = False):
+            require_last_num: bool = False, after_id: int = None):
         """
         Возвращает задачи РП.
         """
@@ -73,11 +75,9 @@ class WSTaskController(BaseController):
         project_id = Int('project_id', request.args.get('project_id'), ErrorCodes.incorrect_workspace_id.value)
 
         tasks = repo.get_ws_tasks(ids.value, workspace_id.value, executor_id.value, project_id.value, date.value, plan_deadline.value,
-                                  status_ids.value, not_completed.value, limit, offset)
+                                  status_ids.value, not_completed.value, limit, offset, after_id=after_id)
 
-        return utl.form_response(200, 'OK', content=tasks.content,
-                                 last_rec_num=tasks.last_record_num,
-                                 records_left=tasks.records_left)
+        return utl.form_get_success_response(tasks.content, tasks.last_record_num, tasks.records_left, tasks.last_id)
 
     @staticmethod
     def add(request: Request, repo: DataRepository, authenticator: Authenticator, authorizer: Authorizer, user_id: int) -> Response:
@@ -202,7 +202,7 @@ class UserController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: Request, repo: DataRepository, authenticator: Authenticator, limit: int = None,
-            offset: int = None, require_last_num: bool = False):
+            offset: int = None, require_last_num: bool = False, after_id: int = None):
 
         ids = IntList(CommonStruct.ids,
                       request.args.getlist(CommonStruct.ids),
@@ -210,17 +210,18 @@ class UserController(BaseController):
 
         if not ids.value:  # Если нет ID пользователя, берём с access
             try:
-                access_token = request.headers.get('Authorization')
-                user_ids = [authenticator.get_user_id(access_token)]
+                user_ids = [utl.get_request_user_id()]
                 result = repo.get_users_by_id(user_ids, limit=limit, offset=offset)
                 return utl.form_response(200, 'OK', content=result.content)
             except ValueError:
                 return utl.form_response(401, 'Expired access token', error_id=ErrorCodes.invalid_access.value)
 
         try:
-            result = repo.get_users_by_id(ids.value, limit=limit, offset=offset)
+            result = repo.get_users_by_id(ids.value, limit=limit, offset=offset, require_last_rec_num=require_last_num,
+                                          after_id=after_id)
             print(f'USERS: {result.content}')
-            return utl.form_success_response(result.content)
+            return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                 result.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -243,20 +244,36 @@ class UserController(BaseController):
     @staticmethod
     @utl.get_request
     def search(request: Request, repo: DataRepository, limit: int = None, offset: int = None,
-               require_last_num: bool = False):
+               require_last_num: bool = False, after_id: int = None):
         """
-        Ищет пользователей (User) по имени. Возвращает пользователей, имя которых содержит переданную строку.
+        Ищет пользователей (User) по имени и email. Результаты поиска по text ранжируются по релевантности, поиск с
+        prefix возвращает пользователей, имя или email которых начинается с переданной строки (подсказки при вводе),
+        упорядоченных по имени. Число результатов не больше max_search_limit, для поиска по text и prefix по умолчанию
+        - search_limit.
         Структура запроса:
         Query:
         username - Строка, содержащаяся в имени пользователя.
         email - Строка, содержащаяся в email пользователя.
+        text - Строка, содержащаяся в имени или email пользователя.
+        prefix - Поиск по началу имени и email.
+        cursor/after_id не поддерживаются при поиске по text и prefix (результаты упорядочены не по ID).
         """
         username = String(CommonStruct.username,
                           request.args.get(CommonStruct.username))
         email_ = String(CommonStruct.email, request.args.get(CommonStruct.email))
+        text = String(CommonStruct.text, request.args.get(CommonStruct.text))
+        prefix = Bool(CommonStruct.prefix, request.args.get(CommonStruct.prefix))
+        if after_id is not None and (text.value or prefix.value):
+            return utl.form_invalid_cursor_response(request.endpoint)
+        if text.value or prefix.value:
+            limit = limit or CommonStruct.search_limit
+        if limit:
+            limit = min(limit, CommonStruct.max_search_limit)
         try:
-            response = repo.search_users(username.value, email_.value, limit, offset, require_last_num)
-            return utl.form_success_response(content=response.content)
+            response = repo.search_users(username.value, email_.value, limit, offset, require_last_num,
+                                         after_id=after_id, text=text.value, prefix=bool(prefix.value))
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -266,7 +283,7 @@ class PersonalTaskController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: Request, repo: DataRepository, user_id: int = None, limit: int = None, offset: int = None,
-            require_last_num: bool = False):
+            require_last_num: bool = False, after_id: int = None):
         """Получает личные задачи по их ID."""
 
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
@@ -284,10 +301,11 @@ class PersonalTaskController(BaseController):
 
         try:
             result = repo.get_personal_tasks_by_id(ids.value, owner_id.value, date.value, plan_deadline.value,
-                                                   status_ids.value, not_completed.value, limit, offset)
-            if limit or offset or require_last_num:  # Check request of limit or offset
-                return utl.form_response(200, 'OK', last_rec_num=result.last_record_num,
-                                         records_left=result.records_left, content=result.content)
+                                                   status_ids.value, not_completed.value, limit, offset,
+                                                   after_id=after_id)
+            if limit or offset or require_last_num or after_id is not None:  # Check request of limit or offset
+                return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                     result.last_id)
             else:
                 return utl.form_response(200, 'OK', content=result.content)
         except BaseRepoException as e:
@@ -358,7 +376,7 @@ class WSDailyEventController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, ids=tp.Iterable[int], user_id: int = None,
-            limit: int = None, offset: int = None, require_last_num: bool = False):
+            limit: int = None, offset: int = None, require_last_num: bool = False, after_id: int = None):
         """Получает однодневные события РП."""
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_ws_daily_events_ids.value)
@@ -373,9 +391,9 @@ class WSDailyEventController(BaseController):
                                    ErrorCodes.incorrect_notified_ids.value)
         try:
             result = repo.get_ws_daily_events_by_id(ids.value, workspace_id.value, notified_ids.value, date.value,
-                                                    limit, offset, require_last_num)
-            return utl.form_response(200, 'OK', result.content, last_rec_num=result.last_record_num,
-                                     records_left=result.records_left)
+                                                    limit, offset, require_last_num, after_id=after_id)
+            return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                 result.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -393,7 +411,7 @@ class WSManyDaysEventController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, user_id: int = None, limit: int = None,
-            offset: int = None, require_last_num: bool = False):
+            offset: int = None, require_last_num: bool = False, after_id: int = None):
         """Получает многодневные события РП."""
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_ws_many_days_events_ids.value)
@@ -409,9 +427,10 @@ class WSManyDaysEventController(BaseController):
                                    ErrorCodes.incorrect_notified_ids.value)
         try:
             result = repo.get_ws_many_days_events_by_id(ids.value, workspace_id.value, notified_ids.value,
-                                                        included_date.value, limit, offset, require_last_num)
-            return utl.form_response(200, 'OK', result.content, last_rec_num=result.last_record_num,
-                                     records_left=result.records_left)
+                                                        included_date.value, limit, offset, require_last_num,
+                                                        after_id=after_id)
+            return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                 result.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -421,7 +440,7 @@ class PersonalDailyEventController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, user_id: int = None, limit: int = None,
-            offset: int = None, require_last_num: bool = False):
+            offset: int = None, require_last_num: bool = False, after_id: int = None):
         """Получает личные однодневные события."""
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_personal_daily_events_ids.value)
@@ -433,9 +452,9 @@ class PersonalDailyEventController(BaseController):
 
         try:
             result = repo.get_personal_daily_events_by_id(ids.value, user_id.value, date.value,
-                                                          limit, offset, require_last_num)
-            return utl.form_response(200, 'OK', result.content, last_rec_num=result.last_record_num,
-                                     records_left=result.records_left)
+                                                          limit, offset, require_last_num, after_id=after_id)
+            return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                 result.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -445,7 +464,7 @@ class PersonalManyDaysEventController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, user_id: int = None, limit: int = None,
-            offset: int = None, require_last_num: bool = False):
+            offset: int = None, require_last_num: bool = False, after_id: int = None):
         """Получает личные многодневные события."""
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_personal_many_days_events_ids.value)
@@ -456,9 +475,10 @@ class PersonalManyDaysEventController(BaseController):
                           ErrorCodes.incorrect_user_id.value)
 
         try:
-            result = repo.get_personal_many_days_events_by_id(ids.value, user_id.value, included_date.value, limit, offset, require_last_num)
-            return utl.form_response(200, 'OK', result.content, last_rec_num=result.last_record_num,
-                                     records_left=result.records_left)
+            result = repo.get_personal_many_days_events_by_id(ids.value, user_id.value, included_date.value, limit, offset,
+                                                              require_last_num, after_id=after_id)
+            return utl.form_get_success_response(result.content, result.last_record_num, result.records_left,
+                                                 result.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -489,7 +509,7 @@ class WorkspaceController(BaseController):
         try:
             services.WorkspaceService.delete_users(workspace_id.value, ids.value, repo)
         except BaseServiceException as e:
-            map_service_to_controller_exc(e, {})
+            raise map_service_to_controller_exc(e, {})
         return utl.form_success_response()
 
     @staticmethod
@@ -503,7 +523,7 @@ class WorkspaceController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, limit: int = None, offset: int = None,
-            require_last_num: bool = False):
+            require_last_num: bool = False, after_id: int = None):
         """
         Query: ids (ID РП), creator_ids (ID создателей)
         """
@@ -511,8 +531,10 @@ class WorkspaceController(BaseController):
         creator_ids = IntList(CommonStruct.creator_ids, request.args.getlist(CommonStruct.creator_ids),
                               ErrorCodes.incorrect_creator_ids.value)
         try:
-            response = repo.get_workspaces(ids.value, creator_ids.value, limit, offset, require_last_num)
-            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left)
+            response = repo.get_workspaces(ids.value, creator_ids.value, limit=limit, offset=offset,
+                                           require_last_rec_num=require_last_num, after_id=after_id)
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -565,14 +587,28 @@ class WorkspaceController(BaseController):
 
     @staticmethod
     def add_user_to_workspace(request: flask.Request, repo: DataRepository, authorizer: Authorizer, user_id: int, workspace_id: int):
-        """Добавляет пользователей в рабочее пространство."""
+        """Добавляет пользователей в рабочее пространство. Структура запроса: api/endpoint?ids."""
         user_ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids), ErrorCodes.incorrect_user_ids.value)
         try:
-            for uid in user_ids.value:
-                services.WorkspaceService.add_user_to_workspace(uid, workspace_id, repo, authorizer, user_id)
+            services.WorkspaceService.invite_users(user_ids.value, workspace_id, repo, authorizer, user_id)
             return utl.form_success_response()
         except BaseServiceException as e:
             raise map_service_to_controller_exc(e, {})
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
+
+    @staticmethod
+    def remove_users_from_workspace(request: flask.Request, repo: DataRepository, authorizer: Authorizer, user_id: int,
+                                    workspace_id: int):
+        """Удаляет пользователей из рабочего пространства. Структура запроса: api/endpoint?ids."""
+        user_ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids), ErrorCodes.incorrect_user_ids.value)
+        try:
+            services.WorkspaceService.kick_users(user_ids.value, workspace_id, repo, authorizer, user_id)
+            return utl.form_success_response()
+        except BaseServiceException as e:
+            raise map_service_to_controller_exc(e, {})
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
 
     @staticmethod
     def remove_user_from_workspace(request: flask.Request, repo: DataRepository, authorizer: Authorizer, user_id: int, workspace_id: int, target_user_id: int):
@@ -584,14 +620,123 @@ class WorkspaceController(BaseController):
             raise map_service_to_controller_exc(e, {})
 
     @staticmethod
-    def get_workspace_users(request: flask.Request, repo: DataRepository, workspace_id: int, limit: int = None, offset: int = None, require_last_num: bool = False):
+    @utl.get_request
+    def get_workspace_users(request: flask.Request, repo: DataRepository, workspace_id: int, limit: int = None, offset: int = None, require_last_num: bool = False,
+                            after_id: int = None):
         """Получает пользователей рабочего пространства."""
         try:
-            response = repo.get_workspace_users(workspace_id, limit, offset, require_last_num)
+            response = repo.get_workspace_users(workspace_id, limit, offset, require_last_num, after_id=after_id)
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
+
+    @staticmethod
+    @utl.get_request
+    def search(request: flask.Request, repo: DataRepository, workspace_id: int, user_id: int, limit: int = None,
+               offset: int = None, require_last_num: bool = False, after_id: int = None):
+        """
+        Ищет задачи, проекты и мероприятия РП, названия или тексты которых содержат строку поиска. Доступно только
+        участникам РП. Результаты ранжированы по релевантности, содержат фрагменты текста с выделенными совпадениями.
+        Число результатов не больше max_search_limit, по умолчанию - search_limit.
+        Структура запроса:
+        Query:
+        text - Строка поиска (не короче MIN_TERM_LENGTH символов).
+        """
+        text = String(CommonStruct.text, request.args.get(CommonStruct.text))
+        if not text.value or len(text.value) < MIN_TERM_LENGTH:
+            raise IncorrectParamException({CommonStruct.text: {
+                VALUE: text.value, MESSAGE: f'Search text must be at least {MIN_TERM_LENGTH} characters long',
+                ERROR_ID: ErrorCodes.incorrect_search_text.value
+            }})
+        limit = min(limit or CommonStruct.search_limit, CommonStruct.max_search_limit)
+        try:
+            if not repo.is_workspace_member(workspace_id, user_id):
+                return utl.form_response(403, 'User is not a member of the workspace',
+                                         error_id=ErrorCodes.forbidden_access_to_workspace.value)
+            response = repo.search_workspace(workspace_id, text.value, limit, offset, require_last_num)
             return utl.form_get_success_response(response.content, response.last_record_num, response.records_left)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
+    @staticmethod
+    def export(request: flask.Request, repo: DataRepository, workspace_id: int, user_id: int):
+        """
+        Выгружает РП потоком NDJSON (application/x-ndjson): строка на объект -
+        {object_type: <тип объекта>, content: <объект>, cursor: <курсор продолжения после объекта>}, последняя строка -
+        {object_type: export_end}. Объекты выбираются из БД пачками и отправляются по мере сериализации. Если
+        выгрузка прервана (обрыв соединения, строка {object_type: export_error}), она продолжается запросом с cursor
+        последней полученной строки. Доступно только участникам РП.
+        Структура запроса:
+        Query:
+        cursor - Курсор последней полученной строки (необязательно).
+        """
+        cursor = request.args.get(CommonStruct.cursor)
+        try:
+            after = utl.decode_export_cursor(cursor) if cursor else None
+        except ValueError:
+            return utl.form_invalid_cursor_response(request.endpoint)
+        try:
+            if not repo.is_workspace_member(workspace_id, user_id):
+                return utl.form_response(403, 'User is not a member of the workspace',
+                                         error_id=ErrorCodes.forbidden_access_to_workspace.value)
+            records = repo.export_workspace(workspace_id, after)
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
+
+        def stream() -> tp.Iterator[str]:
+            try:
+                for object_type, object_id, record in records:
+                    yield json.dumps({CommonStruct.object_type: object_type, CommonStruct.content: record,
+                                      CommonStruct.cursor: utl.encode_export_cursor(object_type, object_id)},
+                                     ensure_ascii=False, default=str) + '\n'
+            except BaseRepoException as e:  # Статус ответа уже отправлен: ошибка - последней строкой
+                logger.error(f'Export of workspace {workspace_id} has been interrupted: {e}')
+                yield json.dumps({CommonStruct.object_type: CommonStruct.export_error,
+                                  CommonStruct.message: 'Export has been interrupted'}) + '\n'
+                return
+            yield json.dumps({CommonStruct.object_type: CommonStruct.export_end}) + '\n'
+
+        return Response(stream(), mimetype='application/x-ndjson')
+
+    @staticmethod
+    def import_objects(request: flask.Request, repo: DataRepository, authorizer: Authorizer, workspace_id: int,
+                       user_id: int):
+        """
+        Импортирует задачи или мероприятия в РП из NDJSON (application/x-ndjson, объект на строку) или CSV (text/csv,
+        первая строка - названия полей). Тело читается потоком, строки проверяются и добавляются пачками, ошибочные
+        строки пропускаются. Возвращает отчёт: {imported: <число импортированных строк>, failed: <число ошибочных
+        строк>, errors: [{row: <номер строки данных с 1>, message: <ошибка>}]}. Доступно только участникам РП.
+        Структура запроса:
+        Query:
+        object_type - ws_task (по умолчанию), ws_daily_event или ws_many_days_event.
+        Поля строк:
+        ws_task - name, plan_deadline, executor_email, project_id или project (название), status_id или status
+        (название, по умолчанию - статус РП по умолчанию), description, plan_start_work_date.
+        ws_daily_event - name, date, time_start, time_end, description.
+        ws_many_days_event - name, datetime_start, datetime_end, description.
+        Даты и время - в формате ISO 8601.
+        """
+        object_type = request.args.get(CommonStruct.object_type, 'ws_task')
+        if object_type not in services.IMPORT_SPECS:
+            return utl.form_response(400, f'Objects of type {object_type} can not be imported',
+                                     error_id=ErrorCodes.incorrect_import_format.value)
+        readers = {'application/x-ndjson': utl.read_ndjson_rows, 'text/csv': utl.read_csv_rows}
+        if request.mimetype not in readers:
+            return utl.form_response(415, f'Content-Type must be one of: {", ".join(readers)}',
+                                     error_id=ErrorCodes.incorrect_import_format.value)
+        try:
+            if not repo.is_workspace_member(workspace_id, user_id):
+                return utl.form_response(403, 'User is not a member of the workspace',
+                                         error_id=ErrorCodes.forbidden_access_to_workspace.value)
+            report = services.ImportService.import_objects(readers[request.mimetype](request.stream), object_type,
+                                                           workspace_id, user_id, repo, authorizer)
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
+        except BaseServiceException as e:
+            raise map_service_to_controller_exc(e, {})
+        return utl.form_success_response(report)
+
     @staticmethod
     def get_user_role_in_workspace(request: flask.Request, repo: DataRepository, workspace_id: int, target_user_id: int):
         """Получает роль пользователя в рабочем пространстве."""
@@ -637,7 +782,8 @@ class ProjectController(BaseController):
 
     @staticmethod
     @utl.get_request
-    def get(request: flask.Request, repo: DataRepository, limit: int = None, offset: int = None, require_last_num: bool = False):
+    def get(request: flask.Request, repo: DataRepository, limit: int = None, offset: int = None, require_last_num: bool = False,
+            after_id: int = None):
         """Получает проекты."""
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids), ErrorCodes.incorrect_id.value)
         workspace_ids = IntList('workspace_ids', request.args.getlist('workspace_ids'), ErrorCodes.incorrect_workspace_id.value)
@@ -646,9 +792,12 @@ class ProjectController(BaseController):
         try:
             response = repo.get_projects(ids.value if ids.value else None,
                                          workspace_ids.value if workspace_ids.value else None,
-                                         creator_ids.value if creator_ids.value else None)
+                                         creator_ids.value if creator_ids.value else None,
+                                         limit=limit, offset=offset, require_last_num=require_last_num,
+                                         after_id=after_id)
             print(response)
-            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left)
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -724,11 +873,14 @@ class ProjectController(BaseController):
             raise map_service_to_controller_exc(e, {})
 
     @staticmethod
-    def get_project_users(request: flask.Request, repo: DataRepository, project_id: int, limit: int = None, offset: int = None, require_last_num: bool = False):
+    @utl.get_request
+    def get_project_users(request: flask.Request, repo: DataRepository, project_id: int, limit: int = None, offset: int = None, require_last_num: bool = False,
+                          after_id: int = None):
         """Получает пользователей проекта."""
         try:
-            response = repo.get_project_users(project_id, limit, offset, require_last_num)
-            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left)
+            response = repo.get_project_users(project_id, limit, offset, require_last_num, after_id=after_id)
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
@@ -741,20 +893,24 @@ class ProjectController(BaseController):
             raise map_repo_to_controller_exc(e, {})
 
     @staticmethod
-    def get_workspace_projects(request: flask.Request, repo: DataRepository, workspace_id: int, user_id: int, limit: int = None, offset: int = None, require_last_num: bool = False):
+    @utl.get_request
+    def get_workspace_projects(request: flask.Request, repo: DataRepository, workspace_id: int, user_id: int, limit: int = None, offset: int = None, require_last_num: bool = False,
+                               after_id: int = None):
         """Получает проекты рабочего пространства."""
         try:
             stage_name = request.args.get('stage_name')
-            response = repo.get_projects_by_workspace_id(workspace_id, current_stage_name=stage_name, limit=limit, offset=offset, require_last_num=require_last_num)
-            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left)
+            response = repo.get_projects_by_workspace_id(workspace_id, current_stage_name=stage_name, limit=limit, offset=offset, require_last_num=require_last_num,
+                                                         after_id=after_id)
+            return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                                 response.last_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
     @staticmethod
-    def get_stage(request: flask.Request, repo: DataRepository, user_id: int, project_id: int):
+    def get_stage(request: flask.Request, repo: DataRepository, authorizer: Authorizer, user_id: int, project_id: int):
         """Получает текущий этап проекта."""
         try:
-            stage = services.ProjectService.get_stage(project_id, repo, request.headers.get('Authorization'), user_id)
+            stage = services.ProjectService.get_stage(project_id, repo, authorizer, user_id)
             if stage:
                 return utl.form_success_response(stage)
             else:
@@ -763,12 +919,12 @@ class ProjectController(BaseController):
             raise map_service_to_controller_exc(e, {})
 
     @staticmethod
-    def change_stage(request: flask.Request, repo: DataRepository, user_id: int, project_id: int):
+    def change_stage(request: flask.Request, repo: DataRepository, authorizer: Authorizer, user_id: int, project_id: int):
         """Меняет текущий этап проекта."""
         stage_type = String('stage_type', request.args.get('stage_type'), ErrorCodes.incorrect_status.value, allowed=WorkStages)
 
         try:
-            stage_id = services.ProjectService.change_stage(project_id, stage_type.value, repo, request.headers.get('Authorization'), user_id)
+            stage_id = services.ProjectService.change_stage(project_id, stage_type.value, repo, authorizer, user_id)
             return utl.form_success_response({'stage_id': stage_id})
         except BaseServiceException as e:
             raise map_service_to_controller_exc(e, {})
@@ -850,23 +1006,65 @@ class AnalyticsController(BaseController):
             raise map_service_to_controller_exc(e, {})
 
 
+class AgendaController(BaseController):
+    """Контроллер повестки пользователя (экран userspace)."""
+
+    @staticmethod
+    def get(request: flask.Request, repo: DataRepository, user_id: int):
+        """
+        Получает одним ответом личные задачи и задачи РП, личные мероприятия и мероприятия РП пользователя на день
+        или период (см. DataRepository.get_agenda).
+        Структура запроса:
+        Query:
+        date - День повестки.
+        from, to - Период повестки (включительно, не длиннее max_agenda_days дней), если не передан date. По умолчанию
+        to = from.
+        not_completed - Только незавершённые задачи.
+        """
+        date = Date(CommonStruct.date, request.args.get(CommonStruct.date), ErrorCodes.incorrect_date.value)
+        date_from = Date(CommonStruct.date_from, request.args.get(CommonStruct.date_from),
+                         ErrorCodes.incorrect_date.value)
+        date_to = Date(CommonStruct.date_to, request.args.get(CommonStruct.date_to), ErrorCodes.incorrect_date.value)
+        not_completed = Bool(CommonStruct.not_completed, request.args.get(CommonStruct.not_completed))
+
+        start = date.value or date_from.value
+        if not start:
+            raise IncorrectParamException({CommonStruct.date: {
+                VALUE: None, MESSAGE: f'{CommonStruct.date} or {CommonStruct.date_from} is required',
+                ERROR_ID: ErrorCodes.incorrect_date.value
+            }})
+        end = start if date.value else date_to.value or start
+        if not 0 <= (end - start).days < CommonStruct.max_agenda_days:
+            raise IncorrectParamException({CommonStruct.date_to: {
+                VALUE: str(end), MESSAGE: f'Period must be from 1 to {CommonStruct.max_agenda_days} days long',
+                ERROR_ID: ErrorCodes.incorrect_date_range.value
+            }})
+
+        try:
+            return utl.form_success_response(repo.get_agenda(user_id, start, end, bool(not_completed.value)))
+        except BaseRepoException as e:
+            raise map_repo_to_controller_exc(e, {})
+
+
 class PersonalTaskEventController(BaseController):
     """Контроллер личных задач-мероприятий."""
 
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, limit: int = None, offset: int = None,
-            require_last_num: bool = False):
+            require_last_num: bool = False, after_id: int = None):
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_personal_tasks_ids.value)
         user_id = Int(CommonStruct.user_id, request.args.get(CommonStruct.user_id), ErrorCodes.incorrect_user_id.value)
 
         try:
-            response = repo.get_personal_task_events_by_user(ids.value, user_id.value, limit, offset, require_last_num)
+            response = repo.get_personal_task_events_by_user(ids.value, user_id.value, limit=limit, offset=offset,
+                                                             require_last_num=require_last_num, after_id=after_id)
         except BaseRepoException as e:
             raise map_repo_to_controller_exc(e, {})
 
-        return utl.form_success_response(content=response.content)
+        return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                             response.last_id)
 
 
 class WSTaskEventController(BaseController):
@@ -875,7 +1073,7 @@ class WSTaskEventController(BaseController):
     @staticmethod
     @utl.get_request
     def get(request: flask.Request, repo: DataRepository, limit: int = None,
-            offset: int = None, require_last_num: bool = False):
+            offset: int = None, require_last_num: bool = False, after_id: int = None):
         ids = IntList(CommonStruct.ids, request.args.getlist(CommonStruct.ids),
                       ErrorCodes.incorrect_ws_task_events_ids.value)
         workspace_id = Int(CommonStruct.workspace_id, request.args.get(CommonStruct.workspace_id),
@@ -883,6 +1081,8 @@ class WSTaskEventController(BaseController):
         executor_id = Int(CommonStruct.executor_id, request.args.get(CommonStruct.executor_id),
                           ErrorCodes.incorrect_executor_id.value)
 
-        response = repo.get_ws_task_events(ids.value, workspace_id.value, executor_id.value, limit, offset, require_last_num)
-        return utl.form_success_response(content=response.content)
+        response = repo.get_ws_task_events(ids.value, workspace_id.value, executor_id.value, limit=limit, offset=offset,
+                                           require_last_num=require_last_num, after_id=after_id)
+        return utl.form_get_success_response(response.content, response.last_record_num, response.records_left,
+                                             response.last_id)
 
@@ -0,0 +1,258 @@
+"""
+Многопроцессный режим сервера (pre-fork): главный процесс открывает слушающий сокет и запускает N рабочих процессов
+waitress, принимающих соединения с этого сокета. Обработка запроса (bcrypt, декодирование JWT, сериализация) занимает
+процессор под GIL, поэтому потоки одного процесса не увеличивают пропускную способность, а процессы - увеличивают
+(до числа ядер).
+
+Приложение импортируется в рабочем процессе после fork: движок БД, соединения, кэши и фоновые потоки создаются в
+каждом процессе свои. Главный процесс приложение не импортирует, поэтому перезапуск подхватывает новый код.
+
+Сигналы главного процесса:
+- SIGHUP - плавный перезапуск: запускаются новые рабочие процессы, старые перестают принимать соединения,
+  дорабатывают начатые запросы и завершаются;
+- SIGTERM, SIGINT - плавная остановка.
+
+Контроль состояния: рабочий процесс отмечает время каждой итерации цикла обработки соединений в общей памяти. Процесс,
+не отмечавшийся health_timeout секунд (завис), завершается SIGKILL; завершившиеся процессы перезапускаются, при
+повторяющихся падениях при запуске - с нарастающей задержкой.
+
+Только POSIX (os.fork).
+"""
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import time
+import typing as tp
+from dataclasses import dataclass
+
+from waitress import wasyncore
+from waitress.server import create_server
+
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+BACKLOG = 1024  # Очередь соединений слушающего сокета
+TICK = 0.5  # Период проверки рабочих процессов главным процессом (сек.)
+LOOP_TIMEOUT = 1  # Таймаут итерации цикла обработки соединений рабочего процесса (сек.)
+MIN_UPTIME = 2  # Процесс, завершившийся раньше, считается упавшим при запуске (сек.)
+MAX_RESPAWN_DELAY = 30  # Максимальная задержка перезапуска падающего процесса (сек.)
+KILL_MARGIN = 5  # Запас к graceful_timeout, после которого завершающийся процесс завершается SIGKILL (сек.)
+
+
+def import_app(app_path: str) -> tp.Callable:
+    """Импортирует WSGI-приложение по пути вида 'модуль:атрибут'."""
+    module_name, _, attribute = app_path.partition(':')
+    return getattr(importlib.import_module(module_name), attribute or 'app')
+
+
+@dataclass
+class Worker:
+    slot: int  # Ячейка отметок состояния в общей памяти
+    started: float
+    stopping_since: float | None = None  # Время отправки SIGTERM (процесс завершается)
+
+
+class PreforkServer:
+    """
+    Главный процесс многопроцессного режима.
+
+    :param app_path: Путь к WSGI-приложению вида 'модуль:атрибут', импортируется в рабочих процессах.
+    :param host: Адрес.
+    :param port: Порт.
+    :param workers: Число рабочих процессов.
+    :param threads: Число потоков обработки запросов в рабочем процессе.
+    :param graceful_timeout: Время (сек.) на завершение начатых запросов при остановке рабочего процесса.
+    :param health_timeout: Время (сек.) без отметки состояния, после которого рабочий процесс считается зависшим.
+    :param on_start: Подготовка перед запуском рабочих процессов (например, миграция БД). Выполняется один раз в
+                     отдельном процессе, чтобы главный процесс не импортировал код приложения.
+    """
+
+    def __init__(self, app_path: str, host: str, port: int, workers: int, threads: int = 8,
+                 graceful_timeout: float = 30, health_timeout: float = 60, on_start: tp.Callable[[], None] = None):
+        if workers < 1:
+            raise ValueError(f'Workers number must be positive, not: {workers}')
+        self._app_path = app_path
+        self._address = (host, port)
+        self._workers_num = workers
+        self._threads = threads
+        self._graceful_timeout = graceful_timeout
+        self._health_timeout = health_timeout
+        self._on_start = on_start
+
+        self._socket: socket.socket | None = None
+        # Два поколения процессов на время плавного перезапуска
+        self._heartbeats = multiprocessing.RawArray('d', 2 * workers)
+        self._workers: dict[int, Worker] = {}
+        self._respawn_delays: dict[int, float] = {}  # Ячейка -> текущая задержка перезапуска
+        self._respawn_at: dict[int, float] = {}  # Ячейка -> время перезапуска
+        self._signals: list[int] = []
+        self._stopping = False
+
+    def run(self):
+        """Запускает рабочие процессы и контролирует их до остановки (SIGTERM, SIGINT)."""
+        if self._on_start is not None:
+            self._run_in_child(self._on_start)
+        self._socket = socket.create_server(self._address, backlog=BACKLOG)
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, self._handle_signal)
+        logger.info(f'Prefork server is running on {self._address}. PID: {os.getpid()}. '
+                    f'Workers: {self._workers_num}, threads: {self._threads}.')
+
+        for slot in range(self._workers_num):
+            self._spawn(slot)
+        try:
+            while not self._stopping or self._workers:
+                self._process_signals()
+                self._reap()
+                self._check_health()
+                if not self._stopping:
+                    self._respawn()
+                time.sleep(TICK)
+        finally:
+            for pid in self._workers:
+                self._kill(pid, signal.SIGKILL)
+            self._socket.close()
+        logger.info('Prefork server has been stopped.')
+
+    def _handle_signal(self, signum: int, frame):
+        self._signals.append(signum)
+
+    def _process_signals(self):
+        while self._signals:
+            signum = self._signals.pop(0)
+            if signum == signal.SIGHUP and not self._stopping:
+                self._restart()
+            elif signum in (signal.SIGTERM, signal.SIGINT) and not self._stopping:
+                logger.info(f'Graceful stop by signal: {signal.Signals(signum).name}.')
+                self._stopping = True
+                self._respawn_at.clear()
+                for pid in self._workers:
+                    self._stop_worker(pid)
+
+    def _restart(self):
+        """Плавный перезапуск: новое поколение процессов запускается до остановки старого."""
+        logger.info('Graceful restart.')
+        old_pids = [pid for pid, worker in self._workers.items() if worker.stopping_since is None]
+        busy_slots = {worker.slot for worker in self._workers.values()}
+        free_slots = [slot for slot in range(len(self._heartbeats)) if slot not in busy_slots]
+        self._respawn_at.clear()
+        for slot in free_slots[:self._workers_num]:
+            self._spawn(slot)
+        for pid in old_pids:
+            self._stop_worker(pid)
+
+    def _spawn(self, slot: int):
+        self._heartbeats[slot] = time.time()
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                exit_code = self._serve(slot)
+            except BaseException:
+                logger.exception(f'Worker {os.getpid()} has failed.')
+            finally:
+                os._exit(exit_code)
+        self._workers[pid] = Worker(slot, time.time())
+        logger.info(f'Worker {pid} has been started.')
+
+    def _stop_worker(self, pid: int):
+        worker = self._workers[pid]
+        if worker.stopping_since is None:
+            worker.stopping_since = time.time()
+            self._kill(pid, signal.SIGTERM)
+
+    def _kill(self, pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _reap(self):
+        """Обрабатывает завершившиеся рабочие процессы, планирует перезапуск неожиданно завершившихся."""
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            worker = self._workers.pop(pid, None)
+            if worker is None:
+                continue
+            if worker.stopping_since is not None:
+                logger.info(f'Worker {pid} has been stopped.')
+                continue
+
+            logger.error(f'Worker {pid} has exited unexpectedly with status: {os.waitstatus_to_exitcode(status)}.')
+            if time.time() - worker.started < MIN_UPTIME:  # Падение при запуске: перезапуск с задержкой
+                delay = min(2 * self._respawn_delays.get(worker.slot, 0.5), MAX_RESPAWN_DELAY)
+            else:
+                delay = 0
+            self._respawn_delays[worker.slot] = delay
+            self._respawn_at[worker.slot] = time.time() + delay
+
+    def _respawn(self):
+        now = time.time()
+        for slot, respawn_at in list(self._respawn_at.items()):
+            if respawn_at <= now:
+                del self._respawn_at[slot]
+                self._spawn(slot)
+
+    def _check_health(self):
+        """Завершает зависшие процессы и процессы, не завершившиеся за graceful_timeout."""
+        now = time.time()
+        for pid, worker in self._workers.items():
+            if worker.stopping_since is not None:
+                if now - worker.stopping_since > self._graceful_timeout + KILL_MARGIN:
+                    logger.warning(f'Worker {pid} has not stopped in {self._graceful_timeout} s, killing it.')
+                    self._kill(pid, signal.SIGKILL)
+            elif now - self._heartbeats[worker.slot] > self._health_timeout:
+                logger.error(f'Worker {pid} has not responded for {self._health_timeout} s, killing it.')
+                self._kill(pid, signal.SIGKILL)  # Процесс будет перезапущен в _reap
+
+    def _run_in_child(self, function: tp.Callable[[], None]):
+        pid = os.fork()
+        if pid == 0:
+            exit_code = 1
+            try:
+                function()
+                exit_code = 0
+            except BaseException:
+                logger.exception('Prefork server start preparation has failed.')
+            finally:
+                os._exit(exit_code)
+        _, status = os.waitpid(pid, 0)
+        if os.waitstatus_to_exitcode(status) != 0:
+            raise RuntimeError('Prefork server start preparation has failed.')
+
+    def _serve(self, slot: int) -> int:
+        """Цикл рабочего процесса. Возвращает код завершения."""
+        stop_requested = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: stop_requested.append(signum))
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+        app = import_app(self._app_path)  # Движок БД, кэши и фоновые потоки создаются в процессе
+        socket_map = {}
+        server = create_server(app, map=socket_map, sockets=[self._socket], threads=self._threads)
+
+        stop_deadline = None
+        while True:
+            self._heartbeats[slot] = time.time()
+            if stop_requested and stop_deadline is None:  # Новые соединения принимают другие процессы
+                stop_deadline = time.time() + self._graceful_timeout
+                server.accepting = False
+            if stop_deadline is not None:
+                for channel in list(server.active_channels.values()):
+                    if not channel.requests and not channel.total_outbufs_len:  # Соединение без запросов
+                        channel.will_close = True
+                if not server.active_channels or time.time() > stop_deadline:
+                    break
+            wasyncore.loop(timeout=LOOP_TIMEOUT, map=socket_map, count=1)
+
+        server.task_dispatcher.shutdown(timeout=max(stop_deadline - time.time(), 0))
+        return 0
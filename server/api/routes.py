@@ -1,21 +1,30 @@
 """Основной модуль сервера. Содержит слой роутеров."""
-from flask import Flask, request
+from flask import Flask, request, g
 from sqlalchemy.orm.session import sessionmaker
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from common_utils.log_utils.memory_logger import check_memory
 from server.data_const import APIAnswers as APIAn
 from server.auth.auth_module import Authenticator, Authorizer
+from server.auth.password_hasher import PasswordHasher, HasherBusy
 from server.database.models.db_utils import launch_db, init_db
 from server.database.repository import DataRepository
+from server.database.sharding import launch_sharded_db, ShardedRepository
+from server.database.write_dispatcher import WriteDispatcher
+from server.database.cash_manager import CashManager
+from server.database.request_scope import RequestScope
+from server.database.exceptions import BaseRepoException
 from server.storage.server_model import Model
 from server.data_const import DataStruct, Config, Permissions
 from common.base import CommonStruct, check_password, ErrorCodes as ErCodes, DBFields, project_root
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
 from server.utils.data_checkers import check_email
-from server.utils.api_utils import form_response, exceptions_handler
+from server.utils.api_utils import (form_response, exceptions_handler, get_request_user_id,
+                                    form_auth_overloaded_response, get_request_scope, form_success_response,
+                                    parse_batch_items, is_batch_item, BatchItem, BATCH_ITEM)
 import server.api.controllers.controllers as handlers
 
 
@@ -24,40 +33,103 @@ logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZ
 app = Flask(__name__)
 config = Config(Path(project_root() / "server" / "config.json"))
 database_path = config.database_path
-engine = launch_db(database_path)
 
-logger.info(f'Module is running. Environment: {config.env}. DB path: {database_path}.'
-            f'Access lifetime: {config.access_token_lifetime}. Refresh lifetime: {config.refresh_token_lifetime}')
-
-session = sessionmaker(bind=engine)
-repo = DataRepository(session)
-model = Model(Path(project_root() / "server" / "storage" / "storage"))
+logger.info(f'Module is running. Environment: {config.env}. DB path: {database_path}. DB profile: {config.db_profile}.'
+            f'Write dispatch: {config.write_dispatch}. Shards: {config.shards}. Query cache size: {config.query_cache_size}. Request session: {config.request_session}. Check permissions: {config.check_permissions}. Access lifetime: {config.access_token_lifetime}. Refresh lifetime: {config.refresh_token_lifetime}')
+
+if config.shards:
+    if config.query_cache_size:
+        logger.warning('Query cache is not supported for a sharded database and is disabled.')
+    engine, shard_engines = launch_sharded_db(database_path, config.shards, config.db_profile)
+    session = sessionmaker(bind=engine)
+    repo = ShardedRepository(session, [sessionmaker(bind=shard_engine) for shard_engine in shard_engines],
+                             write_dispatch=config.write_dispatch)
+else:
+    engine = launch_db(database_path, config.db_profile)
+    session = sessionmaker(bind=engine)
+    repo = DataRepository(session, write_dispatcher=WriteDispatcher(session) if config.write_dispatch else None,
+                          cash_manager=CashManager(engine, config.query_cache_size) if config.query_cache_size else None,
+                          request_scope_provider=get_request_scope)
+# Сессия на запрос: транзакция запроса не объединяется с транзакциями группы очереди записи и не охватывает шарды
+request_session = config.request_session and not config.shards and not config.write_dispatch
+if config.request_session and not request_session:
+    logger.warning('Request session is not supported with write dispatch or sharding and is disabled.')
 ds_const = DataStruct()
+model = Model(
+    Path(project_root() / "server" / "storage" / "storage"),
+    compaction_interval=ds_const.blacklist_compaction_interval
+)
 common_struct = CommonStruct()
 authenticator = Authenticator(
     repo,
     model,
     ds_const.jwt_alg,
     config.access_token_lifetime,
-    config.refresh_token_lifetime
+    config.refresh_token_lifetime,
+    password_hasher=PasswordHasher(config.hash_workers, config.hash_queue_size, config.bcrypt_rounds)
 )
 authorizer = Authorizer(
     repo,
     ds_const,
-    Permissions
+    Permissions,
+    # Маски разрешений кэшируются до изменения ролей. Для шардов - без кэша: роли хранятся в БД шардов
+    cash_manager=None if config.shards else CashManager(engine, ds_const.permissions_cache_size),
+    enforce=config.check_permissions
 )
 
 EXCLUDED_ENDPOINTS = ['register', 'auth_login', 'auth_refresh', 'auth_recall']
+# Не выполняются в пакете: эндпоинты без токена, пакет и потоковые выгрузка и импорт
+BATCH_EXCLUDED_ENDPOINTS = EXCLUDED_ENDPOINTS + ['batch', 'workspace_export', 'workspace_import']
+# Подзапросы чтения пакета выполняются параллельно, если у них нет общей сессии запроса
+batch_executor = None if request_session else ThreadPoolExecutor(ds_const.batch_workers, thread_name_prefix='batch')
 
 
 @app.before_request
 def check_auth():
     if request.endpoint in EXCLUDED_ENDPOINTS:
         return
+    if is_batch_item():  # Пользователь подзапроса аутентифицирован запросом /batch
+        return
 
     auth = request.headers.get('Authorization')
-    if not authenticator.check_token_valid(auth, DataStruct.access_token):
+    payload = authenticator.decode_token(auth, DataStruct.access_token)
+    if payload is None:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
+    g.token_payload = payload  # Токен декодируется один раз за запрос, дальше ID берётся из flask.g
+    g.user_id = int(payload.get('sub'))
+
+
+@app.before_request
+def open_request_scope():
+    """Контекст БД запроса: сессия открывается при первом обращении репозитория к БД."""
+    if request_session and not is_batch_item():  # Подзапросы пакета выполняются в контексте пакета
+        g.request_scope = RequestScope()
+
+
+@app.after_request
+def commit_request_scope(response):
+    """Фиксирует транзакцию запроса. Если запрос завершился ошибкой сервера (5xx), транзакция откатывается."""
+    if is_batch_item():
+        return response
+    scope: RequestScope | None = g.pop('request_scope', None)
+    if scope is None:
+        return response
+    try:
+        scope.close(commit=response.status_code < 500)
+    except BaseRepoException as e:
+        logger.error(f'Request transaction of endpoint {request.endpoint} has not been committed: {e}')
+        return form_response(500, 'Changes have not been saved', error_id=ErCodes.server_error.value)
+    return response
+
+
+@app.teardown_request
+def close_request_scope(exc):
+    """Откатывает транзакцию запроса, завершившегося необработанным исключением."""
+    if is_batch_item():
+        return
+    scope: RequestScope | None = g.pop('request_scope', None)
+    if scope is not None:
+        scope.close(commit=False)
 
 
 @exceptions_handler
@@ -108,6 +180,8 @@ def register():
     try:
         authenticator.register(login, email, password)
         return form_response(200, 'OK', {})
+    except HasherBusy as e:
+        return form_auth_overloaded_response(e.retry_after)
     except ValueError:
         by_login = repo.get_users_by_username((login, ))
         if by_login.content:  # Если есть пользователь с таким же логином
@@ -146,6 +220,8 @@ def auth_login():
     try:
         tokens = authenticator.authorize(login, password)
         return form_response(200, 'OK', tokens)
+    except HasherBusy as e:
+        return form_auth_overloaded_response(e.retry_after)
     except ValueError:
         return form_response(400, APIAn.unknown_credentials_message, error_id=ErCodes.invalid_credentials.value)
 
@@ -200,8 +276,7 @@ def personal_tasks():
 @app.route('/personal_tasks/<int:task_id>/status', methods=['PUT'])
 def personal_task_status(task_id: int):
 
-    access_token = request.headers.get('Authorization')
-    request_sender_id = authenticator.get_user_id(access_token)
+    request_sender_id = get_request_user_id()
 
     response = handlers.PersonalTaskController.change_status(request, task_id, repo)
 
@@ -229,7 +304,7 @@ def users():
 def user_personal_tasks(user_id: int):
     response = None
 
-    request_sender_id = authenticator.get_user_id(request.headers.get('Authorization'))
+    request_sender_id = get_request_user_id()
     if not authorizer.pre_check_access_to_personal_objects(request_sender_id, user_id):
         return form_response(403, f"You haven't access to personal objects of user (ID: {user_id})",
                              error_id=ErCodes.forbidden_access_to_personal_object.value)
@@ -250,7 +325,7 @@ def user_personal_tasks(user_id: int):
 @app.route('/users/<int:user_id>/ws_tasks', methods=['GET'])  # ToDo: удалить, перенести на основной эндпоинт получения задач
 def user_ws_tasks(user_id: int):
 
-    request_sender_id = authenticator.get_user_id(request.headers.get('Authorization'))
+    request_sender_id = get_request_user_id()
     if not authorizer.pre_check_access_to_personal_objects(request_sender_id, user_id):
         return form_response(403, f"You haven't access to personal objects of user (ID: {user_id})",
                              error_id=ErCodes.forbidden_access_to_personal_object.value)
@@ -260,6 +335,18 @@ def user_ws_tasks(user_id: int):
     return response
 
 
+@exceptions_handler
+@app.route('/users/<int:user_id>/agenda', methods=['GET'])
+def user_agenda(user_id: int):
+    """Повестка пользователя на день или период: задачи и мероприятия одним ответом."""
+    request_sender_id = get_request_user_id()
+    if not authorizer.pre_check_access_to_personal_objects(request_sender_id, user_id):
+        return form_response(403, f"You haven't access to personal objects of user (ID: {user_id})",
+                             error_id=ErCodes.forbidden_access_to_personal_object.value)
+
+    return handlers.AgendaController.get(request, repo, user_id)
+
+
 @exceptions_handler
 @app.route('/ws_tasks', methods=['GET', 'PUT', 'POST', 'DELETE'])
 def ws_tasks():
@@ -269,7 +356,7 @@ def ws_tasks():
 
     response = None
     try:
-        user_id = authenticator.get_user_id(request.headers.get('Authorization'))
+        user_id = get_request_user_id()
     except ValueError:
         return form_response(400, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
@@ -417,8 +504,7 @@ def workspaces():
 
     if request.method in ['PUT', 'POST', 'DELETE']:
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
@@ -441,18 +527,16 @@ def workspace_people(workspace_id: int):
     response = None
     if request.method in ['PUT', 'POST', 'DELETE']:
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
-            response = handlers.WorkspaceController.create(request, repo, authenticator, authorizer, user_id)
+            user_id = get_request_user_id()
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
     if request.method == 'GET':
         response = handlers.WorkspaceController.get_workspace_users(request, repo, workspace_id)
-    elif request.method == 'POST':
-        response = handlers.WorkspaceController.add_user_to_workspace(request, repo, authenticator, authorizer, user_id, workspace_id)
-    elif request.method == 'DELETE':
-        response = handlers.WorkspaceController.remove_user_from_workspace(request, repo, authenticator, authorizer, user_id, workspace_id)
+    elif request.method == 'POST':  # Массовое добавление: ?ids=1&ids=2...
+        response = handlers.WorkspaceController.add_user_to_workspace(request, repo, authorizer, user_id, workspace_id)
+    elif request.method == 'DELETE':  # Массовое удаление: ?ids=1&ids=2...
+        response = handlers.WorkspaceController.remove_users_from_workspace(request, repo, authorizer, user_id, workspace_id)
 
     return response
 
@@ -462,9 +546,8 @@ def workspace_people(workspace_id: int):
 def workspace_remove_user(workspace_id: int, target_user_id: int):
     """Удаление пользователя из рабочего пространства."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
-        response = handlers.WorkspaceController.remove_user_from_workspace(request, repo, authenticator, authorizer, user_id, workspace_id, target_user_id)
+        user_id = get_request_user_id()
+        response = handlers.WorkspaceController.remove_user_from_workspace(request, repo, authorizer, user_id, workspace_id, target_user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
@@ -476,8 +559,7 @@ def workspace_remove_user(workspace_id: int, target_user_id: int):
 def workspace_set_user_role(workspace_id: int, target_user_id: int):
     """Установка роли пользователя в рабочем пространстве."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.WorkspaceController.set_user_role_in_workspace(request, repo, authenticator, authorizer, user_id, workspace_id, target_user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -498,8 +580,7 @@ def workspace_get_user_role(workspace_id: int, target_user_id: int):
 def workspace_projects(workspace_id: int):
     """Получение проектов рабочего пространства."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.get_workspace_projects(request, repo, workspace_id, user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -507,13 +588,48 @@ def workspace_projects(workspace_id: int):
     return response
 
 
+@exceptions_handler
+@app.route('/workspaces/<int:workspace_id>/search', methods=['GET'])
+def workspace_search(workspace_id: int):
+    """Поиск по задачам, проектам и мероприятиям рабочего пространства."""
+    try:
+        user_id = get_request_user_id()
+    except ValueError:
+        return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
+
+    return handlers.WorkspaceController.search(request, repo, workspace_id, user_id)
+
+
+@exceptions_handler
+@app.route('/workspaces/<int:workspace_id>/export', methods=['GET'])
+def workspace_export(workspace_id: int):
+    """Потоковая выгрузка рабочего пространства (NDJSON)."""
+    try:
+        user_id = get_request_user_id()
+    except ValueError:
+        return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
+
+    return handlers.WorkspaceController.export(request, repo, workspace_id, user_id)
+
+
+@exceptions_handler
+@app.route('/workspaces/<int:workspace_id>/import', methods=['POST'])
+def workspace_import(workspace_id: int):
+    """Массовый импорт задач и мероприятий рабочего пространства (NDJSON, CSV)."""
+    try:
+        user_id = get_request_user_id()
+    except ValueError:
+        return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
+
+    return handlers.WorkspaceController.import_objects(request, repo, authorizer, workspace_id, user_id)
+
+
 @exceptions_handler
 @app.route('/workspaces/<int:workspace_id>/analytics', methods=['GET'])
 def workspace_analytics(workspace_id: int):
     """Получение аналитики рабочего пространства."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.AnalyticsController.get_workspace_analytics(request, repo, workspace_id, user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -526,8 +642,7 @@ def workspace_analytics(workspace_id: int):
 def project_analytics(workspace_id: int, project_id: int):
     """Получение аналитики проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.AnalyticsController.get_project_analytics(request, repo, workspace_id, project_id, user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -545,22 +660,19 @@ def projects():
         response = handlers.ProjectController.get(request, repo)
     elif request.method == 'POST':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.create(request, repo, authenticator, authorizer, user_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
     elif request.method == 'PUT':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.update(request, repo, authenticator, authorizer, user_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
     elif request.method == 'DELETE':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.delete(request, repo, authenticator, authorizer, user_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -587,15 +699,13 @@ def project_students(project_id: int):
 
     if request.method == 'POST':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.add_student_to_project(request, repo, authenticator, authorizer, user_id, project_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
     elif request.method == 'DELETE':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.add_student_to_project(request, repo, authenticator, authorizer, user_id, project_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -608,8 +718,7 @@ def project_students(project_id: int):
 def project_remove_student(project_id: int, target_user_id: int):
     """Удаление студента из проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.remove_student_from_project(request, repo, authenticator, authorizer, user_id, project_id, target_user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -627,15 +736,13 @@ def project_mentors(project_id: int):
         response = handlers.ProjectController.get_project_mentors(repo, project_id)
     if request.method == 'POST':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.add_mentor_to_project(request, repo, authenticator, authorizer, user_id, project_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
     elif request.method == 'DELETE':
         try:
-            access_token = request.headers.get('Authorization')
-            user_id = authenticator.get_user_id(access_token)
+            user_id = get_request_user_id()
             response = handlers.ProjectController.add_mentor_to_project(request, repo, authenticator, authorizer, user_id, project_id)
         except ValueError:
             return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -648,8 +755,7 @@ def project_mentors(project_id: int):
 def project_remove_mentor(project_id: int, target_user_id: int):
     """Удаление наставника из проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.remove_mentor_from_project(request, repo, authenticator, authorizer, user_id, project_id, target_user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -662,9 +768,8 @@ def project_remove_mentor(project_id: int, target_user_id: int):
 def project_stage(workspace_id: int, project_id: int):
     """Получение текущего этапа проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
-        response = handlers.ProjectController.get_stage(request, repo, user_id, project_id)
+        user_id = get_request_user_id()
+        response = handlers.ProjectController.get_stage(request, repo, authorizer, user_id, project_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
@@ -676,9 +781,8 @@ def project_stage(workspace_id: int, project_id: int):
 def project_change_stage(workspace_id: int, project_id: int):
     """Изменение текущего этапа проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
-        response = handlers.ProjectController.change_stage(request, repo, user_id, project_id)
+        user_id = get_request_user_id()
+        response = handlers.ProjectController.change_stage(request, repo, authorizer, user_id, project_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
 
@@ -690,8 +794,7 @@ def project_change_stage(workspace_id: int, project_id: int):
 def project_stages(project_id: int):
     """Получение всех этапов проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.get_project_stages(request, repo, project_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -704,8 +807,7 @@ def project_stages(project_id: int):
 def project_stage_by_id(workspace_id: int, project_id: int, stage_id: int):
     """Получение этапа проекта по его ID."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.get_work_stage_by_id(request, repo, user_id, project_id, stage_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -718,8 +820,7 @@ def project_stage_by_id(workspace_id: int, project_id: int, stage_id: int):
 def update_project_stages(project_id: int):
     """Обновление этапов проекта."""
     try:
-        access_token = request.headers.get('Authorization')
-        user_id = authenticator.get_user_id(access_token)
+        user_id = get_request_user_id()
         response = handlers.ProjectController.update_project_stages(request, repo, project_id, user_id)
     except ValueError:
         return form_response(401, 'Expired access token', error_id=ErCodes.invalid_access.value)
@@ -738,6 +839,62 @@ def users_search():
     return response
 
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """
+    Пакет запросов: выполняет подзапросы {"method", "path", "query", "body"} из списка requests за один HTTP-запрос с
+    одной аутентификацией, возвращает список {"status_code", "body"} ответов подзапросов в порядке подзапросов (body -
+    ответ подзапроса в формате form_response).
+
+    С сессией на запрос подзапросы выполняются по порядку в контексте БД пакета: повторные чтения берутся из
+    identity map, изменения фиксируются одной транзакцией пакета, чтения пакета без изменений видят один снимок БД.
+    Без неё подзапросы чтения (GET) между изменениями выполняются параллельно.
+    """
+    try:
+        items = parse_batch_items(request.get_json(silent=True), common_struct.max_batch_requests)
+    except ValueError as e:
+        return form_response(400, APIAn.invalid_data_error(CommonStruct.requests, request.endpoint, str(e)),
+                             error_id=ErCodes.incorrect_batch.value)
+
+    user, base_url = (g.token_payload, g.user_id), request.host_url
+    scope: RequestScope | None = g.get('request_scope')
+    if batch_executor is None:
+        if scope is not None and all(item.method == 'GET' for item in items):
+            scope.begin_snapshot(session)
+        return form_success_response([dispatch_batch_item(item, user, base_url) for item in items])
+
+    results, reads = [], []
+    for item in items:
+        if item.method == 'GET':
+            reads.append(batch_executor.submit(dispatch_batch_item, item, user, base_url))
+            continue
+        results += [future.result() for future in reads]  # Изменение выполняется после предшествующих чтений
+        reads = []
+        results.append(dispatch_batch_item(item, user, base_url))
+    results += [future.result() for future in reads]
+    return form_success_response(results)
+
+
+def dispatch_batch_item(item: BatchItem, user: tuple[dict, int], base_url: str) -> dict:
+    """
+    Выполняет подзапрос пакета от имени пользователя пакета user (данные access-токена, ID). Подзапрос проходит
+    обработчики запроса, кроме аутентификации и открытия контекста БД.
+    """
+    with app.test_request_context(item.path, base_url, method=item.method, query_string=item.query, json=item.body,
+                                  environ_overrides={BATCH_ITEM: True}):
+        g.token_payload, g.user_id = user
+        if request.endpoint in BATCH_EXCLUDED_ENDPOINTS:
+            response = form_response(400, f'Endpoint {request.endpoint} can not be executed in batch',
+                                     error_id=ErCodes.incorrect_batch.value)
+        else:
+            try:
+                response = app.full_dispatch_request()
+            except Exception as e:
+                logger.exception(f'An exception caught during executing batch request {item}: {e}')
+                response = form_response(500, 'Server error', error_id=ErCodes.server_error.value)
+        return {CommonStruct.status_code: response.status_code, CommonStruct.body: response.get_json(silent=True)}
+
+
 def run():
     app.run()
 
@@ -3,12 +3,13 @@ import enum
 import os
 import shelve
 import jwt
-from bcrypt import checkpw, hashpw, gensalt
 
-from server.database.exceptions import NotUniqueValue
+from server.auth.password_hasher import PasswordHasher, HasherBusy, hash_password
+from server.database.exceptions import NotUniqueValue, BaseRepoException
 from server.storage.server_model import Model
 from server.database.repository import DataRepository
-from server.data_const import DataStruct, Permissions
+from server.data_const import DataStruct, Permissions, PERMISSION_BITS
+from server.database.cash_manager import CashManager
 from common.base import DBFields, CommonStruct, TasksStatuses
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
@@ -16,12 +17,12 @@ from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LE
 logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
 
 
-def hash_password(password: str) -> str:
-    return hashpw(bytes(password, encoding='utf-8'), gensalt()).decode('utf-8')
-
-
 class Authenticator:
-    """Сервис аутентификации."""
+    """
+    Сервис аутентификации. Пароли хешируются и проверяются через password_hasher (см. server.auth.password_hasher):
+    если его очередь заполнена, register и authorize выбрасывают HasherBusy. По умолчанию bcrypt выполняется в
+    вызывающем потоке.
+    """
 
     def __init__(
              self,
@@ -30,9 +31,11 @@ class Authenticator:
              jwt_alg: str,
              access_token_lifetime: datetime.timedelta,
              refresh_token_lifetime: datetime.timedelta,
-             data_struct: DataStruct = DataStruct()
+             data_struct: DataStruct = DataStruct(),
+             password_hasher: PasswordHasher = None
                  ):
         self._jwt_alg = jwt_alg
+        self._password_hasher = password_hasher or PasswordHasher(workers=0)
         self._repository = repository
         self._model = model
         self._model.get_secret()
@@ -53,48 +56,56 @@ class Authenticator:
         )
         return token_
 
-    def check_token_valid(self, token_: str, type_: str) -> bool:
+    def decode_token(self, token_: str, type_: str) -> dict | None:
         """
-        Проверяет валидность токена. Возвращает логическое значение <Токен валиден>
+        Проверяет токен и возвращает его payload. Если токен недействителен (в блеклисте, просрочен, не того типа),
+        возвращает None.
         :param token_: токен
         :param type_: тип токена (access_token или refresh_token)
         """
 
-        secret = self._model.get_secret()
+        if not token_:
+            return None
         if self._model.check_token_in_blacklist(token_):
             logger.warning(f'Token in blacklist. Token: {token_}')
-            return False
+            return None
         try:
-            payload = jwt.decode(token_, key=secret, algorithms=[self._jwt_alg])
+            payload = jwt.decode(token_, key=self._model.get_secret(), algorithms=[self._jwt_alg])
             creating_time = payload.get('iat')  # Проверка типа токена
             expiring_time = payload.get('exp')
             if type_ == self._data_struct.access_token:
                 if expiring_time - creating_time != self._access_token_lifetime.total_seconds():
-                    return False
+                    return None
             elif type_ == self._data_struct.refresh_token:
                 if expiring_time - creating_time != self._refresh_token_lifetime.total_seconds():
                     logger.warning(f"Invalid refresh token. Token's time difference: {expiring_time - creating_time}."
                                    f"It must be refresh token lifetime: {self._refresh_token_lifetime.total_seconds()}")
-                    return False
+                    return None
             else:
                 raise ValueError(f'Unknown token_type: {type_}. Must be access or refresh')
 
         except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
             logger.warning(f'Invalid token. Type: {type_}. Token: {token_}')
-            return False
-        return True
+            return None
+        return payload
+
+    def check_token_valid(self, token_: str, type_: str) -> bool:
+        """
+        Проверяет валидность токена. Возвращает логическое значение <Токен валиден>
+        :param token_: токен
+        :param type_: тип токена (access_token или refresh_token)
+        """
+        return self.decode_token(token_, type_) is not None
 
     def get_user_id(self, token_: str) -> int:
         """
         Возвращает user_id из access-токена. Вызывает ValueError, если токен недействителен или произошла ошибка при
         декодировании.
         """
-        if self.check_token_valid(token_, self._data_struct.access_token):
-            secret = self._model.get_secret()
-            payload = jwt.decode(token_, key=secret, algorithms=[self._jwt_alg])
-            return int(payload.get('sub'))
-        else:
+        payload = self.decode_token(token_, self._data_struct.access_token)
+        if payload is None:
             raise ValueError
+        return int(payload.get('sub'))
 
     def update_tokens(self, refresh_token: str) -> dict[str, str]:
         """
@@ -103,46 +114,45 @@ class Authenticator:
         декодировании.
         """
 
-        if self.check_token_valid(refresh_token, self._data_struct.refresh_token):
-            secret = self._model.get_secret()
-            payload = jwt.decode(refresh_token, key=secret, algorithms=[self._jwt_alg])
-            user_id = payload.get('sub')
+        payload = self.decode_token(refresh_token, self._data_struct.refresh_token)
+        if payload is None:
+            raise ValueError
 
-            if not user_id:
-                raise ValueError('Invalid token: no user_id')
-            access_token = self._create_token(user_id, self._access_token_lifetime)
-            new_refresh_token = self._create_token(user_id, self._refresh_token_lifetime)
+        user_id = payload.get('sub')
+        if not user_id:
+            raise ValueError('Invalid token: no user_id')
+        access_token = self._create_token(user_id, self._access_token_lifetime)
+        new_refresh_token = self._create_token(user_id, self._refresh_token_lifetime)
 
-            self._model.add_token_to_blacklist(refresh_token)
+        self._model.add_token_to_blacklist(refresh_token)
 
-            return {CommonStruct.access_token: access_token, CommonStruct.refresh_token: new_refresh_token}
-        else:
-            raise ValueError
+        return {CommonStruct.access_token: access_token, CommonStruct.refresh_token: new_refresh_token}
 
     def register(self, login: str, email: str, password: str):
-        hashed_password = hash_password(password)
+        hashed_password = self._password_hasher.hash(password)
         try:
-            response = self._repository.add_users(({DBFields.username: login, DBFields.email: email,
-                                                    DBFields.hashed_password: hashed_password},))
-            user_id = response.ids[0]
-            # Создание стандартных статусов задач
-            default_personal_task_status = {DBFields.owner_id: user_id,
-                                            DBFields.name: TasksStatuses.default_task_status_name.value}
-            completed_personal_task_status = {DBFields.owner_id: user_id,
-                                              DBFields.name: TasksStatuses.default_completed_task_status_name.value}
-
-            # Добавление статусов
-            status_response = self._repository.add_personal_task_statuses(
-                      [default_personal_task_status, completed_personal_task_status]
-            )
-            ids = status_response.ids
-            # Добавление статусов пользователю
-
-            statuses = {
-                DBFields.id: user_id,
-                DBFields.default_task_status_id: ids[0],
-                DBFields.completed_task_status_id: ids[1]}
-            self._repository.update_users([statuses])
+            with self._repository.unit_of_work() as uow:  # Пользователь и его статусы - в одной транзакции
+                response = uow.add_users(({DBFields.username: login, DBFields.email: email,
+                                           DBFields.hashed_password: hashed_password},))
+                user_id = response.ids[0]
+                # Создание стандартных статусов задач
+                default_personal_task_status = {DBFields.owner_id: user_id,
+                                                DBFields.name: TasksStatuses.default_task_status_name.value}
+                completed_personal_task_status = {DBFields.owner_id: user_id,
+                                                  DBFields.name: TasksStatuses.default_completed_task_status_name.value}
+
+                # Добавление статусов
+                status_response = uow.add_personal_task_statuses(
+                          [default_personal_task_status, completed_personal_task_status]
+                )
+                ids = status_response.ids
+                # Добавление статусов пользователю
+
+                statuses = {
+                    DBFields.id: user_id,
+                    DBFields.default_task_status_id: ids[0],
+                    DBFields.completed_task_status_id: ids[1]}
+                uow.update_users([statuses])
 
         except NotUniqueValue as e:
             raise ValueError
@@ -155,7 +165,8 @@ class Authenticator:
     def authorize(self, login: str, password: str) -> dict[str, str]:
         """
         Авторизует пользователя. Возвращает пару access + refresh JWT-токенов.
-        Вызывает ValueError, если авторизация не удалась.
+        Вызывает ValueError, если авторизация не удалась. Если хеш пароля создан с другой стоимостью bcrypt, он
+        заменяется хешем с текущей.
         """
 
         user_data = self._repository.get_users_by_username((login, ))
@@ -165,15 +176,22 @@ class Authenticator:
         hashed_password = self._repository.get_user_hashed_password(login)
         user_id = user_data.content[0].get(DBFields.id)
 
-        try:
-            if not checkpw(bytes(password, encoding='utf-8'), bytes(hashed_password, encoding='utf-8')):
-                raise ValueError
-            access_token = self._create_token(user_id, self._access_token_lifetime)
-            refresh_token = self._create_token(user_id, self._refresh_token_lifetime)
-            return {self.access_name: access_token, self.refresh_name: refresh_token}
-        except ValueError as e:
-            logger.warning(f'INVALID PASSWORD: saved_hash: {hashed_password}; received_hash: {bytes(password, encoding='utf-8')}')
+        if not self._password_hasher.verify(password, hashed_password):
+            logger.warning(f'Invalid password for login: {login}')
             raise ValueError
+        if self._password_hasher.needs_rehash(hashed_password):
+            self._rehash_password(user_id, password)
+        access_token = self._create_token(user_id, self._access_token_lifetime)
+        refresh_token = self._create_token(user_id, self._refresh_token_lifetime)
+        return {self.access_name: access_token, self.refresh_name: refresh_token}
+
+    def _rehash_password(self, user_id: int, password: str):
+        """Заменяет хеш пароля хешем с текущей стоимостью. Ошибка замены не мешает входу (хеш заменится позже)."""
+        try:
+            self._repository.update_users([{DBFields.id: user_id,
+                                            DBFields.hashed_password: self._password_hasher.hash(password)}])
+        except (HasherBusy, BaseRepoException) as e:
+            logger.warning(f'Password hash of user {user_id} has not been updated: {e}')
 
     @property
     def access_name(self):
@@ -185,11 +203,22 @@ class Authenticator:
 
 
 class Authorizer:
-    """Сервис авторизации."""
-    def __init__(self, repository: DataRepository, data_const: DataStruct = DataStruct(), permissions: enum.Enum = Permissions):
+    """
+    Сервис авторизации. Разрешения пользователя в РП - маска (побитовое OR масок его ролей, см.
+    server.database.models.permission_masks), проверка разрешения - одна операция AND. Маски пользователей хранятся в
+    cash_manager до изменения ролей (таблиц ролей и их участников), без него - получаются из репозитория.
+
+    :param enforce: Проверять ли разрешения (параметр конфига check_permissions). Если False, любая операция
+                    разрешена.
+    """
+    def __init__(self, repository: DataRepository, data_const: DataStruct = DataStruct(), permissions: enum.Enum = Permissions,
+                 cash_manager: CashManager = None, enforce: bool = True):
         self._repo = repository
         self._data_const = data_const
         self._permissions = permissions
+        self._cash_manager = cash_manager
+        self._enforce = enforce
+        self._bits = {permission.value: 1 << PERMISSION_BITS[permission.name] for permission in permissions}
 
     @staticmethod
     def check_access_to_personal_objects(user_id: int, objects: list[dict]) -> bool:
@@ -209,14 +238,24 @@ class Authorizer:
         """Проверяет доступ пользователя к личным объектам."""
         return user_id == owner_id
 
-    def check_permissions(self, user_id: int, operation_type: str) -> bool:
+    def get_permissions_mask(self, user_id: int, workspace_id: int) -> int:
+        """Возвращает маску разрешений пользователя в РП."""
+        if self._cash_manager is None:
+            return self._repo.get_permissions_mask(workspace_id, user_id)
+        return self._cash_manager.get(('permissions_mask', workspace_id, user_id),
+                                      lambda: self._repo.get_permissions_mask(workspace_id, user_id))
+
+    def check_permissions(self, user_id: int, operation_type: str, workspace_id: int) -> bool:
         """
         Проверяет право пользователя на выполнение операции.
         :user_id: ID пользователя.
-        :operation_type: Тип выполняемой операции.
+        :operation_type: Тип выполняемой операции (значение Permissions).
+        :workspace_id: ID РП, в котором выполняется операция.
 
         """
-        return True  # Запрос в БД за ролью, проверка роли и типа операции
+        if not self._enforce:
+            return True
+        return bool(self.get_permissions_mask(user_id, workspace_id) & self._bits[operation_type])
 
 
 if __name__ == '__main__':
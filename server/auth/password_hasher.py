@@ -0,0 +1,116 @@
+"""
+Хеширование и проверка паролей (bcrypt) в пуле процессов с ограничением очереди.
+
+Хеширование bcrypt занимает сотни миллисекунд процессора. Выполняемое в потоке waitress, оно занимает поток на всё это
+время: массовый вход пользователей занимает все потоки, и остальные запросы ждут. PasswordHasher выполняет bcrypt в
+пуле из workers процессов и принимает не больше workers + max_pending операций одновременно: при заполнении очереди
+операция сразу отклоняется (HasherBusy, ответ 503 с Retry-After), и запросами аутентификации занято не больше
+workers + max_pending потоков waitress.
+
+Модуль импортируется процессами пула (start method spawn), поэтому зависит только от bcrypt.
+"""
+import concurrent.futures
+import math
+import multiprocessing
+import threading
+import time
+import typing as tp
+
+from bcrypt import checkpw, hashpw, gensalt
+
+DEFAULT_ROUNDS = 12  # Стоимость bcrypt по умолчанию (2^12 итераций), как у bcrypt.gensalt
+
+
+class HasherBusy(Exception):
+    """Очередь хеширования заполнена. retry_after - через сколько секунд повторить запрос."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f'Password hasher is busy, retry after {retry_after} s.')
+        self.retry_after = retry_after
+
+
+def hash_password(password: str, rounds: int = DEFAULT_ROUNDS) -> str:
+    return hashpw(bytes(password, encoding='utf-8'), gensalt(rounds)).decode('utf-8')
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    return checkpw(bytes(password, encoding='utf-8'), bytes(hashed_password, encoding='utf-8'))
+
+
+def get_rounds(hashed_password: str) -> int | None:
+    """Возвращает стоимость хеша bcrypt ($2b$<стоимость>$...), None - если хеш не в формате bcrypt."""
+    parts = hashed_password.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """
+    Пул хеширования паролей.
+
+    :param workers: Число процессов пула. 0 - bcrypt выполняется в вызывающем потоке без ограничения очереди
+                    (утилиты, тесты).
+    :param max_pending: Максимальное число операций, ожидающих свободный процесс.
+    :param rounds: Стоимость bcrypt новых хешей. Хеши с другой стоимостью заменяются при входе (needs_rehash).
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 4, rounds: int = DEFAULT_ROUNDS):
+        if workers < 0 or max_pending < 0:
+            raise ValueError(f'Number of workers and pending operations must be non-negative: {workers}, {max_pending}')
+        if not 4 <= rounds <= 31:
+            raise ValueError(f'bcrypt rounds must be in range 4-31, got {rounds}.')
+        self._workers = workers
+        self._rounds = rounds
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._executor: concurrent.futures.ProcessPoolExecutor | None = None
+        self._executor_lock = threading.Lock()
+        self._duration = 0.0  # Среднее время операции с ожиданием в очереди (экспоненциальное сглаживание), с
+
+    @property
+    def rounds(self) -> int:
+        return self._rounds
+
+    def hash(self, password: str) -> str:
+        """Возвращает хеш пароля. Если очередь заполнена, выбрасывает HasherBusy."""
+        return self._execute(hash_password, password, self._rounds)
+
+    def verify(self, password: str, hashed_password: str) -> bool:
+        """Проверяет пароль по хешу. Если очередь заполнена, выбрасывает HasherBusy."""
+        return self._execute(verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Создан ли хеш с другой стоимостью (после проверки пароля его нужно заменить хешем с текущей)."""
+        return get_rounds(hashed_password) != self._rounds
+
+    def close(self):
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _execute(self, function: tp.Callable[..., tp.Any], *args):
+        if not self._workers:
+            return function(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy(self._retry_after())
+        try:
+            start = time.perf_counter()
+            result = self._get_executor().submit(function, *args).result()
+            self._duration = 0.8 * self._duration + 0.2 * (time.perf_counter() - start)
+            return result
+        finally:
+            self._slots.release()
+
+    def _get_executor(self) -> concurrent.futures.ProcessPoolExecutor:
+        """Пул создаётся при первой операции - в процессе, который её выполняет (после fork рабочих процессов)."""
+        with self._executor_lock:
+            if self._executor is None:
+                # spawn: fork процесса с потоками (waitress, очередь записи) небезопасен
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    self._workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def _retry_after(self) -> int:
+        """Оценка времени (с), через которое освободится место в очереди: среднее время операции с ожиданием."""
+        return max(1, math.ceil(self._duration))
@@ -4,6 +4,7 @@ import logging
 import os
 from pathlib import Path
 import json
+import typing as tp
 
 from common.base import CommonStruct, project_root
 
@@ -26,12 +27,26 @@ class DataStruct:
     access_token_lifetime = 'access_token_lifetime'
     refresh_token_lifetime = 'refresh_token_lifetime'
     database_path = 'database_path'
+    db_profile = 'db_profile'
+    write_dispatch = 'write_dispatch'
+    shards = 'shards'
+    query_cache_size = 'query_cache_size'
+    bcrypt_rounds = 'bcrypt_rounds'
+    hash_workers = 'hash_workers'
+    hash_queue_size = 'hash_queue_size'
+    request_session = 'request_session'
+    check_permissions = 'check_permissions'
 
     # Параметры конфига по умолчанию
 
     default_access_token_lifetime = datetime.timedelta(seconds=15 * 60)
     default_refresh_token_lifetime = datetime.timedelta(seconds=24 * 3600)
     default_database_path = f'sqlite:///{Path(project_root() / "server" / "database" / "database")}'
+    blacklist_compaction_interval = 10 * 60  # Интервал компактизации журнала отозванных токенов (сек.)
+    import_chunk_size = 500  # Число строк импорта, проверяемых и добавляемых одним запросом
+    max_import_errors = 1000  # Максимальное число ошибок строк в отчёте импорта
+    permissions_cache_size = 4096  # Число масок разрешений (пользователь, РП) в кэше Authorizer
+    batch_workers = 4  # Число потоков параллельного выполнения подзапросов чтения пакета (без сессии на запрос)
 
     login = 'login'
     email = 'email'
@@ -63,14 +78,42 @@ class DBStruct:
     default_tasks_description = 'Задачи отсутствуют'
 
 
+class DBProfiles:
+    """Профили соединений SQLite (набор PRAGMA, см. server.database.models.db_utils.DB_PROFILES)."""
+    prod = 'prod'  # Рабочий сервер: WAL, synchronous=NORMAL
+    test = 'test'  # Тесты: без fsync
+    bulk = 'bulk'  # Массовая загрузка данных: без fsync, большой кэш
+
+    all = (prod, test, bulk)
+
+
 # Конфиг по умолчанию
 default_config = {
     DataStruct.env: DataStruct.prod,
     DataStruct.access_token_lifetime: DataStruct.default_access_token_lifetime,
-    DataStruct.refresh_token_lifetime: DataStruct.default_refresh_token_lifetime
+    DataStruct.refresh_token_lifetime: DataStruct.default_refresh_token_lifetime,
+    DataStruct.db_profile: DBProfiles.prod,
+    DataStruct.write_dispatch: False,
+    DataStruct.shards: 0,
+    DataStruct.query_cache_size: 0,
+    DataStruct.bcrypt_rounds: 12,
+    DataStruct.hash_workers: 2,
+    DataStruct.hash_queue_size: 4,
+    DataStruct.request_session: True,
+    DataStruct.check_permissions: False
 }
 
 
+class Rollup:
+    """Области (scope) и разрезы (dimension) предрассчитанной аналитики (таблица analytics_rollup)."""
+    workspace = 'workspace'
+    project = 'project'
+
+    executor = 'executor'  # Число задач исполнителя
+    status = 'status'  # Число задач в статусе
+    stage = 'stage'  # Число проектов РП на текущем этапе
+
+
 class Permissions(enum.Enum):
     # Базовые доступы роли в Workspace
     del_ws = 'del_ws'
@@ -101,6 +144,25 @@ class Permissions(enum.Enum):
     view = 'view'
 
 
+# Номера битов разрешений в масках ролей (permissions_mask, см. server.database.models.permission_masks): порядок
+# членов Permissions. Тип разрешения в таблице permission - имя члена. Маски хранятся в БД, поэтому новые разрешения
+# добавляются только в конец Permissions.
+PERMISSION_BITS = {permission.name: bit for bit, permission in enumerate(Permissions)}
+
+
+def get_permissions_mask(permissions: tp.Iterable[Permissions | str]) -> int:
+    """Возвращает маску разрешений (членов Permissions или их значений)."""
+    mask = 0
+    for permission in permissions:
+        mask |= 1 << PERMISSION_BITS[Permissions(permission).name]
+    return mask
+
+
+def get_mask_permissions(mask: int) -> tuple[str, ...]:
+    """Возвращает типы разрешений маски (имена членов Permissions, как в таблице permission)."""
+    return tuple(name for name, bit in PERMISSION_BITS.items() if mask >> bit & 1)
+
+
 class Roles(enum.Enum):
     """Роли РП."""
 
@@ -137,6 +199,17 @@ class Config:
         'env': str [prod, dev, test]
         'access_token_lifetime': int (seconds)
         'refresh_token_lifetime': int (seconds)
+        'database_path': str
+        'db_profile': str [prod, test, bulk] (профиль соединений SQLite, см. DBProfiles)
+        'write_dispatch': bool (запись через очередь с объединением транзакций, см. server.database.write_dispatcher)
+        'shards': int (число шардов БД; 0 - без шардирования, см. server.database.sharding)
+        'query_cache_size': int (число результатов в кэше запросов; 0 - без кэша, см. server.database.cash_manager)
+        'bcrypt_rounds': int [4-31] (стоимость хеширования паролей)
+        'hash_workers': int (число процессов хеширования паролей; 0 - в потоке запроса, см. server.auth.password_hasher)
+        'hash_queue_size': int (число операций хеширования, ожидающих процесс; при заполнении - ответ 503.
+                                hash_workers + hash_queue_size должно быть меньше числа потоков сервера)
+        'request_session': bool (одна сессия и транзакция БД на запрос API, см. server.database.request_scope)
+        'check_permissions': bool (проверка разрешений ролей пользователя в РП, см. server.auth.auth_module.Authorizer)
     }
 
     """
@@ -172,11 +245,68 @@ class Config:
                 logging.warning(f'Incorrect param in config: {DataStruct.database_path} = {self._database_path}')
                 self._database_path = DataStruct.default_database_path
 
+            self._db_profile = config_data.get(DataStruct.db_profile)
+            if self._db_profile not in DBProfiles.all:
+                logging.warning(f'Incorrect param in config: {DataStruct.db_profile} = {self._db_profile}')
+                self._db_profile = default_config[DataStruct.db_profile]
+
+            self._write_dispatch = config_data.get(DataStruct.write_dispatch, default_config[DataStruct.write_dispatch])
+            if not isinstance(self._write_dispatch, bool):
+                logging.warning(f'Incorrect param in config: {DataStruct.write_dispatch} = {self._write_dispatch}')
+                self._write_dispatch = default_config[DataStruct.write_dispatch]
+
+            self._shards = config_data.get(DataStruct.shards, default_config[DataStruct.shards])
+            if not isinstance(self._shards, int) or isinstance(self._shards, bool) or self._shards < 0:
+                logging.warning(f'Incorrect param in config: {DataStruct.shards} = {self._shards}')
+                self._shards = default_config[DataStruct.shards]
+
+            self._query_cache_size = config_data.get(DataStruct.query_cache_size,
+                                                     default_config[DataStruct.query_cache_size])
+            if (not isinstance(self._query_cache_size, int) or isinstance(self._query_cache_size, bool)
+                    or self._query_cache_size < 0):
+                logging.warning(f'Incorrect param in config: {DataStruct.query_cache_size} = {self._query_cache_size}')
+                self._query_cache_size = default_config[DataStruct.query_cache_size]
+
+            self._bcrypt_rounds = self._get_int(config_data, DataStruct.bcrypt_rounds, 4, 31)
+            self._hash_workers = self._get_int(config_data, DataStruct.hash_workers, 0)
+            self._hash_queue_size = self._get_int(config_data, DataStruct.hash_queue_size, 0)
+
+            self._request_session = config_data.get(DataStruct.request_session,
+                                                    default_config[DataStruct.request_session])
+            if not isinstance(self._request_session, bool):
+                logging.warning(f'Incorrect param in config: {DataStruct.request_session} = {self._request_session}')
+                self._request_session = default_config[DataStruct.request_session]
+
+            self._check_permissions = config_data.get(DataStruct.check_permissions,
+                                                      default_config[DataStruct.check_permissions])
+            if not isinstance(self._check_permissions, bool):
+                logging.warning(f'Incorrect param in config: {DataStruct.check_permissions} = {self._check_permissions}')
+                self._check_permissions = default_config[DataStruct.check_permissions]
+
         except (OSError, json.JSONDecodeError):
             self._env = default_config[DataStruct.env]
             self._refresh_token_lifetime = DataStruct.default_refresh_token_lifetime
             self._access_token_lifetime = DataStruct.default_access_token_lifetime
             self._database_path = DataStruct.default_database_path
+            self._db_profile = default_config[DataStruct.db_profile]
+            self._write_dispatch = default_config[DataStruct.write_dispatch]
+            self._shards = default_config[DataStruct.shards]
+            self._query_cache_size = default_config[DataStruct.query_cache_size]
+            self._bcrypt_rounds = default_config[DataStruct.bcrypt_rounds]
+            self._hash_workers = default_config[DataStruct.hash_workers]
+            self._hash_queue_size = default_config[DataStruct.hash_queue_size]
+            self._request_session = default_config[DataStruct.request_session]
+            self._check_permissions = default_config[DataStruct.check_permissions]
+
+    @staticmethod
+    def _get_int(config_data: dict, name: str, min_value: int, max_value: int = None) -> int:
+        """Возвращает целый параметр конфига из диапазона min_value-max_value или значение по умолчанию."""
+        value = config_data.get(name, default_config[name])
+        if (not isinstance(value, int) or isinstance(value, bool) or value < min_value
+                or max_value is not None and value > max_value):
+            logging.warning(f'Incorrect param in config: {name} = {value}')
+            return default_config[name]
+        return value
 
     @property
     def env(self) -> str:
@@ -194,6 +324,42 @@ class Config:
     def database_path(self) -> str:
         return self._database_path
 
+    @property
+    def db_profile(self) -> str:
+        return self._db_profile
+
+    @property
+    def write_dispatch(self) -> bool:
+        return self._write_dispatch
+
+    @property
+    def shards(self) -> int:
+        return self._shards
+
+    @property
+    def query_cache_size(self) -> int:
+        return self._query_cache_size
+
+    @property
+    def bcrypt_rounds(self) -> int:
+        return self._bcrypt_rounds
+
+    @property
+    def hash_workers(self) -> int:
+        return self._hash_workers
+
+    @property
+    def hash_queue_size(self) -> int:
+        return self._hash_queue_size
+
+    @property
+    def request_session(self) -> bool:
+        return self._request_session
+
+    @property
+    def check_permissions(self) -> bool:
+        return self._check_permissions
+
 
 if __name__ == '__main__':
     Config('config.json')
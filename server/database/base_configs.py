@@ -1,6 +1,6 @@
 import random
 
-from sqlalchemy.engine import Engine, create_engine
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm.session import sessionmaker
 from sqlalchemy.sql import select
 
@@ -290,8 +290,7 @@ if __name__ == '__main__':
     from server.database.models.db_utils import init_db
     from server.database.repository import DataRepository
 
-    init_db('sqlite:///database')
-    engine = create_engine('sqlite:///database')
+    engine = init_db('sqlite:///database')
     set_db_config_1(engine=engine)
     repo = DataRepository(sessionmaker(bind=engine))
 
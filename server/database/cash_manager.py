@@ -1,9 +1,204 @@
-"""Объекты для управления кэшем."""
+"""
+Кэш результатов методов чтения репозитория (read-through): результат метода сохраняется по имени метода и его
+нормализованным параметрам вместе с версиями таблиц, из которых он получен, и возвращается без запроса к БД, пока эти
+таблицы не изменятся.
+
+Таблицы результата определяются по запросам, выполненным методом (событие движка before_cursor_execute), версии таблиц -
+по таблице table_version (см. server.database.models.table_versions), которую обновляют триггеры при любом изменении,
+в том числе другими процессами. Версии перечитываются только после фиксации изменений другим соединением: кэш
+проверяет это по PRAGMA data_version своего соединения, не обращаясь к файлу БД. Запись в таблицу (например, ws_task)
+делает недействительными только результаты, полученные из неё.
+"""
+import contextvars
+import copy
+import sqlite3
+import threading
+import typing as tp
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event, Engine
+from sqlalchemy.sql import visitors
+
+from server.database.models.table_versions import TABLE_VERSION, DERIVED_TABLES
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+T = tp.TypeVar('T')
+
+UNKNOWN_TABLE = None  # Запрос без скомпилированного выражения (текст SQL): таблицы неизвестны, результат не кэшируется
+# Таблицы, прочитанные текущим вызовом загрузки результата (None - загрузка не выполняется)
+_read_tables: contextvars.ContextVar[set[str | None] | None] = contextvars.ContextVar('read_tables', default=None)
+
+
+@dataclass
+class CacheEntry:
+    value: tp.Any
+    versions: dict[str, int]  # Версии таблиц, из которых получен результат
+
+
+@dataclass
+class CacheStats:
+    """Метрики кэша."""
+    hits: int = 0  # Результат возвращён из кэша
+    misses: int = 0  # Результат получен из БД
+    invalidations: int = 0  # Результат удалён из-за изменения его таблиц
+    evictions: int = 0  # Результат вытеснен (LRU)
+    uncacheable: int = 0  # Результат не сохранён: таблицы неизвестны или параметры не хешируются
+    size: int = 0  # Число сохранённых результатов
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / (self.hits + self.misses) if self.hits + self.misses else 0.0
+
+
+def normalize(value: tp.Any) -> tp.Hashable:
+    """
+    Приводит параметр запроса к хешируемому виду: одинаковые запросы получают одинаковый ключ. Порядок элементов
+    множеств не учитывается, списков и кортежей - учитывается. Если значение не хешируется (или это итератор),
+    выбрасывает TypeError.
+    """
+    if isinstance(value, (set, frozenset)):
+        return frozenset(normalize(item) for item in value)
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize(item) for item in value)
+    if isinstance(value, dict):
+        return frozenset((key, normalize(item)) for key, item in value.items())
+    if isinstance(value, tp.Iterator):  # Генератор: ключ не определяется содержимым
+        raise TypeError(f'Iterator can not be a cache key: {value}')
+    hash(value)
+    return value
 
 
 class CashManager:
+    """
+    Кэш результатов методов чтения репозитория с вытеснением давно не использованных результатов (LRU).
+    Результаты копируются при сохранении и получении: изменение полученного результата не изменяет кэш.
+
+    :param engine: Движок SQLite, запросы которого кэшируются.
+    :param max_size: Максимальное число сохранённых результатов.
+    """
+
+    def __init__(self, engine: Engine, max_size: int = 1024):
+        if max_size < 1:
+            raise ValueError(f'Cache size must be positive, got {max_size}.')
+        self._max_size = max_size
+        self._entries: OrderedDict[tp.Hashable, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+        self._versions: dict[str, int] = {}  # Версии таблиц на момент последней проверки
+        self._data_version: int | None = None
+        self._connection: sqlite3.Connection | None = None  # Соединение проверки изменений
+        if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+            logger.error(f'Query cache supports only SQLite database files, caching is disabled: {engine.url}')
+            return
+
+        connection = sqlite3.connect(engine.url.database, check_same_thread=False)
+        if not connection.execute('SELECT 1 FROM sqlite_master WHERE type = ? AND name = ?',
+                                  ('table', TABLE_VERSION)).fetchone():
+            logger.error(f'There is no table {TABLE_VERSION} in {engine.url}, caching is disabled. Apply migrations.')
+            connection.close()
+            return
+        self._connection = connection
+        event.listen(engine, 'before_cursor_execute', self._record_tables)
+
+    @property
+    def enabled(self) -> bool:
+        return self._connection is not None
+
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**{**self._stats.__dict__, 'size': len(self._entries)})
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def close(self):
+        """Отключает кэш (вызовы get выполняют загрузку) и закрывает его соединение."""
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._entries.clear()
+
+    def get(self, key: tp.Hashable, loader: tp.Callable[[], T]) -> T:
+        """
+        Возвращает результат с ключом key: из кэша, если таблицы результата не изменились, иначе - результат
+        loader(), который сохраняется в кэше.
+        """
+        if not self.enabled:
+            return loader()
+        try:
+            key = normalize(key)
+        except TypeError:
+            with self._lock:
+                self._stats.uncacheable += 1
+            return loader()
+
+        with self._lock:
+            versions = self._get_versions()
+            entry = self._entries.get(key)
+            if entry is not None and all(versions.get(table) == version for table, version in entry.versions.items()):
+                self._entries.move_to_end(key)
+                self._stats.hits += 1
+                outer = _read_tables.get()
+                if outer is not None:  # Получение внутри загрузки другого результата
+                    outer.update(entry.versions)
+                return copy.deepcopy(entry.value)
+            if entry is not None:
+                del self._entries[key]
+                self._stats.invalidations += 1
+            self._stats.misses += 1
+
+        value, tables = self._load(loader)
+        with self._lock:
+            # Версии - до выполнения запросов: изменения во время загрузки сделают результат недействительным
+            if UNKNOWN_TABLE in tables or not tables or any(table not in versions for table in tables):
+                self._stats.uncacheable += 1
+                return value
+            self._entries[key] = CacheEntry(copy.deepcopy(value), {table: versions[table] for table in tables})
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+        return value
 
-    def __init__(self):
-        pass
+    @staticmethod
+    def _load(loader: tp.Callable[[], T]) -> tuple[T, set[str | None]]:
+        """Выполняет loader, возвращает результат и прочитанные таблицы (с таблицами-источниками индексов)."""
+        token = _read_tables.set(set())
+        try:
+            value = loader()
+            tables = _read_tables.get()
+        finally:
+            _read_tables.reset(token)
+        outer = _read_tables.get()
+        if outer is not None:  # Загрузка внутри загрузки другого результата: его таблицы включают таблицы этого
+            outer |= tables
+        expanded = set()
+        for table in tables:
+            expanded.update(DERIVED_TABLES.get(table, (table,)))
+        return value, expanded
 
+    def _get_versions(self) -> dict[str, int]:
+        """Возвращает текущие версии таблиц. Таблица table_version читается, только если БД изменена."""
+        data_version = self._connection.execute('PRAGMA data_version').fetchone()[0]
+        if data_version != self._data_version:
+            self._versions = dict(self._connection.execute(f'SELECT table_name, version FROM {TABLE_VERSION}'))
+            self._data_version = data_version
+        return self._versions
 
+    @staticmethod
+    def _record_tables(connection, cursor, statement, parameters, context, executemany):
+        tables = _read_tables.get()
+        if tables is None:
+            return
+        compiled = getattr(context, 'compiled', None)
+        if compiled is None or compiled.statement is None:
+            tables.add(UNKNOWN_TABLE)
+            return
+        tables.update(element.name for element in visitors.iterate(compiled.statement)
+                      if element.__visit_name__ == 'table')
@@ -0,0 +1,62 @@
+"""
+Окружение миграций Alembic.
+
+Если миграции запускаются из кода (server.database.models.db_utils.upgrade_db), соединение передаётся в
+config.attributes['connection']. При запуске из командной строки путь к БД берётся из sqlalchemy.url alembic.ini, а
+если он не задан - из server/config.json. Соединения настраиваются PRAGMA профиля (см. create_db_engine), в частности
+проверяются внешние ключи.
+"""
+from pathlib import Path
+
+from alembic import context
+
+import server.database.models.common_models as cm
+from common.base import project_root
+from server.data_const import Config, DBProfiles
+from server.database.models.db_utils import create_db_engine
+
+target_metadata = cm.Base.metadata
+
+
+def get_url() -> str:
+    url = context.config.get_main_option('sqlalchemy.url')
+    if url:
+        return url
+    return Config(Path(project_root() / "server" / "config.json")).database_path
+
+
+def get_profile() -> str:
+    """Профиль соединений: из server/config.json, если путь к БД берётся из него, иначе prod."""
+    if context.config.get_main_option('sqlalchemy.url'):
+        return DBProfiles.prod
+    return Config(Path(project_root() / "server" / "config.json")).db_profile
+
+
+def run_migrations_offline():
+    context.configure(url=get_url(), target_metadata=target_metadata, literal_binds=True, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations(connection):
+    context.configure(connection=connection, target_metadata=target_metadata, render_as_batch=True)
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = context.config.attributes.get('connection')
+    if connection is not None:
+        run_migrations(connection)
+        return
+
+    engine = create_db_engine(get_url(), get_profile())
+    with engine.connect() as connection:
+        run_migrations(connection)
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
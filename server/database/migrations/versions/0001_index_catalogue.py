@@ -0,0 +1,86 @@
+"""Каталог индексов
+
+Индексы по фильтрам запросов DataRepository и по FK, по которым загружаются связанные объекты (см. INDEXES в
+server/database/models/common_models.py). Список индексов зафиксирован здесь, чтобы миграция не зависела от
+последующих изменений моделей. В базах, созданных init_db, индексы уже есть - они создаются с IF NOT EXISTS.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+from alembic import op
+
+revision: str = '0001'
+down_revision: str | None = None
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+# (имя индекса, таблица, столбцы)
+INDEXES = (
+    ('ix_workspace_user_user_id', 'workspace_user', ['user_id']),
+    ('ix_user_ws_role_role_id', 'user_ws_role', ['role_id']),
+    ('ix_project_user_project_id', 'project_user', ['project_id']),
+    ('ix_project_mentor_project_id', 'project_mentor', ['project_id']),
+    ('ix_workspace_creator_id', 'workspace', ['creator_id']),
+    ('ix_project_workspace_id', 'project', ['workspace_id']),
+    ('ix_project_creator_id', 'project', ['creator_id']),
+    ('ix_work_stage_project_id', 'work_stage', ['project_id']),
+    ('ix_ws_task_workspace_id_status_id', 'ws_task', ['workspace_id', 'status_id']),
+    ('ix_ws_task_project_id', 'ws_task', ['project_id']),
+    ('ix_ws_task_executor_id', 'ws_task', ['executor_id']),
+    ('ix_ws_task_status_id', 'ws_task', ['status_id']),
+    ('ix_ws_task_creator_id', 'ws_task', ['creator_id']),
+    ('ix_ws_task_entrusted_id', 'ws_task', ['entrusted_id']),
+    ('ix_ws_task_parent_task_id', 'ws_task', ['parent_task_id']),
+    ('ix_ws_task_work_direction_id', 'ws_task', ['work_direction_id']),
+    ('ix_ws_task_event_task_id_date', 'ws_task_event', ['task_id', 'date']),
+    ('ix_ws_task_event_date', 'ws_task_event', ['date']),
+    ('ix_responsible_task_task_id', 'responsible_task', ['task_id']),
+    ('ix_executor_task_task_id', 'executor_task', ['task_id']),
+    ('ix_tag_ws_task_ws_task_tag_id', 'tag_ws_task', ['ws_task_tag_id']),
+    ('ix_personal_task_owner_id_status_id', 'personal_task', ['owner_id', 'status_id']),
+    ('ix_personal_task_status_id', 'personal_task', ['status_id']),
+    ('ix_personal_task_parent_task_id', 'personal_task', ['parent_task_id']),
+    ('ix_personal_task_work_direction_id', 'personal_task', ['work_direction_id']),
+    ('ix_personal_task_event_task_id_date', 'personal_task_event', ['task_id', 'date']),
+    ('ix_personal_task_event_date', 'personal_task_event', ['date']),
+    ('ix_tag_personal_task_personal_task_tag_id', 'tag_personal_task', ['personal_task_tag_id']),
+    ('ix_ws_daily_event_workspace_id_date', 'ws_daily_event', ['workspace_id', 'date']),
+    ('ix_ws_daily_event_creator_id', 'ws_daily_event', ['creator_id']),
+    ('ix_ws_daily_event_user_event_id', 'ws_daily_event_user', ['event_id']),
+    ('ix_ws_many_days_event_workspace_id_datetime_start', 'ws_many_days_event', ['workspace_id', 'datetime_start']),
+    ('ix_ws_many_days_event_creator_id', 'ws_many_days_event', ['creator_id']),
+    ('ix_ws_many_days_event_user_event_id', 'ws_many_days_event_user', ['event_id']),
+    ('ix_personal_daily_event_owner_id_date', 'personal_daily_event', ['owner_id', 'date']),
+    ('ix_personal_many_days_event_owner_id_datetime_start', 'personal_many_days_event', ['owner_id', 'datetime_start']),
+    ('ix_ws_role_workspace_id', 'ws_role', ['workspace_id']),
+    ('ix_ws_task_status_workspace_id', 'ws_task_status', ['workspace_id']),
+    ('ix_ws_task_tag_workspace_id', 'ws_task_tag', ['workspace_id']),
+    ('ix_ws_work_direction_workspace_id', 'ws_work_direction', ['workspace_id']),
+    ('ix_ws_base_category_workspace_id', 'ws_base_category', ['workspace_id']),
+    ('ix_ws_base_category_parent_category_id', 'ws_base_category', ['parent_category_id']),
+    ('ix_ws_document_workspace_id', 'ws_document', ['workspace_id']),
+    ('ix_ws_document_creator_id', 'ws_document', ['creator_id']),
+    ('ix_ws_document_base_category_id', 'ws_document', ['base_category_id']),
+    ('ix_personal_task_status_owner_id', 'personal_task_status', ['owner_id']),
+    ('ix_personal_task_tag_owner_id', 'personal_task_tag', ['owner_id']),
+    ('ix_personal_work_direction_owner_id', 'personal_work_direction', ['owner_id']),
+    ('ix_ws_role_task_task_id_role_id', 'ws_role_task', ['task_id', 'role_id']),
+    ('ix_ws_role_project_project_id_role_id', 'ws_role_project', ['project_id', 'role_id']),
+    ('ix_ws_role_document_document_id_role_id', 'ws_role_document', ['document_id', 'role_id']),
+    ('ix_ws_role_daily_event_daily_event_id_role_id', 'ws_role_daily_event', ['daily_event_id', 'role_id']),
+    ('ix_ws_role_many_days_event_many_days_event_id_role_id', 'ws_role_many_days_event', ['many_days_event_id', 'role_id']),
+)
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
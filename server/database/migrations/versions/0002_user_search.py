@@ -0,0 +1,49 @@
+"""Поиск пользователей
+
+Индекс полнотекстового поиска user_search (FTS5, токенизатор trigram) по имени и email пользователей, триггеры его
+синхронизации с таблицей user и индексы поиска по началу имени и email без учёта регистра (см.
+server/database/models/search_index.py). Индекс заполняется имеющимися пользователями.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+from alembic import op
+
+revision: str = '0002'
+down_revision: str | None = '0001'
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+TRIGGERS = ('user_search_insert', 'user_search_delete', 'user_search_update')
+
+
+def upgrade():
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_username_nocase ON user (username COLLATE NOCASE)')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_email_nocase ON user (email COLLATE NOCASE)')
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS user_search')
+    op.execute("CREATE VIRTUAL TABLE user_search USING fts5(username, email, content='user', content_rowid='id', "
+               "tokenize='trigram')")
+    op.execute('CREATE TRIGGER user_search_insert AFTER INSERT ON user BEGIN '
+               'INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email); END')
+    op.execute('CREATE TRIGGER user_search_delete AFTER DELETE ON user BEGIN '
+               "INSERT INTO user_search(user_search, rowid, username, email) VALUES ('delete', old.id, old.username, "
+               'old.email); END')
+    op.execute('CREATE TRIGGER user_search_update AFTER UPDATE OF username, email ON user BEGIN '
+               "INSERT INTO user_search(user_search, rowid, username, email) VALUES ('delete', old.id, old.username, "
+               'old.email); '
+               'INSERT INTO user_search(rowid, username, email) VALUES (new.id, new.username, new.email); END')
+    op.execute("INSERT INTO user_search(user_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    for trigger in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS user_search')
+    op.drop_index('ix_user_email_nocase', table_name='user', if_exists=True)
+    op.drop_index('ix_user_username_nocase', table_name='user', if_exists=True)
@@ -0,0 +1,70 @@
+"""Поиск по РП
+
+Индекс полнотекстового поиска workspace_search (FTS5, токенизатор trigram) по названиям и текстам задач, проектов и
+мероприятий РП и триггеры его синхронизации с таблицами объектов (см. server/database/models/search_index.py).
+Индекс заполняется имеющимися объектами.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+from alembic import op
+
+revision: str = '0003'
+down_revision: str | None = '0002'
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+# Значения текстовых столбцов по умолчанию (не индексируются)
+DEFAULT_TEXTS = {
+    'description': 'Описание отсутствует',
+    'goal': 'Цель отсутствует',
+    'tasks_description': 'Задачи отсутствуют',
+    'problem': 'Проблема отсутствует',
+    'relevance': 'Актуальность отсутствует',
+    'thesis': 'Тезисы отсутствуют'
+}
+# (тип объекта, таблица, столбец названия, текстовые столбцы). Код типа - индекс в кортеже
+SOURCES = (
+    ('ws_task', 'ws_task', 'name', ('description',)),
+    ('project', 'project', 'name', ('description', 'goal', 'tasks_description', 'problem', 'relevance', 'thesis')),
+    ('ws_daily_event', 'ws_daily_event', 'name', ('description',)),
+    ('ws_many_days_event', 'ws_many_days_event', 'name', ('description',))
+)
+
+
+def drop_triggers():
+    for kind, *_ in SOURCES:
+        for operation in ('insert', 'delete', 'update'):
+            op.execute(f'DROP TRIGGER IF EXISTS workspace_search_{kind}_{operation}')
+
+
+def upgrade():
+    drop_triggers()
+    op.execute('DROP TABLE IF EXISTS workspace_search')
+    op.execute("CREATE VIRTUAL TABLE workspace_search USING fts5(title, body, kind UNINDEXED, object_id UNINDEXED, "
+               "workspace_id UNINDEXED, tokenize='trigram')")
+    for code, (kind, source, title_column, text_columns) in enumerate(SOURCES):
+        def row(record: str) -> str:
+            body = ' || char(10) || '.join(f"coalesce(nullif({record}.{text_column}, '{DEFAULT_TEXTS[text_column]}'), '')"
+                                           for text_column in text_columns)
+            return (f"{record}.id * {len(SOURCES)} + {code}, {record}.{title_column}, {body}, '{kind}', {record}.id, "
+                    f"{record}.workspace_id")
+
+        insert_row = 'INSERT INTO workspace_search(rowid, title, body, kind, object_id, workspace_id)'
+        delete_row = f'DELETE FROM workspace_search WHERE rowid = old.id * {len(SOURCES)} + {code}'
+        updated_columns = ', '.join((title_column, *text_columns, 'workspace_id'))
+        op.execute(f'CREATE TRIGGER workspace_search_{kind}_insert AFTER INSERT ON {source} BEGIN '
+                   f'{insert_row} VALUES ({row("new")}); END')
+        op.execute(f'CREATE TRIGGER workspace_search_{kind}_delete AFTER DELETE ON {source} BEGIN {delete_row}; END')
+        op.execute(f'CREATE TRIGGER workspace_search_{kind}_update AFTER UPDATE OF {updated_columns} ON {source} BEGIN '
+                   f'{delete_row}; {insert_row} VALUES ({row("new")}); END')
+        op.execute(f'{insert_row} SELECT {row(source)} FROM {source}')
+
+
+def downgrade():
+    drop_triggers()
+    op.execute('DROP TABLE IF EXISTS workspace_search')
@@ -0,0 +1,48 @@
+"""Версии таблиц
+
+Таблица table_version со счётчиком изменений каждой таблицы и триггеры его увеличения при добавлении, изменении и
+удалении строк (см. server/database/models/table_versions.py). Используется кэшем запросов для проверки
+актуальности результатов.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+from alembic import op
+
+revision: str = '0004'
+down_revision: str | None = '0003'
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+OPERATIONS = ('insert', 'update', 'delete')
+
+
+def get_table_names() -> list[str]:
+    """Таблицы БД, кроме служебных, виртуальных (индексы FTS5) и их таблиц хранения."""
+    rows = op.get_bind().exec_driver_sql("SELECT name, sql FROM sqlite_master WHERE type = 'table'").all()
+    virtual = [name for name, sql in rows if sql.upper().startswith('CREATE VIRTUAL')]
+    return [name for name, sql in rows if name not in virtual and not name.startswith('sqlite_')
+            and name not in ('alembic_version', 'table_version')
+            and not any(name.startswith(f'{table}_') for table in virtual)]
+
+
+def upgrade():
+    op.execute('CREATE TABLE IF NOT EXISTS table_version (table_name VARCHAR NOT NULL PRIMARY KEY, '
+               'version INTEGER NOT NULL DEFAULT 0)')
+    for name in get_table_names():
+        op.execute(f"INSERT OR IGNORE INTO table_version (table_name, version) VALUES ('{name}', 0)")
+        for operation in OPERATIONS:
+            op.execute(f'DROP TRIGGER IF EXISTS table_version_{name}_{operation}')
+            op.execute(f'CREATE TRIGGER table_version_{name}_{operation} AFTER {operation.upper()} ON "{name}" BEGIN '
+                       f"UPDATE table_version SET version = version + 1 WHERE table_name = '{name}'; END")
+
+
+def downgrade():
+    for name in get_table_names():
+        for operation in OPERATIONS:
+            op.execute(f'DROP TRIGGER IF EXISTS table_version_{name}_{operation}')
+    op.execute('DROP TABLE IF EXISTS table_version')
@@ -0,0 +1,67 @@
+"""Маски разрешений
+
+Номер бита разрешения (permission.bit), маска разрешений (permissions_mask) ролей РП и их переопределений для
+объектов, триггеры пересчёта масок при изменении ассоциативных таблиц разрешений (см.
+server/database/models/permission_masks.py). Маски заполняются по имеющимся разрешениям ролей.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+from alembic import op
+
+revision: str = '0005'
+down_revision: str | None = '0004'
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+# Типы разрешений в порядке битов (порядок членов server.data_const.Permissions)
+PERMISSIONS = ('del_ws', 'del_project', 'create_event', 'del_event', 'edit_event', 'create_task', 'del_task',
+               'edit_task', 'complete_task', 'invite', 'kick', 'create_doc', 'dec_doc', 'edit_doc', 'set_project',
+               'set_workspace', 'set_roles', 'view_analytics', 'set_analytics', 'create', 'edit', 'delete', 'view')
+# (таблица владельца маски, ассоциативная таблица разрешений, столбец ID владельца в ней)
+SOURCES = (
+    ('ws_role', 'ws_role_permission', 'role_id'),
+    ('ws_role_task', 'ws_role_task_permission', 'role_task_id'),
+    ('ws_role_project', 'ws_role_project_permission', 'role_project_id'),
+    ('ws_role_daily_event', 'ws_role_daily_event_permission', 'role_daily_event_id'),
+    ('ws_role_many_days_event', 'ws_role_many_days_event_permission', 'role_many_days_event_id'),
+    ('ws_role_document', 'ws_role_document_permission', 'role_document_id')
+)
+OPERATIONS = ('insert', 'delete', 'update')
+
+
+def mask(links: str, owner_column: str, owner_id: str) -> str:
+    return (f'(SELECT coalesce(sum(DISTINCT 1 << permission.bit), 0) FROM {links} '
+            f'JOIN permission ON permission.id = {links}.permissions_id WHERE {links}.{owner_column} = {owner_id})')
+
+
+def upgrade():
+    op.execute('ALTER TABLE permission ADD COLUMN bit INTEGER')
+    for bit, type_ in enumerate(PERMISSIONS):
+        op.execute(f"UPDATE permission SET bit = {bit} WHERE type = '{type_}'")
+
+    for owner, links, owner_column in SOURCES:
+        op.execute(f"ALTER TABLE {owner} ADD COLUMN permissions_mask INTEGER NOT NULL DEFAULT '0'")
+
+        def update(record: str) -> str:
+            return (f'UPDATE {owner} SET permissions_mask = {mask(links, owner_column, f"{record}.{owner_column}")} '
+                    f'WHERE id = {record}.{owner_column};')
+
+        statements = {'insert': update('new'), 'delete': update('old'), 'update': f"{update('old')} {update('new')}"}
+        for operation in OPERATIONS:
+            op.execute(f'DROP TRIGGER IF EXISTS permissions_mask_{links}_{operation}')
+            op.execute(f'CREATE TRIGGER permissions_mask_{links}_{operation} AFTER {operation.upper()} ON {links} '
+                       f'BEGIN {statements[operation]} END')
+        op.execute(f'UPDATE {owner} SET permissions_mask = {mask(links, owner_column, f"{owner}.id")}')
+
+
+def downgrade():
+    for owner, links, _ in SOURCES:
+        for operation in OPERATIONS:
+            op.execute(f'DROP TRIGGER IF EXISTS permissions_mask_{links}_{operation}')
+        op.execute(f'ALTER TABLE {owner} DROP COLUMN permissions_mask')
+    op.execute('ALTER TABLE permission DROP COLUMN bit')
@@ -0,0 +1,67 @@
+"""Предрассчитанная аналитика
+
+Таблица analytics_rollup со счётчиками задач РП и проектов по исполнителям и статусам и проектов РП по текущим этапам
+(см. DataRepository.rebuild_analytics_rollup), её версия (см. server/database/models/table_versions.py). Счётчики
+заполняются по имеющимся задачам и проектам. В базах, где таблица уже создана (init_db, прежний запуск сервера),
+миграция ничего не изменяет. В глобальной БД шардированной базы таблиц РП нет - таблица создаётся в шардах.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+
+"""
+import typing as tp
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = '0006'
+down_revision: str | None = '0005'
+branch_labels: str | tp.Sequence[str] | None = None
+depends_on: str | tp.Sequence[str] | None = None
+
+OPERATIONS = ('insert', 'update', 'delete')
+# (область, столбец области, разрез, столбец разреза) счётчиков задач
+TASK_COUNTERS = (
+    ('workspace', 'workspace_id', 'executor', 'executor_id'),
+    ('workspace', 'workspace_id', 'status', 'status_id'),
+    ('project', 'project_id', 'executor', 'executor_id'),
+    ('project', 'project_id', 'status', 'status_id')
+)
+
+
+def upgrade():
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if 'ws_task' not in tables or 'analytics_rollup' in tables:
+        return
+
+    op.create_table(
+        'analytics_rollup',
+        sa.Column('scope', sa.String(20), primary_key=True),
+        sa.Column('scope_id', sa.Integer, primary_key=True),
+        sa.Column('dimension', sa.String(20), primary_key=True),
+        sa.Column('key', sa.Integer, primary_key=True),
+        sa.Column('count', sa.Integer, nullable=False)
+    )
+    for scope, scope_column, dimension, key_column in TASK_COUNTERS:
+        op.execute(f"INSERT INTO analytics_rollup (scope, scope_id, dimension, key, count) "
+                   f"SELECT '{scope}', {scope_column}, '{dimension}', {key_column}, count(*) FROM ws_task "
+                   f"WHERE {scope_column} IS NOT NULL AND {key_column} IS NOT NULL "
+                   f"GROUP BY {scope_column}, {key_column}")
+    op.execute("INSERT INTO analytics_rollup (scope, scope_id, dimension, key, count) "
+               "SELECT 'workspace', workspace_id, 'stage', current_stage_id, count(*) FROM project "
+               "WHERE current_stage_id IS NOT NULL GROUP BY workspace_id, current_stage_id")
+
+    op.execute("INSERT OR IGNORE INTO table_version (table_name, version) VALUES ('analytics_rollup', 0)")
+    for operation in OPERATIONS:
+        op.execute(f'DROP TRIGGER IF EXISTS table_version_analytics_rollup_{operation}')
+        op.execute(f'CREATE TRIGGER table_version_analytics_rollup_{operation} AFTER {operation.upper()} '
+                   f"ON analytics_rollup BEGIN UPDATE table_version SET version = version + 1 "
+                   f"WHERE table_name = 'analytics_rollup'; END")
+
+
+def downgrade():
+    for operation in OPERATIONS:
+        op.execute(f'DROP TRIGGER IF EXISTS table_version_analytics_rollup_{operation}')
+    op.execute("DELETE FROM table_version WHERE table_name = 'analytics_rollup'")
+    op.execute('DROP TABLE IF EXISTS analytics_rollup')
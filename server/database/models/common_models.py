@@ -1,5 +1,5 @@
 from sqlalchemy.orm import relationship, mapped_column, Mapped
-from sqlalchemy import ForeignKey, Table, Column, Integer
+from sqlalchemy import ForeignKey, Table, Column, Integer, Index
 from sqlalchemy.types import String
 
 import datetime
@@ -201,6 +201,18 @@ tag_personal_task = Table(
     Column('personal_task_tag_id', ForeignKey('personal_task_tag.id'), primary_key=True)
 )
 
+# Предрассчитанная аналитика (счётчики), поддерживается DataRepository при записи задач и проектов.
+# scope - область (РП или проект), dimension - разрез (исполнитель, статус, текущий этап проекта), key - ID в разрезе.
+analytics_rollup = Table(
+    'analytics_rollup',
+    Base.metadata,
+    Column('scope', String(20), primary_key=True),
+    Column('scope_id', Integer, primary_key=True),
+    Column('dimension', String(20), primary_key=True),
+    Column('key', Integer, primary_key=True),
+    Column('count', Integer, nullable=False, default=0)
+)
+
 
 class WSTask(Base):
     """Задача РП."""
@@ -473,6 +485,7 @@ class WSRole(Base):
     workspace_id: Mapped[int] = mapped_column(ForeignKey('workspace.id'))
     name: Mapped[str] = mapped_column(String[60])
     color: Mapped[str] = mapped_column(String[30], default='#FFFFFF')
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
 
     permissions: Mapped[list['Permission']] = relationship(secondary='ws_role_permission', back_populates='roles')
     users: Mapped[list[User]] = relationship(secondary='user_ws_role', back_populates='roles')
@@ -488,6 +501,7 @@ class Permission(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     type: Mapped[str] = mapped_column(String[60], unique=True)  # Тип разрешения (CRUD-<Объект>)
+    bit: Mapped[int | None] = mapped_column()  # Номер бита в масках ролей (data_const.PERMISSION_BITS)
 
     roles: Mapped[list[WSRole]] = relationship(secondary='ws_role_permission', back_populates='permissions')
     project_roles: Mapped[list['WSRoleProject']] = relationship(secondary='ws_role_project_permission',
@@ -509,6 +523,7 @@ class WSRoleTask(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('ws_role.id'))
     task_id: Mapped[int] = mapped_column(ForeignKey('ws_task.id'))
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
     permissions: Mapped[list[Permission]] = relationship(secondary='ws_role_task_permission',
                                                          back_populates='task_roles')
 
@@ -519,6 +534,7 @@ class WSRoleProject(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('ws_role.id'))
     project_id: Mapped[int] = mapped_column(ForeignKey('project.id'))
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
     permissions: Mapped[list[Permission]] = relationship(secondary='ws_role_project_permission',
                                                          back_populates='project_roles')
 
@@ -529,6 +545,7 @@ class WSRoleDailyEvent(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('ws_role.id'))
     daily_event_id: Mapped[int] = mapped_column(ForeignKey('ws_daily_event.id'))
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
     permissions: Mapped[list[Permission]] = relationship(secondary='ws_role_daily_event_permission',
                                                          back_populates='daily_event_roles')
 
@@ -539,6 +556,7 @@ class WSRoleManyDaysEvent(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('ws_role.id'))
     many_days_event_id: Mapped[int] = mapped_column(ForeignKey('ws_many_days_event.id'))
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
     permissions: Mapped[list[Permission]] = relationship(secondary='ws_role_many_days_event_permission',
                                                          back_populates='many_days_event_roles')
 
@@ -549,6 +567,7 @@ class WSRoleDocument(Base):
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey('ws_role.id'))
     document_id: Mapped[int] = mapped_column(ForeignKey('ws_document.id'))
+    permissions_mask: Mapped[int] = mapped_column(default=0, server_default='0')  # См. models.permission_masks
     permissions: Mapped[list[Permission]] = relationship(secondary='ws_role_document_permission',
                                                          back_populates='document_roles')
 
@@ -598,5 +617,84 @@ ws_role_document_permission = Table(
 
 )
 
+# Каталог индексов. Составлен по фильтрам запросов DataRepository (в комментарии - методы, использующие индекс) и
+# по FK, по которым сериализаторы загружают связанные объекты (ID связанных one-to-many и many-to-many). Для
+# ассоциативных таблиц индексируется обратное направление: прямое покрывается индексом составного PK.
+# Индексы добавляются в существующие БД миграцией server/database/migrations/versions/0001_index_catalogue.py.
+INDEXES = (
+    # Пользователи: поиск по началу имени и email без учёта регистра (LIKE 'x%' - поиск по диапазону индекса)
+    Index('ix_user_username_nocase', User.username.collate('NOCASE')),  # search_users(prefix=True)
+    Index('ix_user_email_nocase', User.email.collate('NOCASE')),
+
+    # Участники РП и проектов, роли пользователей
+    Index('ix_workspace_user_user_id', workspace_user.c.user_id),  # get_workspaces(participant_id), User.linked_workspaces
+    Index('ix_user_ws_role_role_id', user_role.c.role_id),  # WSRole.users, delete_workspace_users
+    Index('ix_project_user_project_id', project_user.c.project_id),  # get_project_users
+    Index('ix_project_mentor_project_id', project_mentor.c.project_id),  # get_project_mentors
+    Index('ix_workspace_creator_id', Workspace.creator_id),  # get_workspaces(creator_ids)
+
+    # Проекты
+    Index('ix_project_workspace_id', Project.workspace_id),  # get_projects, get_projects_by_workspace_id
+    Index('ix_project_creator_id', Project.creator_id),  # get_projects(creator_ids)
+    Index('ix_work_stage_project_id', WorkStage.project_id),  # get_work_stages_by_project_id
+
+    # Задачи РП
+    Index('ix_ws_task_workspace_id_status_id', WSTask.workspace_id, WSTask.status_id),  # get_ws_tasks(workspace_id, status_ids)
+    Index('ix_ws_task_project_id', WSTask.project_id),  # get_ws_tasks(project_id), аналитика проекта
+    Index('ix_ws_task_executor_id', WSTask.executor_id),  # get_ws_tasks(executor_id), get_ws_task_events(executor_id)
+    Index('ix_ws_task_status_id', WSTask.status_id),  # WSTaskStatus.tasks
+    Index('ix_ws_task_creator_id', WSTask.creator_id),  # User.created_ws_tasks
+    Index('ix_ws_task_entrusted_id', WSTask.entrusted_id),  # User.assigned_by_user_tasks
+    Index('ix_ws_task_parent_task_id', WSTask.parent_task_id),  # WSTask.child_tasks
+    Index('ix_ws_task_work_direction_id', WSTask.work_direction_id),  # WSWorkDirection.tasks
+    Index('ix_ws_task_event_task_id_date', WSTaskEvent.task_id, WSTaskEvent.date),  # WSTask.task_events
+    Index('ix_ws_task_event_date', WSTaskEvent.date),  # get_ws_tasks(working_date), get_ws_task_events(date)
+    Index('ix_responsible_task_task_id', responsible_task.c.task_id),  # WSTask.responsible
+    Index('ix_executor_task_task_id', executor_task.c.task_id),
+    Index('ix_tag_ws_task_ws_task_tag_id', tag_ws_task.c.ws_task_tag_id),  # WSTaskTag.tasks
+
+    # Личные задачи
+    Index('ix_personal_task_owner_id_status_id', PersonalTask.owner_id, PersonalTask.status_id),  # get_personal_tasks_by_id
+    Index('ix_personal_task_status_id', PersonalTask.status_id),  # PersonalTaskStatus.tasks
+    Index('ix_personal_task_parent_task_id', PersonalTask.parent_task_id),  # PersonalTask.child_tasks
+    Index('ix_personal_task_work_direction_id', PersonalTask.work_direction_id),  # PersonalWorkDirection.tasks
+    Index('ix_personal_task_event_task_id_date', PersonalTaskEvent.task_id, PersonalTaskEvent.date),  # PersonalTask.task_events
+    Index('ix_personal_task_event_date', PersonalTaskEvent.date),  # get_personal_tasks_by_id(working_date)
+    Index('ix_tag_personal_task_personal_task_tag_id', tag_personal_task.c.personal_task_tag_id),  # PersonalTaskTag.tasks
+
+    # Мероприятия
+    Index('ix_ws_daily_event_workspace_id_date', WSDailyEvent.workspace_id, WSDailyEvent.date),  # get_ws_daily_events_by_id
+    Index('ix_ws_daily_event_creator_id', WSDailyEvent.creator_id),  # User.created_ws_daily_events
+    Index('ix_ws_daily_event_user_event_id', ws_daily_event_user.c.event_id),  # WSDailyEvent.notified
+    Index('ix_ws_many_days_event_workspace_id_datetime_start', WSManyDaysEvent.workspace_id,
+          WSManyDaysEvent.datetime_start),  # get_ws_many_days_events_by_id(workspace_id, included_date)
+    Index('ix_ws_many_days_event_creator_id', WSManyDaysEvent.creator_id),  # User.created_ws_many_days_events
+    Index('ix_ws_many_days_event_user_event_id', ws_many_days_event_user.c.event_id),  # WSManyDaysEvent.notified
+    Index('ix_personal_daily_event_owner_id_date', PersonalDailyEvent.owner_id,
+          PersonalDailyEvent.date),  # get_personal_daily_events_by_id
+    Index('ix_personal_many_days_event_owner_id_datetime_start', PersonalManyDaysEvent.owner_id,
+          PersonalManyDaysEvent.datetime_start),  # get_personal_many_days_events_by_id
+
+    # Справочники РП и пользователя
+    Index('ix_ws_role_workspace_id', WSRole.workspace_id),  # get_role_by_user_id, Workspace.roles
+    Index('ix_ws_task_status_workspace_id', WSTaskStatus.workspace_id),  # get_ws_task_statuses_by_workspace
+    Index('ix_ws_task_tag_workspace_id', WSTaskTag.workspace_id),  # get_ws_task_tags_by_workspace
+    Index('ix_ws_work_direction_workspace_id', WSWorkDirection.workspace_id),  # Workspace.work_directions
+    Index('ix_ws_base_category_workspace_id', WSBaseCategory.workspace_id),  # Workspace.base_categories
+    Index('ix_ws_base_category_parent_category_id', WSBaseCategory.parent_category_id),  # WSBaseCategory.child_categories
+    Index('ix_ws_document_workspace_id', WSDocument.workspace_id),  # Workspace.documents
+    Index('ix_ws_document_creator_id', WSDocument.creator_id),  # User.created_ws_documents
+    Index('ix_ws_document_base_category_id', WSDocument.base_category_id),  # WSBaseCategory.documents
+    Index('ix_personal_task_status_owner_id', PersonalTaskStatus.owner_id),  # get_personal_task_statuses_by_user
+    Index('ix_personal_task_tag_owner_id', PersonalTaskTag.owner_id),  # get_personal_task_tags_by_user
+    Index('ix_personal_work_direction_owner_id', PersonalWorkDirection.owner_id),  # User.work_directions
+    Index('ix_ws_role_task_task_id_role_id', WSRoleTask.task_id, WSRoleTask.role_id),  # get_ws_role_task
+    Index('ix_ws_role_project_project_id_role_id', WSRoleProject.project_id, WSRoleProject.role_id),
+    Index('ix_ws_role_document_document_id_role_id', WSRoleDocument.document_id, WSRoleDocument.role_id),
+    Index('ix_ws_role_daily_event_daily_event_id_role_id', WSRoleDailyEvent.daily_event_id, WSRoleDailyEvent.role_id),
+    Index('ix_ws_role_many_days_event_many_days_event_id_role_id', WSRoleManyDaysEvent.many_days_event_id,
+          WSRoleManyDaysEvent.role_id),
+)
+
 if __name__ == '__main__':
     pass
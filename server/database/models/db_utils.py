@@ -1,32 +1,116 @@
-from sqlalchemy import create_engine, Engine
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from sqlalchemy import create_engine, inspect, event, Engine
 from sqlalchemy.orm.session import sessionmaker
 from sqlalchemy.sql.expression import insert
 
 import server.database.models.common_models as cm
-from server.data_const import Permissions, Roles
+# Модули регистрируют DDL схемы последней ревизии при create_all (init_db отмечает БД этой ревизией)
+import server.database.models.search_index  # Индексы поиска user_search, workspace_search
+import server.database.models.table_versions  # Таблица table_version и триггеры версий
+import server.database.models.permission_masks  # Триггеры масок разрешений
+from server.data_const import Permissions, Roles, DBProfiles, PERMISSION_BITS
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
 
 logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
 
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / 'alembic.ini'
 
-def init_db(path: str) -> Engine:
-    """Создаёт базу заново и возвращает её движок."""
+# Профили соединений SQLite: PRAGMA, выполняемые один раз при открытии соединения пулом (а не в каждой сессии).
+# journal_mode=WAL - читатели не блокируются писателем, synchronous=NORMAL в WAL - fsync только при checkpoint,
+# cache_size < 0 - размер кэша страниц в КиБ, busy_timeout (мс) - ожидание блокировки вместо ошибки "database is locked".
+DB_PROFILES = {
+    DBProfiles.prod: {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -64_000,
+        'mmap_size': 256 * 1024 ** 2,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5_000,
+        'foreign_keys': 'ON'
+    },
+    DBProfiles.test: {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -16_000,
+        'mmap_size': 0,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5_000,
+        'foreign_keys': 'ON'
+    },
+    DBProfiles.bulk: {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -512_000,
+        'mmap_size': 1024 ** 3,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 60_000,
+        'foreign_keys': 'ON'
+    }
+}
+
+
+def set_pragmas(engine: Engine, pragmas: dict[str, str | int]):
+    """Задаёт PRAGMA pragmas каждому новому соединению движка SQLite engine."""
+    statements = [f'PRAGMA {name}={value}' for name, value in pragmas.items()]
+
+    @event.listens_for(engine, 'connect')
+    def execute_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+
+def create_db_engine(path: str, profile: str = DBProfiles.prod) -> Engine:
+    """Создаёт движок, соединения которого настраиваются PRAGMA профиля profile (см. DB_PROFILES)."""
+    if profile not in DB_PROFILES:
+        raise ValueError(f'Unknown database profile: {profile}. Available profiles: {", ".join(DB_PROFILES)}')
     engine = create_engine(path)
+    if engine.dialect.name == 'sqlite':
+        set_pragmas(engine, DB_PROFILES[profile])
+    return engine
+
+
+def init_db(path: str, profile: str = DBProfiles.prod) -> Engine:
+    """Создаёт базу заново и возвращает её движок."""
+    engine = create_db_engine(path, profile)
     cm.Base.metadata.drop_all(bind=engine)
     cm.Base.metadata.create_all(bind=engine)
     add_permissions(engine)
+    migrate_db(engine, stamp_only=True)  # create_all создаёт схему последней ревизии
     return engine
 
 
-def launch_db(path: str) -> Engine:
+def launch_db(path: str, profile: str = DBProfiles.prod) -> Engine:
     """Возвращает движок уже созданной базы данных."""
-    engine = create_engine(path)
+    engine = create_db_engine(path, profile)
+    migrate_db(engine)
     return engine
 
 
+def migrate_db(engine: Engine, stamp_only: bool = False):
+    """
+    Применяет к базе миграции Alembic (server/database/migrations) до последней ревизии. Если stamp_only - только
+    отмечает базу последней ревизией.
+    """
+    alembic_config = AlembicConfig(str(ALEMBIC_INI))
+    with engine.begin() as connection:
+        alembic_config.attributes['connection'] = connection
+        if stamp_only:
+            command.stamp(alembic_config, 'head')
+        elif not inspect(connection).has_table(cm.User.__tablename__):  # База ещё не создана (init_db)
+            logger.warning(f'Database is not initialized, migrations are skipped: {engine.url}')
+        else:
+            command.upgrade(alembic_config, 'head')
+
+
 def add_permissions(engine: Engine):
     session = sessionmaker(bind=engine)
     with session() as s, s.begin():
-        s.execute(insert(cm.Permission), [{'type': type_} for type_ in Permissions.__dict__])
+        s.execute(insert(cm.Permission), [{'type': type_, 'bit': PERMISSION_BITS.get(type_)}
+                                          for type_ in Permissions.__dict__])
 
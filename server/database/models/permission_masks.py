@@ -0,0 +1,85 @@
+"""
+Маски разрешений: роль РП (ws_role) и каждое её переопределение для объекта (ws_role_task, ws_role_project, ...)
+хранят в столбце permissions_mask битовую маску своих разрешений (бит разрешения - permission.bit, см.
+data_const.PERMISSION_BITS). Проверка разрешения - одна операция AND над маской вместо запросов к ассоциативным
+таблицам и таблице permission.
+
+Ассоциативные таблицы разрешений остаются источником данных: маска владельца пересчитывается триггерами при каждом
+добавлении, изменении и удалении их строк, поэтому она согласована при любом способе изменения (ORM, SQL, другой
+процесс). Изменение маски изменяет строку роли - версия таблицы (server.database.models.table_versions) увеличивается,
+и кэшированные маски пользователей становятся недействительными.
+
+Триггеры создаются вместе с таблицами (Base.metadata.create_all), в существующих базах - миграцией
+0005_permission_masks. В шардах (server.database.sharding) таблица permission хранится в подключённой глобальной БД, а
+постоянный триггер может читать только таблицы своей БД: триггеры шарда - временные (temp=True), создаются для каждого
+соединения шарда.
+"""
+import typing as tp
+
+from sqlalchemy import event, Table
+from sqlalchemy.engine import Connection
+
+import server.database.models.common_models as cm
+
+PERMISSIONS_MASK = 'permissions_mask'
+# (таблица владельца маски, ассоциативная таблица разрешений, столбец ID владельца в ней)
+MASK_SOURCES = (
+    (cm.WSRole.__tablename__, cm.ws_role_permission.name, 'role_id'),
+    (cm.WSRoleTask.__tablename__, cm.ws_role_task_permission.name, 'role_task_id'),
+    (cm.WSRoleProject.__tablename__, cm.ws_role_project_permission.name, 'role_project_id'),
+    (cm.WSRoleDailyEvent.__tablename__, cm.ws_role_daily_event_permissions.name, 'role_daily_event_id'),
+    (cm.WSRoleManyDaysEvent.__tablename__, cm.ws_role_many_days_event_permission.name, 'role_many_days_event_id'),
+    (cm.WSRoleDocument.__tablename__, cm.ws_role_document_permission.name, 'role_document_id')
+)
+
+
+def get_mask_expression(links: str, owner_column: str, owner_id: str) -> str:
+    """
+    Возвращает SQL-выражение маски владельца owner_id: сумма различных степеней двойки равна их побитовому OR
+    (в SQLite нет агрегата побитового OR).
+    """
+    return (f'(SELECT coalesce(sum(DISTINCT 1 << permission.bit), 0) FROM {links} '
+            f'JOIN permission ON permission.id = {links}.permissions_id WHERE {links}.{owner_column} = {owner_id})')
+
+
+def get_permission_masks_ddl(temp: bool = False, table_names: tp.Collection[str] = None) -> list[str]:
+    """
+    Возвращает DDL триггеров пересчёта масок и пересчёт масок имеющихся строк. temp - временные триггеры соединения
+    (без пересчёта). table_names - таблицы БД: маски владельцев, таблиц которых нет, не создаются.
+    """
+    ddl = []
+    for owner, links, owner_column in MASK_SOURCES:
+        if table_names is not None and not {owner, links} <= set(table_names):
+            continue
+
+        def update(record: str) -> str:
+            return (f'UPDATE {owner} SET {PERMISSIONS_MASK} = '
+                    f'{get_mask_expression(links, owner_column, f"{record}.{owner_column}")} '
+                    f'WHERE id = {record}.{owner_column};')
+
+        for operation, statements in (('insert', update('new')), ('delete', update('old')),
+                                      ('update', f"{update('old')} {update('new')}")):
+            if temp:
+                ddl.append(f'CREATE TEMP TRIGGER {PERMISSIONS_MASK}_{links}_{operation} AFTER {operation.upper()} '
+                           f'ON main.{links} BEGIN {statements} END')
+            else:
+                ddl += [
+                    f'DROP TRIGGER IF EXISTS {PERMISSIONS_MASK}_{links}_{operation}',
+                    f'CREATE TRIGGER {PERMISSIONS_MASK}_{links}_{operation} AFTER {operation.upper()} ON {links} '
+                    f'BEGIN {statements} END'
+                ]
+        if not temp:
+            ddl.append(f'UPDATE {owner} SET {PERMISSIONS_MASK} = '
+                       f'{get_mask_expression(links, owner_column, f"{owner}.id")}')
+    return ddl
+
+
+@event.listens_for(cm.Base.metadata, 'after_create')
+def create_permission_masks(target, connection: Connection, tables: tp.Collection[Table] = None, **kwargs):
+    if connection.dialect.name != 'sqlite':
+        return
+    table_names = [table.name for table in tables or target.sorted_tables]
+    if cm.Permission.__tablename__ not in table_names:  # БД без разрешений (шард)
+        return
+    for statement in get_permission_masks_ddl(table_names=table_names):
+        connection.exec_driver_sql(statement)
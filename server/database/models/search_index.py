@@ -0,0 +1,122 @@
+"""
+Полнотекстовые индексы поиска: виртуальные таблицы SQLite FTS5 с токенизатором trigram (поиск подстроки без учёта
+регистра). Индексы - таблицы с внешним содержимым (content=<таблица>): хранят только индекс, текст читается из
+таблицы-источника. Синхронизируются с источником триггерами.
+
+Индексы создаются вместе с таблицами-источниками (Base.metadata.create_all), в существующих базах - миграциями
+0002_user_search, 0003_workspace_search. Модуль подключается в DataRepository.
+"""
+import typing as tp
+
+from sqlalchemy import event, Integer
+from sqlalchemy.engine import Connection
+from sqlalchemy.sql import table, column
+
+import server.database.models.common_models as cm
+from server.data_const import DBStruct
+
+# Минимальная длина искомой строки для поиска по индексу: trigram индексирует подстроки из трёх символов, более
+# короткие строки ищутся без индекса (LIKE)
+MIN_TERM_LENGTH = 3
+
+# Поиск пользователей по имени и email
+USER_SEARCH = 'user_search'
+user_search = table(USER_SEARCH, column('rowid', Integer), column('username'), column('email'),
+                    column(USER_SEARCH))  # Скрытый столбец с именем таблицы - левая часть MATCH и аргумент bm25
+USER_SEARCH_WEIGHTS = (2.0, 1.0)  # Веса столбцов username, email при ранжировании (bm25)
+USER_SEARCH_DDL = (
+    f'DROP TABLE IF EXISTS {USER_SEARCH}',
+    f"CREATE VIRTUAL TABLE {USER_SEARCH} USING fts5(username, email, content='user', content_rowid='id', "
+    f"tokenize='trigram')",
+    f'CREATE TRIGGER {USER_SEARCH}_insert AFTER INSERT ON user BEGIN '
+    f'INSERT INTO {USER_SEARCH}(rowid, username, email) VALUES (new.id, new.username, new.email); END',
+    f'CREATE TRIGGER {USER_SEARCH}_delete AFTER DELETE ON user BEGIN '
+    f"INSERT INTO {USER_SEARCH}({USER_SEARCH}, rowid, username, email) VALUES ('delete', old.id, old.username, "
+    f'old.email); END',
+    f'CREATE TRIGGER {USER_SEARCH}_update AFTER UPDATE OF username, email ON user BEGIN '
+    f"INSERT INTO {USER_SEARCH}({USER_SEARCH}, rowid, username, email) VALUES ('delete', old.id, old.username, "
+    f'old.email); '
+    f'INSERT INTO {USER_SEARCH}(rowid, username, email) VALUES (new.id, new.username, new.email); END',
+    f"INSERT INTO {USER_SEARCH}({USER_SEARCH}) VALUES ('rebuild')"  # Индексирует уже имеющиеся записи
+)
+
+
+def create_search_index(connection: Connection, ddl: tp.Sequence[str]):
+    """Создаёт (пересоздаёт) индекс поиска. Для СУБД, отличных от SQLite, индекс не создаётся."""
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in ddl:
+        connection.exec_driver_sql(statement)
+
+
+def phrase(term: str) -> str:
+    """Возвращает строку как фразу запроса FTS5: спецсимволы синтаксиса запросов в ней не интерпретируются."""
+    return '"' + term.replace('"', '""') + '"'
+
+
+@event.listens_for(cm.User.__table__, 'after_create')
+def create_user_search(target, connection: Connection, **kwargs):
+    create_search_index(connection, USER_SEARCH_DDL)
+
+
+# Поиск по РП: задачи, проекты и мероприятия. Индекс хранит копию текста (для фрагментов snippet), объект
+# определяется по rowid: rowid = ID объекта * len(WORKSPACE_SEARCH_SOURCES) + код типа объекта. title - название,
+# body - описание и текстовые поля объекта через перевод строки.
+WORKSPACE_SEARCH = 'workspace_search'
+workspace_search = table(WORKSPACE_SEARCH, column('rowid', Integer), column('title'), column('body'),
+                         column('kind'), column('object_id', Integer), column('workspace_id', Integer),
+                         column(WORKSPACE_SEARCH))
+WORKSPACE_SEARCH_WEIGHTS = (3.0, 1.0)  # Веса столбцов title, body при ранжировании (bm25)
+SNIPPET_START, SNIPPET_END, SNIPPET_ELLIPSIS = '<b>', '</b>', '…'  # Выделение совпадений во фрагментах
+SNIPPET_TOKENS = 64  # Длина фрагмента в токенах (для trigram - символах), максимум FTS5
+
+# Значения текстовых столбцов по умолчанию (заглушки) не индексируются
+DEFAULT_TEXTS = {
+    'description': DBStruct.default_description,
+    'goal': DBStruct.default_goal,
+    'tasks_description': DBStruct.default_tasks_description,
+    'problem': DBStruct.default_problem,
+    'relevance': DBStruct.default_relevance,
+    'thesis': DBStruct.default_thesis
+}
+# (тип объекта, таблица, столбец названия, текстовые столбцы). Код типа - индекс в кортеже
+WORKSPACE_SEARCH_SOURCES = (
+    ('ws_task', 'ws_task', 'name', ('description',)),
+    ('project', 'project', 'name', ('description', 'goal', 'tasks_description', 'problem', 'relevance', 'thesis')),
+    ('ws_daily_event', 'ws_daily_event', 'name', ('description',)),
+    ('ws_many_days_event', 'ws_many_days_event', 'name', ('description',))
+)
+
+
+def get_workspace_search_ddl() -> list[str]:
+    """Возвращает DDL индекса поиска по РП, триггеров синхронизации с таблицами объектов и заполнения индекса."""
+    sources_num = len(WORKSPACE_SEARCH_SOURCES)
+    ddl = [f'DROP TABLE IF EXISTS {WORKSPACE_SEARCH}',
+           f"CREATE VIRTUAL TABLE {WORKSPACE_SEARCH} USING fts5(title, body, kind UNINDEXED, object_id UNINDEXED, "
+           f"workspace_id UNINDEXED, tokenize='trigram')"]
+    for code, (kind, source, title_column, text_columns) in enumerate(WORKSPACE_SEARCH_SOURCES):
+        def row(record: str) -> str:  # Значения строки индекса для записи new/old (для заполнения - таблицы)
+            body = ' || char(10) || '.join(f"coalesce(nullif({record}.{text_column}, '{DEFAULT_TEXTS[text_column]}'), '')"
+                                           for text_column in text_columns)
+            return (f"{record}.id * {sources_num} + {code}, {record}.{title_column}, {body}, '{kind}', {record}.id, "
+                    f"{record}.workspace_id")
+
+        insert_row = f'INSERT INTO {WORKSPACE_SEARCH}(rowid, title, body, kind, object_id, workspace_id)'
+        delete_row = f'DELETE FROM {WORKSPACE_SEARCH} WHERE rowid = old.id * {sources_num} + {code}'
+        updated_columns = ', '.join((title_column, *text_columns, 'workspace_id'))
+        ddl += [
+            f'CREATE TRIGGER {WORKSPACE_SEARCH}_{kind}_insert AFTER INSERT ON {source} BEGIN '
+            f'{insert_row} VALUES ({row("new")}); END',
+            f'CREATE TRIGGER {WORKSPACE_SEARCH}_{kind}_delete AFTER DELETE ON {source} BEGIN {delete_row}; END',
+            f'CREATE TRIGGER {WORKSPACE_SEARCH}_{kind}_update AFTER UPDATE OF {updated_columns} ON {source} BEGIN '
+            f'{delete_row}; {insert_row} VALUES ({row("new")}); END',
+            f'{insert_row} SELECT {row(source)} FROM {source}'
+        ]
+    return ddl
+
+
+@event.listens_for(cm.Base.metadata, 'after_create')
+def create_workspace_search(target, connection: Connection, tables: tp.Collection = None, **kwargs):
+    if tables is not None and cm.WSTask.__table__ not in tables:  # Таблицы РП не создавались (глобальная БД шардов)
+        return
+    create_search_index(connection, get_workspace_search_ddl())
@@ -0,0 +1,57 @@
+"""
+Версии таблиц: таблица table_version хранит для каждой таблицы БД счётчик изменений, который увеличивается триггерами
+при каждом добавлении, изменении и удалении строки. По версиям таблиц кэш запросов (server.database.cash_manager)
+определяет, изменились ли таблицы, из которых получен результат, в том числе другими процессами.
+
+Версии создаются вместе с таблицами (Base.metadata.create_all), в существующих базах - миграцией 0004_table_versions.
+Миграции, добавляющие таблицы, должны создавать и их версии (get_table_versions_ddl).
+"""
+import typing as tp
+
+from sqlalchemy import event, Table, MetaData, Column, String, Integer
+from sqlalchemy.engine import Connection
+
+import server.database.models.common_models as cm
+from server.database.models.search_index import USER_SEARCH, WORKSPACE_SEARCH, WORKSPACE_SEARCH_SOURCES
+
+TABLE_VERSION = 'table_version'
+table_version = Table(
+    TABLE_VERSION, MetaData(),
+    Column('table_name', String, primary_key=True),
+    Column('version', Integer, nullable=False, default=0)
+)
+
+# Таблицы, изменяемые только триггерами других таблиц (индексы поиска): таблица -> таблицы-источники
+DERIVED_TABLES = {
+    USER_SEARCH: (cm.User.__tablename__,),
+    WORKSPACE_SEARCH: tuple(source for _, source, _, _ in WORKSPACE_SEARCH_SOURCES)
+}
+
+
+def get_table_versions_ddl(table_names: tp.Iterable[str]) -> list[str]:
+    """Возвращает DDL версий таблиц table_names: строки table_version и триггеры увеличения версии."""
+    ddl = [f'CREATE TABLE IF NOT EXISTS {TABLE_VERSION} (table_name VARCHAR NOT NULL PRIMARY KEY, '
+           f'version INTEGER NOT NULL DEFAULT 0)']
+    for name in table_names:
+        ddl.append(f"INSERT OR IGNORE INTO {TABLE_VERSION} (table_name, version) VALUES ('{name}', 0)")
+        for operation in ('insert', 'update', 'delete'):
+            ddl += [
+                f'DROP TRIGGER IF EXISTS {TABLE_VERSION}_{name}_{operation}',
+                f'CREATE TRIGGER {TABLE_VERSION}_{name}_{operation} AFTER {operation.upper()} ON "{name}" BEGIN '
+                f"UPDATE {TABLE_VERSION} SET version = version + 1 WHERE table_name = '{name}'; END"
+            ]
+    return ddl
+
+
+@event.listens_for(cm.Base.metadata, 'after_create')
+def create_table_versions(target, connection: Connection, tables: tp.Collection[Table] = None, **kwargs):
+    if connection.dialect.name != 'sqlite':
+        return
+    for statement in get_table_versions_ddl(table.name for table in tables or target.sorted_tables):
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(cm.Base.metadata, 'after_drop')
+def drop_table_versions(target, connection: Connection, **kwargs):
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql(f'DROP TABLE IF EXISTS {TABLE_VERSION}')
@@ -1,22 +1,113 @@
+import copy
 import datetime
+import functools
+import inspect
 import logging
+import operator
+from contextlib import contextmanager
 
 from sqlalchemy.orm.session import sessionmaker, Select, Session
-from sqlalchemy.sql import select, delete, text, and_, func
+from sqlalchemy.sql import select, insert, delete, and_, or_, func, literal, true, tuple_
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
 
 import typing as tp
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import server.database.models.common_models as cm
-from common.base import DBFields, get_datetime_now
+import server.database.models.search_index as search_index
+import server.database.models.permission_masks  # Триггеры масок разрешений
+from common.base import CommonStruct, DBFields, get_datetime_now
 from server.database.schemes.base import schemes_models
+from server.database.schemes.serializers import compiled_serializers
+from server.data_const import Rollup, get_mask_permissions
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
-from server.database.exceptions import exc_mapped, BaseRepoException, IncorrectParam
+from server.database.exceptions import exc_mapped, map_sqlalchemy_exc_to_repo_exc, BaseRepoException, IncorrectParam
+from server.database.write_dispatcher import WriteDispatcher
+from server.database.cash_manager import CashManager, normalize
+from server.database.request_scope import RequestScope, NO_VALUE, begin_read_transaction, begin_write_transaction
 
 logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
 
+M = tp.TypeVar('M', bound=tp.Callable)
+
+EXPORT_BATCH_SIZE = 500  # Число записей в пачке выгрузки РП (yield_per), не больше IN_CHUNK_SIZE
+# Разделы выгрузки РП (типы объектов) в порядке выгрузки
+EXPORT_SECTIONS = (cm.Project.__tablename__, cm.WorkStage.__tablename__, cm.WSTask.__tablename__,
+                   cm.WSDailyEvent.__tablename__, cm.WSManyDaysEvent.__tablename__, cm.workspace_user.name)
+
+
+def dispatched_write(method: M = None, exclusive: bool = False) -> M:
+    """
+    Отмечает изменяющий метод репозитория. Если у репозитория есть очередь записи (write_dispatcher), метод
+    выполняется потоком-писателем в транзакции группы (см. server.database.write_dispatcher), вызывающий поток ждёт
+    результат. Внутри единицы работы и в потоке-писателе метод выполняется сразу. exclusive - метод выполняется в
+    отдельной транзакции (массовые изменения). В контексте запроса (см. server.database.request_scope) метод
+    выполняется в точке сохранения транзакции запроса. Применяется под exc_mapped.
+    """
+    if method is None:
+        return functools.partial(dispatched_write, exclusive=exclusive)
+
+    @functools.wraps(method)
+    def wrapper(self: 'DataRepository', *args, **kwargs):
+        if self._uow_session is not None:
+            return method(self, *args, **kwargs)
+        scope = self._get_request_scope()
+        if scope is not None:
+            session = scope.get_write_session(self._session_maker)
+            with session.begin_nested():  # Ошибка метода откатывает только его изменения
+                return method(self._bind(session), *args, **kwargs)
+        dispatcher = self._write_dispatcher
+        if dispatcher is None or dispatcher.in_writer():
+            return method(self, *args, **kwargs)
+        return dispatcher.execute(lambda session: method(self._bind(session), *args, **kwargs), exclusive)
+
+    return wrapper
+
+
+def cached(method: M) -> M:
+    """
+    Отмечает метод чтения репозитория. Если у репозитория есть кэш запросов (cash_manager), результат метода
+    возвращается из кэша по параметрам вызова, пока таблицы, из которых он получен, не изменятся (см.
+    server.database.cash_manager). В контексте запроса (см. server.database.request_scope) результат запоминается
+    в его identity map до конца запроса или изменения БД; после изменения БД в контексте кэш запросов не используется.
+    Внутри единицы работы (могут быть видны незафиксированные изменения) и при serialize=False (возвращаются
+    ORM-объекты) метод выполняется без кэша. Применяется под exc_mapped.
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self: 'DataRepository', *args, **kwargs):
+        cash_manager = self._cash_manager
+        scope = self._get_request_scope()
+        if cash_manager is None and scope is None or self._uow_session is not None:
+            return method(self, *args, **kwargs)
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        arguments.arguments.pop('self')
+        if arguments.arguments.get('serialize') is False:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, arguments.arguments)
+        if scope is None:
+            return cash_manager.get(key, lambda: method(self, *args, **kwargs))
+
+        try:
+            key = (id(self._session_maker), normalize(key))  # Результаты разных БД (шардов) не смешиваются
+        except TypeError:
+            return method(self, *args, **kwargs)
+        value = scope.get(key)
+        if value is NO_VALUE:
+            if cash_manager is not None and not scope.written:
+                value = cash_manager.get(key[1], lambda: method(self, *args, **kwargs))
+            else:
+                value = method(self, *args, **kwargs)
+            scope.put(key, value)
+        return value
+
+    return wrapper
+
 
 class DataRepository:
 
@@ -25,76 +116,194 @@ class DataRepository:
     RepoSelectResponse.content - список сериализованных моделей, полученных в ответе.
     RepoSelectResponse.last_record_num - номер последней модели (если в запрос передан limit, offset или require_last_rec_num,
     иначе - None)
+    RepoSelectResponse.last_id - ID последней модели страницы (только при keyset-пагинации через параметр after_id,
+    records_left при этом - 1, если после страницы есть записи, иначе 0)
+    Каждый метод выполняется в отдельной транзакции. Несколько операций в одной транзакции выполняются через
+    unit_of_work.
 
     :param session_maker: Фабрика сессий sessionmaker, используемая для создания сессий в репозитории.
     :param launch_validation: Запускать ли проверку целостности БД при инициализации? По умолчанию: да.
-    :param enable_fk_check: Включать ли проверку FK при создании сессий? (Только для SQLite). По умолчанию: да.
+    :param write_dispatcher: Очередь записи. Если передана, изменяющие методы (dispatched_write) выполняются
+                             потоком-писателем с объединением транзакций (см. server.database.write_dispatcher).
+    :param cash_manager: Кэш запросов. Если передан, результаты методов чтения (cached) кэшируются до изменения
+                         таблиц, из которых они получены (см. server.database.cash_manager).
+    :param request_scope_provider: Возвращает контекст текущего запроса API (None - вне запроса). Если передан, методы
+                                   в контексте запроса выполняются в его сессии и транзакции (см.
+                                   server.database.request_scope).
+
+    Проверка FK и остальные параметры SQLite задаются один раз для соединения профилем движка (см.
+    server.database.models.db_utils.DB_PROFILES), а не при каждой сессии.
 
     """
 
-    def __init__(self, session_maker: sessionmaker, launch_validation: bool = True, enable_fk_check: bool = True):
+    def __init__(self, session_maker: sessionmaker, launch_validation: bool = True,
+                 write_dispatcher: WriteDispatcher = None, cash_manager: CashManager = None,
+                 request_scope_provider: tp.Callable[[], RequestScope | None] = None):
         self._session_maker = session_maker
-        self._enable_fk_check = enable_fk_check
+        self._uow_session: Session | None = None  # Сессия единицы работы (см. unit_of_work)
+        self._write_dispatcher = write_dispatcher
+        self._cash_manager = cash_manager
+        self._request_scope_provider = request_scope_provider
         if launch_validation:
             self._validate()
 
     def _validate(self):
         pass
 
-    def _prepare_session(self, session: Session):
-        """
-        Выполняет действия с сессией перед обработкой запросов. Включает проверку FK при соответствующем параметре.
+    def _get_request_scope(self) -> RequestScope | None:
+        """Возвращает контекст текущего запроса API. Внутри единицы работы и вне запроса - None."""
+        if self._request_scope_provider is None or self._uow_session is not None:
+            return None
+        return self._request_scope_provider()
+
+    @contextmanager
+    def _session_scope(self, shared: bool = True) -> tp.Iterator[Session]:
         """
-        if self._enable_fk_check:
-            session.execute(text('PRAGMA foreign_keys=ON'))
+        Возвращает сессию для выполнения запроса. Вне единицы работы - новую сессию с отдельной транзакцией
+        (фиксируется при выходе), внутри единицы работы (см. unit_of_work) - её общую сессию без фиксации, в контексте
+        запроса API - сессию контекста без фиксации (фиксируется в конце запроса).
 
-    def _get_permissions(self, query: Select) -> tuple[str, ...]:
+        :param shared: False - сессия контекста запроса не используется (сессия нужна после завершения запроса).
+        """
+        if self._uow_session is not None:
+            yield self._uow_session
+            return
+        scope = self._get_request_scope() if shared else None
+        if scope is not None:
+            yield scope.get_session(self._session_maker)
+            return
         with self._session_maker() as session, session.begin():
-            perm_ids = session.execute(query)
-            permissions = session.execute(
-                select(cm.Permission.type).where(cm.Permission.id.in_(perm_ids))).scalars().all()
+            yield session
 
-        return permissions
+    @contextmanager
+    def unit_of_work(self) -> tp.Iterator['DataRepository']:
+        """
+        Единица работы: выполняет несколько операций репозитория в одной сессии и одной транзакции. Возвращает
+        репозиторий, все методы которого работают в общей сессии: добавленные модели сбрасываются в БД (flush), поэтому
+        их ID доступны сразу (RepoInsertResponse.ids) без повторного получения, изменения видны последующим запросам.
+        Транзакция фиксируется одним COMMIT при выходе из блока, при исключении - откатывается целиком. В контексте
+        запроса API единица работы - точка сохранения транзакции запроса.
+
+        Пример:
+            with repo.unit_of_work() as uow:
+                user_id = uow.add_users([user]).ids[0]
+                uow.update_users([{DBFields.id: user_id, ...}])
+        """
+        if self._uow_session is not None:  # Вложенная единица работы выполняется в сессии внешней
+            yield self
+            return
+
+        scope = self._get_request_scope()
+        try:
+            if scope is not None:
+                session = scope.get_write_session(self._session_maker)
+                with session.begin_nested():
+                    yield self._bind(session)
+                return
+            with self._session_maker() as session, session.begin():
+                yield self._bind(session)
+        except SQLAlchemyError as e:  # Ошибки при фиксации транзакции
+            logger.exception(f'An SQLAlchemyError caught during unit of work commit: {e}')
+            raise map_sqlalchemy_exc_to_repo_exc(e)
+
+    def _bind(self, session: Session) -> 'DataRepository':
+        """Возвращает репозиторий, все методы которого работают в сессии session без фиксации."""
+        uow = copy.copy(self)
+        uow._uow_session = session
+        return uow
+
+    def _get_permissions(self, query: Select) -> tuple[str, ...]:
+        """Возвращает типы разрешений по запросу масок разрешений (permissions_mask) - одним запросом."""
+        with self._session_scope() as session:
+            mask = functools.reduce(operator.or_, session.execute(query).scalars(), 0)
+        return get_mask_permissions(mask)
 
     def _execute_select(self, query: Select, limit: int = None, offset: int = None, require_last_rec_num: bool = False,
-                        serialize: bool = True) -> 'RepoSelectResponse':
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
-            result = session.execute(query.limit(limit).offset(offset)).scalars().all()
-            if serialize:
-                models_list = [model for model in result]
-                if models_list:  # Сериализуем
-                    scheme = schemes_models.get(type(models_list[0]))  # Получаем схему
+                        serialize: bool = True, after_id: int = None, count_total: bool = True) -> 'RepoSelectResponse':
+        """
+        Выполняет запрос на получение данных. Если передан limit, offset или require_last_rec_num, общее число записей
+        вычисляется в том же запросе некоррелированным подзапросом SELECT count(*) (вычисляется БД один раз) -
+        оставшиеся записи не загружаются. Модели, для которых есть скомпилированный сериализатор (см.
+        schemes.serializers), выбираются колонками таблицы без создания ORM-объектов и сериализуются им.
+
+        :param after_id: Курсор keyset-пагинации: ID последней полученной записи. Если передан, возвращаются записи с
+                         ID > after_id в порядке возрастания ID, offset игнорируется, last_record_num = None, общее
+                         число записей не вычисляется (как при count_total=False). Для первой страницы передаётся 0.
+        :param count_total: Если False, общее число записей не вычисляется: выбирается limit + 1 запись, records_left
+                            равен 1, если есть записи после страницы, иначе 0. Время запроса не зависит от числа
+                            подходящих записей.
+        """
+        count_required = bool(limit or offset or require_last_rec_num or after_id is not None)
+        has_next = None  # Есть ли записи после страницы (при count_total=False)
+        offset = offset or 0
+        model = query.column_descriptions[0]['entity']
+        if after_id is not None:  # Keyset-пагинация: страница N по индексу PK, без пропуска offset и подсчёта записей
+            query = query.where(model.id > after_id).order_by(None).order_by(model.id)
+            offset = 0
+            count_total = False
+
+        serializer = None
+        if serialize and len(query.column_descriptions) == 1 and query.column_descriptions[0]['type'] is model:
+            serializer = compiled_serializers.get(model)
+        if serializer:  # Выбираются колонки таблицы, а не ORM-объекты
+            query = serializer.select(query)
+
+        with self._session_scope() as session:
+            total = None
+            if count_required and not count_total:
+                rows = session.execute(query.limit(None if limit is None else limit + 1).offset(offset)).all()
+                has_next = limit is not None and len(rows) > limit
+                rows = rows[:limit]
+                result = rows if serializer else [row[0] for row in rows]
+            elif count_required:
+                count_query = select(func.count()).select_from(query.order_by(None).subquery())
+                rows = session.execute(
+                    query.add_columns(count_query.scalar_subquery().label('total_count')).limit(limit).offset(offset)
+                ).all()
+                result = rows if serializer else [row[0] for row in rows]
+                if rows:
+                    total = rows[0][-1]
+                else:  # Пустая страница: общее число считаем в БД, не получая записей
+                    total = session.execute(count_query).scalar_one()
+            elif serializer:
+                result = session.execute(query.limit(limit).offset(offset)).all()
+            else:
+                result = session.execute(query.limit(limit).offset(offset)).scalars().all()
+
+            if serializer:
+                content = serializer.dump(session, result)
+            elif serialize:
+                if result:  # Сериализуем
+                    scheme = schemes_models.get(type(result[0]))  # Получаем схему
                     if not scheme:
-                        logger.critical(f'There is no scheme for model: {type(models_list[0])}.')
-                    content = [scheme.dump(obj=model) for model in result]
+                        logger.critical(f'There is no scheme for model: {type(result[0])}.')
+                    content = [scheme.dump(obj=db_model) for db_model in result]
                 else:
                     content = []
             else:
-                content = [model for model in result]
+                content = list(result)
 
             response = RepoSelectResponse(content=content)
-            if limit or offset or require_last_rec_num:  # Поиск номера последней таблицы
+            if count_required:  # Поиск номера последней записи
                 results_num = len(response.content)
-                last_rec_num = results_num + offset
-                response.last_record_num = last_rec_num
-                all_records = session.execute(query.offset(offset)).scalars().all()  # Получаем все записи
-                all_records_num = len(all_records)
-
-                response.records_left = all_records_num - results_num  # Осталось: все - полученные
+                response.last_record_num = results_num + offset if after_id is None else None
+                if has_next is not None:
+                    response.records_left = int(has_next)
+                else:
+                    response.records_left = max(total - offset - results_num, 0)  # Осталось: все - пропущенные - полученные
+                if result and after_id is not None:
+                    response.last_id = result[-1].id
 
             return response
 
     def _execute_delete(self, ids: tp.Iterable[int], base_model: tp.Type[cm.Base]):
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             session.execute(delete(base_model).where(base_model.id.in_(ids)))
 
     def _execute_insert(self, models: tp.Iterable[dict], base_model: tp.Type[cm.Base]) -> 'RepoInsertResponse':
         if base_model is cm.WSTask:
             print(f'ЗАДАЧИ: {models}')
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             schema: SQLAlchemyAutoSchema = schemes_models.get(base_model)
             schema.sqla_session = session
             models = [schema.load(model, session=session) for model in models]
@@ -103,14 +312,52 @@ class DataRepository:
             session.flush()
             return RepoInsertResponse(ids=list(int(db_model.id) for db_model in models))
 
+    def _execute_bulk_insert(self, models: tp.Sequence[dict], base_model: tp.Type[cm.Base]) -> 'RepoBulkInsertResponse':
+        """
+        Добавляет строки таблицы модели одним INSERT ... RETURNING для всех строк с одинаковым набором колонок
+        (executemany, без создания ORM-объектов и десериализации схемой). Непереданные колонки получают значения по
+        умолчанию колонки (в том числе вычисляемые), как при добавлении через ORM.
+        Если добавление нарушает ограничение БД, строки добавляются по одной (каждая в точке сохранения): ошибочные
+        строки пропускаются, остальные добавляются.
+        """
+        table = base_model.__table__
+        groups: dict[frozenset, list[int]] = {}  # executemany требует одинаковых колонок во всех строках
+        for num, model in enumerate(models):
+            groups.setdefault(frozenset(model), []).append(num)
+        query = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+        if not models:
+            return RepoBulkInsertResponse(ids=[], errors={})
+
+        with self._session_scope() as session:
+            # Точки сохранения - внутри транзакции, а не вне её (см. begin_write_transaction)
+            begin_write_transaction(session.connection())
+            ids = [None] * len(models)
+            try:
+                with session.begin_nested():
+                    for nums in groups.values():
+                        inserted = session.execute(query, [models[num] for num in nums]).scalars()
+                        for num, id_ in zip(nums, inserted):
+                            ids[num] = id_
+                return RepoBulkInsertResponse(ids=ids, errors={})
+            except IntegrityError:
+                pass
+            ids, errors = [], {}
+            for num, model in enumerate(models):  # Поиск ошибочных строк
+                try:
+                    with session.begin_nested():
+                        ids.append(session.execute(query.values(model)).scalar_one())
+                except IntegrityError as e:
+                    ids.append(None)
+                    errors[num] = str(e.orig)
+            return RepoBulkInsertResponse(ids=ids, errors=errors)
+
     def _execute_update(self, models: tp.Iterable[dict], base_model: tp.Type[cm.Base]):
         """
         Частично обновляет указанные модели введёнными данными. Автоматически десериализует модели, ID которых передан в
         relationship-полях. В переданных моделях обязательно должно быть поле id (ID обновляемого объекта), кроме него
         могут быть любые другие поля, значения которых будут обновлены.
         """
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             schema: SQLAlchemyAutoSchema = schemes_models.get(base_model)
             ids = []
             for model in models:
@@ -126,8 +373,10 @@ class DataRepository:
                 model[DBFields.updated_at] = get_datetime_now()
                 db_model = db_models.get(model.get(DBFields.id))
                 schema.load(model, session=session, partial=True, instance=db_model)
+            session.flush()  # Ошибки целостности - здесь, а не при фиксации единицы работы
 
     @exc_mapped
+    @cached
     def get_users_by_username(self, usernames: tp.Iterable[str] = None, require_last_rec_num: bool = False, limit: int = None, offset: int = 0,
                               serialize: bool = True) -> 'RepoSelectResponse':
 
@@ -138,64 +387,72 @@ class DataRepository:
         return self._execute_select(query, limit, offset, require_last_rec_num, serialize)
 
     @exc_mapped
+    @cached
     def get_users_by_email(self, emails: tp.Iterable[str] = None, require_last_rec_num: bool = False,
                                limit: int = None, offset: int = 0) -> 'RepoSelectResponse':
         query = select(cm.User).where(cm.User.email.in_(emails))
         return self._execute_select(query, limit, offset, require_last_rec_num)
 
     @exc_mapped
+    @cached
     def get_users_by_id(self, ids: tp.Iterable[int], limit: int = None, offset: int = 0, require_last_rec_num: bool = False,
-                        serialize: bool = True):
+                        serialize: bool = True, after_id: int = None):
         query = select(cm.User).where(cm.User.id.in_(ids))
-        return self._execute_select(query, limit, offset, require_last_rec_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_rec_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_workspaces(self, workspace_ids: tp.Sequence[int] | None = None, creator_ids: tp.Sequence[int] | None = None,
                        participant_id: int | None = None, limit: int = None, offset: int = 0, require_last_rec_num: bool = False,
-                       serialize: bool = True) -> 'RepoSelectResponse':
+                       serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.Workspace)
         if workspace_ids:
             query = query.where(cm.Workspace.id.in_(workspace_ids))
         if creator_ids:
-            query = query.where(cm.Workspace.creator.id.in_(creator_ids))
+            query = query.where(cm.Workspace.creator_id.in_(creator_ids))
         if participant_id:
             query = query.join(cm.Workspace.users).where(cm.User.id == participant_id)
 
-        return self._execute_select(query, limit, offset, require_last_rec_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_rec_num, serialize, after_id=after_id)
 
     @exc_mapped
     def get_user_hashed_password(self, login: str) -> str | None:
         """Возвращает хэш пароля пользователя с заданным логином. Если такого пользователя нет - возвращает None."""
-        with self._session_maker() as session, session.begin():
+        with self._session_scope() as session:
             query = select(cm.User).where(cm.User.username == login)
             result = session.execute(query).scalars().all()
             if result:
                 return result[0].hashed_password
 
     @exc_mapped
+    @dispatched_write
     def update_ws_roles(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.WSRole)
 
     @exc_mapped
+    @cached
     def get_ws_daily_event_by_notified_id(self, notified_id: int, limit: int = None, offset: int = 0,
                                           require_last_num: bool = False) -> 'RepoSelectResponse':
-        query = select(cm.WSDailyEvent).where(cm.WSDailyEvent.notified.contains(notified_id))
+        query = select(cm.WSDailyEvent).where(cm.WSDailyEvent.id.in_(
+            select(cm.ws_daily_event_user.c.event_id).where(cm.ws_daily_event_user.c.user_id == notified_id)
+        ))
         return self._execute_select(query, limit, offset, require_last_num)
 
     @exc_mapped
+    @cached
     def get_ws_tasks(self, ids: tp.Sequence[int], workspace_id: int = None, executor_id: int = None, project_id: int = None,
                      working_date: datetime.date = None, plan_deadline: datetime.datetime = None, status_ids: tp.Sequence[int] = None,
                      not_completed: bool = False, limit: int = None, offset: int = None,
-                     require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
+                     require_last_num: bool = False, serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.WSTask)
         if ids:
             query = query.where(cm.WSTask.id.in_(ids))
         if executor_id:
-            query = query.where(cm.WSTask.executor.has(cm.User.id == executor_id))
+            query = query.where(cm.WSTask.executor_id == executor_id)
         if workspace_id:
             query = query.where(cm.WSTask.workspace_id == workspace_id)
         if working_date:
-            query = query.where(cm.WSTask.task_events.any(cm.WSTaskEvent.date == working_date))
+            query = query.where(cm.WSTask.id.in_(select(cm.WSTaskEvent.task_id).where(cm.WSTaskEvent.date == working_date)))
         if status_ids:
             query = query.where(cm.WSTask.status_id.in_(status_ids))
         if not_completed:
@@ -205,9 +462,33 @@ class DataRepository:
         if project_id:
             query = query.where(cm.WSTask.project_id == project_id)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
+
+    @exc_mapped
+    @cached
+    def get_permissions_mask(self, workspace_id: int, user_id: int) -> int:
+        """
+        Возвращает маску разрешений пользователя в РП - побитовое OR масок его ролей РП (см.
+        server.database.models.permission_masks). Если у пользователя нет ролей в РП - 0.
+        """
+        query = (select(cm.WSRole.permissions_mask)
+                 .join(cm.user_role, cm.user_role.c.role_id == cm.WSRole.id)
+                 .where(cm.WSRole.workspace_id == workspace_id, cm.user_role.c.user_id == user_id))
+        with self._session_scope() as session:
+            return functools.reduce(operator.or_, session.execute(query).scalars(), 0)
+
+    @exc_mapped
+    @cached
+    def get_permission_ids(self, types: tp.Iterable[str] = None) -> dict[str, int]:
+        """Возвращает ID разрешений типов types (имена членов Permissions; None - всех): {тип: ID}."""
+        query = select(cm.Permission.type, cm.Permission.id).where(cm.Permission.bit.is_not(None))
+        if types is not None:
+            query = query.where(cm.Permission.type.in_(types))
+        with self._session_scope() as session:
+            return dict(session.execute(query).all())
 
     @exc_mapped
+    @cached
     def get_role_by_user_id(self, workspace_id: int, user_id: int):
         """Получает роль пользователя в проекте."""
         query = (select(cm.WSRole).where(cm.WSRole.workspace_id == workspace_id).
@@ -215,15 +496,15 @@ class DataRepository:
         return self._execute_select(query)
 
     @exc_mapped
-    def get_workspace_default_role_id(self, workspace_id: int) -> int:
-        """Получает ID роли РП по умолчанию."""
-        query = select(cm.Workspace).where(cm.Workspace.id == workspace_id)
-        result = self._execute_select(query)
-        role_id = result.content[0].get(DBFields.id)
-
-        return role_id
+    @cached
+    def get_workspace_default_role_id(self, workspace_id: int) -> int | None:
+        """Получает ID роли РП по умолчанию. Если РП нет - возвращает None."""
+        with self._session_scope() as session:
+            query = select(cm.Workspace.default_role_id).where(cm.Workspace.id == workspace_id)
+            return session.execute(query).scalar_one_or_none()
 
     @exc_mapped
+    @cached
     def get_roles_by_id(self,
                         ids: tp.Iterable[int],
                         limit: int = None,
@@ -234,94 +515,135 @@ class DataRepository:
         return self._execute_select(query, limit, offset, require_last_num)
 
     @exc_mapped
+    @dispatched_write
     def update_ws_tasks(self, models: list[cm.WSTask]):
-        print(models)
-        self._execute_update(models, cm.WSTask)
-        print(self.get_ws_tasks(ids=[models[0].get('id')]))
+        with self.unit_of_work() as uow:
+            ids = [model.get(DBFields.id) for model in models]
+            old_rows = uow._get_tasks_rollup_rows(ids)
+            uow._execute_update(models, cm.WSTask)
+            uow._apply_rollup_deltas(self._tasks_rollup_deltas(old_rows, -1) + self._tasks_rollup_deltas(
+                uow._get_tasks_rollup_rows(ids), 1))
 
     @exc_mapped
+    @dispatched_write
     def delete_ws_tasks_by_id(self, ids: list[int]):
-        self._execute_delete(ids, cm.WSTask)
+        ids = list(ids)
+        with self.unit_of_work() as uow:
+            old_rows = uow._get_tasks_rollup_rows(ids)
+            uow._execute_delete(ids, cm.WSTask)
+            uow._apply_rollup_deltas(self._tasks_rollup_deltas(old_rows, -1))
 
     @exc_mapped
+    @dispatched_write
     def update_personal_tasks(self, models: list[cm.PersonalTask]):
         self._execute_update(models, cm.PersonalTask)
 
     @exc_mapped
+    @dispatched_write
     def delete_workspaces(self, workspaces_ids: tp.Iterable[int]):
         self._execute_delete(workspaces_ids, cm.Workspace)
 
     @exc_mapped
+    @dispatched_write
     def update_users(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.User)
 
     @exc_mapped
+    @dispatched_write
     def add_users(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.User)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_tasks(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
-        print(f'ПЕРЕДАНЫ МОДЕЛИ ЗАДАЧ: {models}')
-        return self._execute_insert(models, cm.WSTask)
+        with self.unit_of_work() as uow:
+            response = uow._execute_insert(models, cm.WSTask)
+            uow._apply_rollup_deltas(self._tasks_rollup_deltas(uow._get_tasks_rollup_rows(response.ids), 1))
+        return response
+
+    @exc_mapped
+    @dispatched_write(exclusive=True)
+    def import_ws_tasks(self, models: tp.Sequence[dict]) -> 'RepoBulkInsertResponse':
+        """
+        Массовое добавление задач РП (см. _execute_bulk_insert): строки добавляются без десериализации схемой,
+        поэтому ссылки (workspace_id, project_id, status_id, executor_id, ...) должны быть получены заранее (см.
+        get_import_references). Предрассчитанная аналитика обновляется по добавленным задачам.
+        """
+        with self.unit_of_work() as uow:
+            response = uow._execute_bulk_insert(models, cm.WSTask)
+            ids = [id_ for id_ in response.ids if id_ is not None]
+            uow._apply_rollup_deltas(self._tasks_rollup_deltas(uow._get_tasks_rollup_rows(ids), 1))
+        return response
 
     @exc_mapped
+    @dispatched_write
     def delete_users(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.User)
 
     @exc_mapped
+    @dispatched_write
     def add_workspaces(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.Workspace)
 
     @exc_mapped
+    @dispatched_write
     def add_personal_tasks(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.PersonalTask)
 
     @exc_mapped
+    @dispatched_write
     def delete_personal_tasks(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.PersonalTask)
 
     @exc_mapped
+    @cached
     def get_task_permissions(self, task_id: int, role_id: int) -> tuple[str]:
-        query = (select(cm.WSRoleTask.permissions).
+        query = (select(cm.WSRoleTask.permissions_mask).
                  where(cm.WSRoleTask.task_id == task_id).
                  where(cm.WSRoleTask.role_id == role_id)
                  )
         return self._get_permissions(query)
 
     @exc_mapped
+    @cached
     def get_project_permissions(self, project_id: int, role_id: int) -> tuple[str]:
-        query = (select(cm.WSRoleProject.permissions).
+        query = (select(cm.WSRoleProject.permissions_mask).
                  where(cm.WSRoleProject.project_id == project_id).
                  where(cm.WSRoleProject.role_id == role_id)
                  )
         return self._get_permissions(query)
 
     @exc_mapped
+    @cached
     def get_document_permissions(self, document_id: int, role_id: int) -> tuple[str]:
-        query = (select(cm.WSRoleDocument.permissions).
+        query = (select(cm.WSRoleDocument.permissions_mask).
                  where(cm.WSRoleDocument.document_id == document_id).
                  where(cm.WSRoleDocument.role_id == role_id)
                  )
         return self._get_permissions(query)
 
     @exc_mapped
+    @cached
     def get_daily_event_permissions(self, daily_event_id: int, role_id: int) -> tuple[str]:
-        query = (select(cm.WSRoleDailyEvent.permissions).
+        query = (select(cm.WSRoleDailyEvent.permissions_mask).
                  where(cm.WSRoleDailyEvent.daily_event_id == daily_event_id).
                  where(cm.WSRoleDailyEvent.role_id == role_id)
                  )
         return self._get_permissions(query)
 
     @exc_mapped
+    @cached
     def get_personal_tasks_by_id(self, ids: tp.Iterable[int] = None, owner_id: int | None = None,
                                  working_date: datetime.date = None, plan_deadline: datetime.datetime = None,
                                  status_ids: tp.Sequence[int] = None, not_completed: bool = False, limit: int = None,
-                                 offset: int = None, require_last_num: bool = False, serialize: bool = True):
+                                 offset: int = None, require_last_num: bool = False, serialize: bool = True, after_id: int = None):
         query = select(cm.PersonalTask)
         if ids:
             query = query.where(cm.PersonalTask.id.in_(ids))
         if working_date:
-            query = query.where(cm.PersonalTask.task_events.any(cm.PersonalTaskEvent.date == working_date))
+            query = query.where(cm.PersonalTask.id.in_(
+                select(cm.PersonalTaskEvent.task_id).where(cm.PersonalTaskEvent.date == working_date)
+            ))
         if status_ids:
             query = query.where(cm.PersonalTask.status_id.in_(status_ids))
         if not_completed:
@@ -331,70 +653,95 @@ class DataRepository:
         if owner_id:
             query = query.where(cm.PersonalTask.owner_id == owner_id)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_ws_daily_events_by_id(self, ids: tp.Iterable[int] | list[int] = None, workspace_id: int | None = None,
                                   notified_ids: tp.Sequence[int] = None, date: datetime.date = None, limit: int = None,
                                   offset: int = None, require_last_num: bool = False,
-                                  serialize: bool = True) -> 'RepoSelectResponse':
+                                  serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.WSDailyEvent)
         if ids:
             query = query.where(cm.WSDailyEvent.id.in_(ids))
         if notified_ids:
-            query = query.where(cm.WSDailyEvent.notified.any(cm.User.id.in_(notified_ids)))
+            query = query.where(cm.WSDailyEvent.id.in_(
+                select(cm.ws_daily_event_user.c.event_id).where(cm.ws_daily_event_user.c.user_id.in_(notified_ids))
+            ))
         if date:
             query = query.where(cm.WSDailyEvent.date == date)
         if workspace_id:
             query = query.where(cm.WSDailyEvent.workspace_id == workspace_id)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
+
+    @exc_mapped
+    @dispatched_write(exclusive=True)
+    def import_ws_daily_events(self, models: tp.Sequence[dict]) -> 'RepoBulkInsertResponse':
+        """Массовое добавление однодневных мероприятий РП (см. _execute_bulk_insert)."""
+        return self._execute_bulk_insert(models, cm.WSDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_daily_events(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.WSDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def delete_ws_daily_events(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.WSDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def update_ws_daily_events(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.WSDailyEvent)
 
     @exc_mapped
+    @cached
     def get_ws_many_days_events_by_id(self, ids: tp.Iterable[int] = None, workspace_id: int | None = None,
                                       notified_ids: tp.Sequence[int] = None, included_date: datetime.date = None,
                                       limit: int = None, offset: int = None, require_last_num: bool = False,
-                                      serialize: bool = True) -> 'RepoSelectResponse':
+                                      serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.WSManyDaysEvent)
         if ids:
             query = query.where(cm.WSManyDaysEvent.id.in_(ids))
         if notified_ids:
-            query = query.where(cm.WSManyDaysEvent.notified.any(cm.User.id.in_(notified_ids)))
+            query = query.where(cm.WSManyDaysEvent.id.in_(
+                select(cm.ws_many_days_event_user.c.event_id).where(cm.ws_many_days_event_user.c.user_id.in_(notified_ids))
+            ))
         if included_date:
             query = query.where(and_(cm.WSManyDaysEvent.datetime_start <= included_date, included_date <= cm.WSManyDaysEvent.datetime_end))
         if workspace_id:
             query = query.where(cm.WSManyDaysEvent.workspace_id == workspace_id)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
+
+    @exc_mapped
+    @dispatched_write(exclusive=True)
+    def import_ws_many_days_events(self, models: tp.Sequence[dict]) -> 'RepoBulkInsertResponse':
+        """Массовое добавление многодневных мероприятий РП (см. _execute_bulk_insert)."""
+        return self._execute_bulk_insert(models, cm.WSManyDaysEvent)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_many_days_events(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.WSManyDaysEvent)
 
     @exc_mapped
+    @dispatched_write
     def delete_ws_many_days_events(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.WSManyDaysEvent)
 
     @exc_mapped
+    @dispatched_write
     def update_ws_many_days_events(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.WSManyDaysEvent)
 
     @exc_mapped
+    @cached
     def get_personal_daily_events_by_id(self, ids: tp.Iterable[int], owner_id: int = None, date: datetime.date = None,
                                         limit: int = None, offset: int = None, require_last_num: bool = False,
-                                        serialize: bool = True) -> 'RepoSelectResponse':
+                                        serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.PersonalDailyEvent)
         if ids:
             query = query.where(cm.PersonalDailyEvent.id.in_(ids))
@@ -403,25 +750,29 @@ class DataRepository:
         if date:
             query = query.where(cm.PersonalDailyEvent.date == date)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @dispatched_write
     def add_personal_daily_events(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.PersonalDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def delete_personal_daily_events(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.PersonalDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def update_personal_daily_events(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.PersonalDailyEvent)
 
     @exc_mapped
+    @cached
     def get_personal_many_days_events_by_id(self, ids: tp.Iterable[int] = None, owner_id: int = None,
                                             included_date: datetime.date = None, limit: int = None,
                                             offset: int = None, require_last_num: bool = False,
-                                            serialize: bool = True) -> 'RepoSelectResponse':
+                                            serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.PersonalManyDaysEvent)
         if ids:
             query = query.where(cm.PersonalManyDaysEvent.id.in_(ids))
@@ -430,102 +781,206 @@ class DataRepository:
         if included_date:
             query = query.where(and_(cm.PersonalManyDaysEvent.datetime_start <= included_date, included_date <= cm.PersonalManyDaysEvent.datetime_end))
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @dispatched_write
     def add_personal_many_days_events(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.PersonalManyDaysEvent)
 
     @exc_mapped
+    @dispatched_write
     def delete_personal_many_days_events(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.PersonalDailyEvent)
 
     @exc_mapped
+    @dispatched_write
     def update_personal_many_days_events(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.PersonalManyDaysEvent)
 
     @exc_mapped
+    @cached
+    def get_agenda(self, user_id: int, date_from: datetime.date, date_to: datetime.date = None,
+                   not_completed: bool = False) -> dict[str, list]:
+        """
+        Возвращает повестку пользователя на даты date_from - date_to включительно (по умолчанию - на день date_from):
+        личные задачи и задачи РП, где он исполнитель, с мероприятиями-задачами в эти даты, его личные мероприятия и
+        мероприятия РП, о которых он уведомляется: однодневные - в эти даты, многодневные - пересекающиеся с ними.
+        Шесть запросов по индексам в одной транзакции. Возвращает {CommonStruct.personal_tasks: [...],
+        CommonStruct.ws_tasks: [...], ...}.
+
+        :param not_completed: Только незавершённые задачи.
+        """
+        date_to = date_to or date_from
+        start = datetime.datetime.combine(date_from, datetime.time.min)
+        end = datetime.datetime.combine(date_to + datetime.timedelta(days=1), datetime.time.min)
+
+        personal_tasks = select(cm.PersonalTask).where(cm.PersonalTask.owner_id == user_id).where(
+            cm.PersonalTask.id.in_(select(cm.PersonalTaskEvent.task_id)
+                                   .where(cm.PersonalTaskEvent.date.between(date_from, date_to))))
+        ws_tasks = select(cm.WSTask).where(cm.WSTask.executor_id == user_id).where(
+            cm.WSTask.id.in_(select(cm.WSTaskEvent.task_id).where(cm.WSTaskEvent.date.between(date_from, date_to))))
+        if not_completed:
+            personal_tasks = personal_tasks.where(
+                cm.PersonalTask.owner.has(cm.User.completed_task_status_id != cm.PersonalTask.status_id))
+            ws_tasks = ws_tasks.where(
+                cm.WSTask.workspace.has(cm.WSTask.status_id != cm.Workspace.completed_task_status_id))
+
+        queries = {
+            CommonStruct.personal_tasks: personal_tasks,
+            CommonStruct.ws_tasks: ws_tasks,
+            CommonStruct.personal_daily_events: (
+                select(cm.PersonalDailyEvent).where(cm.PersonalDailyEvent.owner_id == user_id)
+                .where(cm.PersonalDailyEvent.date.between(date_from, date_to))),
+            CommonStruct.personal_many_days_events: (
+                select(cm.PersonalManyDaysEvent).where(cm.PersonalManyDaysEvent.owner_id == user_id)
+                .where(cm.PersonalManyDaysEvent.datetime_start < end, cm.PersonalManyDaysEvent.datetime_end >= start)),
+            CommonStruct.ws_daily_events: (
+                select(cm.WSDailyEvent).where(cm.WSDailyEvent.id.in_(
+                    select(cm.ws_daily_event_user.c.event_id).where(cm.ws_daily_event_user.c.user_id == user_id)
+                )).where(cm.WSDailyEvent.date.between(date_from, date_to))),
+            CommonStruct.ws_many_days_events: (
+                select(cm.WSManyDaysEvent).where(cm.WSManyDaysEvent.id.in_(
+                    select(cm.ws_many_days_event_user.c.event_id).where(cm.ws_many_days_event_user.c.user_id == user_id)
+                )).where(cm.WSManyDaysEvent.datetime_start < end, cm.WSManyDaysEvent.datetime_end >= start))
+        }
+        with self._session_scope() as session:  # Одна сессия и транзакция на все запросы
+            repository = self._bind(session)
+            return {name: repository._execute_select(query).content for name, query in queries.items()}
+
+    @exc_mapped
+    @cached
     def get_many_days_event_permissions(self, many_days_event_id: int, role_id: int) -> tuple[str]:
-        query = (select(cm.WSRoleManyDaysEvent.permissions).
+        query = (select(cm.WSRoleManyDaysEvent.permissions_mask).
                  where(cm.WSRoleManyDaysEvent.many_days_event_id == many_days_event_id).
                  where(cm.WSRoleManyDaysEvent.role_id == role_id)
                  )
         return self._get_permissions(query)
 
     @exc_mapped
+    @cached
     def get_role_by_id_workspace(self, id_: int, workspace_id: int) -> 'RepoSelectResponse':
         query = select(cm.WSRole).where(cm.WSRole.id == id_).where(cm.WSRole.workspace_id == workspace_id)
         return self._execute_select(query)
 
     @exc_mapped
+    @dispatched_write
     def update_workspaces(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.Workspace)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_roles(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.WSRole)
 
     @exc_mapped
+    @dispatched_write
     def add_project_user(self, user_id: int, project_id: int):
         """Добавляет пользователя в проект через таблицу project_user."""
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             session.execute(cm.project_user.insert().values(user_id=user_id, project_id=project_id))
 
     @exc_mapped
+    @dispatched_write
     def delete_project_user(self, user_id: int, project_id: int):
         """Удаляет пользователя из проекта через таблицу project_user."""
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             session.execute(cm.project_user.delete().where(
                 (cm.project_user.c.user_id == user_id) & (cm.project_user.c.project_id == project_id)
             ))
 
     @exc_mapped
+    @dispatched_write
     def add_workspace_user(self, user_id: int, workspace_id: int):
         """Добавляет пользователя в рабочее пространство через таблицу workspace_user."""
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             session.execute(cm.workspace_user.insert().values(user_id=user_id, workspace_id=workspace_id))
 
     @exc_mapped
+    @dispatched_write
     def delete_workspace_user(self, user_id: int, workspace_id: int):
         """Удаляет пользователя из рабочего пространства через таблицу workspace_user."""
-        with self._session_maker() as session, session.begin():
-            self._prepare_session(session)
+        with self._session_scope() as session:
             session.execute(cm.workspace_user.delete().where(
                 (cm.workspace_user.c.user_id == user_id) & (cm.workspace_user.c.workspace_id == workspace_id)
             ))
 
     @exc_mapped
+    @dispatched_write
+    def add_workspace_users(self, workspace_id: int, user_ids: tp.Iterable[int], role_id: int = None) -> int:
+        """
+        Добавляет пользователей в РП одним INSERT ... ON CONFLICT DO NOTHING в таблицу workspace_user (и в user_ws_role,
+        если передан role_id). Уже состоящие в РП пользователи пропускаются, остальные участники РП не загружаются.
+        Возвращает число добавленных в РП пользователей.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0
+        with self._session_scope() as session:
+            result = session.execute(
+                sqlite_insert(cm.workspace_user).on_conflict_do_nothing(),
+                [{'workspace_id': workspace_id, 'user_id': user_id} for user_id in user_ids]
+            )
+            if role_id is not None:
+                session.execute(
+                    sqlite_insert(cm.user_role).on_conflict_do_nothing(),
+                    [{'role_id': role_id, 'user_id': user_id} for user_id in user_ids]
+                )
+            return result.rowcount
+
+    @exc_mapped
+    @dispatched_write
+    def delete_workspace_users(self, workspace_id: int, user_ids: tp.Iterable[int]) -> int:
+        """
+        Удаляет пользователей из РП и из всех его ролей запросами DELETE ... WHERE user_id IN (...) к таблицам
+        workspace_user и user_ws_role. Возвращает число удалённых из РП пользователей.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return 0
+        with self._session_scope() as session:
+            result = session.execute(cm.workspace_user.delete().where(
+                (cm.workspace_user.c.workspace_id == workspace_id) & (cm.workspace_user.c.user_id.in_(user_ids))
+            ))
+            session.execute(cm.user_role.delete().where(
+                cm.user_role.c.user_id.in_(user_ids),
+                cm.user_role.c.role_id.in_(select(cm.WSRole.id).where(cm.WSRole.workspace_id == workspace_id))
+            ))
+            return result.rowcount
+
+    @exc_mapped
+    @cached
     def get_project_users(self, project_id: int, limit: int = None, offset: int = None,
-                          require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
+                          require_last_num: bool = False, serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         """Получает пользователей проекта."""
         query = select(cm.User).join(cm.project_user, cm.User.id == cm.project_user.c.user_id
                                      ).where(cm.project_user.c.project_id == project_id)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_project_mentors(self, project_id: int, limit: int = None, offset: int = None, require_last_num: bool = False,
-                            serialize: bool = True) -> 'RepoSelectResponse':
+                            serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         """Получает наставников проекта."""
         query = select(cm.User).join(cm.project_mentor, cm.User.id == cm.project_mentor.c.user_id
                                      ).where(cm.project_mentor.c.project_id == project_id)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_workspace_users(self, workspace_id: int, limit: int = None, offset: int = None,
-                            require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
+                            require_last_num: bool = False, serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         """Получает пользователей рабочего пространства."""
         query = select(cm.User).join(cm.workspace_user, cm.User.id == cm.workspace_user.c.user_id
                                      ).where(cm.workspace_user.c.workspace_id == workspace_id)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_projects(self, project_ids: tp.Sequence[int] | None = None, workspace_ids: tp.Sequence[int] | None = None,
                      creator_ids: tp.Sequence[int] | None = None, current_stage_name: str = None,
                      limit: int = None, offset: int = None,
-                     require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
+                     require_last_num: bool = False, serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         """Получает проекты по фильтрам."""
         query = select(cm.Project)
         if project_ids:
@@ -537,35 +992,52 @@ class DataRepository:
         if current_stage_name:
             query = query.join(cm.WorkStage, cm.Project.current_stage_id == cm.WorkStage.id).where(
                 cm.WorkStage.name == current_stage_name)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_projects_by_workspace_id(self, workspace_id: int, current_stage_name: str = None,
                                      limit: int = None, offset: int = None,
-                                     require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
+                                     require_last_num: bool = False, serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         """Получает проекты по ID рабочего пространства."""
         query = select(cm.Project).where(cm.Project.workspace_id == workspace_id)
         if current_stage_name:
             query = query.join(cm.WorkStage, cm.Project.current_stage_id == cm.WorkStage.id).where(
                 cm.WorkStage.name == current_stage_name)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @dispatched_write
     def add_projects(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         """Добавляет проекты в БД."""
-        return self._execute_insert(models, cm.Project)
+        with self.unit_of_work() as uow:
+            response = uow._execute_insert(models, cm.Project)
+            uow._apply_rollup_deltas(self._stages_rollup_deltas(uow._get_stages_rollup_rows(response.ids), 1))
+        return response
 
     @exc_mapped
+    @dispatched_write
     def delete_projects(self, project_ids: tp.Iterable[int]):
         """Удаляет проекты по ID."""
-        self._execute_delete(project_ids, cm.Project)
+        project_ids = list(project_ids)
+        with self.unit_of_work() as uow:
+            old_rows = uow._get_stages_rollup_rows(project_ids)
+            uow._execute_delete(project_ids, cm.Project)
+            uow._apply_rollup_deltas(self._stages_rollup_deltas(old_rows, -1))
 
     @exc_mapped
+    @dispatched_write
     def update_projects(self, models: tp.Iterable[dict]):
         """Обновляет проекты."""
-        self._execute_update(models, cm.Project)
+        with self.unit_of_work() as uow:
+            ids = [model.get(DBFields.id) for model in models]
+            old_rows = uow._get_stages_rollup_rows(ids)
+            uow._execute_update(models, cm.Project)
+            uow._apply_rollup_deltas(self._stages_rollup_deltas(old_rows, -1) + self._stages_rollup_deltas(
+                uow._get_stages_rollup_rows(ids), 1))
 
     @exc_mapped
+    @cached
     def get_work_stages_by_project_id(self, project_id: int, limit: int = None, offset: int = None,
                                       require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
         """Получает этапы проекта по его ID."""
@@ -573,134 +1045,319 @@ class DataRepository:
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @dispatched_write
     def update_work_stages(self, models: tp.Iterable[dict]):
         """Обновляет этапы работы."""
         self._execute_update(models, cm.WorkStage)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_task_statuses(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.WSTaskStatus)
 
     @exc_mapped
+    @dispatched_write
     def update_ws_task_statuses(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.WSTaskStatus)
 
     @exc_mapped
+    @dispatched_write
     def delete_ws_task_statuses(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.WSTaskStatus)
 
     @exc_mapped
+    @cached
     def get_ws_task_statuses_by_id(self, ids: tp.Iterable[int], limit: int = None, offset: int = None,
                                    require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
         query = select(cm.WSTaskStatus).where(cm.WSTaskStatus.id.in_(ids))
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @dispatched_write
     def add_ws_task_tags(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.WSTaskTag)
 
     @exc_mapped
+    @dispatched_write
     def update_ws_task_tags(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.WSTaskTag)
 
     @exc_mapped
+    @dispatched_write
     def delete_ws_task_tags(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.WSTaskTag)
 
     @exc_mapped
+    @cached
     def get_ws_task_tags_by_id(self, ids: tp.Iterable[int], limit: int = None, offset: int = None,
                                require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
         query = select(cm.WSTaskTag).where(cm.WSTaskTag.id.in_(ids))
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @dispatched_write
     def add_personal_task_statuses(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.PersonalTaskStatus)
 
     @exc_mapped
+    @dispatched_write
     def update_personal_task_statuses(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.PersonalTaskStatus)
 
     @exc_mapped
+    @dispatched_write
     def delete_personal_task_statuses(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.PersonalTaskStatus)
 
     @exc_mapped
+    @cached
     def get_personal_task_statuses_by_id(self, ids: tp.Iterable[int], limit: int = None, offset: int = None,
                                    require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
         query = select(cm.PersonalTaskStatus).where(cm.PersonalTaskStatus.id.in_(ids))
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @dispatched_write
     def add_personal_task_tags(self, models: tp.Iterable[dict]) -> 'RepoInsertResponse':
         return self._execute_insert(models, cm.PersonalTaskTag)
 
     @exc_mapped
+    @dispatched_write
     def update_personal_task_tags(self, models: tp.Iterable[dict]):
         self._execute_update(models, cm.PersonalTaskTag)
 
     @exc_mapped
+    @dispatched_write
     def delete_personal_task_tags(self, ids: tp.Iterable[int]):
         self._execute_delete(ids, cm.PersonalTaskTag)
 
     @exc_mapped
+    @cached
     def get_personal_task_tags_by_id(self, ids: tp.Iterable[int], limit: int = None, offset: int = None,
                                      require_last_num: bool = False, serialize: bool = True) -> 'RepoSelectResponse':
         query = select(cm.PersonalTaskTag).where(cm.PersonalTaskTag.id.in_(ids))
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @cached
     def get_personal_task_tags_by_user(self, user_id: int, limit: int = None, offset: int = None,
                                        require_last_num: bool = False, serialize: bool = True):
         query = select(cm.PersonalTaskTag).where(cm.PersonalTaskTag.owner_id == user_id)
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @cached
     def get_personal_task_statuses_by_user(self, user_id: int, limit: int = None, offset: int = None,
                                            require_last_num: bool = False, serialize: bool = True):
         query = select(cm.PersonalTaskStatus).where(cm.PersonalTaskStatus.owner_id == user_id)
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @cached
     def get_ws_task_tags_by_workspace(self, workspace_id: int, limit: int = None, offset: int = None,
                                       require_last_num: bool = False, serialize: bool = True):
-        query = select(cm.WSTaskTag).where(cm.WSTaskTag.workspace == workspace_id)
+        query = select(cm.WSTaskTag).where(cm.WSTaskTag.workspace_id == workspace_id)
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @cached
     def get_ws_task_statuses_by_workspace(self, workspace_id: int, limit: int = None, offset: int = None,
                                           require_last_num: bool = False, serialize: bool = True):
         query = select(cm.WSTaskStatus).where(cm.WSTaskStatus.workspace_id == workspace_id)
         return self._execute_select(query, limit, offset, require_last_num, serialize)
 
     @exc_mapped
+    @cached
     def get_ws_task_events(self, ids: tp.Sequence[int], workspace_id: int, executor_id: int = None,
                            date: datetime.date = None, limit: int = None, offset: int = None, require_last_num: bool = False,
-                           serialize: bool = True) -> 'RepoSelectResponse':
+                           serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.WSTaskEvent)
         if ids:
             query = query.where(cm.WSTaskEvent.id.in_(ids))
         if workspace_id:
-            query = query.where(cm.WSTaskEvent.task.workspace_id == workspace_id)
+            query = query.where(cm.WSTaskEvent.task_id.in_(select(cm.WSTask.id).where(cm.WSTask.workspace_id == workspace_id)))
         if executor_id:
-            query = query.where(cm.WSTaskEvent.task.executor_id == executor_id)
+            query = query.where(cm.WSTaskEvent.task_id.in_(select(cm.WSTask.id).where(cm.WSTask.executor_id == executor_id)))
         if date:
             query = query.where(cm.WSTaskEvent.date == date)
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
 
     @exc_mapped
+    @cached
     def get_personal_task_events_by_user(self, ids: tp.Sequence[int], user_id: int, date: datetime.date = None,
                                          limit: int = None, offset: int = None, require_last_num: bool = False,
-                                         serialize: bool = True) -> 'RepoSelectResponse':
+                                         serialize: bool = True, after_id: int = None) -> 'RepoSelectResponse':
         query = select(cm.PersonalTaskEvent)
         if ids:
             query = query.where(cm.PersonalTaskEvent.id.in_(ids))
         if user_id:
-            query = query.where(cm.PersonalTaskEvent.task.owner_id == user_id)
+            query = query.where(cm.PersonalTaskEvent.task_id.in_(
+                select(cm.PersonalTask.id).where(cm.PersonalTask.owner_id == user_id)
+            ))
         if date:
             query = query.where(cm.PersonalTaskEvent.date == date)
 
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+        return self._execute_select(query, limit, offset, require_last_num, serialize, after_id=after_id)
+
+    def _get_tasks_rollup_rows(self, task_ids: tp.Iterable[int]) -> list:
+        """Возвращает поля задач, от которых зависит предрассчитанная аналитика."""
+        with self._session_scope() as session:
+            return session.execute(
+                select(cm.WSTask.workspace_id, cm.WSTask.project_id, cm.WSTask.executor_id, cm.WSTask.status_id)
+                .where(cm.WSTask.id.in_(task_ids))
+            ).all()
+
+    def _get_stages_rollup_rows(self, project_ids: tp.Iterable[int]) -> list:
+        """Возвращает поля проектов, от которых зависит предрассчитанная аналитика."""
+        with self._session_scope() as session:
+            return session.execute(
+                select(cm.Project.workspace_id, cm.Project.current_stage_id).where(cm.Project.id.in_(project_ids))
+            ).all()
+
+    @staticmethod
+    def _tasks_rollup_deltas(rows: tp.Iterable, sign: int) -> list[tuple[tuple, int]]:
+        """Изменения счётчиков analytics_rollup при добавлении (sign = 1) или удалении (sign = -1) задач."""
+        deltas = []
+        for workspace_id, project_id, executor_id, status_id in rows:
+            for scope, scope_id in ((Rollup.workspace, workspace_id), (Rollup.project, project_id)):
+                for dimension, key in ((Rollup.executor, executor_id), (Rollup.status, status_id)):
+                    if scope_id is not None and key is not None:
+                        deltas.append(((scope, scope_id, dimension, key), sign))
+        return deltas
+
+    @staticmethod
+    def _stages_rollup_deltas(rows: tp.Iterable, sign: int) -> list[tuple[tuple, int]]:
+        """Изменения счётчиков analytics_rollup при добавлении (sign = 1) или удалении (sign = -1) проектов."""
+        return [((Rollup.workspace, workspace_id, Rollup.stage, stage_id), sign)
+                for workspace_id, stage_id in rows if workspace_id is not None and stage_id is not None]
+
+    def _apply_rollup_deltas(self, deltas: tp.Iterable[tuple[tuple, int]]):
+        """
+        Применяет изменения к счётчикам analytics_rollup одним INSERT ... ON CONFLICT DO UPDATE. Обнулившиеся
+        счётчики удаляются.
+        """
+        totals = {}
+        for key, delta in deltas:
+            totals[key] = totals.get(key, 0) + delta
+        totals = {key: delta for key, delta in totals.items() if delta}
+        if not totals:
+            return
+
+        table = cm.analytics_rollup
+        insert_query = sqlite_insert(table)
+        insert_query = insert_query.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.scope_id, table.c.dimension, table.c.key],
+            set_={'count': table.c.count + insert_query.excluded.count}
+        )
+        with self._session_scope() as session:
+            session.execute(insert_query, [
+                {'scope': scope, 'scope_id': scope_id, 'dimension': dimension, 'key': key, 'count': delta}
+                for (scope, scope_id, dimension, key), delta in totals.items()
+            ])
+            session.execute(table.delete().where(
+                table.c.count <= 0,
+                tuple_(table.c.scope, table.c.scope_id, table.c.dimension, table.c.key).in_(list(totals))
+            ))
+
+    @exc_mapped
+    @dispatched_write(exclusive=True)
+    def rebuild_analytics_rollup(self, workspace_ids: tp.Sequence[int] | None = None):
+        """
+        Пересчитывает предрассчитанную аналитику (analytics_rollup) по задачам и проектам в БД (исправление
+        расхождений). Если workspace_ids не переданы - для всех РП.
+        """
+        table = cm.analytics_rollup
+        task_filter = cm.WSTask.workspace_id.in_(workspace_ids) if workspace_ids is not None else true()
+        project_filter = cm.Project.workspace_id.in_(workspace_ids) if workspace_ids is not None else true()
+        columns = [table.c.scope, table.c.scope_id, table.c.dimension, table.c.key, table.c.count]
+
+        with self.unit_of_work() as uow, uow._session_scope() as session:
+            if workspace_ids is None:
+                session.execute(table.delete())
+            else:
+                project_ids = select(cm.Project.id).where(project_filter)
+                session.execute(table.delete().where(or_(
+                    and_(table.c.scope == Rollup.workspace, table.c.scope_id.in_(workspace_ids)),
+                    and_(table.c.scope == Rollup.project, table.c.scope_id.in_(project_ids))
+                )))
+
+            for scope, scope_column in ((Rollup.workspace, cm.WSTask.workspace_id), (Rollup.project, cm.WSTask.project_id)):
+                for dimension, key_column in ((Rollup.executor, cm.WSTask.executor_id), (Rollup.status, cm.WSTask.status_id)):
+                    session.execute(table.insert().from_select(columns, (
+                        select(literal(scope), scope_column, literal(dimension), key_column, func.count())
+                        .where(task_filter, scope_column.is_not(None), key_column.is_not(None))
+                        .group_by(scope_column, key_column)
+                    )))
+            session.execute(table.insert().from_select(columns, (
+                select(literal(Rollup.workspace), cm.Project.workspace_id, literal(Rollup.stage),
+                       cm.Project.current_stage_id, func.count())
+                .where(project_filter, cm.Project.current_stage_id.is_not(None))
+                .group_by(cm.Project.workspace_id, cm.Project.current_stage_id)
+            )))
+
+    @exc_mapped
+    @cached
+    def get_analytics_rollup(self, scope: str, scope_id: int, dimension: str) -> dict[int, int]:
+        """Возвращает предрассчитанные счётчики области scope в разрезе dimension: {ID: число} (см. Rollup)."""
+        table = cm.analytics_rollup
+        with self._session_scope() as session:
+            rows = session.execute(select(table.c.key, table.c.count).where(
+                table.c.scope == scope, table.c.scope_id == scope_id, table.c.dimension == dimension
+            )).all()
+        return {key: count for key, count in rows}
+
+    def _get_tasks_analytics(self, scope: str, scope_id: int, members_table, members_filter) -> 'RepoTasksAnalytics':
+        """
+        Возвращает аналитику задач из предрассчитанных счётчиков analytics_rollup (без просмотра задач).
+
+        :param scope: Область аналитики (Rollup.workspace или Rollup.project).
+        :param scope_id: ID РП или проекта.
+        :param members_table: Таблица участников (workspace_user или project_user).
+        :param members_filter: Условие отбора участников в members_table.
+        """
+        table = cm.analytics_rollup
+        rollup_filter = and_(table.c.scope == scope, table.c.scope_id == scope_id, table.c.dimension == Rollup.executor)
+        with self._session_scope() as session:
+            total_tasks, members_num = session.execute(select(
+                select(func.coalesce(func.sum(table.c.count), 0)).where(rollup_filter).scalar_subquery(),
+                select(func.count()).select_from(members_table).where(members_filter).scalar_subquery()
+            )).one()
+            distribution = session.execute(
+                select(cm.User.email, table.c.count)
+                .join(cm.User, cm.User.id == table.c.key)
+                .join(members_table, and_(members_table.c.user_id == table.c.key, members_filter))
+                .where(rollup_filter)
+            ).all()
+
+        return RepoTasksAnalytics(total_tasks, members_num, {email: count for email, count in distribution})
+
+    @exc_mapped
+    @cached
+    def get_workspace_tasks_analytics(self, workspace_id: int) -> 'RepoTasksAnalytics':
+        """Возвращает число задач РП с исполнителем, число участников РП и число задач участников {email: число}."""
+        return self._get_tasks_analytics(Rollup.workspace, workspace_id, cm.workspace_user,
+                                         cm.workspace_user.c.workspace_id == workspace_id)
+
+    @exc_mapped
+    @cached
+    def get_project_tasks_analytics(self, project_id: int) -> 'RepoTasksAnalytics':
+        """Возвращает число задач проекта с исполнителем, число участников проекта и число задач участников {email: число}."""
+        return self._get_tasks_analytics(Rollup.project, project_id, cm.project_user,
+                                         cm.project_user.c.project_id == project_id)
+
+    @exc_mapped
+    @cached
+    def get_workspace_stages_distribution(self, workspace_id: int) -> dict[str, int]:
+        """Возвращает распределение проектов РП по названиям текущих этапов: {название этапа: число проектов}."""
+        table = cm.analytics_rollup
+        query = (
+            select(cm.WorkStage.name, func.sum(table.c.count))
+            .join(cm.WorkStage, cm.WorkStage.id == table.c.key)
+            .where(table.c.scope == Rollup.workspace, table.c.scope_id == workspace_id, table.c.dimension == Rollup.stage)
+            .group_by(cm.WorkStage.name)
+        )
+        with self._session_scope() as session:
+            return {name: count for name, count in session.execute(query).all()}
 
     @exc_mapped
     def get_days_no_break(self, user_id: int) -> int:
@@ -712,29 +1369,273 @@ class DataRepository:
         last_work_date = result.content[0].last_work_date
 
     @exc_mapped
+    @cached
     def search_users(self, username: str, email: str, limit: int = None, offset: int = None, require_last_num: bool = False,
-                     serialize: bool = True) -> 'RepoSelectResponse':
+                     serialize: bool = True, after_id: int = None, text: str = None,
+                     prefix: bool = False) -> 'RepoSelectResponse':
+        """
+        Ищет пользователей по строкам, содержащимся в имени (username), email (email), имени или email (text).
+        Строки от MIN_TERM_LENGTH символов ищутся по индексу user_search, более короткие - перебором.
+        Результаты поиска по text ранжируются (bm25, совпадение в имени весомее совпадения в email), остальные
+        упорядочены по ID.
+
+        :param prefix: Поиск по началу имени и email (подсказки при вводе): строки ищутся по индексам
+                       ix_user_username_nocase, ix_user_email_nocase, результаты упорядочены по имени. Общее число
+                       найденных не вычисляется (records_left - 1, если есть ещё результаты).
+        :param after_id: Курсор keyset-пагинации (см. _execute_select). Не поддерживается при поиске по text и prefix:
+                         страницы по ID не сохраняют их порядок.
+        """
+        if after_id is not None and (text or prefix):
+            raise IncorrectParam(str(cm.User), after_id, CommonStruct.after_id,
+                                 'Keyset pagination is not supported for ranked (text) and prefix search')
+        if prefix:
+            return self._execute_select(self._get_users_prefix_query(username, email, text), limit, offset,
+                                        require_last_num, serialize, after_id=after_id, count_total=False)
+
         query = select(cm.User)
+        phrases = []  # Условия запроса к индексу
+        for column_name, term in ((DBFields.username, username), (DBFields.email, email), (None, text)):
+            if not term:
+                continue
+            if len(term) >= search_index.MIN_TERM_LENGTH:
+                phrases.append(f'{column_name} : {search_index.phrase(term)}' if column_name else search_index.phrase(term))
+            elif column_name:
+                query = query.where(getattr(cm.User, column_name).contains(term, autoescape=True))
+            else:
+                query = query.where(or_(cm.User.username.contains(term, autoescape=True),
+                                        cm.User.email.contains(term, autoescape=True)))
+
+        order = [cm.User.id]
+        if phrases:
+            user_search = search_index.user_search
+            query = (query.join(user_search, user_search.c.rowid == cm.User.id)
+                     .where(user_search.c.user_search.match(' AND '.join(phrases))))
+            if text and len(text) >= search_index.MIN_TERM_LENGTH:
+                order.insert(0, func.bm25(user_search.c.user_search, *search_index.USER_SEARCH_WEIGHTS))
+            else:  # Индекс возвращает записи в порядке rowid (ID) - без сортировки всех найденных
+                order = [user_search.c.rowid]
+        return self._execute_select(query.order_by(*order), limit, offset, require_last_num, serialize,
+                                    after_id=after_id)
+
+    @staticmethod
+    def _get_users_prefix_query(username: str | None, email: str | None, text: str | None) -> Select:
+        """Возвращает запрос пользователей, имя и email которых начинаются с переданных строк."""
+        def starts_with(column, term: str):  # LIKE 'x%' с параметром-шаблоном: поиск по диапазону индекса NOCASE
+            escaped = term.replace('/', '//').replace('%', '/%').replace('_', '/_')
+            return column.like(f'{escaped}%', escape='/')
 
+        query = select(cm.User)
         if username:
-            query = query.where(cm.User.username.contains(username))
+            query = query.where(starts_with(cm.User.username, username))
         if email:
-            query = query.where(cm.User.email.contains(email))
-        return self._execute_select(query, limit, offset, require_last_num, serialize)
+            query = query.where(starts_with(cm.User.email, email))
+        if text:
+            query = query.where(or_(starts_with(cm.User.username, text), starts_with(cm.User.email, text)))
+        order_column = cm.User.email if email and not (username or text) else cm.User.username
+        return query.order_by(order_column.collate('NOCASE'), cm.User.id)
+
+
+    @exc_mapped
+    @cached
+    def is_workspace_member(self, workspace_id: int, user_id: int) -> bool:
+        """Проверяет, является ли пользователь участником РП."""
+        query = select(cm.workspace_user.c.user_id).where(cm.workspace_user.c.workspace_id == workspace_id,
+                                                          cm.workspace_user.c.user_id == user_id)
+        with self._session_scope() as session:
+            return session.execute(query).first() is not None
+
+    @exc_mapped
+    @cached
+    def search_workspace(self, workspace_id: int, text: str, limit: int = None, offset: int = None,
+                         require_last_num: bool = False) -> 'RepoSelectResponse':
+        """
+        Ищет строку text (не короче MIN_TERM_LENGTH символов) в названиях и текстах задач, проектов и мероприятий РП по
+        индексу workspace_search. Результаты ранжированы (bm25, совпадение в названии весомее совпадения в тексте):
+        [{object_type: <тип объекта (WORKSPACE_SEARCH_SOURCES)>, id: <ID объекта>, name: <название>,
+          snippet: <фрагмент названия или текста, совпадения выделены SNIPPET_START, SNIPPET_END>}]
+        """
+        if not text or len(text) < search_index.MIN_TERM_LENGTH:
+            raise IncorrectParam(search_index.WORKSPACE_SEARCH, text, CommonStruct.text,
+                                 f'Search text must be at least {search_index.MIN_TERM_LENGTH} characters long')
+        workspace_search = search_index.workspace_search
+        search_filter = and_(workspace_search.c.workspace_search.match(search_index.phrase(text)),
+                             workspace_search.c.workspace_id == workspace_id)
+        query = (
+            select(workspace_search.c.kind, workspace_search.c.object_id, workspace_search.c.title,
+                   func.snippet(workspace_search.c.workspace_search, -1, search_index.SNIPPET_START,
+                                search_index.SNIPPET_END, search_index.SNIPPET_ELLIPSIS, search_index.SNIPPET_TOKENS))
+            .where(search_filter)
+            .order_by(func.bm25(workspace_search.c.workspace_search, *search_index.WORKSPACE_SEARCH_WEIGHTS),
+                      workspace_search.c.rowid)
+            .limit(limit).offset(offset or 0)
+        )
+        with self._session_scope() as session:
+            content = [{CommonStruct.object_type: kind, DBFields.id: object_id, DBFields.name: title,
+                        CommonStruct.snippet: snippet} for kind, object_id, title, snippet in session.execute(query)]
+            response = RepoSelectResponse(content=content)
+            if limit or offset or require_last_num:
+                total = session.execute(select(func.count()).select_from(workspace_search).where(search_filter)).scalar_one()
+                response.last_record_num = len(content) + (offset or 0)
+                response.records_left = max(total - response.last_record_num, 0)
+            return response
+
+    @exc_mapped
+    def get_import_references(self, workspace_id: int, emails: tp.Collection[str] = (),
+                              project_ids: tp.Collection[int] = (), project_names: tp.Collection[str] = (),
+                              status_ids: tp.Collection[int] = (), status_names: tp.Collection[str] = ()
+                              ) -> 'RepoImportReferences':
+        """
+        Получает объекты РП, на которые ссылаются импортируемые строки, одним запросом на вид ссылки: ID участников РП
+        по email, ID проектов и статусов задач РП по ID и названию (при совпадении названий - с меньшим ID), статус
+        задач РП по умолчанию.
+        """
+        references = RepoImportReferences()
+        with self._session_scope() as session:
+            references.default_status_id = session.execute(
+                select(cm.Workspace.default_task_status_id).where(cm.Workspace.id == workspace_id)
+            ).scalar()
+            if emails:
+                references.users = dict(session.execute(
+                    select(cm.User.email, cm.User.id)
+                    .join(cm.workspace_user, cm.workspace_user.c.user_id == cm.User.id)
+                    .where(cm.workspace_user.c.workspace_id == workspace_id, cm.User.email.in_(set(emails)))
+                ).all())
+            for model, ids, names, ids_result, names_result in (
+                    (cm.Project, project_ids, project_names, references.project_ids, references.projects),
+                    (cm.WSTaskStatus, status_ids, status_names, references.status_ids, references.statuses)):
+                if not ids and not names:
+                    continue
+                query = (select(model.id, model.name)
+                         .where(model.workspace_id == workspace_id,
+                                or_(model.id.in_(set(ids)), model.name.in_(set(names))))
+                         .order_by(model.id))
+                for id_, name in session.execute(query):
+                    ids_result.add(id_)
+                    names_result.setdefault(name, id_)
+        return references
+
+    @exc_mapped
+    def export_workspace(self, workspace_id: int, after: tuple[str, int] | None = None,
+                         batch_size: int = EXPORT_BATCH_SIZE) -> tp.Iterator[tuple[str, int, dict]]:
+        """
+        Выгружает объекты РП: проекты, этапы, задачи, однодневные и многодневные мероприятия и участников РП
+        ({user_id, roles: [ID ролей в РП]}) - по разделам EXPORT_SECTIONS, в разделе - по возрастанию ID.
+        Возвращает итератор кортежей (тип объекта, ID объекта (участника - ID пользователя), сериализованный объект).
+        Записи выбираются пачками по batch_size (yield_per), поэтому память не зависит от размера РП. Выгрузка читает
+        одну транзакцию (согласованный снимок РП), сессия закрывается по завершении или закрытии итератора.
+
+        :param after: (тип объекта, ID) последней полученной записи - выгрузка продолжается после неё.
+        """
+        if after is not None and after[0] not in EXPORT_SECTIONS:
+            raise IncorrectParam(cm.Workspace.__tablename__, after[0], CommonStruct.object_type,
+                                 f'Unknown export section: {after[0]}')
+        return self._iter_export(workspace_id, after, batch_size)
+
+    def _iter_export(self, workspace_id: int, after: tuple[str, int] | None,
+                     batch_size: int) -> tp.Iterator[tuple[str, int, dict]]:
+        conditions = {
+            cm.Project: cm.Project.workspace_id == workspace_id,
+            cm.WorkStage: cm.WorkStage.project_id.in_(select(cm.Project.id).where(cm.Project.workspace_id == workspace_id)),
+            cm.WSTask: cm.WSTask.workspace_id == workspace_id,
+            cm.WSDailyEvent: cm.WSDailyEvent.workspace_id == workspace_id,
+            cm.WSManyDaysEvent: cm.WSManyDaysEvent.workspace_id == workspace_id
+        }
+        models = {model.__tablename__: model for model in conditions}
+        start = 0 if after is None else EXPORT_SECTIONS.index(after[0])
+        try:
+            with self._session_scope(shared=False) as session:  # Выгрузка читается после завершения запроса
+                begin_read_transaction(session.connection())  # Все разделы и пачки - из одного снимка БД
+                for object_type in EXPORT_SECTIONS[start:]:
+                    after_id = after[1] if after is not None and after[0] == object_type else 0
+                    if object_type == cm.workspace_user.name:
+                        yield from self._export_members(session, workspace_id, after_id, batch_size)
+                    else:
+                        model = models[object_type]
+                        yield from self._export_models(session, model, conditions[model], after_id, batch_size)
+        except SQLAlchemyError as e:  # Ошибки при чтении очередной пачки
+            logger.exception(f'An SQLAlchemyError caught during workspace export: {e}')
+            raise map_sqlalchemy_exc_to_repo_exc(e)
+
+    @staticmethod
+    def _export_models(session: Session, model: tp.Type[cm.Base], condition, after_id: int,
+                       batch_size: int) -> tp.Iterator[tuple[str, int, dict]]:
+        query = select(model).where(condition, model.id > after_id).order_by(model.id)
+        serializer = compiled_serializers.get(model)
+        if serializer:
+            result = session.execute(serializer.select(query).execution_options(yield_per=batch_size))
+            for rows in result.partitions():
+                for record in serializer.dump(session, rows):
+                    yield model.__tablename__, record[DBFields.id], record
+        else:
+            scheme = schemes_models.get(model)
+            result = session.execute(query.execution_options(yield_per=batch_size))
+            for db_models in result.scalars().partitions():
+                for db_model in db_models:
+                    yield model.__tablename__, db_model.id, scheme.dump(obj=db_model)
+
+    @staticmethod
+    def _export_members(session: Session, workspace_id: int, after_id: int,
+                        batch_size: int) -> tp.Iterator[tuple[str, int, dict]]:
+        user_id = cm.workspace_user.c.user_id
+        query = (select(user_id)
+                 .where(cm.workspace_user.c.workspace_id == workspace_id, user_id > after_id)
+                 .order_by(user_id))
+        roles_query = (select(cm.user_role.c.user_id, cm.user_role.c.role_id)
+                       .join(cm.WSRole, cm.WSRole.id == cm.user_role.c.role_id)
+                       .where(cm.WSRole.workspace_id == workspace_id)
+                       .order_by(cm.user_role.c.role_id))
+        for rows in session.execute(query.execution_options(yield_per=batch_size)).partitions():
+            user_ids = [row[0] for row in rows]
+            roles = {}
+            for member_id, role_id in session.execute(roles_query.where(cm.user_role.c.user_id.in_(user_ids))):
+                roles.setdefault(member_id, []).append(role_id)
+            for member_id in user_ids:
+                yield cm.workspace_user.name, member_id, {CommonStruct.user_id: member_id,
+                                                          DBFields.roles: roles.get(member_id, [])}
 
 
 @dataclass
 class RepoSelectResponse:
     """Ответ DataRepository на запрос по получению данных."""
     content: list
-    last_record_num: int = 0
+    last_record_num: int | None = 0
     records_left: int = 0
+    last_id: int | None = None  # ID последней записи страницы (для курсора keyset-пагинации)
 
     def __str__(self):
         return (f'RepoInsertResponse: last_records_num = {self.last_record_num}, records_left = {self.records_left}\n'
                 f' content = [{[f'{record}\n' for record in self.content]}]')
 
 
+@dataclass
+class RepoTasksAnalytics:
+    """Ответ DataRepository на запрос аналитики задач (РП или проекта)."""
+    total_tasks: int  # Число задач с исполнителем
+    members_num: int  # Число участников
+    distribution: dict[str, int]  # {email участника: число задач, где он исполнитель}
+
+
+@dataclass
+class RepoBulkInsertResponse:
+    """
+    Ответ DataRepository на массовое добавление данных: ID добавленных строк в порядке строк (None - строка не
+    добавлена) и ошибки строк {номер строки: описание ошибки}.
+    """
+    ids: list[int | None]
+    errors: dict[int, str]
+
+
+@dataclass
+class RepoImportReferences:
+    """Объекты РП, на которые ссылаются импортируемые строки (см. DataRepository.get_import_references)."""
+    users: dict[str, int] = field(default_factory=dict)  # email участника РП -> ID
+    project_ids: set[int] = field(default_factory=set)
+    projects: dict[str, int] = field(default_factory=dict)  # Название проекта -> ID
+    status_ids: set[int] = field(default_factory=set)
+    statuses: dict[str, int] = field(default_factory=dict)  # Название статуса задач -> ID
+    default_status_id: int | None = None
+
+
 @dataclass
 class RepoInsertResponse:
     """Ответ DataRepository на запрос по добавлению данных."""
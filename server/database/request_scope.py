@@ -0,0 +1,129 @@
+"""
+Контекст запроса API на уровне БД: одна сессия и одна транзакция на весь запрос и identity map результатов чтения.
+
+Без контекста каждый метод репозитория открывает свою сессию и транзакцию, и запрос, который проверяет роль, читает
+задачи по одной и изменяет их, выполняет столько транзакций, сколько вызовов репозитория. Репозиторий, получивший
+провайдер контекста (DataRepository(request_scope_provider=...)), выполняет методы в сессии контекста текущего
+запроса: сессия открывается при первом обращении к БД, транзакция фиксируется одним COMMIT в конце запроса.
+Изменяющий метод выполняется в точке сохранения (SAVEPOINT): ошибка метода откатывает только его изменения, как
+раньше - его отдельная транзакция. Результаты методов чтения (cached) запоминаются в identity map контекста:
+повторное получение того же пользователя, роли или РП за запрос не выполняет запросов. Изменение очищает identity map.
+
+Контекст хранится в flask.g (см. server.utils.api_utils.get_request_scope), модуль от flask не зависит.
+"""
+import copy
+import typing as tp
+
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm.session import sessionmaker, Session
+from sqlalchemy.exc import SQLAlchemyError
+
+from server.database.exceptions import map_sqlalchemy_exc_to_repo_exc
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+NO_VALUE = object()  # Результата нет в identity map
+
+
+def begin_read_transaction(connection: Connection):
+    """
+    Начинает транзакцию чтения соединения: все чтения транзакции видят один снимок БД (снимок SQLite фиксируется
+    первым чтением транзакции). Драйвер sqlite3 не начинает транзакцию перед SELECT - без неё каждое чтение видит
+    последние зафиксированные изменения.
+    """
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN')
+
+
+def begin_write_transaction(connection: Connection):
+    """
+    Начинает транзакцию записи соединения (BEGIN IMMEDIATE - блокировка записи с ожиданием busy_timeout). Драйвер
+    sqlite3 начинает транзакцию только перед INSERT/UPDATE/DELETE, но не перед SAVEPOINT, а RELEASE точки сохранения
+    вне транзакции фиксирует изменения.
+    """
+    if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+        connection.exec_driver_sql('BEGIN IMMEDIATE')
+
+
+class RequestScope:
+    """
+    Сессии и identity map одного запроса. Для каждой фабрики сессий (БД) открывается одна сессия. Используется одним
+    потоком.
+    """
+
+    def __init__(self):
+        self._sessions: dict[sessionmaker, Session] = {}
+        self._identity_map: dict[tp.Hashable, tp.Any] = {}
+        self._written = False
+
+    @property
+    def written(self) -> bool:
+        """Изменялась ли БД в контексте (изменения видны только его сессии до фиксации)."""
+        return self._written
+
+    @property
+    def transactions(self) -> int:
+        """Число открытых транзакций (сессий) контекста."""
+        return len(self._sessions)
+
+    def get_session(self, session_maker: sessionmaker) -> Session:
+        """Возвращает сессию контекста для БД session_maker, при первом обращении - открывает её и транзакцию."""
+        session = self._sessions.get(session_maker)
+        if session is None:
+            session = session_maker()
+            session.begin()
+            self._sessions[session_maker] = session
+        return session
+
+    def get(self, key: tp.Hashable) -> tp.Any:
+        """Возвращает копию результата с ключом key из identity map или NO_VALUE."""
+        value = self._identity_map.get(key, NO_VALUE)
+        return value if value is NO_VALUE else copy.deepcopy(value)
+
+    def put(self, key: tp.Hashable, value: tp.Any):
+        self._identity_map[key] = copy.deepcopy(value)
+
+    def begin_snapshot(self, session_maker: sessionmaker):
+        """
+        Начинает транзакцию чтения БД session_maker: все чтения контекста видят один снимок БД (см.
+        begin_read_transaction).
+        """
+        begin_read_transaction(self.get_session(session_maker).connection())
+
+    def get_write_session(self, session_maker: sessionmaker) -> Session:
+        """
+        Возвращает сессию контекста для изменения БД session_maker и отмечает изменение: запомненные результаты могут
+        быть устаревшими.
+
+        Транзакция SQLite начинается явно (см. begin_write_transaction), чтения до первого изменения выполняются вне
+        неё.
+        """
+        self._written = True
+        self._identity_map.clear()
+        session = self.get_session(session_maker)
+        begin_write_transaction(session.connection())
+        return session
+
+    def close(self, commit: bool = True):
+        """
+        Фиксирует (commit=True) или откатывает транзакции контекста и закрывает его сессии. Если фиксация не удалась,
+        остальные транзакции откатываются, выбрасывается исключение репозитория (BaseRepoException).
+        """
+        sessions, self._sessions = self._sessions, {}
+        self._identity_map.clear()
+        error = None
+        for session in sessions.values():
+            try:
+                if commit and error is None:
+                    session.commit()
+                else:
+                    session.rollback()
+            except SQLAlchemyError as e:
+                logger.exception(f'An SQLAlchemyError caught during request transaction commit: {e}')
+                error = e
+            finally:
+                session.close()
+        if error is not None:
+            raise map_sqlalchemy_exc_to_repo_exc(error)
@@ -228,6 +228,7 @@ class WSRoleSchema(BaseSchema):
         model = cm.WSRole
     workspace_id = fields.Int(load_only=True)
     workspace = auto_field(dump_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 class PermissionSchema(BaseSchema):
@@ -242,6 +243,7 @@ class WSRoleTaskSchema(BaseSchema):
         model = cm.WSRoleTask
     role_id = fields.Int(load_only=True)
     task_id = fields.Int(load_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 class WSRoleProjectSchema(BaseSchema):
@@ -250,6 +252,7 @@ class WSRoleProjectSchema(BaseSchema):
         model = cm.WSRoleProject
     role_id = fields.Int(load_only=True)
     project_id = fields.Int(load_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 class WSRoleDailyEventSchema(BaseSchema):
@@ -258,6 +261,7 @@ class WSRoleDailyEventSchema(BaseSchema):
         model = cm.WSRoleDailyEvent
     role_id = fields.Int(load_only=True)
     daily_event_id = fields.Int(load_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 class WSRoleManyDaysEventSchema(BaseSchema):
@@ -266,6 +270,7 @@ class WSRoleManyDaysEventSchema(BaseSchema):
         model = cm.WSRoleManyDaysEvent
     role_id = fields.Int(load_only=True)
     many_days_event_id = fields.Int(load_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 class WSRoleDocumentSchema(BaseSchema):
@@ -274,6 +279,7 @@ class WSRoleDocumentSchema(BaseSchema):
         model = cm.WSRoleDocument
     role_id = fields.Int(load_only=True)
     document_id = fields.Int(load_only=True)
+    permissions_mask = auto_field(dump_only=True)  # Пересчитывается триггерами (см. models.permission_masks)
 
 
 if __name__ == '__main__':
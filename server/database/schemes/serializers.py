@@ -0,0 +1,213 @@
+"""
+Скомпилированные сериализаторы моделей.
+
+Для каждой пары модель-схема из schemes_models по полям схемы (dump_fields) генерируется функция, которая собирает
+словарь из кортежа колонок строки (SELECT колонок таблицы вместо загрузки ORM-объектов). ID (и колонки) связанных
+объектов many-to-one выбираются тем же запросом через LEFT JOIN по PK, one-to-many и many-to-many - загружаются пачкой
+для всей страницы одним запросом на отношение в том же порядке, что и при ленивой загрузке. Результат совпадает с scheme.dump(obj=model) поле в поле и в
+том же порядке ключей, но без создания ORM-объектов и без запроса на каждое отношение каждой модели.
+
+Поля, которые не удаётся скомпилировать (нестандартный тип, отношение не по ID), отключают компиляцию модели: для неё
+используется сериализация схемой.
+"""
+import typing as tp
+
+from marshmallow import fields
+from marshmallow_sqlalchemy.fields import Related, RelatedList
+from sqlalchemy import inspect
+from sqlalchemy.orm import RelationshipProperty, Session
+from sqlalchemy.orm.interfaces import MANYTOONE, MANYTOMANY
+from sqlalchemy.sql import Select, select, literal_column
+from sqlalchemy.sql.schema import Column
+from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+
+import server.database.models.common_models as cm
+from server.database.schemes.base import schemes_models
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+IN_CHUNK_SIZE = 500  # Число ID в одном запросе пакетной загрузки (ограничение числа параметров SQLite)
+
+# Вычисляемые поля схем (fields.Method): (модель, поле) -> (many-to-one отношение, колонка связанной модели)
+RELATED_ATTRIBUTE_FIELDS = {
+    (cm.WSTask, 'executor_email'): (cm.WSTask.executor, cm.User.email)  # WSTaskSchema.get_executor_email
+}
+
+ISO_FORMATS = ('iso', 'iso8601')
+RAW_FIELDS = (fields.Integer, fields.String, fields.Boolean)  # Значения колонок SQLite уже имеют нужный тип
+
+
+class NotCompilable(Exception):
+    """Поле схемы не может быть скомпилировано."""
+
+
+def chunked(values: tp.Sequence, size: int = IN_CHUNK_SIZE) -> tp.Iterator[tp.Sequence]:
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+class RelationshipLoader:
+    """
+    Пакетная загрузка ID связанных объектов для страницы. Возвращает словарь {ID владельца: [ID связанных]} (для
+    отношений с uselist=False - {ID владельца: ID первого связанного}). Порядок ID совпадает с ленивой загрузкой:
+    one-to-many - по ID, many-to-many - по индексу PK ассоциативной таблицы, если FK владельца в нём первый, иначе в
+    порядке записей ассоциативной таблицы (SQLite сканирует её целиком).
+    """
+
+    def __init__(self, relationship: RelationshipProperty, owner_key: str):
+        self.owner_key = owner_key  # Колонка владельца, по которой выбираются связанные объекты
+        self._uselist = relationship.uselist
+        target = relationship.mapper.local_table
+        ((_, owner_fk),) = relationship.synchronize_pairs
+        if relationship.direction is MANYTOMANY:
+            ((target_pk, target_fk),) = relationship.secondary_synchronize_pairs
+            secondary = relationship.secondary
+            if list(secondary.primary_key.columns)[0] is owner_fk:
+                order = (owner_fk, target_fk)
+            else:
+                order = (literal_column(f'{secondary.name}.rowid'), )
+            self._query = select(owner_fk, target_fk).join(target, target_pk == target_fk).order_by(*order)
+        else:
+            self._query = select(owner_fk, target.c.id).order_by(target.c.id)
+        self._owner_fk = owner_fk
+
+    def load(self, session: Session, owner_ids: tp.Sequence[int]) -> dict[int, tp.Any]:
+        result: dict[int, list[int]] = {}
+        for chunk in chunked(owner_ids):
+            for owner_id, related_id in session.execute(self._query.where(self._owner_fk.in_(chunk))):
+                result.setdefault(owner_id, []).append(related_id)
+        if not self._uselist:
+            return {owner_id: related_ids[0] for owner_id, related_ids in result.items()}
+        return result
+
+
+class CompiledSerializer:
+    """
+    Сериализатор модели, сгенерированный по её схеме. Используется в DataRepository._execute_select:
+
+        query = serializer.select(query)  # Вместо модели выбираются колонки её таблицы и связанных объектов
+        content = serializer.dump(session, session.execute(query).all())
+
+    Строки могут содержать дополнительные колонки после выбранных select (например, общее число записей).
+    """
+
+    def __init__(self, model: tp.Type[cm.Base], schema: SQLAlchemyAutoSchema):
+        mapper = inspect(model)
+        if mapper.inherits is not None:
+            raise NotCompilable(f'Inherited model: {model}')
+        self.model = model
+        self._columns = list(mapper.local_table.columns)
+        self._indexes = {column.key: i for i, column in enumerate(self._columns)}
+        self._loaders: list[RelationshipLoader] = []
+        self._joins: dict[str, tp.Any] = {}  # Отношение many-to-one -> псевдоним таблицы связанной модели
+        self._onclauses = []
+        self._joined_columns: list[Column] = []  # Колонки связанных объектов, выбираемые после колонок таблицы
+        namespace: dict[str, tp.Any] = {}
+        items = []
+        for name, field in schema.dump_fields.items():
+            key = field.data_key if field.data_key is not None else name
+            items.append(f'        {key!r}: {self._compile_field(mapper, name, field, namespace)},')
+
+        loaders = ''.join(f', l{i}' for i in range(len(self._loaders)))
+        source = '\n'.join([f'def dump_row(row{loaders}):', '    return {', *items, '    }'])
+        exec(compile(source, f'<compiled serializer {model.__name__}>', 'exec'), namespace)
+        self._dump_row = namespace['dump_row']
+        self.source = source
+
+    def _column_index(self, column: Column) -> int:
+        if column.table is not self._columns[0].table or column.key not in self._indexes:
+            raise NotCompilable(f'Column {column} is not in table of {self.model}')
+        return self._indexes[column.key]
+
+    def _joined_column_index(self, relationship: RelationshipProperty, column: Column) -> int:
+        """Возвращает индекс колонки объекта many-to-one отношения, присоединяемого к запросу через LEFT JOIN."""
+        ((target_pk, fk),) = relationship.synchronize_pairs
+        if relationship.key not in self._joins:
+            alias = relationship.mapper.local_table.alias(f'{relationship.key}_joined')
+            self._joins[relationship.key] = alias
+            self._onclauses.append((alias, alias.c[target_pk.key] == self._columns[self._column_index(fk)]))
+        column = self._joins[relationship.key].c[column.key]
+        for i, joined_column in enumerate(self._joined_columns):
+            if joined_column is column:
+                return len(self._columns) + i
+        self._joined_columns.append(column)
+        return len(self._columns) + len(self._joined_columns) - 1
+
+    def _add_loader(self, loader: RelationshipLoader) -> str:
+        self._loaders.append(loader)
+        return f'l{len(self._loaders) - 1}'
+
+    def _compile_field(self, mapper, name: str, field: fields.Field, namespace: dict) -> str:
+        """Возвращает выражение, вычисляющее значение поля из строки row."""
+        attr_name = field.attribute or name
+        if (self.model, name) in RELATED_ATTRIBUTE_FIELDS:
+            relationship_attr, column = RELATED_ATTRIBUTE_FIELDS[(self.model, name)]
+            if relationship_attr.property.direction is not MANYTOONE:
+                raise NotCompilable(f'Field {name} of {self.model} is not a many-to-one attribute')
+            return f'row[{self._joined_column_index(relationship_attr.property, column)}]'
+
+        if isinstance(field, (Related, RelatedList)):
+            return self._compile_relationship(mapper, attr_name, field)
+
+        if attr_name not in mapper.column_attrs:
+            raise NotCompilable(f'Field {name} of {self.model} is not a column')
+        value = f'row[{self._column_index(mapper.column_attrs[attr_name].columns[0])}]'
+        if isinstance(field, RAW_FIELDS) and not getattr(field, 'as_string', False):
+            return value
+        if isinstance(field, (fields.DateTime, fields.Date, fields.Time)) and field.format in ISO_FORMATS:
+            return f'(None if (v := {value}) is None else v.isoformat())'
+        namespace[f'f_{name}'] = field._serialize  # Остальные типы - сериализатором поля
+        return f'f_{name}({value}, {name!r}, None)'
+
+    def _compile_relationship(self, mapper, attr_name: str, field: Related | RelatedList) -> str:
+        relationship = mapper.relationships.get(attr_name)
+        related_field = field.inner if isinstance(field, RelatedList) else field
+        if relationship is None or len(relationship.synchronize_pairs) != 1:
+            raise NotCompilable(f'Unsupported relationship {attr_name} of {self.model}')
+        related_keys = related_field.related_keys
+        target_pk = list(relationship.mapper.primary_key)
+        if len(related_keys) != 1 or len(target_pk) != 1 or related_keys[0].columns[0] is not target_pk[0]:
+            raise NotCompilable(f'Relationship {attr_name} of {self.model} is not serialized by ID')
+
+        if relationship.direction is MANYTOONE:  # ID связанного объекта (None, если его нет - как при ленивой загрузке)
+            return f'row[{self._joined_column_index(relationship, target_pk[0])}]'
+
+        ((owner_pk, _),) = relationship.synchronize_pairs
+        owner_index = self._column_index(owner_pk)
+        loader = self._add_loader(RelationshipLoader(relationship, owner_pk.key))
+        if relationship.uselist:
+            return f'({loader}.get(row[{owner_index}]) or [])'  # Новый список для каждой модели
+        return f'{loader}.get(row[{owner_index}])'
+
+    def select(self, query: Select) -> Select:
+        """Заменяет в запросе выбираемую модель колонками её таблицы и присоединённых many-to-one объектов."""
+        query = query.with_only_columns(*self._columns, *self._joined_columns)
+        for alias, onclause in self._onclauses:
+            query = query.outerjoin(alias, onclause)
+        return query
+
+    def dump(self, session: Session, rows: tp.Sequence[tp.Sequence]) -> list[dict]:
+        """Сериализует строки, полученные запросом select(query). Связанные ID загружаются в сессии session."""
+        loaded = []
+        for loader in self._loaders:
+            index = self._indexes[loader.owner_key]
+            loaded.append(loader.load(session, [row[index] for row in rows]) if rows else {})
+        dump_row = self._dump_row
+        return [dump_row(row, *loaded) for row in rows]
+
+
+def compile_serializers(schemes: dict[tp.Type[cm.Base], SQLAlchemyAutoSchema]) -> dict[tp.Type[cm.Base], CompiledSerializer]:
+    serializers = {}
+    for model, schema in schemes.items():
+        if getattr(model, '__table__', None) is None:  # Абстрактная модель
+            continue
+        try:
+            serializers[model] = CompiledSerializer(model, schema)
+        except NotCompilable as e:
+            logger.warning(f'Model {model.__name__} is serialized by schema: {e}')
+    return serializers
+
+
+compiled_serializers = compile_serializers(schemes_models)  # Соответствие моделей и скомпилированных сериализаторов
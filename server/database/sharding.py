@@ -0,0 +1,551 @@
+"""
+Шардирование БД по РП. Глобальная БД (database_path) хранит пользователей, РП, участников РП и личные данные
+(GLOBAL_TABLES), таблицы РП (задачи, мероприятия, проекты, этапы, роли, теги, статусы - остальные таблицы) хранятся
+в шардах: файлах <database_path>.shard<номер>. РП с ID workspace_id хранится в шарде workspace_id % <число шардов>,
+поэтому запись в одном РП блокирует только его шард. Миграции Alembic применяются только к глобальной БД, шарды
+создаются схемой последней версии.
+
+Соединение шарда подключает глобальную БД (ATTACH ... AS GLOBAL_SCHEMA): запросы шарда видят таблицы глобальной БД
+без изменений в запросах репозитория (в шарде нет таблиц с такими именами). Соединение глобальной БД подключает все
+шарды и создаёт временные представления таблиц РП (UNION ALL таблиц шардов): связи пользователей и РП (например,
+задачи пользователя) загружаются из всех шардов. Число шардов ограничено числом подключаемых к соединению БД SQLite
+(MAX_SHARDS). Внешние ключи между БД не проверяются и не удаляют каскадно: в схеме шарда их нет.
+
+ID объектов шардов уникальны во всех шардах: шард shard выдаёт ID (AUTOINCREMENT) из диапазона
+[(shard + 1) * ID_SPAN, (shard + 2) * ID_SPAN), шард объекта определяется по его ID. Объекты, перенесённые из
+нешардированной БД (split_database), сохраняют ID (< ID_SPAN), их шард - в таблице shard_directory глобальной БД.
+
+ShardedRepository - DataRepository, направляющий каждый вызов в шард по ID РП или объектов (ROUTES); запросы без
+РП (например, задачи исполнителя во всех РП) выполняются во всех шардах, результаты объединяются.
+"""
+import functools
+import inspect
+import typing as tp
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from sqlalchemy import MetaData, Table, Column, Integer, String, Engine, event, inspect as sqla_inspect
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm.session import sessionmaker, Session
+from sqlalchemy.sql import select
+
+import server.database.models.common_models as cm
+import server.database.models.search_index as search_index
+import server.database.models.permission_masks as permission_masks
+from common.base import DBFields
+from server.data_const import DBProfiles, Rollup
+from server.database.exceptions import BaseRepoException
+from server.database.models.db_utils import create_db_engine, add_permissions, migrate_db
+from server.database.repository import DataRepository, RepoSelectResponse, RepoInsertResponse, RepoBulkInsertResponse
+from server.database.write_dispatcher import WriteDispatcher
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+ID_SPAN = 2 ** 40  # Размер диапазона ID шарда
+GLOBAL_SCHEMA = 'global_db'  # Имя глобальной БД в соединениях шардов
+SHARD_SCHEMA = 'shard_{}'  # Имя шарда в соединениях глобальной БД
+MAX_SHARDS = 10  # SQLITE_MAX_ATTACHED
+MAX_FANOUT_THREADS = 8
+DIRECTORY_CACHE_SIZE = 100_000
+READ_PREFIXES = ('get_', 'search_')  # Методы чтения: выполняются в нескольких шардах параллельно
+
+GLOBAL_TABLES = frozenset({
+    'user', 'permission', 'workspace', 'workspace_user', 'personal_task', 'personal_task_status', 'personal_task_tag',
+    'personal_work_direction', 'personal_daily_event', 'personal_many_days_event', 'personal_task_event',
+    'tag_personal_task'
+})
+WORKSPACE = cm.Workspace.__tablename__
+
+# Шард объектов, перенесённых из нешардированной БД: (таблица, ID объекта) -> шард
+shard_directory = Table(
+    'shard_directory', MetaData(),
+    Column('table_name', String, primary_key=True),
+    Column('object_id', Integer, primary_key=True),
+    Column('shard', Integer, nullable=False)
+)
+
+
+def get_global_tables() -> list[Table]:
+    return [table for table in cm.Base.metadata.sorted_tables if table.name in GLOBAL_TABLES]
+
+
+def get_shard_metadata() -> MetaData:
+    """
+    Возвращает схему шарда: копии таблиц РП без внешних ключей на таблицы глобальной БД, с AUTOINCREMENT (ID
+    выдаются из диапазона шарда).
+    """
+    metadata = MetaData()
+    for table in cm.Base.metadata.sorted_tables:
+        if table.name in GLOBAL_TABLES:
+            continue
+        shard_table = table.to_metadata(metadata)
+        for constraint in list(shard_table.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split('.')[0] in GLOBAL_TABLES:
+                shard_table.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+                    shard_table.foreign_keys.discard(element)
+        if has_id_sequence(shard_table):
+            shard_table.dialect_options['sqlite']['autoincrement'] = True
+    return metadata
+
+
+def has_id_sequence(table: Table) -> bool:
+    return [column.name for column in table.primary_key] == [DBFields.id]
+
+
+def get_shard_url(path: str, shard: int) -> str:
+    return f'{path}.shard{shard}'
+
+
+def create_shard_engine(path: str, shard: int, profile: str = DBProfiles.prod) -> Engine:
+    """Создаёт движок шарда shard глобальной БД path. Глобальная БД подключается к каждому соединению."""
+    engine = create_db_engine(get_shard_url(path, shard), profile)
+    global_path = make_url(path).database
+
+    @event.listens_for(engine, 'connect')
+    def attach_global(dbapi_connection, _):
+        dbapi_connection.execute(f'ATTACH DATABASE ? AS {GLOBAL_SCHEMA}', (global_path,))
+        shard_created = dbapi_connection.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?",
+                                                 (cm.WSRole.__tablename__,)).fetchone()
+        if shard_created:  # Триггеры масок разрешений читают таблицу permission глобальной БД - только временные
+            for statement in permission_masks.get_permission_masks_ddl(temp=True):
+                dbapi_connection.execute(statement)
+
+    return engine
+
+
+def create_global_engine(path: str, shards_num: int, profile: str = DBProfiles.prod) -> Engine:
+    """
+    Создаёт движок глобальной БД path. Шарды подключаются к каждому соединению, таблицы РП доступны как временные
+    представления - объединения таблиц шардов.
+    """
+    if not 0 < shards_num <= MAX_SHARDS:
+        raise ValueError(f'Number of shards must be from 1 to {MAX_SHARDS}, got {shards_num}.')
+    engine = create_db_engine(path, profile)
+    shard_paths = [make_url(get_shard_url(path, shard)).database for shard in range(shards_num)]
+    views = [
+        f'CREATE TEMP VIEW "{table.name}" AS ' + ' UNION ALL '.join(
+            f'SELECT * FROM {SHARD_SCHEMA.format(shard)}."{table.name}"' for shard in range(shards_num))
+        for table in get_shard_metadata().sorted_tables
+    ]
+
+    @event.listens_for(engine, 'connect')
+    def attach_shards(dbapi_connection, _):
+        for shard, shard_path in enumerate(shard_paths):
+            dbapi_connection.execute(f'ATTACH DATABASE ? AS {SHARD_SCHEMA.format(shard)}', (shard_path,))
+        for view in views:
+            dbapi_connection.execute(view)
+
+    return engine
+
+
+def create_shard(engine: Engine, shard: int):
+    """Создаёт схему шарда заново, задаёт начало диапазона ID шарда."""
+    metadata = get_shard_metadata()
+    with engine.begin() as connection:
+        metadata.drop_all(connection)
+        metadata.create_all(connection)
+        search_index.create_search_index(connection, search_index.get_workspace_search_ddl())
+        connection.exec_driver_sql('DELETE FROM sqlite_sequence')
+        for table in metadata.sorted_tables:
+            if has_id_sequence(table):
+                connection.exec_driver_sql('INSERT INTO sqlite_sequence(name, seq) VALUES (?, ?)',
+                                           (table.name, (shard + 1) * ID_SPAN))
+    engine.dispose()  # Соединения, открытые до создания схемы, не имеют триггеров масок разрешений
+
+
+def init_sharded_db(path: str, shards_num: int, profile: str = DBProfiles.prod) -> tuple[Engine, list[Engine]]:
+    """Создаёт шардированную базу заново, возвращает движки глобальной БД и шардов."""
+    engine = create_db_engine(path, profile)
+    cm.Base.metadata.drop_all(engine)
+    cm.Base.metadata.create_all(engine, tables=get_global_tables())
+    shard_directory.create(engine, checkfirst=True)
+    add_permissions(engine)
+    migrate_db(engine, stamp_only=True)
+    engine.dispose()
+
+    shard_engines = [create_shard_engine(path, shard, profile) for shard in range(shards_num)]
+    for shard, shard_engine in enumerate(shard_engines):
+        create_shard(shard_engine, shard)
+    return create_global_engine(path, shards_num, profile), shard_engines
+
+
+def launch_sharded_db(path: str, shards_num: int, profile: str = DBProfiles.prod) -> tuple[Engine, list[Engine]]:
+    """
+    Возвращает движки глобальной БД и шардов уже созданной шардированной базы. Недостающие шарды создаются. Шарды
+    создаются схемой последней версии, миграции Alembic применяются только к глобальной БД.
+    """
+    engine = create_db_engine(path, profile)
+    migrate_db(engine)
+    engine.dispose()
+    shard_engines = []
+    for shard in range(shards_num):
+        engine = create_shard_engine(path, shard, profile)
+        if not sqla_inspect(engine).has_table(cm.WSTask.__tablename__):
+            logger.warning(f'Shard {shard} of database {path} does not exist and will be created.')
+            create_shard(engine, shard)
+        shard_engines.append(engine)
+    return create_global_engine(path, shards_num, profile), shard_engines
+
+
+@dataclass(frozen=True)
+class Route:
+    """
+    Правило маршрутизации метода: шард определяется по значению аргумента arg - ID РП (table = WORKSPACE) или
+    объекта таблицы table, списку ID или списку моделей (ключ модели - field). table может быть функцией аргументов
+    метода.
+    """
+    arg: str
+    table: str | tp.Callable[[dict], str] = WORKSPACE
+    field: str | None = None
+
+
+WS = Route('workspace_id')
+PROJECT = Route('project_id', cm.Project.__tablename__)
+NEW_MODELS = Route('models', WORKSPACE, DBFields.workspace_id)  # Добавление: шард РП модели
+
+
+def ids(table: tp.Type[cm.Base], arg: str = 'ids') -> Route:
+    return Route(arg, table.__tablename__)
+
+
+def models(table: tp.Type[cm.Base]) -> Route:
+    """Изменение: шард по ID модели."""
+    return Route('models', table.__tablename__, DBFields.id)
+
+
+def rollup_scope_table(arguments: dict) -> str:
+    return WORKSPACE if arguments['scope'] == Rollup.workspace else cm.Project.__tablename__
+
+
+# Методы, работающие с таблицами РП: правила маршрутизации по порядку. Если ни одно правило не применимо (аргумента
+# нет) - метод выполняется во всех шардах. Методы GLOBAL_METHODS выполняются в глобальной БД.
+ROUTES: dict[str, list[Route]] = {
+    'get_ws_tasks': [WS, ids(cm.WSTask), PROJECT],
+    'add_ws_tasks': [NEW_MODELS],
+    'import_ws_tasks': [NEW_MODELS],
+    'update_ws_tasks': [models(cm.WSTask)],
+    'delete_ws_tasks_by_id': [ids(cm.WSTask)],
+    'get_ws_task_events': [WS, ids(cm.WSTaskEvent)],
+    'get_task_permissions': [ids(cm.WSTask, 'task_id')],
+
+    'get_ws_daily_event_by_notified_id': [],
+    'get_ws_daily_events_by_id': [WS, ids(cm.WSDailyEvent)],
+    'add_ws_daily_events': [NEW_MODELS],
+    'import_ws_daily_events': [NEW_MODELS],
+    'update_ws_daily_events': [models(cm.WSDailyEvent)],
+    'delete_ws_daily_events': [ids(cm.WSDailyEvent)],
+    'get_daily_event_permissions': [ids(cm.WSDailyEvent, 'daily_event_id')],
+    'get_ws_many_days_events_by_id': [WS, ids(cm.WSManyDaysEvent)],
+    'add_ws_many_days_events': [NEW_MODELS],
+    'import_ws_many_days_events': [NEW_MODELS],
+    'update_ws_many_days_events': [models(cm.WSManyDaysEvent)],
+    'delete_ws_many_days_events': [ids(cm.WSManyDaysEvent)],
+    'get_many_days_event_permissions': [ids(cm.WSManyDaysEvent, 'many_days_event_id')],
+    'get_document_permissions': [ids(cm.WSDocument, 'document_id')],
+
+    'get_projects': [Route('workspace_ids'), ids(cm.Project, 'project_ids')],
+    'get_projects_by_workspace_id': [WS],
+    'add_projects': [NEW_MODELS],
+    'update_projects': [models(cm.Project)],
+    'delete_projects': [ids(cm.Project, 'project_ids')],
+    'get_project_permissions': [PROJECT],
+    'add_project_user': [PROJECT],
+    'delete_project_user': [PROJECT],
+    'get_project_users': [PROJECT],
+    'get_project_mentors': [PROJECT],
+    'get_work_stages_by_project_id': [PROJECT],
+    'update_work_stages': [models(cm.WorkStage)],
+
+    'get_role_by_user_id': [WS],
+    'get_permissions_mask': [WS],
+    'get_role_by_id_workspace': [WS],
+    'get_roles_by_id': [ids(cm.WSRole)],
+    'add_ws_roles': [NEW_MODELS],
+    'update_ws_roles': [models(cm.WSRole)],
+    'add_workspace_users': [WS],  # Участники (глобальная БД) и их роли (шард)
+    'delete_workspace_users': [WS],
+
+    'get_ws_task_statuses_by_id': [ids(cm.WSTaskStatus)],
+    'get_ws_task_statuses_by_workspace': [WS],
+    'add_ws_task_statuses': [NEW_MODELS],
+    'update_ws_task_statuses': [models(cm.WSTaskStatus)],
+    'delete_ws_task_statuses': [ids(cm.WSTaskStatus)],
+    'get_ws_task_tags_by_id': [ids(cm.WSTaskTag)],
+    'get_ws_task_tags_by_workspace': [WS],
+    'add_ws_task_tags': [NEW_MODELS],
+    'update_ws_task_tags': [models(cm.WSTaskTag)],
+    'delete_ws_task_tags': [ids(cm.WSTaskTag)],
+
+    'rebuild_analytics_rollup': [Route('workspace_ids')],
+    'get_analytics_rollup': [Route('scope_id', rollup_scope_table)],
+    'get_workspace_tasks_analytics': [WS],
+    'get_project_tasks_analytics': [PROJECT],
+    'get_workspace_stages_distribution': [WS],
+    'search_workspace': [WS],
+    'export_workspace': [WS],
+    'get_import_references': [WS],
+}
+GLOBAL_METHODS = frozenset({
+    'get_users_by_username', 'get_users_by_email', 'get_users_by_id', 'get_user_hashed_password', 'add_users',
+    'update_users', 'delete_users', 'search_users', 'get_days_no_break',
+    'get_workspaces', 'add_workspaces', 'update_workspaces', 'delete_workspaces', 'get_workspace_default_role_id',
+    'add_workspace_user', 'delete_workspace_user', 'get_workspace_users', 'is_workspace_member',
+    'get_personal_tasks_by_id', 'add_personal_tasks', 'update_personal_tasks', 'delete_personal_tasks',
+    'get_personal_task_events_by_user', 'get_personal_daily_events_by_id', 'add_personal_daily_events',
+    'update_personal_daily_events', 'delete_personal_daily_events', 'get_personal_many_days_events_by_id',
+    'add_personal_many_days_events', 'update_personal_many_days_events', 'delete_personal_many_days_events',
+    'get_personal_task_statuses_by_id', 'get_personal_task_statuses_by_user', 'add_personal_task_statuses',
+    'update_personal_task_statuses', 'delete_personal_task_statuses', 'get_personal_task_tags_by_id',
+    'get_personal_task_tags_by_user', 'add_personal_task_tags', 'update_personal_task_tags',
+    'delete_personal_task_tags', 'unit_of_work', 'get_permission_ids',
+    'get_agenda'  # Задачи и мероприятия РП - через временные представления шардов глобальной БД
+})
+
+
+class ShardedRepository(DataRepository):
+    """
+    Репозиторий шардированной БД. Методы ROUTES выполняются в шарде РП или объектов из аргументов (если объекты в
+    разных шардах - в каждом шарде для его объектов), при отсутствии аргумента - во всех шардах (чтение - параллельно);
+    остальные методы - в глобальной БД. Результаты нескольких шардов объединяются: записи RepoSelectResponse
+    упорядочиваются по ID, пагинация (limit, offset, after_id) применяется к объединённому результату.
+
+    Единица работы (unit_of_work) охватывает глобальную БД и шарды, к которым обращаются её методы (см.
+    ShardedRepository.unit_of_work).
+
+    :param global_session_maker: Фабрика сессий глобальной БД.
+    :param shard_session_makers: Фабрики сессий шардов (номер шарда - индекс).
+    :param write_dispatch: Запись через очереди записи (по одной на БД, см. server.database.write_dispatcher).
+    """
+
+    def __init__(self, global_session_maker: sessionmaker, shard_session_makers: tp.Sequence[sessionmaker],
+                 write_dispatch: bool = False):
+        super().__init__(global_session_maker,
+                         write_dispatcher=WriteDispatcher(global_session_maker) if write_dispatch else None)
+        self._shards = [
+            DataRepository(session_maker, write_dispatcher=WriteDispatcher(session_maker, name=f'shard-{shard}-writer')
+                           if write_dispatch else None)
+            for shard, session_maker in enumerate(shard_session_makers)
+        ]
+        self._executor = ThreadPoolExecutor(min(len(self._shards), MAX_FANOUT_THREADS), thread_name_prefix='shard')
+        self._uow_shard_sessions: dict[int, Session] | None = None  # Сессии шардов единицы работы: {шард: сессия}
+        self._directory: dict[tuple[str, int], int | None] = {}  # Кэш shard_directory
+        with global_session_maker() as session:
+            self._has_directory = sqla_inspect(session.connection()).has_table(shard_directory.name)
+
+    @property
+    def shards_num(self) -> int:
+        return len(self._shards)
+
+    def for_workspace(self, workspace_id: int) -> DataRepository:
+        """Возвращает репозиторий шарда РП (внутри единицы работы - работающий в её сессии шарда)."""
+        return self._get_shard(workspace_id % self.shards_num)
+
+    @contextmanager
+    def unit_of_work(self) -> tp.Iterator['ShardedRepository']:
+        """
+        Единица работы шардированной БД: методы глобальной БД выполняются в её транзакции, методы ROUTES - в
+        транзакциях шардов, которые открываются при первом обращении к шарду (одна сессия на шард). При выходе из блока
+        транзакции фиксируются: сначала шарды, затем глобальная БД; при исключении в блоке откатываются все.
+
+        Фиксация нескольких файлов БД не атомарна: если фиксация не удалась после фиксации других шардов, их изменения
+        остаются. Порядок фиксации оставляет в этом случае объекты РП без строки РП в глобальной БД, но не РП без его
+        ролей и статусов.
+        """
+        if self._uow_session is not None:
+            yield self
+            return
+        shard_sessions: dict[int, Session] = {}
+        try:
+            with super().unit_of_work() as uow:
+                uow._uow_shard_sessions = shard_sessions
+                yield uow
+                for session in shard_sessions.values():  # До фиксации глобальной БД при выходе из её единицы работы
+                    session.commit()
+        finally:
+            for session in shard_sessions.values():  # Незафиксированные транзакции откатываются
+                session.close()
+
+    def _get_shard(self, shard: int) -> DataRepository:
+        """Возвращает репозиторий шарда shard, внутри единицы работы - работающий в её сессии шарда."""
+        if self._uow_shard_sessions is None:
+            return self._shards[shard]
+        session = self._uow_shard_sessions.get(shard)
+        if session is None:
+            session = self._shards[shard]._session_maker()
+            session.begin()
+            self._uow_shard_sessions[shard] = session
+            connection = session.connection()
+            # Драйвер sqlite3 не начинает транзакцию перед SAVEPOINT и SELECT (см. RequestScope.get_write_session).
+            # Не BEGIN IMMEDIATE: он блокирует и подключённую глобальную БД, изменяемую сессией единицы работы
+            if connection.dialect.name == 'sqlite' and not connection.connection.driver_connection.in_transaction:
+                connection.exec_driver_sql('BEGIN')
+        return self._shards[shard]._bind(session)
+
+    def get_shards(self, table: str, keys: tp.Iterable) -> dict[tp.Any, int | None]:
+        """Возвращает шарды РП (table = WORKSPACE) или объектов таблицы table: {ID: шард или None, если неизвестен}."""
+        shards, legacy = {}, []
+        for key in keys:
+            try:
+                id_ = int(key)
+            except (TypeError, ValueError):
+                shards[key] = None
+                continue
+            if table == WORKSPACE:
+                shards[key] = id_ % self.shards_num
+            elif id_ >= ID_SPAN:
+                shard = id_ // ID_SPAN - 1
+                shards[key] = shard if shard < self.shards_num else None
+            elif (table, id_) in self._directory:
+                shards[key] = self._directory[(table, id_)]
+            else:
+                legacy.append(key)
+
+        if legacy:
+            found = {}
+            if self._has_directory:
+                with self._session_maker() as session:
+                    found = dict(session.execute(
+                        select(shard_directory.c.object_id, shard_directory.c.shard).where(
+                            shard_directory.c.table_name == table,
+                            shard_directory.c.object_id.in_({int(key) for key in legacy}))
+                    ).all())
+            if len(self._directory) > DIRECTORY_CACHE_SIZE:
+                self._directory.clear()
+            for key in legacy:
+                shards[key] = self._directory[(table, int(key))] = found.get(int(key))
+        return shards
+
+    def _split(self, route: Route, arguments: dict) -> dict[int, tuple[tp.Any, list[int]]] | None:
+        """
+        Делит значение аргумента маршрута по шардам: {шард: (значение для шарда, позиции элементов)}. None - аргумента
+        нет.
+        """
+        value = arguments.get(route.arg)
+        if value is None or (not isinstance(value, (int, str)) and not value):
+            return None
+        table = route.table(arguments) if callable(route.table) else route.table
+        if isinstance(value, (int, str)):
+            shard = self.get_shards(table, [value])[value]
+            return {shard if shard is not None else 0: (value, [0])}
+
+        items = list(value)
+        keys = [item.get(route.field) if route.field else item for item in items]
+        if route.field and any(key is None for key in keys):
+            raise BaseRepoException.get_no_required_param_error(route.field)
+        shards = self.get_shards(table, set(keys))
+        groups = {}
+        for position, (item, key) in enumerate(zip(items, keys)):
+            if shards[key] is None:  # Неизвестный объект: запрос к любому шарду вернёт пустой результат
+                continue
+            group = groups.setdefault(shards[key], ([], []))
+            group[0].append(item)
+            group[1].append(position)
+        return groups or {0: (items, list(range(len(items))))}
+
+    def _call_routed(self, name: str, routes: list[Route], arguments: dict):
+        for route in routes:
+            groups = self._split(route, arguments)
+            if groups is not None:
+                break
+        else:
+            route, groups = None, {shard: (None, None) for shard in range(self.shards_num)}
+
+        calls = {shard: arguments if route is None else {**arguments, route.arg: value}
+                 for shard, (value, _) in groups.items()}
+        if len(calls) == 1:
+            shard, shard_arguments = next(iter(calls.items()))
+            return getattr(self._get_shard(shard), name)(**shard_arguments)
+
+        offset, limit = arguments.get('offset') or 0, arguments.get('limit')
+        if limit is not None and arguments.get('after_id') is None:  # Страница из первых offset + limit записей шардов
+            calls = {shard: {**shard_arguments, 'limit': offset + limit, 'offset': 0}
+                     for shard, shard_arguments in calls.items()}
+        elif 'offset' in arguments:
+            calls = {shard: {**shard_arguments, 'offset': 0} for shard, shard_arguments in calls.items()}
+        if name.startswith(READ_PREFIXES):
+            futures = {shard: self._executor.submit(getattr(self._get_shard(shard), name), **shard_arguments)
+                       for shard, shard_arguments in calls.items()}
+            results = {shard: future.result() for shard, future in futures.items()}
+        else:  # Десериализация изменений использует общие для потоков схемы marshmallow (schema.sqla_session)
+            results = {shard: getattr(self._get_shard(shard), name)(**shard_arguments)
+                       for shard, shard_arguments in calls.items()}
+        return merge_results(results, {shard: positions for shard, (_, positions) in groups.items()}, arguments)
+
+
+def get_record_id(record) -> int:
+    return record[DBFields.id] if isinstance(record, dict) else record.id
+
+
+def merge_results(results: dict[int, tp.Any], positions: dict[int, list[int] | None], arguments: dict):
+    """Объединяет результаты метода в нескольких шардах."""
+    values = list(results.values())
+    first = next((value for value in values if value is not None), None)
+    if first is None:
+        return None
+    if isinstance(first, RepoInsertResponse):
+        if any(positions[shard] is None for shard in results):
+            return RepoInsertResponse(ids=[id_ for value in values for id_ in value.ids])
+        ids_ = [None] * sum(len(shard_positions) for shard_positions in positions.values())
+        for shard, value in results.items():
+            for position, id_ in zip(positions[shard], value.ids):
+                ids_[position] = id_
+        return RepoInsertResponse(ids=ids_)
+    if isinstance(first, RepoBulkInsertResponse):  # Строки - в порядке переданных моделей
+        ids_, errors = [None] * sum(len(shard_positions) for shard_positions in positions.values()), {}
+        for shard, value in results.items():
+            for position, id_ in zip(positions[shard], value.ids):
+                ids_[position] = id_
+            errors.update({positions[shard][num]: message for num, message in value.errors.items()})
+        return RepoBulkInsertResponse(ids=ids_, errors=dict(sorted(errors.items())))
+    if isinstance(first, bool):
+        return any(values)
+    if isinstance(first, int):
+        return sum(values)
+    if isinstance(first, (list, tuple)):
+        return type(first)(item for value in values for item in value)
+    if isinstance(first, dict):
+        merged = {}
+        for value in values:
+            merged.update(value)
+        return merged
+    if not isinstance(first, RepoSelectResponse):
+        raise TypeError(f'Results of type {type(first)} can not be merged.')
+
+    records = sorted((record for value in values for record in value.content), key=get_record_id)
+    offset, limit, after_id = arguments.get('offset') or 0, arguments.get('limit'), arguments.get('after_id')
+    if after_id is not None:
+        page = records if limit is None else records[:limit]
+        return RepoSelectResponse(content=page, last_record_num=None,
+                                  records_left=sum(value.records_left for value in values) + len(records) - len(page),
+                                  last_id=get_record_id(page[-1]) if page else None)
+
+    page = records[offset:] if limit is None else records[offset:offset + limit]
+    if all(value.last_record_num is None for value in values):
+        return RepoSelectResponse(content=page)
+    total = sum((value.last_record_num or 0) + value.records_left for value in values)
+    last_record_num = offset + len(page)
+    return RepoSelectResponse(content=page, last_record_num=last_record_num,
+                              records_left=max(total - last_record_num, 0))
+
+
+def routed(name: str, routes: list[Route]) -> tp.Callable:
+    method = getattr(DataRepository, name)
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self: ShardedRepository, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs)
+        arguments.apply_defaults()
+        return self._call_routed(name, routes, {key: value for key, value in arguments.arguments.items()
+                                                if key != 'self'})
+
+    return wrapper
+
+
+for _name, _routes in ROUTES.items():
+    setattr(ShardedRepository, _name, routed(_name, _routes))
@@ -0,0 +1,129 @@
+"""
+Очередь записи: все изменяющие операции репозитория выполняются одним потоком-писателем (по одному на БД), который
+объединяет накопившиеся в очереди операции в одну транзакцию (group commit).
+
+SQLite допускает одного писателя: потоки, пишущие через отдельные сессии, ждут блокировку файла (busy_timeout) или
+получают "database is locked", а каждая транзакция заканчивается отдельной фиксацией. Писатель берёт блокировку записи
+один раз на группу (BEGIN IMMEDIATE), выполняет каждую операцию группы в точке сохранения (SAVEPOINT) - ошибка
+операции откатывает только её - и фиксирует группу одним COMMIT. Вызывающий поток ждёт результат операции на
+Future, результат передаётся после фиксации группы.
+"""
+import queue
+import threading
+import typing as tp
+from concurrent.futures import Future
+
+from sqlalchemy.orm.session import sessionmaker, Session
+
+from common.logger import config_logger, SERVER
+from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LEVEL
+
+logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
+
+T = tp.TypeVar('T')
+
+
+class WriteJob:
+    """Операция записи в очереди: функция от сессии группы и Future её результата."""
+
+    def __init__(self, function: tp.Callable[[Session], tp.Any], exclusive: bool):
+        self.function = function
+        self.exclusive = exclusive
+        self.future = Future()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class WriteDispatcher:
+    """
+    Поток-писатель с очередью операций записи.
+
+    :param session_maker: Фабрика сессий БД, в которую пишет поток.
+    :param max_batch: Максимальное число операций в одной транзакции.
+    :param name: Имя потока-писателя.
+    """
+
+    def __init__(self, session_maker: sessionmaker, max_batch: int = 64, name: str = 'repository-writer'):
+        self._session_maker = session_maker
+        self._max_batch = max_batch
+        self._queue: queue.Queue[WriteJob | None] = queue.Queue()
+        self._next_job: WriteJob | None = None  # Монопольная операция, прервавшая набор группы
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def in_writer(self) -> bool:
+        """Выполняется ли текущий код в потоке-писателе."""
+        return threading.current_thread() is self._thread
+
+    def submit(self, function: tp.Callable[[Session], T], exclusive: bool = False) -> 'Future[T]':
+        """
+        Ставит операцию в очередь. function выполняется в потоке-писателе с сессией группы и не должна фиксировать
+        транзакцию. Монопольная (exclusive) операция (массовое изменение) выполняется в отдельной транзакции.
+        """
+        if not self._thread.is_alive():
+            raise RuntimeError('Write dispatcher is closed.')
+        job = WriteJob(function, exclusive)
+        self._queue.put(job)
+        return job.future
+
+    def execute(self, function: tp.Callable[[Session], T], exclusive: bool = False) -> T:
+        """Выполняет операцию через очередь и возвращает её результат (исключение операции пробрасывается)."""
+        return self.submit(function, exclusive).result()
+
+    def close(self):
+        """Выполняет операции, уже поставленные в очередь, и останавливает поток-писатель."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            batch = self._get_batch()
+            if not batch:
+                return
+            self._execute_batch(batch)
+
+    def _get_batch(self) -> list[WriteJob]:
+        """Ждёт операцию и добирает к ней уже ожидающие в очереди. Пустой список - поток остановлен."""
+        job, self._next_job = self._next_job or self._queue.get(), None
+        if job is None:
+            return []
+        batch = [job]
+        while not job.exclusive and len(batch) < self._max_batch:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:  # Остановка - после группы
+                self._queue.put(None)
+                break
+            if job.exclusive:
+                self._next_job = job
+                break
+            batch.append(job)
+        return [job for job in batch if job.future.set_running_or_notify_cancel()]
+
+    def _execute_batch(self, batch: list[WriteJob]):
+        try:
+            with self._session_maker() as session, session.begin():
+                if session.get_bind().dialect.name == 'sqlite':  # Блокировка записи - сразу, SAVEPOINT - внутри
+                    session.connection().exec_driver_sql('BEGIN IMMEDIATE')
+                for job in batch:
+                    try:
+                        with session.begin_nested():
+                            job.result = job.function(session)
+                    except Exception as e:
+                        job.error = e
+        except Exception as e:  # Ошибка фиксации: операции повторяются по одной, чтобы найти ошибочную
+            if len(batch) > 1:
+                logger.warning(f'Group commit of {len(batch)} writes has failed: {e}. Retrying one by one.')
+                for job in batch:
+                    job.result, job.error = None, None
+                    self._execute_batch([job])
+                return
+            batch[0].error = e
+
+        for job in batch:
+            if job.error is not None:
+                job.future.set_exception(job.error)
+            else:
+                job.future.set_result(job.result)
@@ -1,17 +1,62 @@
-"""Файл запуска сервера в производственном окружении."""
+"""
+Файл запуска сервера в производственном окружении.
+
+По умолчанию сервер работает в одном процессе waitress. С --workers N > 1 запускается многопроцессный режим
+(server.api.prefork): N рабочих процессов на одном сокете, плавный перезапуск по SIGHUP.
+"""
 from waitress import serve
 
+import argparse
 import threading
 import os
 from pathlib import Path
 
 from common_utils.log_utils.memory_logger import check_memory
-os.chdir('api')
-from server.api.routes import app
 
-thread = threading.Thread(target=check_memory, args=[Path('../../log/memory_server.txt')], daemon=True)
-thread.start()
+APP_PATH = 'server.api.routes:app'
+
+
+def migrate():
+    """Приводит схему БД к актуальной версии до запуска рабочих процессов (иначе их миграции конкурируют)."""
+    from common.base import project_root
+    from server.data_const import Config
+    from server.database.models.db_utils import launch_db
+    from server.database.sharding import launch_sharded_db
+
+    config = Config(Path(project_root() / "server" / "config.json"))
+    if config.shards:
+        global_engine, shard_engines = launch_sharded_db(config.database_path, config.shards, config.db_profile)
+        for engine in [global_engine, *shard_engines]:
+            engine.dispose()
+    else:
+        launch_db(config.database_path, config.db_profile).dispose()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Запуск сервера.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help='Число рабочих процессов (обычно - число ядер).')
+    parser.add_argument('--threads', type=int, default=8, help='Число потоков обработки запросов в процессе.')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    os.chdir('api')
+
+    if args.workers > 1:
+        from server.api.prefork import PreforkServer
+
+        PreforkServer(APP_PATH, args.host, args.port, args.workers, args.threads, on_start=migrate).run()
+    else:
+        from server.api.routes import app
+
+        thread = threading.Thread(target=check_memory, args=[Path('../../log/memory_server.txt')], daemon=True)
+        thread.start()
 
-serve(app, host='127.0.0.1', port=8080, threads=8)
+        serve(app, host=args.host, port=args.port, threads=args.threads)
 
 
+if __name__ == '__main__':  # Модуль импортируется процессами хеширования паролей (spawn)
+    main()
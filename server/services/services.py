@@ -1,7 +1,11 @@
 """Сервисы."""
+import datetime
+import itertools
+import typing as tp
+from dataclasses import dataclass
 
 from common.base import CommonStruct, DBFields, get_datetime_now, TasksStatuses, WorkStages
-from server.database.repository import DataRepository
+from server.database.repository import DataRepository, RepoTasksAnalytics, RepoImportReferences
 from server.data_const import DataStruct, DBStruct, Permissions
 import server.services.exceptions as err
 from common.logger import config_logger, SERVER
@@ -16,6 +20,23 @@ class BaseService:
     pass
 
 
+def check_permission(authorizer, user_id: int, permission: Permissions, workspace_ids: tp.Iterable[int]):
+    """Проверяет разрешение пользователя во всех РП workspace_ids. Если нет хотя бы в одном - AccessDenied."""
+    for workspace_id in set(workspace_ids):
+        if not authorizer.check_permissions(user_id, permission.value, workspace_id):
+            raise err.AccessDenied(f'Your role can\'t {permission.value}')
+
+
+def get_projects_workspaces(project_ids: tp.Iterable[int], repo: DataRepository) -> list[int]:
+    """Возвращает ID РП проектов project_ids. Если какого-то проекта нет - IncorrectParamError."""
+    project_ids = set(project_ids)
+    projects = repo.get_projects(list(project_ids)).content
+    missing = project_ids - {project.get(DBFields.id) for project in projects}
+    if missing:
+        raise err.IncorrectParamError('project', f'Projects with ids {sorted(missing)} not found')
+    return [project.get(DBFields.workspace) for project in projects]
+
+
 class UserService(BaseService):
 
     def get_days_no_break(self, repo: DataRepository, user_id: int):
@@ -28,63 +49,34 @@ class WorkspaceService(BaseService):
         pass
 
     @staticmethod
-    def add_users(user_ids: tuple[int, ...], workspace_id: int, repo: DataRepository):
+    def add_users(user_ids: tuple[int, ...], workspace_id: int, repo: DataRepository) -> int:
         """
-        Добавляет пользователя в РП. Устанавливает ему стандартную роль. Пользователи, уже имеющиеся в РП, добавлены
-        не будут. (Исключений при этом не вызывается)
+        Добавляет пользователей в РП. Устанавливает им стандартную роль. Пользователи, уже имеющиеся в РП, добавлены
+        не будут. (Исключений при этом не вызывается). Изменяются только строки добавляемых пользователей в
+        workspace_user и user_ws_role. Возвращает число добавленных пользователей.
         """
         default_role_id = repo.get_workspace_default_role_id(workspace_id)  # ID стандартной роли
         if not default_role_id:
             raise err.IncorrectParamError('workspace', f'There is no default role in this Workspace: ws_id: {workspace_id}')
 
-        content = repo.get_roles_by_id([default_role_id]).content
-        if not content:
-            raise err.IncorrectParamError('workspace', f'There is no role with default role id: {default_role_id}')
-        default_role = content[0]
-
-        workspace_content = repo.get_workspaces([workspace_id]).content
-        if not workspace_content:
-            raise err.IncorrectParamError('workspace', f'There is no workspace with id {workspace_id}')
-        workspace = workspace_content[0]
-
-        role_users = set(default_role[DBFields.users])  # Добавляем пользователей в роль
-        role_users.update(user_ids)
-        default_role[DBFields.users] = list(role_users)
-
-        workspace_users = set(workspace[DBFields.users])  # Добавляем пользователей в РП
-        workspace_users.update(user_ids)
-        workspace[DBFields.users] = list(workspace_users)
-
-        repo.update_ws_roles([default_role])  # Отправляем в БД
-        repo.update_workspaces([workspace])
+        return repo.add_workspace_users(workspace_id, user_ids, default_role_id)
 
     @staticmethod
-    def delete_users(workspace_id: int, users_ids: tuple[int], repo: DataRepository):  # ToDo: удаление из всех связанных с РП сущностями
-        workspace_content = repo.get_workspaces([workspace_id]).content
-        if not workspace_content:
-            raise err.IncorrectParamError('workspace', f'There is no workspace with id {workspace_id}')
-        workspace = workspace_content[0]
-
-        default_role_id = workspace.get(DBFields.default_role_id)
-        default_role_content = repo.get_roles_by_id([default_role_id]).content
-        if not default_role_content:
-            logger.error(f'There is no role with default role id: {default_role_id}. Workspace: {workspace}.'
-                          f' (Excepting during deleting_users from workspace)')
-            raise err.IncorrectParamError('workspace', f'There is no role with default role id: {default_role_id}')
-        default_role = default_role_content[0]
-
-        for user_id in users_ids:
-            if user_id in workspace[DBFields.users]:  # Удаление из РП
-                workspace[DBFields.users].remove(user_id)
-            if user_id in default_role[DBFields.users]:  # Удаление из роли
-                default_role[DBFields.users].remove(user_id)
-        repo.update_workspaces([workspace])
-        repo.update_ws_roles([default_role])
+    def delete_users(workspace_id: int, users_ids: tuple[int], repo: DataRepository) -> int:  # ToDo: удаление из всех связанных с РП сущностями
+        """
+        Удаляет пользователей из РП и из всех его ролей. Изменяются только строки удаляемых пользователей в
+        workspace_user и user_ws_role. Возвращает число удалённых пользователей.
+        """
+        with repo.unit_of_work() as uow:
+            if not uow.get_workspaces([workspace_id]).content:
+                raise err.IncorrectParamError('workspace', f'There is no workspace with id {workspace_id}')
+            return uow.delete_workspace_users(workspace_id, users_ids)
 
     @staticmethod
     def create(workspace: dict, user_id: int, repo: DataRepository, authorizer) -> int:
         """
-        Создаёт РП. Добавляет туда пользователя с id = user_id и присваивает ему роль создателя (creator role).
+        Создаёт РП. Добавляет туда пользователя с id = user_id и присваивает ему роль создателя (creator role) со
+        всеми разрешениями.
         Создаёт creator role и default role в РП.
         Создаёт стандартные статусы задач в РП (Запланировано, Выполнено, В работе, Проверяется, Доработать).
         Возвращает ID созданной модели Workspace в БД.
@@ -101,56 +93,57 @@ class WorkspaceService(BaseService):
         # Обновляем поля workspace
         workspace[DBFields.users] = [user_id]
         workspace[DBFields.creator_id] = user_id
-        result = repo.add_workspaces([workspace])  # Вносим РП в БД
-        workspace_id = result.ids[0]
-        workspace = repo.get_workspaces([workspace_id]).content[0]  # Получаем РП (чтобы узнать ID)
-
-        default_role = {DBFields.name: DBStruct.default_role, DBFields.workspace_id: workspace_id}
-        creator_role = {DBFields.name: DBStruct.creator_role, DBFields.workspace_id: workspace_id}
-
-        result = repo.add_ws_roles([default_role, creator_role])
-        default_role_id = result.ids[0]
-        creator_role_id = result.ids[1]
-
-        workspace[DBFields.default_role_id] = default_role_id
-        creator_role = repo.get_roles_by_id([creator_role_id]).content[0]
-        creator_role[DBFields.users] = [user_id]
-
-        # Создаём стандартные статусы задач
-        task_statuses = [
-            {DBFields.name: TasksStatuses.planned_name, DBFields.workspace_id: workspace_id},
-            {DBFields.name: TasksStatuses.in_work_name, DBFields.workspace_id: workspace_id},
-            {DBFields.name: TasksStatuses.on_check_name, DBFields.workspace_id: workspace_id},
-            {DBFields.name: TasksStatuses.completed_name, DBFields.workspace_id: workspace_id},
-            {DBFields.name: TasksStatuses.to_rework_name, DBFields.workspace_id: workspace_id},
-        ]
-        result = repo.add_ws_task_statuses(task_statuses)
-
-        # Получаем ID статусов и устанавливаем default и completed
-        status_ids = result.ids
-        workspace[DBFields.default_task_status_id] = status_ids[0]  # Запланировано
-        workspace[DBFields.completed_task_status_id] = status_ids[3]  # Выполнено
-
-        repo.update_workspaces([workspace])  # Обновляем РП и роли
-        repo.update_ws_roles([creator_role])
+
+        with repo.unit_of_work() as uow:  # Одна транзакция: ID новых моделей известны после flush, без повторных запросов
+            workspace_id = uow.add_workspaces([workspace]).ids[0]  # Вносим РП в БД
+
+            default_role = {DBFields.name: DBStruct.default_role, DBFields.workspace_id: workspace_id}
+            creator_role = {DBFields.name: DBStruct.creator_role, DBFields.workspace_id: workspace_id,
+                            DBFields.users: [user_id], DBFields.permissions: list(uow.get_permission_ids().values())}
+            default_role_id = uow.add_ws_roles([default_role, creator_role]).ids[0]
+
+            # Создаём стандартные статусы задач
+            task_statuses = [
+                {DBFields.name: TasksStatuses.planned_name.value, DBFields.workspace_id: workspace_id},
+                {DBFields.name: TasksStatuses.in_work_name.value, DBFields.workspace_id: workspace_id},
+                {DBFields.name: TasksStatuses.on_check_name.value, DBFields.workspace_id: workspace_id},
+                {DBFields.name: TasksStatuses.completed_name.value, DBFields.workspace_id: workspace_id},
+                {DBFields.name: TasksStatuses.to_rework_name.value, DBFields.workspace_id: workspace_id},
+            ]
+            status_ids = uow.add_ws_task_statuses(task_statuses).ids
+
+            uow.update_workspaces([{  # Устанавливаем стандартную роль и статусы default и completed
+                DBFields.id: workspace_id,
+                DBFields.default_role_id: default_role_id,
+                DBFields.default_task_status_id: status_ids[0],  # Запланировано
+                DBFields.completed_task_status_id: status_ids[3]  # Выполнено
+            }])
 
         return workspace_id
 
     @staticmethod
     def add_user_to_workspace(user_id: int, workspace_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Добавляет пользователя в рабочее пространство."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.invite.value):
-            raise err.AccessDenied(f'Your role can\'t invite')
-
-        repo.add_workspace_user(user_id, workspace_id)
+        WorkspaceService.invite_users((user_id,), workspace_id, repo, authorizer, requesting_user_id)
 
     @staticmethod
     def delete_user_from_workspace(user_id: int, workspace_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Удаляет пользователя из рабочего пространства."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.kick.value):
-            raise err.AccessDenied(f'Your role can\'t kick')
+        WorkspaceService.kick_users((user_id,), workspace_id, repo, authorizer, requesting_user_id)
 
-        repo.delete_workspace_user(user_id, workspace_id)
+    @staticmethod
+    def invite_users(user_ids: tuple[int, ...], workspace_id: int, repo: DataRepository, authorizer,
+                     requesting_user_id: int) -> int:
+        """Добавляет пользователей в рабочее пространство со стандартной ролью. Возвращает число добавленных."""
+        check_permission(authorizer, requesting_user_id, Permissions.invite, [workspace_id])
+        return WorkspaceService.add_users(user_ids, workspace_id, repo)
+
+    @staticmethod
+    def kick_users(user_ids: tuple[int, ...], workspace_id: int, repo: DataRepository, authorizer,
+                   requesting_user_id: int) -> int:
+        """Удаляет пользователей из рабочего пространства и его ролей. Возвращает число удалённых."""
+        check_permission(authorizer, requesting_user_id, Permissions.kick, [workspace_id])
+        return WorkspaceService.delete_users(workspace_id, user_ids, repo)
 
     @staticmethod
     def get_user_role(user_id: int, workspace_id: int, repo: DataRepository) -> dict | None:
@@ -163,8 +156,7 @@ class WorkspaceService(BaseService):
     @staticmethod
     def set_user_role(user_id: int, workspace_id: int, role_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Устанавливает роль пользователю в рабочем пространстве."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.set_roles.value):
-            raise err.AccessDenied(f'Your role can\'t set_roles')
+        check_permission(authorizer, requesting_user_id, Permissions.set_roles, [workspace_id])
 
         # Проверяем, что роль существует и принадлежит этому workspace
         role_data = repo.get_role_by_id_workspace(role_id, workspace_id)
@@ -233,7 +225,7 @@ class WSTaskService(BaseService):
         workspace_id = project_data.content[0].get(DBFields.workspace)
 
         # Проверяем доступ к созданию задач
-        if not authorizer.check_permissions(user_id, Permissions.create_task.value):
+        if not authorizer.check_permissions(user_id, Permissions.create_task.value, workspace_id):
             role_data = repo.get_role_by_user_id(workspace_id, user_id)
             if role_data.content:
                 role_name = role_data.content[0].get(DBFields.name, 'unknown')
@@ -264,10 +256,7 @@ class WSTaskService(BaseService):
         Редактирует поля задач.
         Проверяет роль пользователя через authorizer перед обновлением.
         """
-        # Проверяем доступ к редактированию задач
-        if not authorizer.check_permissions(user_id, Permissions.edit_task.value):
-            raise err.AccessDenied(f'Your role can\'t edit_task')
-
+        workspace_ids = []
         for task in ws_tasks:
             task_id = task.get(DBFields.id)
             if not task_id:
@@ -277,9 +266,13 @@ class WSTaskService(BaseService):
             task_data = repo.get_ws_tasks([task_id])
             if not task_data.content:
                 raise err.IncorrectParamError('task', f'There is no task with id {task_id}')
+            workspace_ids.append(task_data.content[0].get(DBFields.workspace))
 
             task[DBFields.updated_at] = get_datetime_now()
 
+        # Проверяем доступ к редактированию задач в РП каждой задачи
+        check_permission(authorizer, user_id, Permissions.edit_task, workspace_ids)
+
         repo.update_ws_tasks(ws_tasks)
 
     @staticmethod
@@ -288,15 +281,16 @@ class WSTaskService(BaseService):
         Удаляет задачи по их ID.
         Проверяет роль пользователя через authorizer перед удалением.
         """
-        # Проверяем доступ к удалению задач
-        if not authorizer.check_permissions(user_id, Permissions.del_task.value):
-            raise err.AccessDenied(f'Your role can\'t del_task')
-
+        workspace_ids = []
         for task_id in task_ids:
             # Получаем задачу для проверки существования
             task_data = repo.get_ws_tasks([task_id])
             if not task_data.content:
                 raise err.IncorrectParamError('task', f'There is no task with id {task_id}')
+            workspace_ids.append(task_data.content[0].get(DBFields.workspace))
+
+        # Проверяем доступ к удалению задач в РП каждой задачи
+        check_permission(authorizer, user_id, Permissions.del_task, workspace_ids)
 
         repo.delete_ws_tasks_by_id(task_ids)
 
@@ -311,8 +305,7 @@ class ProjectService(BaseService):
         Возвращает ID созданного проекта.
         """
         # Проверяем доступ к созданию проектов
-        if not authorizer.check_permissions(user_id, Permissions.set_project.value):
-            raise err.AccessDenied(f'Your role can\'t set_project')
+        check_permission(authorizer, user_id, Permissions.set_project, [workspace_id])
 
         if DBFields.name not in project:
             raise err.IncorrectParamError('project', f'No name in project: {project}')
@@ -331,12 +324,10 @@ class ProjectService(BaseService):
     @staticmethod
     def update(project: dict, user_id: int, repo: DataRepository, authorizer):
         """Обновляет проект."""
-        if not authorizer.check_permissions(user_id, Permissions.set_project.value):
-            raise err.AccessDenied(f'Your role can\'t set_project')
-
         project_id = project.get(DBFields.id)
         if not project_id:
             raise err.IncorrectParamError('project', 'Project must have id field')
+        check_permission(authorizer, user_id, Permissions.set_project, get_projects_workspaces([project_id], repo))
 
         project[DBFields.updated_at] = get_datetime_now()
         print(project)
@@ -345,27 +336,17 @@ class ProjectService(BaseService):
     @staticmethod
     def delete(project_ids: tuple[int, ...], user_id: int, repo: DataRepository, authorizer):
         """Удаляет проекты по ID."""
-        if not authorizer.check_permissions(user_id, Permissions.del_project.value):
-            raise err.AccessDenied(f'Your role can\'t del_project')
+        check_permission(authorizer, user_id, Permissions.del_project, get_projects_workspaces(project_ids, repo))
 
         repo.delete_projects(project_ids)
 
     @staticmethod
     def add_student_to_project(user_id: int, project_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Добавляет студента в проект."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.invite.value):
-            raise err.AccessDenied(f'Your role can\'t invite')
+        workspace_id, = get_projects_workspaces([project_id], repo)
+        check_permission(authorizer, requesting_user_id, Permissions.invite, [workspace_id])
 
         # Проверяем, что пользователь не является студентом в другом проекте этого рабочего пространства
-        project_data = repo.get_projects([project_id])
-        if not project_data.content:
-            raise err.IncorrectParamError('project', f'Project with id {project_id} not found')
-
-        project = project_data.content[0]
-        workspace_id = project.get('workspace_id')
-
-        if not workspace_id:
-            raise err.IncorrectParamError('project', f'Project {project_id} has no workspace_id')
 
         # Получаем все проекты этого рабочего пространства
         workspace_projects = repo.get_projects_by_workspace_id(workspace_id)
@@ -385,38 +366,33 @@ class ProjectService(BaseService):
     @staticmethod
     def delete_student_from_project(user_id: int, project_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Удаляет студента из проекта."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.kick.value):
-            raise err.AccessDenied(f'Your role can\'t kick')
+        check_permission(authorizer, requesting_user_id, Permissions.kick, get_projects_workspaces([project_id], repo))
 
         repo.delete_project_user(user_id, project_id)
 
     @staticmethod
     def add_mentor_to_project(user_id: int, project_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Добавляет наставника в проект."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.invite.value):
-            raise err.AccessDenied(f'Your role can\'t invite')
+        check_permission(authorizer, requesting_user_id, Permissions.invite, get_projects_workspaces([project_id], repo))
 
         repo.add_project_user(user_id, project_id)
 
     @staticmethod
     def delete_mentor_from_project(user_id: int, project_id: int, repo: DataRepository, authorizer, requesting_user_id: int):
         """Удаляет наставника из проекта."""
-        if not authorizer.check_permissions(requesting_user_id, Permissions.kick.value):
-            raise err.AccessDenied(f'Your role can\'t kick')
+        check_permission(authorizer, requesting_user_id, Permissions.kick, get_projects_workspaces([project_id], repo))
 
         repo.delete_project_user(user_id, project_id)
 
     @staticmethod
     def get_stage(project_id: int, repo: DataRepository, authorizer, user_id: int) -> dict | None:
         """Получает текущий этап проекта."""
-        if not authorizer.check_permissions(user_id, Permissions.view_project.value):
-            raise err.AccessDenied(f'Your role can\'t view_project')
-
         project_data = repo.get_projects([project_id])
         if not project_data.content:
             raise err.IncorrectParamError('project', f'Project with id {project_id} not found')
 
         project = project_data.content[0]
+        check_permission(authorizer, user_id, Permissions.view, [project.get(DBFields.workspace)])
         current_stage_id = project.get(DBFields.current_stage_id)
 
         if current_stage_id:
@@ -434,8 +410,7 @@ class ProjectService(BaseService):
         stage_type - строковое значение из WorkStages enum (например, 'idea_generating').
         Возвращает ID нового этапа.
         """
-        if not authorizer.check_permissions(user_id, Permissions.set_project.value):
-            raise err.AccessDenied(f'Your role can\'t set_project')
+        check_permission(authorizer, user_id, Permissions.set_project, get_projects_workspaces([project_id], repo))
 
         # Проверяем, что stage_type валидный
         try:
@@ -443,48 +418,49 @@ class ProjectService(BaseService):
         except ValueError:
             raise err.IncorrectParamError('stage_type', f'Invalid stage type: {stage_type}. Valid values: {[s.value for s in WorkStages]}')
 
-        project_data = repo.get_projects([project_id])
-        if not project_data.content:
-            raise err.IncorrectParamError('project', f'Project with id {project_id} not found')
+        with repo.unit_of_work() as uow:  # Проект, этапы и обновление - в одной транзакции
+            project_data = uow.get_projects([project_id])
+            if not project_data.content:
+                raise err.IncorrectParamError('project', f'Project with id {project_id} not found')
 
-        # Получаем все этапы проекта
-        stages = repo.get_work_stages_by_project_id(project_id)
-        if not stages.content:
-            raise err.IncorrectParamError('stage', f'No stages found for project {project_id}')
+            # Получаем все этапы проекта
+            stages = uow.get_work_stages_by_project_id(project_id)
+            if not stages.content:
+                raise err.IncorrectParamError('stage', f'No stages found for project {project_id}')
 
-        # Ищем этап с нужным типом (по имени)
-        target_stage = None
-        for stage in stages.content:
-            stage_name = stage.get(DBFields.name)
-            # Сопоставляем название этапа с WorkStages
-            if stage_name == stage_enum.value.replace('_name', '') or \
-               stage_name == getattr(WorkStages, f'{stage_type}_name', None):
-                target_stage = stage
-                break
-
-        # Если не нашли по имени, ищем по соответствию с WorkStages названиями
-        if not target_stage:
-            stage_name_mapping = {
-                'idea_generating': WorkStages.idea_generating_name,
-                'thesis_proofing': WorkStages.thesis_proofing_name,
-                'solution_projecting': WorkStages.solution_projecting_name,
-                'development': WorkStages.development_name,
-                'testing': WorkStages.testing_name,
-                'results_preparation': WorkStages.results_preparation_name,
-            }
-            target_name = stage_name_mapping.get(stage_type)
-            if target_name:
-                for stage in stages.content:
-                    if stage.get(DBFields.name) == target_name:
-                        target_stage = stage
-                        break
-
-        if not target_stage:
-            raise err.IncorrectParamError('stage', f'Stage with type {stage_type} not found in project {project_id}')
-
-        # Обновляем проект с новым current_stage_id
-        target_stage_id = target_stage.get(DBFields.id)
-        repo.update_projects([{DBFields.id: project_id, DBFields.current_stage_id: target_stage_id}])
+            # Ищем этап с нужным типом (по имени)
+            target_stage = None
+            for stage in stages.content:
+                stage_name = stage.get(DBFields.name)
+                # Сопоставляем название этапа с WorkStages
+                if stage_name == stage_enum.value.replace('_name', '') or \
+                   stage_name == getattr(WorkStages, f'{stage_type}_name', None):
+                    target_stage = stage
+                    break
+
+            # Если не нашли по имени, ищем по соответствию с WorkStages названиями
+            if not target_stage:
+                stage_name_mapping = {
+                    'idea_generating': WorkStages.idea_generating_name,
+                    'thesis_proofing': WorkStages.thesis_proofing_name,
+                    'solution_projecting': WorkStages.solution_projecting_name,
+                    'development': WorkStages.development_name,
+                    'testing': WorkStages.testing_name,
+                    'results_preparation': WorkStages.results_preparation_name,
+                }
+                target_name = stage_name_mapping.get(stage_type)
+                if target_name:
+                    for stage in stages.content:
+                        if stage.get(DBFields.name) == target_name:
+                            target_stage = stage
+                            break
+
+            if not target_stage:
+                raise err.IncorrectParamError('stage', f'Stage with type {stage_type} not found in project {project_id}')
+
+            # Обновляем проект с новым current_stage_id
+            target_stage_id = target_stage.get(DBFields.id)
+            uow.update_projects([{DBFields.id: project_id, DBFields.current_stage_id: target_stage_id}])
 
         return target_stage_id
 
@@ -507,7 +483,15 @@ class ProjectService(BaseService):
 
 
 class AnalyticsService(BaseService):
-    """Сервис аналитики."""
+    """Сервис аналитики. Агрегаты вычисляются в БД (GROUP BY/JOIN), задачи и этапы не загружаются."""
+
+    @staticmethod
+    def _form_tasks_analytics(analytics: RepoTasksAnalytics) -> dict:
+        avg_tasks = round(analytics.total_tasks / analytics.members_num, 2) if analytics.members_num else 0.0
+        return {
+            'avg_tasks_per_user': avg_tasks,
+            'tasks_distribution': analytics.distribution
+        }
 
     @staticmethod
     def get_workspace_analytics(workspace_id: int, repo: DataRepository) -> dict:
@@ -517,61 +501,11 @@ class AnalyticsService(BaseService):
         - tasks_distribution: {email: количество задач}
         - stages_distribution: {название этапа: количество проектов}
         """
-        # Получаем задачи workspace (сериализованные словари)
-        tasks_response = repo.get_ws_tasks(ids=[], workspace_id=workspace_id)
-        tasks = tasks_response.content
-
-        # Получаем пользователей workspace
-        users_response = repo.get_workspace_users(workspace_id)
-        users = users_response.content
-        # Считаем распределение задач по исполнителям
-        distribution: dict[int, int] = {}
-        for task in tasks:
-            executor_id = task.get(DBFields.executor)
-            if executor_id is not None:
-                distribution[executor_id] = distribution.get(executor_id, 0) + 1
-
-        # Формируем ответ с email
-        tasks_distribution: dict[str, int] = {}
-        for user in users:
-            count = distribution.get(user.get(DBFields.id), 0)
-            if count > 0:
-                tasks_distribution[user.get(DBFields.email)] = count
-
-        total_tasks = sum(distribution.values())
-        avg_tasks = round(total_tasks / len(users), 2) if users else 0.0
-
-        # Получаем все проекты workspace
-        projects_response = repo.get_projects_by_workspace_id(workspace_id)
-        projects = projects_response.content
-        print(f'CSI: {projects}')
-        # Считаем распределение проектов по этапам
-        stages_distribution: dict[str, int] = {}
-
-        # Получаем все этапы для всех проектов этого workspace
-        # Сначала получаем все project_id из workspace
-
-        # Инициализируем счётчик для каждого проекта
-        for project in projects:
-            project_id = project.get(DBFields.id)
-            current_stage_id = project.get(DBFields.current_stage_id)
-
-            if current_stage_id:
-                # Получаем все этапы проекта и ищем текущий
-                stages = repo.get_work_stages_by_project_id(project_id)
-                for stage in stages.content:
-                    if stage.get(DBFields.id) == current_stage_id:
-                        stage_name = stage.get(DBFields.name, 'Не указан')
-                        stages_distribution[stage_name] = stages_distribution.get(stage_name, 0) + 1
-                        break
-
-        print(f'RESULT: {total_tasks} | {avg_tasks} | {users} \n| {tasks_distribution} | {distribution}')
-        print(f'Stages distribution: {stages_distribution}')
-        return {
-            'avg_tasks_per_user': avg_tasks,
-            'tasks_distribution': tasks_distribution,
-            'stages_distribution': stages_distribution
-        }
+        with repo.unit_of_work() as uow:  # Согласованный снимок данных
+            analytics = AnalyticsService._form_tasks_analytics(uow.get_workspace_tasks_analytics(workspace_id))
+            analytics['stages_distribution'] = uow.get_workspace_stages_distribution(workspace_id)
+
+        return analytics
 
     @staticmethod
     def get_project_analytics(project_id: int, repo: DataRepository) -> dict:
@@ -580,34 +514,203 @@ class AnalyticsService(BaseService):
         - avg_tasks_per_user: среднее число задач на участника проекта
         - tasks_distribution: {email: количество задач}
         """
-        # Получаем задачи проекта (сериализованные словари)
-        tasks_response = repo.get_ws_tasks(ids=[], project_id=project_id)
-        tasks = tasks_response.content
-
-        # Получаем пользователей проекта
-        users_response = repo.get_project_users(project_id)
-        users = users_response.content
-
-        # Считаем распределение
-        distribution: dict[int, int] = {}
-        for task in tasks:
-            executor_id = task.get(DBFields.executor)
-            if executor_id is not None:
-                distribution[executor_id] = distribution.get(executor_id, 0) + 1
-
-        tasks_distribution: dict[str, int] = {}
-        for user in users:
-            count = distribution.get(user.get(DBFields.id), 0)
-            if count > 0:
-                tasks_distribution[user.get(DBFields.email)] = count
-
-        total_tasks = sum(distribution.values())
-        avg_tasks = round(total_tasks / len(users), 2) if users else 0.0
+        return AnalyticsService._form_tasks_analytics(repo.get_project_tasks_analytics(project_id))
 
-        return {
-            'avg_tasks_per_user': avg_tasks,
-            'tasks_distribution': tasks_distribution
-        }
+
+
+def parse_text(max_length: int) -> tp.Callable[[tp.Any], str]:
+    def parse(value: tp.Any) -> str:
+        if not isinstance(value, str):
+            raise ValueError('must be a string')
+        if len(value) > max_length:
+            raise ValueError(f'must be at most {max_length} characters long')
+        return value
+    return parse
+
+
+def parse_id(value: tp.Any) -> int:
+    """ID объекта: целое число JSON или строка из цифр (ячейка CSV). Дробные и логические значения не приводятся."""
+    if isinstance(value, str) and value.isascii() and value.isdigit():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise ValueError('must be a positive integer')
+    return value
+
+
+def parse_iso(type_: tp.Type[datetime.date | datetime.time | datetime.datetime]) -> tp.Callable[[tp.Any], tp.Any]:
+    def parse(value: tp.Any):
+        if not isinstance(value, str):
+            raise ValueError('must be a string in ISO format')
+        try:
+            return type_.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f'must be a {type_.__name__} in ISO format')
+    return parse
+
+
+@dataclass(frozen=True)
+class ImportSpec:
+    """
+    Импортируемый тип объектов РП.
+
+    :param fields: Поля строки: {поле: функция преобразования значения (ValueError - значение невалидно)}.
+    :param required: Обязательные поля.
+    :param permission: Доступ, необходимый для импорта.
+    :param insert: Метод репозитория для массового добавления.
+    """
+    fields: dict[str, tp.Callable[[tp.Any], tp.Any]]
+    required: frozenset[str]
+    permission: Permissions
+    insert: str
+
+
+NAME = parse_text(CommonStruct.max_name_length)
+DESCRIPTION = parse_text(CommonStruct.max_description_length)
+IMPORT_SPECS = {
+    'ws_task': ImportSpec(
+        {DBFields.name: NAME, DBFields.description: DESCRIPTION, DBFields.plan_deadline: parse_iso(datetime.datetime),
+         DBFields.plan_start_work_date: parse_iso(datetime.datetime), DBFields.executor_email: parse_text(60),
+         DBFields.project_id: parse_id, DBFields.project: NAME, DBFields.status_id: parse_id,
+         DBFields.status: NAME},
+        frozenset({DBFields.name, DBFields.plan_deadline, DBFields.executor_email}),
+        Permissions.create_task, 'import_ws_tasks'
+    ),
+    'ws_daily_event': ImportSpec(
+        {DBFields.name: NAME, DBFields.description: DESCRIPTION, DBFields.date: parse_iso(datetime.date),
+         DBFields.time_start: parse_iso(datetime.time), DBFields.time_end: parse_iso(datetime.time)},
+        frozenset({DBFields.name, DBFields.date, DBFields.time_start, DBFields.time_end}),
+        Permissions.create_event, 'import_ws_daily_events'
+    ),
+    'ws_many_days_event': ImportSpec(
+        {DBFields.name: NAME, DBFields.description: DESCRIPTION, DBFields.datetime_start: parse_iso(datetime.datetime),
+         DBFields.datetime_end: parse_iso(datetime.datetime)},
+        frozenset({DBFields.name, DBFields.datetime_start, DBFields.datetime_end}),
+        Permissions.create_event, 'import_ws_many_days_events'
+    )
+}
+
+
+class ImportService(BaseService):
+    """
+    Массовый импорт задач и мероприятий РП. Строки обрабатываются пачками по DataStruct.import_chunk_size: строки
+    пачки проверяются, ссылки всех строк пачки (email исполнителей, проекты, статусы) получаются одним запросом на
+    вид ссылки, строки добавляются одним INSERT (executemany). Ошибочные строки пропускаются и попадают в отчёт,
+    остальные строки импортируются.
+    """
+
+    @staticmethod
+    def import_objects(rows: tp.Iterable[dict | ValueError], object_type: str, workspace_id: int, user_id: int,
+                       repo: DataRepository, authorizer) -> dict:
+        """
+        Импортирует строки rows (словари полей или ValueError - строку не удалось прочитать) как объекты типа
+        object_type (IMPORT_SPECS). Возвращает отчёт: {imported: <число импортированных строк>, failed: <число
+        ошибочных строк>, errors: [{row: <номер строки с 1>, message: <ошибка>}]} (не больше
+        DataStruct.max_import_errors ошибок).
+        """
+        spec = IMPORT_SPECS.get(object_type)
+        if spec is None:
+            raise err.IncorrectParamError(CommonStruct.object_type, f'Objects of type {object_type} can not be imported')
+        check_permission(authorizer, user_id, spec.permission, [workspace_id])
+
+        report = {CommonStruct.imported: 0, CommonStruct.failed: 0, CommonStruct.errors: []}
+        numbered_rows = enumerate(rows, 1)
+        while chunk := list(itertools.islice(numbered_rows, DataStruct.import_chunk_size)):
+            ImportService._import_chunk(chunk, spec, workspace_id, user_id, repo, report)
+        return report
+
+    @staticmethod
+    def _import_chunk(chunk: list[tuple[int, dict | ValueError]], spec: ImportSpec, workspace_id: int, user_id: int,
+                      repo: DataRepository, report: dict):
+        valid = []
+        for num, row in chunk:
+            try:
+                valid.append((num, ImportService._validate_row(row, spec)))
+            except ValueError as e:
+                ImportService._add_error(report, num, str(e))
+
+        if spec.insert == 'import_ws_tasks':
+            references = repo.get_import_references(
+                workspace_id,
+                emails=[row[DBFields.executor_email] for _, row in valid],
+                project_ids=[row[DBFields.project_id] for _, row in valid if DBFields.project_id in row],
+                project_names=[row[DBFields.project] for _, row in valid if DBFields.project in row],
+                status_ids=[row[DBFields.status_id] for _, row in valid if DBFields.status_id in row],
+                status_names=[row[DBFields.status] for _, row in valid if DBFields.status in row]
+            )
+            resolved = []
+            for num, row in valid:
+                try:
+                    resolved.append((num, ImportService._resolve_task(row, references)))
+                except ValueError as e:
+                    ImportService._add_error(report, num, str(e))
+            valid = resolved
+
+        now = get_datetime_now()
+        models = [{**row, DBFields.workspace_id: workspace_id, DBFields.creator_id: user_id, DBFields.created_at: now,
+                   DBFields.updated_at: now} for _, row in valid]
+        if spec.insert == 'import_ws_tasks':
+            for model in models:
+                model[DBFields.entrusted_id] = user_id
+        if not models:
+            return
+        response = getattr(repo, spec.insert)(models)
+        report[CommonStruct.imported] += len(models) - len(response.errors)
+        for position, message in response.errors.items():
+            ImportService._add_error(report, valid[position][0], message)
+
+    @staticmethod
+    def _validate_row(row: dict | ValueError, spec: ImportSpec) -> dict:
+        """Возвращает значения полей строки. Пустые значения (пустые ячейки CSV) не учитываются."""
+        if isinstance(row, ValueError):
+            raise row
+        if not isinstance(row, dict):
+            raise ValueError('Row must be an object')
+        unknown = set(row) - set(spec.fields)
+        if unknown:
+            raise ValueError(f'Unknown fields: {", ".join(sorted(map(str, unknown)))}')
+        values = {}
+        for field_name, value in row.items():
+            if value is None or value == '':
+                continue
+            try:
+                values[field_name] = spec.fields[field_name](value)
+            except (TypeError, ValueError) as e:
+                raise ValueError(f'{field_name}: {e}')
+        missing = spec.required - set(values)
+        if missing:
+            raise ValueError(f'Missing required fields: {", ".join(sorted(missing))}')
+        return values
+
+    @staticmethod
+    def _resolve_task(row: dict, references: RepoImportReferences) -> dict:
+        """Заменяет email исполнителя, проект и статус задачи (ID или название) их ID в РП."""
+        executor_id = references.users.get(row.pop(DBFields.executor_email))
+        if executor_id is None:
+            raise ValueError('executor_email: there is no workspace member with this email')
+        row[DBFields.executor_id] = executor_id
+
+        for id_field, name_field, ids, names in (
+                (DBFields.project_id, DBFields.project, references.project_ids, references.projects),
+                (DBFields.status_id, DBFields.status, references.status_ids, references.statuses)):
+            name = row.pop(name_field, None)
+            if id_field in row:
+                if row[id_field] not in ids:
+                    raise ValueError(f'{id_field}: there is no such object in the workspace')
+            elif name is not None:
+                if name not in names:
+                    raise ValueError(f'{name_field}: there is no such object in the workspace')
+                row[id_field] = names[name]
+            elif id_field == DBFields.status_id and references.default_status_id is not None:
+                row[id_field] = references.default_status_id
+            else:
+                raise ValueError(f'Missing required fields: {id_field} or {name_field}')
+        return row
+
+    @staticmethod
+    def _add_error(report: dict, num: int, message: str):
+        report[CommonStruct.failed] += 1
+        if len(report[CommonStruct.errors]) < DataStruct.max_import_errors:
+            report[CommonStruct.errors].append({CommonStruct.row: num, CommonStruct.message: message})
 
 
 if __name__ == '__main__':
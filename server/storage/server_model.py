@@ -1,8 +1,18 @@
 import jwt
 
+import hashlib
+import os
 import shelve
+import threading
+import time
 from pathlib import Path
 import typing as tp
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: многопроцессный режим (server.api.prefork) не поддерживается
+    fcntl = None
 
 from server.data_const import DataStruct
 
@@ -12,63 +22,242 @@ from server.api.base import LOG_DIR, MAX_FILE_SIZE, MAX_BACKUP_FILES, LOGGING_LE
 logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
 
 
+def hash_token(token_: str) -> str:
+    """Возвращает SHA-256-хэш токена, под которым он хранится в блеклисте."""
+    return hashlib.sha256(token_.encode('utf-8')).hexdigest()
+
+
+def get_token_expiration(token_: str) -> float | None:
+    """Возвращает время истечения токена (exp, unix time) без проверки подписи. Если его нет - None."""
+    try:
+        expiration = jwt.decode(token_, options={'verify_signature': False}).get('exp')
+    except jwt.InvalidTokenError:
+        return None
+    return float(expiration) if expiration is not None else None
+
+
 class Model:
+    """
+    Хранилище сервера (секрет и блеклист токенов). Секрет хранится в shelve-файле storage_path и держится в памяти.
+
+    Блеклист (отозванные токены) - append-only журнал <storage_path>_revoked.log со строками вида
+    "<exp>\t<SHA-256-хэш токена>" (exp = 0 - токен удалён из блеклиста). Добавление токена - запись одной строки в конец
+    журнала, O(1). В памяти держатся словарь {хэш: exp} (проверка наличия за O(1)) и индекс по времени истечения:
+    корзины {exp // EXPIRY_BUCKET: [хэши]}. Компактизация удаляет из памяти токены с истёкшим exp (просматриваются
+    только истёкшие корзины) и перезаписывает журнал живыми записями, поэтому размер блеклиста пропорционален числу
+    живых отозванных токенов. Компактизация выполняется в фоновом потоке раз в compaction_interval секунд (если
+    передан) или вызовом update_blacklist.
+
+    Блеклист согласован между процессами (рабочие процессы server.api.prefork): запись в журнал и компактизация
+    выполняются под межпроцессной блокировкой файла <storage_path>_revoked.lock, перед проверкой токена процесс
+    дочитывает строки, добавленные в журнал другими процессами, а после компактизации другим процессом (журнал
+    заменён новым файлом) - перечитывает журнал.
+
+    :param storage_path: Путь к shelve-файлу хранилища.
+    :param data_const: Константы сервера.
+    :param compaction_interval: Интервал (в сек.) фоновой компактизации блеклиста. Если None - фоновый поток не
+                                запускается.
+    """
 
-    def __init__(self, storage_path: Path, data_const: DataStruct = DataStruct()):
+    EXPIRY_BUCKET = 60  # Размер корзины индекса по времени истечения (сек.)
+
+    def __init__(self, storage_path: Path, data_const: DataStruct = DataStruct(), compaction_interval: float = None):
         self._storage_path = storage_path
+        self._log_path = Path(f'{storage_path}_revoked.log')
+        self._lock_path = Path(f'{storage_path}_revoked.lock')
         self._data_const = data_const
+        self._lock = threading.Lock()
+        self._blacklist: dict[str, float] = {}
+        self._expiry_index: dict[int, list[str]] = {}
+        self._log_records = 0  # Число строк в журнале
+        self._log_inode = None  # Файл журнала, прочитанный в память, и позиция, до которой он прочитан
+        self._read_position = 0
         self._validate()
 
+        with shelve.open(self._storage_path) as storage:
+            self._secret: str = storage.get(self._data_const.secret)
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._load_log()
+        self._migrate_legacy_blacklist()
+
+        if compaction_interval:
+            thread = threading.Thread(target=self._run_compaction, args=[compaction_interval], daemon=True)
+            thread.start()
+
     def _validate(self):
         """Проверяет и восстанавливает структуру хранилища."""
         with shelve.open(self._storage_path) as storage:
             if self._data_const.secret not in storage:
                 storage[self._data_const.secret] = ''
-            if self._data_const.blacklist not in storage:
-                storage[self._data_const.blacklist] = []
-                logger.warning(f'There is no "blacklist"-field in storage in: {self._storage_path}. The blank field added.')
-            if not isinstance(storage[self._data_const.blacklist], tp.Collection):
-                storage[self._data_const.blacklist] = []
-                logger.warning(f'There is incorrect type of "blacklist-field in storage in: {self._storage_path}. '
-                                f'Type: {type(storage[self._data_const.blacklist])}. It has been changed to blank field.')
             secret = storage.get(self._data_const.secret)
             if not secret:
                 logger.critical(f'There is no secret in storage: {self._storage_path}. Secret value: {secret}')
 
+    def _migrate_legacy_blacklist(self):
+        """Переносит блеклист старого формата (список токенов или словарь хэшей в shelve) в журнал."""
+        with shelve.open(self._storage_path) as storage:
+            legacy = storage.get(self._data_const.blacklist)
+            if legacy is None:
+                return
+            if isinstance(legacy, dict):
+                entries = legacy.items()
+            elif isinstance(legacy, tp.Collection) and not isinstance(legacy, str):
+                entries = [(hash_token(token_), get_token_expiration(token_)) for token_ in legacy]
+            else:
+                entries = []
+
+            now = time.time()
+            with self._lock, self._file_lock():
+                for token_hash, expiration in entries:
+                    if expiration and expiration > now:
+                        self._append(token_hash, expiration)
+            del storage[self._data_const.blacklist]
+            logger.warning(f'Blacklist from storage in: {self._storage_path} has been moved to: {self._log_path}.')
+
+    @contextmanager
+    def _file_lock(self):
+        """Межпроцессная блокировка журнала (вызывается под self._lock). Без fcntl - только блокировка потоков."""
+        if fcntl is None:
+            yield
+            return
+        with open(self._lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load_log(self):
+        """Восстанавливает блеклист в памяти из журнала, пропуская истёкшие и удалённые записи."""
+        self._blacklist.clear()
+        self._expiry_index.clear()
+        self._log_records = 0
+        self._log_inode = None
+        self._read_position = 0
+        self._sync()
+
+    def _sync(self):
+        """
+        Дочитывает строки, добавленные в журнал после последнего чтения (в т.ч. другими процессами). Если журнал
+        заменён компактизацией - перечитывает его (вызывается под self._lock).
+        """
+        try:
+            stat = os.stat(self._log_path)
+        except FileNotFoundError:
+            return
+        if self._log_inode is not None and stat.st_ino != self._log_inode:
+            self._load_log()
+            return
+        if self._log_inode is not None and stat.st_size <= self._read_position:
+            return
+
+        with open(self._log_path, 'rb') as file:
+            self._log_inode = os.fstat(file.fileno()).st_ino
+            file.seek(self._read_position)
+            data = file.read()
+        end = data.rfind(b'\n') + 1  # Незавершённая строка (запись в процессе) дочитывается позже
+        self._read_position += end
+
+        now = time.time()
+        for line in data[:end].decode('utf-8').splitlines():
+            self._log_records += 1
+            try:
+                expiration, token_hash = line.split()
+                expiration = float(expiration)
+            except ValueError:
+                logger.warning(f'Incorrect record in revocation log {self._log_path}: {line!r}')
+                continue
+            if expiration > now:
+                if self._blacklist.get(token_hash) != expiration:
+                    self._index(token_hash, expiration)
+            else:
+                self._blacklist.pop(token_hash, None)
+
+    def _index(self, token_hash: str, expiration: float):
+        self._blacklist[token_hash] = expiration
+        self._expiry_index.setdefault(int(expiration // self.EXPIRY_BUCKET), []).append(token_hash)
+
+    def _append(self, token_hash: str, expiration: float):
+        """
+        Записывает запись в конец журнала и дочитывает журнал вместе с ней (вызывается под self._lock и
+        self._file_lock).
+        """
+        if os.fstat(self._log.fileno()).st_ino != self._log_inode:  # Журнал заменён компактизацией другого процесса
+            self._log.close()
+            self._sync()
+            self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._log.write(f'{expiration:.0f}\t{token_hash}\n')
+        self._log.flush()
+        self._sync()
+
+    def _compact(self, now: float):
+        """
+        Удаляет из памяти токены с истёкшим временем жизни и перезаписывает журнал только живыми записями
+        (вызывается под self._lock и self._file_lock).
+        """
+        self._sync()
+        current_bucket = int(now // self.EXPIRY_BUCKET)
+        for bucket in [bucket for bucket in self._expiry_index if bucket <= current_bucket]:
+            hashes = self._expiry_index.pop(bucket)
+            for token_hash in hashes:
+                expiration = self._blacklist.get(token_hash)
+                if expiration is not None and expiration <= now:
+                    del self._blacklist[token_hash]
+                elif expiration is not None and int(expiration // self.EXPIRY_BUCKET) == bucket:
+                    self._expiry_index.setdefault(bucket, []).append(token_hash)  # Ещё не истёк
+
+        if self._log_records == len(self._blacklist):  # В журнале нет мёртвых записей
+            return
+        tmp_path = self._log_path.with_name(f'{self._log_path.name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.writelines(f'{expiration:.0f}\t{token_hash}\n' for token_hash, expiration in self._blacklist.items())
+        self._log.close()
+        os.replace(tmp_path, self._log_path)
+        self._log = open(self._log_path, 'a', encoding='utf-8')
+        self._log_records = len(self._blacklist)
+        self._log_inode = os.fstat(self._log.fileno()).st_ino
+        self._read_position = os.path.getsize(self._log_path)
+
+    def _run_compaction(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.update_blacklist()
+            except OSError as e:
+                logger.exception(f'Error during compaction of revocation log {self._log_path}: {e}')
+
     def update_blacklist(self):
-        """Удаляет из блек-листа токены с истёкшим временем жизни."""
-        with shelve.open(self._storage_path, 'w') as storage:
-            tokens = list(storage[self._data_const.blacklist])
-            for token_ in tokens:
-                try:
-                    jwt.decode(token_)
-                except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-                    tokens.remove(token_)
-            storage[self._data_const.blacklist] = tokens
+        """Удаляет из блеклиста токены с истёкшим временем жизни (компактизация журнала)."""
+        with self._lock, self._file_lock():
+            self._compact(time.time())
 
     def get_secret(self) -> str:
-        with shelve.open(self._storage_path) as storage:
-            secret = storage.get(self._data_const.secret)
-        return secret
+        return self._secret
 
     def add_token_to_blacklist(self, token_: str):
-        with shelve.open(self._storage_path, 'w') as storage:
-            tokens = storage[self._data_const.blacklist]
-            if token_ not in tokens:
-                tokens.append(token_)
-            storage[self._data_const.blacklist] = tokens
+        expiration = get_token_expiration(token_)
+        if expiration is None or expiration <= time.time():  # Недействительный токен не пройдёт проверку и без блеклиста
+            return
+
+        token_hash = hash_token(token_)
+        with self._lock, self._file_lock():
+            self._sync()
+            if token_hash not in self._blacklist:
+                self._append(token_hash, expiration)
 
     def delete_token_from_blacklist(self, token_: str):
-        with shelve.open(self._storage_path, 'w') as storage:
-            tokens = storage[self._data_const.blacklist]
-            tokens.remove(token_)
-            storage[self._data_const.blacklist] = tokens
+        token_hash = hash_token(token_)
+        with self._lock, self._file_lock():
+            self._sync()
+            if self._blacklist.pop(token_hash, None) is not None:
+                self._append(token_hash, 0)
 
     def check_token_in_blacklist(self, token_: str) -> bool:
         """Проверяет наличие токена в блеклисте."""
-        with shelve.open(self._storage_path) as storage:
-            tokens = storage[self._data_const.blacklist]
-            return token_ in tokens
+        with self._lock:
+            self._sync()
+        expiration = self._blacklist.get(hash_token(token_))
+        return expiration is not None and expiration > time.time()
 
     def add_day_to_score(self, user_id: int):
         pass
@@ -82,5 +271,4 @@ if __name__ == '__main__':
     model.add_token_to_blacklist('12345')
     model.add_token_to_blacklist('12345')
     model.add_token_to_blacklist('12345')
-    model.delete_token_from_blacklist('12345')
     print(model.check_token_in_blacklist('12345'))
@@ -2,18 +2,37 @@ import flask
 from flask import Response, jsonify, Request
 from sqlalchemy.exc import SQLAlchemyError
 
+import base64
+import binascii
+import csv
 import datetime
+import io
+import json
 import typing as tp
 import functools
+from dataclasses import dataclass
 
 from common.base import CommonStruct, ErrorCodes
 from common.logger import config_logger, SERVER
 from server.api.base import LOG_DIR, LOGGING_LEVEL, MAX_FILE_SIZE, MAX_BACKUP_FILES
 from server.data_const import APIAnswers as APIAn
+from server.database.request_scope import RequestScope
 import server.api.controllers.exceptions as controller_exc
 
 logger = config_logger(__name__, SERVER, LOG_DIR, MAX_BACKUP_FILES, MAX_FILE_SIZE, LOGGING_LEVEL)
 
+BATCH_ITEM = 'terv.batch_item'  # Ключ environ подзапроса пакета (/batch)
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'DELETE')
+
+
+@dataclass(frozen=True)
+class BatchItem:
+    """Подзапрос пакета. query - строка запроса или словарь параметров, body - JSON тела."""
+    method: str
+    path: str
+    query: str | dict | None = None
+    body: tp.Any = None
+
 
 def form_response(http_code: int,
                   message: str,
@@ -21,6 +40,7 @@ def form_response(http_code: int,
                   last_rec_num: int = None,
                   records_left: int = None,
                   error_id: int = ErrorCodes.ok.value,
+                  next_cursor: str = None
                   ) -> Response:
     """
     Формирует ответ API.
@@ -31,6 +51,7 @@ def form_response(http_code: int,
     :param error_id: ID ошибки.
     :param last_rec_num: Номер последней записи в БД (для GET-запросов).
     :param records_left: Осталось записей в БД (для GET-запросов).
+    :param next_cursor: Курсор следующей страницы (для GET-запросов с keyset-пагинацией).
     """
 
     response = {
@@ -42,6 +63,8 @@ def form_response(http_code: int,
         response.update(last_rec_num=last_rec_num)
     if records_left is not None:
         response.update(records_left=records_left)
+    if next_cursor is not None:
+        response.update(next_cursor=next_cursor)
     if error_id != ErrorCodes.ok.value:
         response.update(error_id=error_id)
 
@@ -64,6 +87,13 @@ def form_invalid_offset_response(endpoint: str) -> flask.Response:
                          )
 
 
+def form_invalid_cursor_response(endpoint: str) -> flask.Response:
+    return form_response(400,
+                         APIAn.invalid_data_error(CommonStruct.cursor, endpoint, f'Incorrect cursor'),
+                         error_id=ErrorCodes.incorrect_cursor.value
+                         )
+
+
 def form_success_response(content: tp.Any = None) -> flask.Response:
     return form_response(200, 'OK', content)
 
@@ -72,16 +102,154 @@ def form_expired_access_response():
     return form_response(401, 'Expired access token', error_id=ErrorCodes.invalid_access.value)
 
 
+def form_auth_overloaded_response(retry_after: int) -> flask.Response:
+    """Формирует ответ API о заполненной очереди проверки паролей (повторить запрос через retry_after секунд)."""
+    response = form_response(503, 'Too many authentication requests, retry later',
+                             error_id=ErrorCodes.auth_overloaded.value)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
 def form_forbidden_response(resource: str, endpoint: str, role: str, permission: str):
     """Формирует ответ API об отсутствии доступа к ресурсу."""
     return form_response(403, f'Users with role {role} have not permission {permission} to execute'
                               f'operation with resource {resource}.')
 
 
+def get_request_user_id() -> int:
+    """
+    Возвращает ID пользователя из access-токена текущего запроса. Токен декодируется один раз за запрос в
+    before_request-обработчике, результат хранится в flask.g. Вызывает ValueError, если в запросе нет валидного
+    access-токена.
+    """
+    user_id = flask.g.get('user_id')
+    if user_id is None:
+        raise ValueError('There is no valid access token in request')
+    return user_id
+
+
+def is_batch_item() -> bool:
+    """Является ли текущий запрос подзапросом пакета (выполняется внутри запроса /batch)."""
+    return flask.has_request_context() and flask.request.environ.get(BATCH_ITEM, False)
+
+
+def parse_batch_items(data: tp.Any, max_items: int) -> list[BatchItem]:
+    """
+    Получает подзапросы пакета из JSON тела запроса /batch: {"requests": [{"method", "path", "query", "body"}, ...]}.
+    Если пакет невалиден, выбрасывает ValueError.
+    """
+    items = data.get(CommonStruct.requests) if isinstance(data, dict) else None
+    if not isinstance(items, list) or not items:
+        raise ValueError(f'Batch must contain a non-empty list {CommonStruct.requests}')
+    if len(items) > max_items:
+        raise ValueError(f'Batch must contain at most {max_items} requests, got {len(items)}')
+
+    result = []
+    for num, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f'Request {num} of batch is not an object')
+        method, path = item.get(CommonStruct.method), item.get(CommonStruct.path)
+        query = item.get(CommonStruct.query)
+        if not isinstance(method, str) or method.upper() not in BATCH_METHODS:
+            raise ValueError(f'Request {num} of batch has incorrect method: {method}')
+        if not isinstance(path, str) or not path.startswith('/'):
+            raise ValueError(f'Request {num} of batch has incorrect path: {path}')
+        if query is not None and not isinstance(query, (str, dict)):
+            raise ValueError(f'Request {num} of batch has incorrect query: {query}')
+        result.append(BatchItem(method.upper(), path, query, item.get(CommonStruct.body)))
+    return result
+
+
+def get_request_scope() -> RequestScope | None:
+    """
+    Возвращает контекст БД текущего запроса (сессия и identity map, см. server.database.request_scope), хранящийся в
+    flask.g. Вне запроса или если контекст не открыт - None. Провайдер контекста для DataRepository.
+    """
+    if not flask.has_request_context():
+        return None
+    return flask.g.get('request_scope')
+
+
 def form_get_success_response(content: tp.Any | None = None, last_rec_num: int | None = None,
-                              records_left: int | None = None):
-    """Формирует ответ на GET-запрос."""
-    return form_response(200, "OK", content, last_rec_num, records_left)
+                              records_left: int | None = None, last_id: int | None = None):
+    """
+    Формирует ответ на GET-запрос. Если передан last_id (ID последней записи страницы при keyset-пагинации) и
+    остались записи, в ответ добавляется курсор следующей страницы.
+    """
+    next_cursor = None
+    if last_id is not None and records_left:
+        next_cursor = encode_cursor(last_id)
+    return form_response(200, "OK", content, last_rec_num, records_left, next_cursor=next_cursor)
+
+
+def encode_cursor(last_id: int) -> str:
+    """Формирует непрозрачный курсор keyset-пагинации по ID последней полученной записи."""
+    return base64.urlsafe_b64encode(json.dumps({CommonStruct.after_id: last_id}).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> int:
+    """
+    Получает ID последней полученной записи из курсора keyset-пагинации. Если курсор невалиден, выбрасывает
+    ValueError.
+    """
+    try:
+        after_id = json.loads(base64.urlsafe_b64decode(cursor.encode())).get(CommonStruct.after_id)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, AttributeError) as e:
+        raise ValueError(f'Incorrect cursor: {cursor}') from e
+
+    if type(after_id) is not int or after_id < 0:
+        raise ValueError(f'Incorrect cursor: {cursor}')
+    return after_id
+
+
+def encode_export_cursor(object_type: str, last_id: int) -> str:
+    """Формирует непрозрачный курсор продолжения выгрузки РП после записи (object_type, last_id)."""
+    return base64.urlsafe_b64encode(
+        json.dumps({CommonStruct.object_type: object_type, CommonStruct.after_id: last_id}).encode()
+    ).decode()
+
+
+def decode_export_cursor(cursor: str) -> tuple[str, int]:
+    """
+    Получает (тип объекта, ID) последней полученной записи выгрузки РП из курсора. Если курсор невалиден,
+    выбрасывает ValueError.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        object_type, after_id = data.get(CommonStruct.object_type), data.get(CommonStruct.after_id)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError, AttributeError) as e:
+        raise ValueError(f'Incorrect cursor: {cursor}') from e
+
+    if type(object_type) is not str or type(after_id) is not int or after_id < 0:
+        raise ValueError(f'Incorrect cursor: {cursor}')
+    return object_type, after_id
+
+
+def read_ndjson_rows(stream: tp.IO[bytes]) -> tp.Iterator[dict | ValueError]:
+    """
+    Читает строки NDJSON из потока тела запроса по одной (тело не загружается в память целиком). Пустые строки
+    пропускаются, вместо невалидной строки возвращается ValueError.
+    """
+    for line in io.TextIOWrapper(stream, encoding='utf-8', errors='replace'):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            yield ValueError(f'Incorrect JSON: {e.msg}')
+
+
+def read_csv_rows(stream: tp.IO[bytes]) -> tp.Iterator[dict | ValueError]:
+    """
+    Читает строки CSV (первая строка - названия полей) из потока тела запроса по одной. Пустые ячейки
+    соответствуют отсутствующим значениям, вместо строки с лишними ячейками возвращается ValueError.
+    """
+    reader = csv.DictReader(io.TextIOWrapper(stream, encoding='utf-8', errors='replace', newline=''))
+    for row in reader:
+        if None in row:
+            yield ValueError(f'Row has more cells than the header ({len(reader.fieldnames)})')
+            continue
+        yield {key: value for key, value in row.items() if value not in ('', None)}
 
 
 def check_list_is_digit(list_: list[str]) -> bool:
@@ -141,8 +309,11 @@ def exceptions_handler(func: tp.Callable):
 def get_request(func: tp.Callable):
     """
     Обработчик для функций, обрабатывающих GET-запросы к ресурсам. Валидирует параметры пагинации (limit,
-    offset, require_last_num) и передаёт их в декорируемую функцию. Если происходит ошибка при валидации, возвращает
-    соответствующий ответ API.
+    offset, require_last_num, cursor/after_id) и передаёт их в декорируемую функцию. Если происходит ошибка при
+    валидации, возвращает соответствующий ответ API.
+    Параметры keyset-пагинации: after_id - ID последней полученной записи (0 - первая страница), cursor - курсор
+    next_cursor из предыдущего ответа. Если переданы оба, используется cursor. Если не передан ни один,
+    after_id = None (пагинация по offset).
     """
 
     @functools.wraps(func)
@@ -150,6 +321,8 @@ def get_request(func: tp.Callable):
         limit = request.args.get(CommonStruct.limit)
         offset = request.args.get(CommonStruct.offset)
         require_last_num = request.args.get(CommonStruct.require_last_num)
+        cursor = request.args.get(CommonStruct.cursor)
+        after_id = request.args.get(CommonStruct.after_id)
 
         if limit:
             try:
@@ -170,7 +343,20 @@ def get_request(func: tp.Callable):
         if require_last_num and require_last_num != '0' and require_last_num.lower() != 'false':
             require_last_num = True
 
-        return func(request, *args, **kwargs, limit=limit, offset=offset, require_last_num=require_last_num)
+        if cursor:
+            try:
+                after_id = decode_cursor(cursor)
+            except ValueError:
+                return form_invalid_cursor_response(request.endpoint)
+        elif after_id:
+            if not after_id.isdigit():
+                return form_invalid_cursor_response(request.endpoint)
+            after_id = int(after_id)
+        else:
+            after_id = None
+
+        return func(request, *args, **kwargs, limit=limit, offset=offset, require_last_num=require_last_num,
+                    after_id=after_id)
 
     return prepare
 
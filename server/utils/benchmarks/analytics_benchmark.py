@@ -0,0 +1,146 @@
+"""
+Бенчмарк аналитики AnalyticsService.
+
+Сравнивает старую реализацию (загрузка и сериализация всех задач РП, запрос этапов для каждого проекта) и текущую
+(чтение предрассчитанных счётчиков analytics_rollup) на сгенерированном РП из 100 проектов и 50 000 задач. Старая реализация выполняется
+несколько минут, поэтому запускается один раз.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.analytics_benchmark
+"""
+import datetime
+import time
+import typing as tp
+
+from sqlalchemy import insert
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from common.base import DBFields, WorkStages
+from server.data_const import DBProfiles
+from server.database.models.db_utils import create_db_engine
+from server.database.repository import DataRepository
+from server.services.services import AnalyticsService
+
+USERS_NUM = 200
+MEMBERS_NUM = 150  # Участники РП - первые MEMBERS_NUM пользователей, исполнителями бывают и не участники
+PROJECTS_NUM = 100
+PROJECT_USERS_NUM = 5
+TASKS_NUM = 50_000
+REPEATS = 3
+STAGE_NAMES = tuple(stage.value for stage in (
+    WorkStages.idea_generating_name, WorkStages.thesis_proofing_name, WorkStages.solution_projecting_name,
+    WorkStages.development_name, WorkStages.testing_name, WorkStages.results_preparation_name
+))
+
+
+def legacy_workspace_analytics(workspace_id: int, repo: DataRepository) -> dict:
+    """Реализация AnalyticsService.get_workspace_analytics до переноса агрегации в БД."""
+    tasks = repo.get_ws_tasks(ids=[], workspace_id=workspace_id).content
+    users = repo.get_workspace_users(workspace_id).content
+    distribution: dict[int, int] = {}
+    for task in tasks:
+        executor_id = task.get(DBFields.executor)
+        if executor_id is not None:
+            distribution[executor_id] = distribution.get(executor_id, 0) + 1
+
+    tasks_distribution: dict[str, int] = {}
+    for user in users:
+        count = distribution.get(user.get(DBFields.id), 0)
+        if count > 0:
+            tasks_distribution[user.get(DBFields.email)] = count
+    total_tasks = sum(distribution.values())
+    avg_tasks = round(total_tasks / len(users), 2) if users else 0.0
+
+    stages_distribution: dict[str, int] = {}
+    for project in repo.get_projects_by_workspace_id(workspace_id).content:
+        current_stage_id = project.get(DBFields.current_stage_id)
+        if current_stage_id:
+            for stage in repo.get_work_stages_by_project_id(project.get(DBFields.id)).content:
+                if stage.get(DBFields.id) == current_stage_id:
+                    stage_name = stage.get(DBFields.name, 'Не указан')
+                    stages_distribution[stage_name] = stages_distribution.get(stage_name, 0) + 1
+                    break
+
+    return {
+        'avg_tasks_per_user': avg_tasks,
+        'tasks_distribution': tasks_distribution,
+        'stages_distribution': stages_distribution
+    }
+
+
+def fill_workspace(session_maker: sessionmaker) -> int:
+    """Создаёт РП с PROJECTS_NUM проектами (по len(STAGE_NAMES) этапов) и TASKS_NUM задачами. Возвращает ID РП."""
+    now = datetime.datetime.now()
+    today = now.date()
+    with session_maker() as session, session.begin():
+        session.execute(insert(cm.User), [
+            {'username': f'user_{i}', 'email': f'user_{i}@mail.com', 'hashed_password': 'hash'} for i in range(USERS_NUM)
+        ])
+        workspace_id = session.execute(insert(cm.Workspace).values(creator_id=1, name='workspace')).inserted_primary_key[0]
+        # work_stage.project_id ссылается на workspace.id (см. cm.WorkStage): пустые РП нужны для проверки внешних ключей
+        session.execute(insert(cm.Workspace), [
+            {'creator_id': 1, 'name': f'workspace_{i}'} for i in range(1, PROJECTS_NUM)
+        ])
+        session.execute(insert(cm.workspace_user), [
+            {'workspace_id': workspace_id, 'user_id': user_id} for user_id in range(1, MEMBERS_NUM + 1)
+        ])
+        session.execute(insert(cm.Project), [
+            {'workspace_id': workspace_id, 'creator_id': 1, 'name': f'project_{i}'} for i in range(PROJECTS_NUM)
+        ])
+        session.execute(insert(cm.project_user), [
+            {'project_id': project_id, 'user_id': (project_id * PROJECT_USERS_NUM + i) % USERS_NUM + 1}
+            for project_id in range(1, PROJECTS_NUM + 1) for i in range(PROJECT_USERS_NUM)
+        ])
+        session.execute(insert(cm.WorkStage), [
+            {'project_id': project_id, 'name': name, 'result': '', 'date_start': today, 'date_end': today,
+             'is_finished': False, 'is_future': False, 'is_current': False}
+            for project_id in range(1, PROJECTS_NUM + 1) for name in STAGE_NAMES
+        ])
+        for project_id in range(1, PROJECTS_NUM + 1):  # Текущий этап - один из этапов проекта
+            stage_id = (project_id - 1) * len(STAGE_NAMES) + project_id % len(STAGE_NAMES) + 1
+            session.execute(cm.Project.__table__.update().where(cm.Project.id == project_id)
+                            .values(current_stage_id=stage_id))
+        status_id = session.execute(insert(cm.WSTaskStatus).values(workspace_id=workspace_id, name='status')
+                                    ).inserted_primary_key[0]
+        session.execute(insert(cm.WSTask), [
+            {'workspace_id': workspace_id, 'project_id': i % PROJECTS_NUM + 1, 'creator_id': 1, 'entrusted_id': 1,
+             'status_id': status_id, 'executor_id': i % USERS_NUM + 1, 'name': f'task_{i}', 'plan_deadline': now}
+            for i in range(TASKS_NUM)
+        ])
+    return workspace_id
+
+
+def measure(func: tp.Callable[[], dict], repeats: int = REPEATS) -> tuple[float, dict]:
+    """Возвращает минимальное время выполнения func (мс) из repeats запусков и результат."""
+    best = None
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark():
+    engine = create_db_engine('sqlite://', DBProfiles.test)
+    cm.Base.metadata.create_all(engine)
+    session_maker = sessionmaker(engine)
+    workspace_id = fill_workspace(session_maker)
+    repo = DataRepository(session_maker)
+    rebuild_time, _ = measure(lambda: repo.rebuild_analytics_rollup(), repeats=1)  # Данные внесены в обход репозитория
+    print(f'Analytics rollup rebuild: {rebuild_time:.1f} ms')
+
+    legacy_time, legacy = measure(lambda: legacy_workspace_analytics(workspace_id, repo), repeats=1)
+    current_time, current = measure(lambda: AnalyticsService.get_workspace_analytics(workspace_id, repo))
+    assert legacy == current, f'Results differ: {legacy} != {current}'
+    print(f'Workspace analytics ({PROJECTS_NUM} projects, {TASKS_NUM} tasks): legacy {legacy_time:.1f} ms, '
+          f'current {current_time:.1f} ms, speedup {legacy_time / current_time:.1f}x')
+
+    project_time, _ = measure(lambda: AnalyticsService.get_project_analytics(1, repo))
+    print(f'Project analytics ({TASKS_NUM // PROJECTS_NUM} tasks): current {project_time:.1f} ms')
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
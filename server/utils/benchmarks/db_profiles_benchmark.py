@@ -0,0 +1,110 @@
+"""
+Бенчмарк профилей соединений SQLite (server.database.models.db_utils.DB_PROFILES).
+
+Для каждого профиля и для движка без профиля (журнал отката, synchronous=FULL, без busy_timeout - как до введения
+профилей) на файловой БД измеряются:
+- скорость записи: WRITES_NUM добавлений пользователя, каждое в отдельной транзакции;
+- конкурентное чтение: READERS_NUM потоков (число потоков waitress по умолчанию) читают страницы пользователей, пока
+  один поток пишет. Считаются выполненные чтения и ошибки блокировки ("database is locked").
+
+Запуск из корня проекта: python -m server.utils.benchmarks.db_profiles_benchmark
+"""
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import create_engine, Engine
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from common.base import DBFields
+from server.data_const import DBProfiles
+from server.database.exceptions import BaseRepoException
+from server.database.models.db_utils import init_db, add_permissions, set_pragmas
+from server.database.repository import DataRepository
+
+WRITES_NUM = 500
+USERS_NUM = 1000
+READERS_NUM = 8  # waitress.serve(threads=8)
+READ_PAGE_SIZE = 50
+READ_DURATION = 3  # сек.
+BARE = 'без профиля'
+
+
+def create_engine_for(path: Path, profile: str) -> Engine:
+    url = f'sqlite:///{path}'
+    if profile != BARE:
+        return init_db(url, profile)
+    engine = create_engine(url)
+    set_pragmas(engine, {'foreign_keys': 'ON'})  # Внешние ключи проверялись и до введения профилей
+    cm.Base.metadata.create_all(engine)
+    add_permissions(engine)
+    return engine
+
+
+def get_user(i: int, prefix: str) -> dict:
+    return {DBFields.username: f'{prefix}_{i}', DBFields.email: f'{prefix}_{i}@mail.com', DBFields.hashed_password: 'hash'}
+
+
+def measure_writes(repo: DataRepository) -> float:
+    """Возвращает число транзакций записи в секунду."""
+    start = time.perf_counter()
+    for i in range(WRITES_NUM):
+        repo.add_users([get_user(i, 'writer')])
+    return WRITES_NUM / (time.perf_counter() - start)
+
+
+def measure_reads(repo: DataRepository) -> tuple[float, int, float]:
+    """Возвращает число чтений в секунду, число ошибок чтения и записи, число записей в секунду во время чтения."""
+    stop = threading.Event()
+    reads = [0] * READERS_NUM
+    errors = [0]
+    writes = [0]
+
+    def read(reader_num: int):
+        offset = 0
+        while not stop.is_set():
+            try:
+                repo.get_users_by_username(limit=READ_PAGE_SIZE, offset=offset)
+                reads[reader_num] += 1
+            except BaseRepoException:
+                errors[0] += 1
+            offset = (offset + READ_PAGE_SIZE) % USERS_NUM
+
+    def write():
+        i = 0
+        while not stop.is_set():
+            try:
+                repo.add_users([get_user(i, 'concurrent')])
+                writes[0] += 1
+            except BaseRepoException:
+                errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=read, args=[i]) for i in range(READERS_NUM)] + [threading.Thread(target=write)]
+    for thread in threads:
+        thread.start()
+    time.sleep(READ_DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return sum(reads) / READ_DURATION, errors[0], writes[0] / READ_DURATION
+
+
+def run_benchmark():
+    for profile in (BARE, *DBProfiles.all):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = create_engine_for(Path(directory) / 'database', profile)
+            repo = DataRepository(sessionmaker(bind=engine))
+            repo.add_users([get_user(i, 'user') for i in range(USERS_NUM)])
+
+            writes_per_sec = measure_writes(repo)
+            reads_per_sec, errors, concurrent_writes_per_sec = measure_reads(repo)
+            print(f'{profile}: writes {writes_per_sec:.0f} tx/s; {READERS_NUM} readers + 1 writer: '
+                  f'reads {reads_per_sec:.0f} pages/s, writes {concurrent_writes_per_sec:.0f} tx/s, errors {errors}')
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,81 @@
+"""
+Бенчмарк выгрузки РП (DataRepository.export_workspace).
+
+Для РП с TASKS_NUMS задачами сравнивается пиковая память (tracemalloc) получения всех задач РП одним списком
+(get_ws_tasks, как при ответе jsonify) и потоковой выгрузки РП в NDJSON (строки не накапливаются, как при отправке
+клиенту). Выводятся пиковая память и время.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.export_benchmark
+"""
+import json
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from common.base import DBFields, get_datetime_now
+from server.data_const import DBProfiles
+from server.database.models.db_utils import init_db
+from server.database.repository import DataRepository
+
+TASKS_NUMS = (1_000, 10_000, 50_000)
+
+
+def fill_workspace(repo: DataRepository, session_maker: sessionmaker, tasks_num: int) -> int:
+    """Создаёт РП с tasks_num задачами, возвращает ID РП."""
+    user_id = repo.add_users([{DBFields.username: 'username', DBFields.email: 'user@mail.com',
+                               DBFields.hashed_password: 'hash'}]).ids[0]
+    workspace_id = repo.add_workspaces([{DBFields.name: 'workspace', DBFields.creator_id: user_id,
+                                         DBFields.users: [user_id]}]).ids[0]
+    project_id = repo.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                     DBFields.creator_id: user_id}]).ids[0]
+    status_id = repo.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+    now = get_datetime_now()
+    with session_maker() as session, session.begin():
+        session.execute(insert(cm.WSTask), [
+            {DBFields.name: f'task_{i}', DBFields.description: 'description ' * 20, DBFields.workspace_id: workspace_id,
+             DBFields.project_id: project_id, DBFields.creator_id: user_id, DBFields.entrusted_id: user_id,
+             DBFields.executor_id: user_id, DBFields.status_id: status_id, DBFields.plan_deadline: now,
+             DBFields.created_at: now, DBFields.updated_at: now} for i in range(tasks_num)
+        ])
+    return workspace_id
+
+
+def measure(function) -> tuple[float, float]:
+    """Возвращает пиковую память (МБ) и время (с) вызова function."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    function()
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20, duration
+
+
+def run_benchmark():
+    for tasks_num in TASKS_NUMS:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = init_db(f'sqlite:///{Path(directory) / "database"}', DBProfiles.test)
+            session_maker = sessionmaker(bind=engine)
+            repo = DataRepository(session_maker)
+            workspace_id = fill_workspace(repo, session_maker, tasks_num)
+
+            def materialise():
+                json.dumps(repo.get_ws_tasks(None, workspace_id).content, default=str)
+
+            def stream():
+                for object_type, _, record in repo.export_workspace(workspace_id):
+                    json.dumps({'object_type': object_type, 'content': record}, default=str)
+
+            for name, function in (('list', materialise), ('stream', stream)):
+                peak, duration = measure(function)
+                print(f'{tasks_num} tasks, {name}: peak memory {peak:.1f} MB, {duration:.2f} s')
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
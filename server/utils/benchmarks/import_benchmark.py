@@ -0,0 +1,76 @@
+"""
+Бенчмарк импорта задач РП (server.services.services.ImportService).
+
+Для ROWS_NUMS строк сравнивается добавление задач по одной (как при создании задач через API: запрос исполнителя по
+email и add_ws_tasks на каждую задачу) и импорт NDJSON (проверка строк, один запрос ссылок и один INSERT на пачку
+строк). Выводятся время и число строк в секунду.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.import_benchmark
+"""
+import io
+import json
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.orm.session import sessionmaker
+
+from common.base import DBFields, get_datetime_now
+from server.auth.auth_module import Authorizer
+from server.data_const import DBProfiles, DataStruct, Permissions
+from server.database.models.db_utils import init_db
+from server.database.repository import DataRepository
+from server.services.services import ImportService
+from server.utils.api_utils import read_ndjson_rows
+
+ROWS_NUMS = (1_000, 5_000)
+EMAIL = 'user@mail.com'
+
+
+def fill_workspace(repo: DataRepository) -> tuple[int, int, int, int]:
+    """Создаёт РП с проектом и статусом, возвращает ID пользователя, РП, проекта и статуса."""
+    user_id = repo.add_users([{DBFields.username: 'username', DBFields.email: EMAIL,
+                               DBFields.hashed_password: 'hash'}]).ids[0]
+    workspace_id = repo.add_workspaces([{DBFields.name: 'workspace', DBFields.creator_id: user_id,
+                                         DBFields.users: [user_id]}]).ids[0]
+    project_id = repo.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                     DBFields.creator_id: user_id}]).ids[0]
+    status_id = repo.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+    return user_id, workspace_id, project_id, status_id
+
+
+def get_rows(rows_num: int, project_id: int, status_id: int) -> list[dict]:
+    deadline = get_datetime_now().isoformat()
+    return [{DBFields.name: f'task_{i}', DBFields.description: 'description', DBFields.plan_deadline: deadline,
+             DBFields.executor_email: EMAIL, DBFields.project_id: project_id, DBFields.status_id: status_id}
+            for i in range(rows_num)]
+
+
+def run_benchmark():
+    for rows_num in ROWS_NUMS:
+        for name in ('row by row', 'import'):
+            with tempfile.TemporaryDirectory() as directory:
+                engine = init_db(f'sqlite:///{Path(directory) / "database"}', DBProfiles.prod)
+                repo = DataRepository(sessionmaker(bind=engine))
+                user_id, workspace_id, project_id, status_id = fill_workspace(repo)
+                rows = get_rows(rows_num, project_id, status_id)
+                body = ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+                start = time.perf_counter()
+                if name == 'import':
+                    ImportService.import_objects(read_ndjson_rows(io.BytesIO(body)), 'ws_task', workspace_id, user_id,
+                                                 repo, Authorizer(repo, DataStruct(), Permissions, enforce=False))
+                else:
+                    for row in rows:
+                        row[DBFields.executor_id] = repo.get_users_by_email([row.pop(DBFields.executor_email)]
+                                                                            ).content[0][DBFields.id]
+                        row.update({DBFields.workspace_id: workspace_id, DBFields.creator_id: user_id,
+                                    DBFields.entrusted_id: user_id})
+                        repo.add_ws_tasks([row])
+                duration = time.perf_counter() - start
+                print(f'{rows_num} tasks, {name}: {duration:.2f} s, {rows_num / duration:.0f} rows/s')
+                engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
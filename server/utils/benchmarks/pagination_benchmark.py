@@ -0,0 +1,76 @@
+"""
+Бенчмарк постраничного получения данных DataRepository._execute_select.
+
+Сравнивает время получения страницы старым способом (повторный запрос query.offset(offset) с загрузкой всех
+оставшихся записей для подсчёта records_left) и текущим (подзапрос SELECT count(*) в том же запросе) на таблицах
+из 1 000, 10 000 и 100 000 записей.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.pagination_benchmark
+"""
+import time
+import typing as tp
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm.session import sessionmaker, Select
+
+import server.database.models.common_models as cm
+from server.data_const import DBProfiles
+from server.database.models.db_utils import create_db_engine
+from server.database.repository import DataRepository, RepoSelectResponse
+
+SIZES = (1_000, 10_000, 100_000)
+PAGE_SIZE = 100
+REPEATS = 5
+
+
+def legacy_select(session_maker: sessionmaker, query: Select, limit: int, offset: int) -> RepoSelectResponse:
+    """Реализация _execute_select до перехода на подсчёт записей в БД (без сериализации)."""
+    with session_maker() as session, session.begin():
+        content = session.execute(query.limit(limit).offset(offset)).scalars().all()
+        response = RepoSelectResponse(content=list(content))
+        response.last_record_num = len(content) + offset
+        all_records = session.execute(query.offset(offset)).scalars().all()
+        response.records_left = len(all_records) - len(content)
+        return response
+
+
+def fill_users(session_maker: sessionmaker, count: int):
+    with session_maker() as session, session.begin():
+        session.execute(insert(cm.User), [
+            {'username': f'user_{i}', 'email': f'user_{i}@mail.com', 'hashed_password': 'hash'} for i in range(count)
+        ])
+
+
+def measure(func: tp.Callable[[], RepoSelectResponse]) -> tuple[float, RepoSelectResponse]:
+    """Возвращает минимальное время выполнения func (мс) из REPEATS запусков и результат."""
+    best = None
+    result = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_benchmark(sizes: tp.Iterable[int] = SIZES, page_size: int = PAGE_SIZE):
+    print(f'{"rows":>8} | {"offset":>8} | {"legacy, ms":>11} | {"current, ms":>11} | {"speedup":>7}')
+    for size in sizes:
+        engine = create_db_engine('sqlite://', DBProfiles.test)
+        cm.Base.metadata.create_all(engine)
+        session_maker = sessionmaker(engine)
+        fill_users(session_maker, size)
+        repo = DataRepository(session_maker)
+        query = select(cm.User).order_by(cm.User.id)
+
+        for offset in (0, size // 2, size - page_size):
+            legacy_time, legacy = measure(lambda: legacy_select(session_maker, query, page_size, offset))
+            current_time, current = measure(lambda: repo._execute_select(query, page_size, offset, serialize=False))
+            assert (legacy.records_left, legacy.last_record_num) == (current.records_left, current.last_record_num)
+            print(f'{size:>8} | {offset:>8} | {legacy_time:>11.2f} | {current_time:>11.2f} | '
+                  f'{legacy_time / current_time:>6.1f}x')
+        engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
@@ -0,0 +1,112 @@
+"""
+Бенчмарк многопроцессного режима сервера (server.api.prefork.PreforkServer).
+
+Сервер обслуживает WSGI-приложение с типичной для запроса API нагрузкой на процессор под GIL: декодирование JWT,
+сериализация страницы записей в JSON. Для числа рабочих процессов из WORKERS_NUMS (до числа ядер) CLIENTS_NUM
+клиентских процессов в течение DURATION секунд отправляют запросы по keep-alive соединениям; выводится число ответов
+в секунду. Число потоков в процессе - как в server/run.py. Масштабирование ограничено числом ядер: процессы клиентов
+конкурируют с сервером за те же ядра.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.prefork_benchmark
+"""
+import datetime
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+
+import jwt
+
+from server.api.prefork import PreforkServer
+
+WORKERS_NUMS = sorted({1, 2, 4, os.cpu_count() or 1})
+CLIENTS_NUM = 16
+DURATION = 5  # сек.
+THREADS = 8  # server/run.py
+HOST = '127.0.0.1'
+SECRET = 'secret'
+RECORDS_NUM = 50  # Записей на странице ответа
+TOKEN = jwt.encode({'sub': '1', 'exp': datetime.datetime.now(tz=datetime.timezone.utc) + datetime.timedelta(days=1)},
+                   SECRET, algorithm='HS256')
+
+
+def app(environ, start_response):
+    """Приложение, нагружающее процессор как запрос чтения страницы записей."""
+    payload = jwt.decode(environ['HTTP_AUTHORIZATION'], SECRET, algorithms=['HS256'])
+    records = [{'id': i, 'name': f'task_{i}', 'description': 'description ' * 10, 'owner_id': int(payload['sub']),
+                'created_at': datetime.datetime.now().isoformat()} for i in range(RECORDS_NUM)]
+    body = json.dumps({'content': records, 'records_left': 0}).encode()
+    start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+    return [body]
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def run_server(port: int, workers: int):
+    PreforkServer(f'{__name__}:app', HOST, port, workers, THREADS).run()
+
+
+def run_client(port: int, deadline: float, results: multiprocessing.Queue):
+    connection = http.client.HTTPConnection(HOST, port)
+    responses = 0
+    while time.time() < deadline:
+        connection.request('GET', '/', headers={'Authorization': TOKEN})
+        connection.getresponse().read()
+        responses += 1
+    connection.close()
+    results.put(responses)
+
+
+def wait_server(port: int):
+    for _ in range(100):
+        try:
+            connection = http.client.HTTPConnection(HOST, port)
+            connection.request('GET', '/', headers={'Authorization': TOKEN})
+            connection.getresponse().read()
+            connection.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('Server has not started.')
+
+
+def measure(workers: int) -> float:
+    """Возвращает число ответов в секунду."""
+    port = get_free_port()
+    server = multiprocessing.Process(target=run_server, args=[port, workers])
+    server.start()
+    try:
+        wait_server(port)
+        results = multiprocessing.Queue()
+        deadline = time.time() + DURATION
+        clients = [multiprocessing.Process(target=run_client, args=[port, deadline, results])
+                   for _ in range(CLIENTS_NUM)]
+        for client in clients:
+            client.start()
+        responses = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+    finally:
+        os.kill(server.pid, signal.SIGTERM)
+        server.join()
+    return responses / DURATION
+
+
+def run_benchmark():
+    base = None
+    for workers in WORKERS_NUMS:
+        requests_per_sec = measure(workers)
+        base = base or requests_per_sec
+        print(f'{workers} workers: {requests_per_sec:.0f} requests/s (x{requests_per_sec / base:.2f})')
+
+
+if __name__ == '__main__':
+    multiprocessing.set_start_method('fork')
+    run_benchmark()
@@ -0,0 +1,82 @@
+"""
+Бенчмарк кэша запросов (server.database.cash_manager.CashManager).
+
+Для РП с TASKS_NUM задачами READS_NUM раз выполняются запросы панели РП (задачи, проекты, аналитика задач и этапов)
+без кэша и с кэшем. Каждые WRITE_EVERY чтений изменяется задача РП (результаты из ws_task становятся
+недействительными). Выводятся время, число чтений в секунду и метрики кэша.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.query_cache_benchmark
+"""
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from common.base import DBFields, get_datetime_now
+from server.data_const import DBProfiles
+from server.database.cash_manager import CashManager
+from server.database.models.db_utils import init_db
+from server.database.repository import DataRepository
+
+TASKS_NUM = 2_000
+READS_NUM = 500
+WRITE_EVERY = 50
+
+
+def fill_workspace(repo: DataRepository, session_maker: sessionmaker) -> tuple[int, list[int]]:
+    """Создаёт РП с задачами, возвращает ID РП и ID задач."""
+    user_id = repo.add_users([{DBFields.username: 'username', DBFields.email: 'user@mail.com',
+                               DBFields.hashed_password: 'hash'}]).ids[0]
+    workspace_id = repo.add_workspaces([{DBFields.name: 'workspace', DBFields.creator_id: user_id,
+                                         DBFields.users: [user_id]}]).ids[0]
+    project_id = repo.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                     DBFields.creator_id: user_id}]).ids[0]
+    status_id = repo.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+    now = get_datetime_now()
+    with session_maker() as session, session.begin():
+        task_ids = list(session.execute(insert(cm.WSTask).returning(cm.WSTask.id), [
+            {DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+             DBFields.creator_id: user_id, DBFields.entrusted_id: user_id, DBFields.executor_id: user_id,
+             DBFields.status_id: status_id, DBFields.plan_deadline: now, DBFields.created_at: now,
+             DBFields.updated_at: now} for i in range(TASKS_NUM)
+        ]).scalars())
+    repo.rebuild_analytics_rollup()
+    return workspace_id, task_ids
+
+
+def read_dashboard(repo: DataRepository, workspace_id: int):
+    repo.get_ws_tasks(None, workspace_id, limit=50)
+    repo.get_projects_by_workspace_id(workspace_id)
+    repo.get_workspace_tasks_analytics(workspace_id)
+    repo.get_workspace_stages_distribution(workspace_id)
+
+
+def run_benchmark():
+    for cache in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            engine = init_db(f'sqlite:///{Path(directory) / "database"}', DBProfiles.prod)
+            session_maker = sessionmaker(bind=engine)
+            workspace_id, task_ids = fill_workspace(DataRepository(session_maker), session_maker)
+            cash_manager = CashManager(engine) if cache else None
+            repo = DataRepository(session_maker, cash_manager=cash_manager)
+
+            start = time.perf_counter()
+            for i in range(READS_NUM):
+                if i % WRITE_EVERY == 0:
+                    repo.update_ws_tasks([{DBFields.id: task_ids[i], DBFields.name: f'updated_{i}'}])
+                read_dashboard(repo, workspace_id)
+            duration = time.perf_counter() - start
+            print(f'{"cache" if cache else "no cache"}: {duration:.2f} s, {READS_NUM / duration:.0f} dashboards/s')
+            if cash_manager:
+                stats = cash_manager.stats()
+                print(f'hits {stats.hits}, misses {stats.misses}, invalidations {stats.invalidations}, '
+                      f'hit rate {stats.hit_rate:.2f}')
+                cash_manager.close()
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
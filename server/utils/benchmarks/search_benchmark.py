@@ -0,0 +1,62 @@
+"""
+Бенчмарк поиска пользователей DataRepository.search_users.
+
+Для таблиц из USERS_NUMS пользователей сравнивает поиск подстроки перебором (LIKE '%x%', реализация до индекса
+user_search) с поиском по индексу user_search (подстрока, ранжированный поиск) и поиском по началу имени (подсказки при
+вводе). Запросы - страница из LIMIT результатов, как при вводе в окне поиска пользователей.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.search_benchmark
+"""
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from common.base import CommonStruct
+from server.data_const import DBProfiles
+from server.database.models.db_utils import init_db
+from server.database.repository import DataRepository
+from server.utils.benchmarks.analytics_benchmark import measure
+
+USERS_NUMS = (10_000, 100_000, 1_000_000)
+BATCH_SIZE = 50_000
+LIMIT = CommonStruct.search_limit
+TERMS = ('u', 'us', 'use', 'user_42', 'user_4242')  # Последовательный ввод
+
+
+def fill_users(session_maker: sessionmaker, users_num: int):
+    with session_maker() as session, session.begin():
+        for start in range(0, users_num, BATCH_SIZE):
+            session.execute(insert(cm.User), [
+                {'username': f'user_{i}', 'email': f'{i}@mail.com', 'hashed_password': 'hash'}
+                for i in range(start, min(start + BATCH_SIZE, users_num))
+            ])
+
+
+def legacy_search(repo: DataRepository, username: str) -> list[dict]:
+    """Поиск до введения индекса: LIKE '%x%' по таблице user."""
+    return repo._execute_select(select(cm.User).where(cm.User.username.contains(username)), limit=LIMIT).content
+
+
+def run_benchmark():
+    for users_num in USERS_NUMS:
+        with tempfile.TemporaryDirectory() as directory:
+            engine = init_db(f'sqlite:///{Path(directory) / "database"}', DBProfiles.bulk)
+            session_maker = sessionmaker(engine)
+            fill_users(session_maker, users_num)
+            repo = DataRepository(session_maker)
+            print(f'{users_num} users:')
+            for term in TERMS:
+                legacy_time, _ = measure(lambda: legacy_search(repo, term))
+                substring_time, _ = measure(lambda: repo.search_users(term, None, limit=LIMIT))
+                ranked_time, _ = measure(lambda: repo.search_users(None, None, limit=LIMIT, text=term))
+                prefix_time, _ = measure(lambda: repo.search_users(term, None, limit=LIMIT, prefix=True))
+                print(f'  "{term}": legacy {legacy_time:.1f} ms, substring {substring_time:.1f} ms, '
+                      f'ranked {ranked_time:.1f} ms, prefix {prefix_time:.1f} ms')
+            engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
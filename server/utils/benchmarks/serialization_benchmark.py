@@ -0,0 +1,51 @@
+"""
+Бенчмарк сериализации результатов DataRepository._execute_select.
+
+Сравнивает сериализацию ORM-объектов схемой (scheme.dump для каждой модели, отношения загружаются лениво) и
+скомпилированными сериализаторами (server.database.schemes.serializers) на страницах задач и пользователей
+сгенерированного РП (см. analytics_benchmark). Проверяет, что JSON-представления результатов совпадают.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.serialization_benchmark
+"""
+import json
+
+from sqlalchemy import select
+from sqlalchemy.orm.session import sessionmaker
+
+import server.database.models.common_models as cm
+from server.data_const import DBProfiles
+from server.database.models.db_utils import create_db_engine
+from server.database.repository import DataRepository
+from server.database.schemes.base import schemes_models
+from server.utils.benchmarks.analytics_benchmark import fill_workspace, measure
+
+PAGE_SIZES = (100, 1000)
+
+
+def legacy_select(session_maker: sessionmaker, model: type[cm.Base], limit: int) -> list[dict]:
+    """Сериализация до компиляции сериализаторов: загрузка ORM-объектов и scheme.dump для каждого."""
+    with session_maker() as session, session.begin():
+        scheme = schemes_models.get(model)
+        return [scheme.dump(obj=db_model) for db_model in session.execute(select(model).limit(limit)).scalars().all()]
+
+
+def run_benchmark():
+    engine = create_db_engine('sqlite://', DBProfiles.test)
+    cm.Base.metadata.create_all(engine)
+    session_maker = sessionmaker(engine)
+    fill_workspace(session_maker)
+    repo = DataRepository(session_maker)
+
+    for model in (cm.WSTask, cm.User):
+        for limit in PAGE_SIZES:
+            legacy_time, legacy = measure(lambda: legacy_select(session_maker, model, limit), repeats=1)
+            current_time, current = measure(lambda: repo._execute_select(select(model), limit=limit).content)
+            assert json.dumps(legacy) == json.dumps(current), f'Results differ for {model.__name__}'
+            print(f'{model.__name__} ({len(current)} rows): legacy {legacy_time:.1f} ms '
+                  f'({legacy_time * 1000 / len(current):.0f} us/row), current {current_time:.1f} ms '
+                  f'({current_time * 1000 / len(current):.0f} us/row), speedup {legacy_time / current_time:.1f}x')
+    engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
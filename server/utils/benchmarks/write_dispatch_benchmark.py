@@ -0,0 +1,72 @@
+"""
+Бенчмарк очереди записи (server.database.write_dispatcher.WriteDispatcher).
+
+WRITERS_NUM потоков (число потоков waitress) одновременно добавляют пользователей по одному, каждый - WRITES_NUM раз.
+Сравниваются запись через отдельные сессии (каждый поток ждёт блокировку файла БД, каждая запись - отдельная
+фиксация) и через очередь записи (записи, накопившиеся за время фиксации, фиксируются одной транзакцией). Выводятся
+число записей в секунду, задержка записи (медиана, 99-й перцентиль, максимум) и число ошибок.
+
+Запуск из корня проекта: python -m server.utils.benchmarks.write_dispatch_benchmark
+"""
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.orm.session import sessionmaker
+
+from common.base import DBFields
+from server.data_const import DBProfiles
+from server.database.exceptions import BaseRepoException
+from server.database.models.db_utils import init_db
+from server.database.repository import DataRepository
+from server.database.write_dispatcher import WriteDispatcher
+
+WRITERS_NUM = 8  # waitress.serve(threads=8)
+WRITES_NUM = 200
+
+
+def measure(repo: DataRepository) -> tuple[float, list[float], int]:
+    """Возвращает число записей в секунду, задержки записей (мс) и число ошибок."""
+    latencies = []
+    errors = [0]
+
+    def write(writer_num: int):
+        for i in range(WRITES_NUM):
+            start = time.perf_counter()
+            try:
+                repo.add_users([{DBFields.username: f'user_{writer_num}_{i}', DBFields.email: f'{writer_num}_{i}@mail.com',
+                                 DBFields.hashed_password: 'hash'}])
+            except BaseRepoException:
+                errors[0] += 1
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=write, args=[i]) for i in range(WRITERS_NUM)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return WRITERS_NUM * WRITES_NUM / (time.perf_counter() - start), latencies, errors[0]
+
+
+def run_benchmark():
+    for profile in (DBProfiles.prod, DBProfiles.test):
+        for dispatch in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                engine = init_db(f'sqlite:///{Path(directory) / "database"}', profile)
+                session_maker = sessionmaker(bind=engine)
+                dispatcher = WriteDispatcher(session_maker) if dispatch else None
+                writes_per_sec, latencies, errors = measure(DataRepository(session_maker, write_dispatcher=dispatcher))
+                latencies.sort()
+                print(f'{profile}, {"write queue" if dispatch else "separate sessions"}: {writes_per_sec:.0f} writes/s, '
+                      f'latency median {statistics.median(latencies):.1f} ms, '
+                      f'p99 {latencies[int(len(latencies) * 0.99)]:.1f} ms, max {latencies[-1]:.1f} ms, errors {errors}')
+                if dispatcher:
+                    dispatcher.close()
+                engine.dispose()
+
+
+if __name__ == '__main__':
+    run_benchmark()
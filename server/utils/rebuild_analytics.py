@@ -0,0 +1,31 @@
+"""
+Пересчёт предрассчитанной аналитики (таблица analytics_rollup) по задачам и проектам в БД. Используется для
+исправления расхождений счётчиков.
+
+Запуск из корня проекта: python -m server.utils.rebuild_analytics [ID РП ...]
+Без ID пересчитывается аналитика всех РП. Путь к БД берётся из server/config.json.
+"""
+import argparse
+from pathlib import Path
+
+from sqlalchemy.orm.session import sessionmaker
+
+from common.base import project_root
+from server.data_const import Config, DBProfiles
+from server.database.models.db_utils import launch_db
+from server.database.repository import DataRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild precomputed workspace and project analytics.')
+    parser.add_argument('workspace_ids', nargs='*', type=int, help='IDs of workspaces to rebuild (all by default)')
+    args = parser.parse_args()
+
+    config = Config(Path(project_root() / "server" / "config.json"))
+    repo = DataRepository(sessionmaker(bind=launch_db(config.database_path, DBProfiles.bulk)))
+    repo.rebuild_analytics_rollup(args.workspace_ids or None)
+    print(f'Analytics rollup has been rebuilt for: {args.workspace_ids or "all workspaces"}')
+
+
+if __name__ == '__main__':
+    main()
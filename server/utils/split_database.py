@@ -0,0 +1,123 @@
+"""
+Перенос нешардированной БД в шардированную (см. server.database.sharding).
+
+Таблицы глобальной БД копируются целиком, строки таблиц РП - в шард своего РП (workspace_id % <число шардов>). РП
+строки определяется по столбцу workspace_id или через родительскую строку (например, событие задачи - по задаче).
+Перенесённые объекты сохраняют ID, их шарды записываются в таблицу shard_directory глобальной БД. Исходная БД не
+изменяется (только приводится к последней ревизии миграций).
+
+Запуск из корня проекта: python -m server.utils.split_database <число шардов> [--source URL] [--target URL]
+По умолчанию исходная БД - database_path из server/config.json. После переноса в server/config.json указываются
+database_path = target и shards = <число шардов>.
+"""
+import argparse
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import Table
+from sqlalchemy.engine import make_url
+
+import server.database.models.common_models as cm
+from common.base import project_root, DBFields
+from server.data_const import Config, DBProfiles, Rollup
+from server.database.models.db_utils import launch_db
+from server.database.sharding import (init_sharded_db, get_global_tables, get_shard_metadata, get_shard_url,
+                                      has_id_sequence, shard_directory, GLOBAL_TABLES)
+
+SOURCE_SCHEMA = 'source'
+GLOBAL_SCHEMA = 'target_global'
+
+# Родительская строка таблиц без workspace_id, не определяемая внешним ключом (в схеме project_id этапа ссылается на
+# workspace): таблица -> (столбец, родительская таблица)
+PARENTS = {cm.WorkStage.__tablename__: (DBFields.project_id, cm.Project.__tablename__)}
+
+
+def get_workspace_expr(table: Table, alias: str, depth: int = 0) -> str:
+    """Возвращает SQL-выражение ID РП строки таблицы table исходной БД (alias - псевдоним таблицы в запросе)."""
+    if table.name == cm.analytics_rollup.name:
+        project = get_workspace_expr(cm.Project.__table__, f'p{depth}', depth + 1)
+        return (f"(CASE WHEN {alias}.scope = '{Rollup.workspace}' THEN {alias}.scope_id ELSE "
+                f"(SELECT {project} FROM {SOURCE_SCHEMA}.{cm.Project.__tablename__} p{depth} "
+                f"WHERE p{depth}.id = {alias}.scope_id) END)")
+    if DBFields.workspace_id in table.c:
+        return f'{alias}.{DBFields.workspace_id}'
+
+    if table.name in PARENTS:
+        column, parent_name = PARENTS[table.name]
+    else:
+        column, parent_name = next((fk.parent.name, fk.column.table.name) for fk in sorted(
+            table.foreign_keys, key=lambda fk: fk.parent.name) if fk.column.table.name not in GLOBAL_TABLES)
+    parent = cm.Base.metadata.tables[parent_name]
+    parent_alias = f'p{depth}'
+    return (f'(SELECT {get_workspace_expr(parent, parent_alias, depth + 1)} FROM {SOURCE_SCHEMA}."{parent_name}" '
+            f'{parent_alias} WHERE {parent_alias}.id = {alias}.{column})')
+
+
+def get_columns(table: Table) -> str:
+    return ', '.join(f'"{column.name}"' for column in table.c)
+
+
+def copy_global(target_path: str, source_path: str):
+    with sqlite3.connect(target_path) as connection:
+        connection.execute(f'ATTACH DATABASE ? AS {SOURCE_SCHEMA}', (source_path,))
+        connection.execute(f'DELETE FROM main.{cm.Permission.__tablename__}')  # Добавлены init_sharded_db
+        for table in get_global_tables():
+            columns = get_columns(table)
+            connection.execute(f'INSERT INTO main."{table.name}" ({columns}) '
+                               f'SELECT {columns} FROM {SOURCE_SCHEMA}."{table.name}"')
+    connection.close()
+
+
+def copy_shard(shard: int, shards_num: int, target_path: str, source_path: str) -> int:
+    """Копирует строки РП шарда shard, возвращает число перенесённых строк."""
+    rows = 0
+    with sqlite3.connect(get_shard_url(target_path, shard)) as connection:
+        connection.execute('PRAGMA foreign_keys = OFF')
+        connection.execute(f'ATTACH DATABASE ? AS {SOURCE_SCHEMA}', (source_path,))
+        connection.execute(f'ATTACH DATABASE ? AS {GLOBAL_SCHEMA}', (target_path,))
+        for table in get_shard_metadata().sorted_tables:
+            columns = get_columns(table)
+            cursor = connection.execute(
+                f'INSERT INTO main."{table.name}" ({columns}) SELECT {columns} FROM {SOURCE_SCHEMA}."{table.name}" t '
+                f'WHERE {get_workspace_expr(table, "t")} % ? = ?', (shards_num, shard)
+            )
+            rows += cursor.rowcount
+            if has_id_sequence(table):
+                connection.execute(f'INSERT INTO {GLOBAL_SCHEMA}.{shard_directory.name} (table_name, object_id, shard) '
+                                   f'SELECT ?, id, ? FROM main."{table.name}"', (table.name, shard))
+    connection.close()
+    return rows
+
+
+def split_database(source: str, target: str, shards_num: int, profile: str = DBProfiles.bulk):
+    """Создаёт шардированную БД target с shards_num шардами и переносит в неё данные БД source."""
+    source_path, target_path = make_url(source).database, make_url(target).database
+    if Path(source_path).resolve() == Path(target_path).resolve():
+        raise ValueError('Source and target databases must be different.')
+    launch_db(source, profile).dispose()
+    global_engine, shard_engines = init_sharded_db(target, shards_num, profile)
+    for engine in [global_engine, *shard_engines]:
+        engine.dispose()
+
+    copy_global(target_path, source_path)
+    for shard in range(shards_num):
+        rows = copy_shard(shard, shards_num, target_path, source_path)
+        print(f'Shard {shard}: {rows} rows')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split a database into a global database and workspace shards.')
+    parser.add_argument('shards_num', type=int, help='Number of shards')
+    parser.add_argument('--source', help='URL of the source database (database_path from config by default)')
+    parser.add_argument('--target', help='URL of the sharded database (<source>_sharded by default)')
+    args = parser.parse_args()
+
+    source = args.source or Config(Path(project_root() / "server" / "config.json")).database_path
+    target = args.target or f'{source}_sharded'
+    split_database(source, target, args.shards_num)
+    print(f'Database {source} has been split into {target} and {args.shards_num} shards. '
+          f'Set database_path = {target} and shards = {args.shards_num} in server/config.json.')
+
+
+if __name__ == '__main__':
+    main()
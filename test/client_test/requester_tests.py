@@ -63,6 +63,20 @@ def test_requests_group(requester: Requester, launch_test_server, params: list[l
         assert args in results, f'There is no result {args} in results. The request may be not finished. Results: {results}'
 
 
+@pytest.mark.parametrize(
+    ['params'],
+    [[[[f'{i}' for v in range(3)] for i in range(10)]]]
+)
+def test_requests_batch(requester: Requester, launch_test_server, params: list[list[str]]):
+    """Запросы, созданные внутри Requester.batch(), выполняются одним запросом к /batch."""
+    with requester.batch():
+        requests = [requester.register(*args) for args in params]
+    group = requester.create_group(*requests)
+    group.wait_until_complete()
+    results = [request.result().content for request in group.requests()]
+    assert results == params
+
+
 @pytest.mark.f_data({REQUEST_LIMIT: 10})
 @pytest.mark.parametrize(
     ('limit', 'offset'),
@@ -4,7 +4,7 @@ import pytest
 import asyncio
 import concurrent.futures
 
-from client.src.requester.requester import Requester
+from client.src.requester.requester import Requester, Response, InternalRequest
 from test.conftest import launch_test_server, client_requester, REQUEST_LIMIT, LEN_TEST_REPO_CONTENT
 
 
@@ -26,3 +26,22 @@ def test_data_receiving(client_requester, launch_test_server, limit: int, offset
     assert result.records_left == LEN_TEST_REPO_CONTENT - limit - offset
 
 
+
+
+def test_short_page_stops_receiving(monkeypatch: pytest.MonkeyPatch):
+    """Неполная страница keyset-пагинации - последняя: следующий запрос не отправляется."""
+    requester = Requester('http://localhost:5000', request_limit=10)
+    pages = [(list(range(10)), 1, 'cursor'), (list(range(10, 14)), 1, 'cursor'), (list(range(14, 24)), 0, None)]
+    requests = []
+
+    async def make_request(request: InternalRequest) -> Response:
+        requests.append(request)
+        content, records_left, next_cursor = pages[len(requests) - 1]
+        return Response(request, content, records_left, None, next_cursor)
+
+    monkeypatch.setattr(requester, '_make_request', make_request)
+    request = InternalRequest('http://localhost:5000/ws_tasks', InternalRequest.GET, query_params={})
+    result = asyncio.run(requester._prepare_requests_sequence(request, None))
+
+    assert len(requests) == 2
+    assert result.content == list(range(14))
@@ -39,6 +39,19 @@ def register():
     return form_response(200, 'OK', content=params)
 
 
+@app.route('/batch', methods=['POST'])
+def batch():
+    """Выполняет подзапросы пакета тестовым клиентом сервера."""
+    client = app.test_client()
+    results = []
+    for item in request.json.get(CommonStruct.requests):
+        response = client.open(item[CommonStruct.path], method=item[CommonStruct.method],
+                               query_string=item.get(CommonStruct.query), json=item.get(CommonStruct.body))
+        results.append({CommonStruct.status_code: response.status_code,
+                        CommonStruct.body: response.get_json(silent=True)})
+    return form_response(200, 'OK', content=results)
+
+
 def launch():
     global thread
 
@@ -1 +1,69 @@
 """Тест авторизации"""
+from pathlib import Path
+
+import sqlalchemy.orm.session
+from sqlalchemy import event
+from sqlalchemy.sql import select, insert
+
+from server.auth.auth_module import Authorizer
+from server.database.cash_manager import CashManager
+from server.database.repository import DataRepository
+from server.database.models.db_utils import init_db
+from server.database.models.common_models import Permission, WSRoleTask, ws_role_task_permission
+from server.data_const import DBProfiles, Permissions, DataStruct, get_permissions_mask
+from common.base import DBFields
+from test.server_test.repository_test import fill_workspaces
+
+
+def test_permission_masks(tmp_path: Path):
+    """
+    Тест масок разрешений: маски ролей и переопределений пересчитываются при изменении их разрешений, маска
+    пользователя - OR масок его ролей, проверка разрешения не выполняет запросов, пока роли не изменятся.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    session_maker = sqlalchemy.orm.session.sessionmaker(bind=engine)
+    repository = DataRepository(session_maker)
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+    with session_maker() as session:
+        permission_ids = dict(session.execute(select(Permission.type, Permission.id)).all())
+
+    def ids(*permissions: Permissions) -> list[int]:
+        return [permission_ids[permission.name] for permission in permissions]
+
+    editor_id, inviter_id = repository.add_ws_roles([
+        {DBFields.workspace_id: workspace_ids[0], DBFields.name: 'editor',
+         'permissions': ids(Permissions.edit_task, Permissions.dec_doc)},
+        {DBFields.workspace_id: workspace_ids[0], DBFields.name: 'inviter', 'permissions': ids(Permissions.invite)}
+    ]).ids
+    repository.add_workspace_users(workspace_ids[0], user_ids[:2], editor_id)
+    repository.add_workspace_users(workspace_ids[0], user_ids[1:2], inviter_id)
+    roles = {role[DBFields.id]: role for role in repository.get_roles_by_id([editor_id, inviter_id]).content}
+    assert roles[editor_id]['permissions_mask'] == get_permissions_mask([Permissions.edit_task, 'del_doc'])
+    assert repository.get_permissions_mask(workspace_ids[0], user_ids[1]) == get_permissions_mask(
+        [Permissions.edit_task, Permissions.dec_doc, Permissions.invite])
+    assert repository.get_permissions_mask(workspace_ids[1], user_ids[1]) == 0
+
+    with session_maker() as session, session.begin():  # Переопределение разрешений роли для задачи
+        role_task_id = session.execute(insert(WSRoleTask).values(role_id=editor_id, task_id=task_ids[0])
+                                       .returning(WSRoleTask.id)).scalar_one()
+        session.execute(insert(ws_role_task_permission), [{'role_task_id': role_task_id, 'permissions_id': id_}
+                                                          for id_ in ids(Permissions.view, Permissions.complete_task)])
+    assert set(repository.get_task_permissions(task_ids[0], editor_id)) == {'view', 'complete_task'}
+
+    authorizer = Authorizer(repository, DataStruct(), Permissions, cash_manager=CashManager(engine))
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    assert authorizer.check_permissions(user_ids[0], Permissions.edit_task.value, workspace_ids[0])
+    assert not authorizer.check_permissions(user_ids[0], Permissions.invite.value, workspace_ids[0])
+    statements.clear()
+    assert authorizer.check_permissions(user_ids[1], Permissions.invite.value, workspace_ids[0])
+    assert authorizer.check_permissions(user_ids[0], Permissions.dec_doc.value, workspace_ids[0])
+    assert len(statements) == 1, 'Permissions mask of a user must be resolved once'
+    assert not authorizer.check_permissions(user_ids[2], Permissions.invite.value, workspace_ids[0])
+    assert Authorizer(repository, enforce=False).check_permissions(user_ids[2], Permissions.invite.value,
+                                                                   workspace_ids[0])  # Проверка отключена
+
+    repository.update_ws_roles([{DBFields.id: editor_id, 'permissions': ids(Permissions.invite)}])
+    assert authorizer.check_permissions(user_ids[0], Permissions.invite.value, workspace_ids[0])
+    assert not authorizer.check_permissions(user_ids[0], Permissions.edit_task.value, workspace_ids[0])
+    engine.dispose()
@@ -13,7 +13,7 @@ import jwt
 import os
 import typing as tp
 
-from common.base import CommonStruct, TasksStatuses
+from common.base import CommonStruct, TasksStatuses, ErrorCodes
 from test.server_test.utils.test_database.base import DatabaseManager
 from test.conftest import (SERVER_CONFIG_PATH, SERVER_WORKING_DIR, TEST_CONFIG_PATH, TEST_DB_PATH, test_db_path,
                            limit_offset_test_config_path, server_config_path)
@@ -297,3 +297,20 @@ def test_update_model(set_config, client: FlaskClient, uri: str, expected_schema
         if checking_exp_ids:  # Валидация ID в контенте
             actual_ids = [model.get("id") for model in checking_response.json.get(CommonStruct.content)]
             assert checking_exp_ids == actual_ids, response.json
+
+
+@pytest.mark.f_data(base_params)
+@pytest.mark.parametrize(
+    ['query_params'],
+    [
+        [{CommonStruct.text: 'User', CommonStruct.after_id: 0}],
+        [{CommonStruct.username: 'User', CommonStruct.prefix: True, CommonStruct.after_id: 0}]
+    ]
+)
+def test_search_cursor(set_config, client: FlaskClient, controller_access_token: str, query_params: dict):
+    """Курсор не принимается при поиске по text и prefix: результаты упорядочены не по ID."""
+    response = client.get('/users/search', query_string=query_params, headers={'Authorization': controller_access_token})
+    js.validate(response.json, schema=common_error_schema.schema)
+
+    assert response.status_code == 400
+    assert response.json.get(CommonStruct.error_id) == ErrorCodes.incorrect_cursor.value
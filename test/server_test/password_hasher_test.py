@@ -0,0 +1,86 @@
+"""Тест хеширования паролей в пуле процессов и замены хешей при входе."""
+import datetime
+import shelve
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import sqlalchemy.orm.session
+
+from server.auth.auth_module import Authenticator
+from server.auth.password_hasher import PasswordHasher, HasherBusy, hash_password, get_rounds
+from server.database.repository import DataRepository
+from server.database.models.db_utils import init_db
+from server.storage.server_model import Model
+from server.data_const import DataStruct, DBProfiles
+
+MIN_ROUNDS = 4
+
+
+def test_hasher_pool():
+    hasher = PasswordHasher(workers=1, max_pending=0, rounds=MIN_ROUNDS)
+    try:
+        hashed_password = hasher.hash('password')
+        assert get_rounds(hashed_password) == MIN_ROUNDS
+        assert hasher.verify('password', hashed_password)
+        assert not hasher.verify('other_password', hashed_password)
+    finally:
+        hasher.close()
+
+
+def test_hasher_busy():
+    """Операция сверх workers + max_pending отклоняется сразу, а не ждёт в очереди."""
+    hasher = PasswordHasher(workers=1, max_pending=0, rounds=15)
+    thread = threading.Thread(target=hasher.hash, args=('password',))
+    try:
+        thread.start()
+        time.sleep(0.2)
+        start = time.perf_counter()
+        with pytest.raises(HasherBusy) as exc_info:
+            hasher.verify('password', hash_password('password', MIN_ROUNDS))
+        assert time.perf_counter() - start < 0.5
+        assert exc_info.value.retry_after >= 1
+    finally:
+        thread.join()
+        hasher.close()
+
+    hasher = PasswordHasher(workers=0, max_pending=0, rounds=MIN_ROUNDS)  # Без пула очередь не ограничивается
+    threads = [threading.Thread(target=hasher.hash, args=('password',)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+@pytest.mark.parametrize('rounds', [3, 32])
+def test_hasher_incorrect_rounds(rounds: int):
+    with pytest.raises(ValueError):
+        PasswordHasher(rounds=rounds)
+
+
+def test_rehash_on_login(tmp_path: Path):
+    """Хеш, созданный с другой стоимостью, заменяется при успешном входе."""
+    storage_path = tmp_path / 'storage'
+    with shelve.open(storage_path) as storage:
+        storage[DataStruct.secret] = 'secret'
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+
+    def create_authenticator(rounds: int) -> Authenticator:
+        return Authenticator(repository, Model(storage_path), DataStruct.jwt_alg, datetime.timedelta(minutes=1),
+                             datetime.timedelta(minutes=2), password_hasher=PasswordHasher(workers=0, rounds=rounds))
+
+    create_authenticator(MIN_ROUNDS).register('login', 'email', 'password')
+    assert get_rounds(repository.get_user_hashed_password('login')) == MIN_ROUNDS
+
+    authenticator = create_authenticator(MIN_ROUNDS + 1)
+    with pytest.raises(ValueError):
+        authenticator.authorize('login', 'other_password')
+    assert get_rounds(repository.get_user_hashed_password('login')) == MIN_ROUNDS  # Неверный пароль: хеш не заменяется
+
+    assert authenticator.authorize('login', 'password')
+    hashed_password = repository.get_user_hashed_password('login')
+    assert get_rounds(hashed_password) == MIN_ROUNDS + 1
+    assert authenticator.authorize('login', 'password')
+    assert repository.get_user_hashed_password('login') == hashed_password
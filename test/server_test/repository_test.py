@@ -1,17 +1,40 @@
 import pytest
 import sqlalchemy.orm.session
+from sqlalchemy import event
 from sqlalchemy.sql import select
 
 import datetime
+import inspect
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
 import typing as tp
 
-from server.database.repository import DataRepository, RepoInsertResponse, RepoSelectResponse
-from common.base import CommonStruct, DBFields, get_datetime_now
-from server.database.models.common_models import Workspace
+from server.database.repository import DataRepository, RepoInsertResponse, RepoSelectResponse, EXPORT_SECTIONS
+from common.base import CommonStruct, DBFields, get_datetime_now, project_root
+from server.data_const import Rollup, DBProfiles, DBStruct
+from server.database.models.db_utils import init_db, launch_db, DB_PROFILES
+from server.database.models.common_models import Workspace, User, Project, WSTask, WSTaskEvent
 from test.server_test.utils.test_database.base import DatabaseManager
 from server.database.schemes.common_schemes import UserSchema
+from server.database.schemes.base import schemes_models
+from server.database.write_dispatcher import WriteDispatcher
+from server.database.cash_manager import CashManager
+from server.database.request_scope import RequestScope
+from server.database.sharding import (init_sharded_db, launch_sharded_db, ShardedRepository, ROUTES, GLOBAL_METHODS,
+                                      ID_SPAN)
+from server.utils.split_database import split_database
+from server.database.models.search_index import USER_SEARCH, WORKSPACE_SEARCH
+from server.database.models.table_versions import TABLE_VERSION
+from server.database.models.permission_masks import PERMISSIONS_MASK
 from test.server_test.utils.test_data.repository_test_data import test_updating_objects_data
-from server.database.exceptions import BaseRepoException, DataIntegrityError, IncorrectLinkError, NotUniqueValue
+from server.database.exceptions import (BaseRepoException, DataIntegrityError, IncorrectLinkError, NotUniqueValue,
+                                        IncorrectParam)
 from test.conftest import TEST_DB_PATH, test_db_path
 
 TEST_LOGIN = 'username'
@@ -19,6 +42,7 @@ TEST_WS_NAME = 'workspace'
 REPOSITORY = 'repository'
 CREATING_METHOD = 'creating_method'
 OBJ_DATA = 'obj_data'
+PAGINATION_USERS_NUM = 25
 
 params = {TEST_DB_PATH: test_db_path}
 
@@ -364,3 +388,887 @@ def test_incorrect_updating_objects(obj_id: int, obj_data: dict, repository: Dat
             assert param == expected_param, (f'The error attribute must be equal to expected. '
                                              f'Expected value: {expected_param}. Fact value: {param}. '
                                              f'Attribute name: {attribute}')
+
+
+@pytest.fixture(scope='function')
+def pagination_repository(set_db_config: DatabaseManager) -> DataRepository:  # Репозиторий с PAGINATION_USERS_NUM пользователями
+    with set_db_config.session_maker() as session, session.begin():
+        session.add_all([User(username=f'user_{i}', email=f'user_{i}@mail.com', hashed_password='hash')
+                         for i in range(PAGINATION_USERS_NUM)])
+    return DataRepository(set_db_config.session_maker)
+
+
+@pytest.mark.f_data(params)
+@pytest.mark.parametrize(
+    ['limit', 'offset', 'require_last_rec_num', 'exp_len', 'exp_last_num', 'exp_left'],
+    [
+        [10, 0, False, 10, 10, 15],
+        [10, 20, False, 5, 25, 0],
+        [None, 5, False, 20, 25, 0],
+        [10, 30, False, 0, 30, 0],
+        [None, 0, True, 25, 25, 0],
+        [0, 0, True, 0, 0, 25],
+    ]
+)
+def test_pagination(pagination_repository: DataRepository, limit: int, offset: int, require_last_rec_num: bool,
+                    exp_len: int, exp_last_num: int, exp_left: int):
+    """Тест подсчёта last_record_num и records_left при постраничном получении данных."""
+    result = pagination_repository.get_users_by_username(limit=limit, offset=offset,
+                                                         require_last_rec_num=require_last_rec_num)
+
+    assert len(result.content) == exp_len
+    assert result.last_record_num == exp_last_num
+    assert result.records_left == exp_left
+
+
+@pytest.mark.f_data(params)
+@pytest.mark.parametrize(
+    ['limit', 'exp_pages'],
+    [[10, 3], [25, 1], [7, 4]]
+)
+def test_keyset_pagination(pagination_repository: DataRepository, limit: int, exp_pages: int):
+    """
+    Тест keyset-пагинации: обход страниц по after_id возвращает все записи по возрастанию ID без повторов, общее число
+    записей не подсчитывается.
+    """
+    ids = []
+    pages = 0
+    after_id = 0
+    statements = []
+    engine = pagination_repository._session_maker.kw['bind']
+    count_statement = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        while True:
+            result = pagination_repository.search_users('user', '', limit=limit, after_id=after_id)
+            pages += 1
+            ids.extend(user.get(DBFields.id) for user in result.content)
+            assert result.last_record_num is None
+            assert result.records_left == int(len(ids) < PAGINATION_USERS_NUM)  # Есть ли следующая страница
+            if not result.records_left:
+                break
+            after_id = result.last_id
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+    assert statements and not any('count(' in statement for statement in statements)
+
+    assert pages == exp_pages
+    assert ids == sorted(ids) and len(set(ids)) == PAGINATION_USERS_NUM
+
+
+@pytest.mark.f_data(params)
+@pytest.mark.parametrize(
+    ['username', 'email', 'text', 'prefix', 'limit', 'exp_usernames', 'exp_left'],
+    [
+        ['ser_1', None, None, False, None, ['user_1'] + [f'user_{i}' for i in range(10, 20)], 0],
+        ['1', None, None, False, 3, ['user_1', 'user_10', 'user_11'], 9],  # Короче MIN_TERM_LENGTH - без индекса
+        [None, 'R_2@MAIL', None, False, None, ['user_2'], 0],  # Без учёта регистра
+        [None, None, 'mail', False, 2, ['mail_lover', 'user_0'], 24],  # Совпадение в имени - выше
+        [None, None, 'user_2', True, 3, ['user_2', 'user_20', 'user_21'], 1],
+        ['US', None, None, True, 1, ['user_0'], 1],
+        [None, 'u', None, True, None, [f'user_{i}' for i in range(PAGINATION_USERS_NUM)], 0],
+        ['ser_1', 'x%', None, False, None, [], 0]
+    ]
+)
+def test_search_users(pagination_repository: DataRepository, username: str, email: str, text: str, prefix: bool,
+                      limit: int, exp_usernames: list[str], exp_left: int):
+    """Тест поиска пользователей: поиск подстроки по индексу и без него, ранжирование, поиск по началу строки."""
+    pagination_repository.add_users([{DBFields.username: 'mail_lover', DBFields.email: 'lover@post.com',
+                                      DBFields.hashed_password: 'hash'}])
+    result = pagination_repository.search_users(username, email, limit=limit, text=text, prefix=prefix)
+    usernames = [user[DBFields.username] for user in result.content]
+    if prefix and not email:  # Упорядочены по имени
+        assert usernames == sorted(usernames)
+    elif not prefix and not text:  # Упорядочены по ID
+        assert [user[DBFields.id] for user in result.content] == sorted(user[DBFields.id] for user in result.content)
+    if prefix or not text:
+        usernames.sort(key=lambda name: int(name.split('_')[1]))
+    assert usernames == exp_usernames
+    if limit:
+        assert result.records_left == exp_left
+
+
+@pytest.mark.f_data(params)
+@pytest.mark.parametrize(
+    ['text', 'prefix'],
+    [['user_1', False], [None, True]]
+)
+def test_search_users_cursor(pagination_repository: DataRepository, text: str | None, prefix: bool):
+    """Тест поиска пользователей: keyset-пагинация не поддерживается для ранжированного поиска и поиска по началу строки."""
+    with pytest.raises(IncorrectParam):
+        pagination_repository.search_users('user', None, limit=5, after_id=0, text=text, prefix=prefix)
+    assert pagination_repository.search_users('user', None, limit=5, after_id=0).records_left == 1  # Упорядочены по ID
+
+
+@pytest.mark.f_data(params)
+def test_user_search_index(pagination_repository: DataRepository):
+    """Тест синхронизации индекса поиска пользователей с таблицей user при изменении и удалении пользователей."""
+    user_id = pagination_repository.search_users('user_3', None).content[0][DBFields.id]
+    pagination_repository.update_users([{DBFields.id: user_id, DBFields.username: 'renamed', DBFields.email: 'r@r.r'}])
+    assert [user[DBFields.id] for user in pagination_repository.search_users('named', None).content] == [user_id]
+    assert user_id not in [user[DBFields.id] for user in pagination_repository.search_users('user_3', None).content]
+
+    pagination_repository.delete_users([user_id])
+    assert not pagination_repository.search_users('renamed', None).content
+    assert not pagination_repository.search_users(None, None, text='ren', prefix=True).content
+
+
+@pytest.mark.f_data(params)
+def test_unit_of_work(pagination_repository: DataRepository):
+    """Тест единицы работы: операции выполняются в одной транзакции, ID доступны до фиксации, ошибка откатывает всё."""
+    with pagination_repository.unit_of_work() as uow:
+        user_id = uow.add_users([{DBFields.username: 'uow_user', DBFields.email: 'uow_user@mail.com',
+                                  DBFields.hashed_password: 'hash'}]).ids[0]
+        assert uow.get_users_by_id([user_id]).content, 'Added model must be visible inside the unit of work'
+        uow.update_users([{DBFields.id: user_id, DBFields.email: 'uow_updated@mail.com'}])
+
+    assert pagination_repository.get_users_by_id([user_id]).content[0][DBFields.email] == 'uow_updated@mail.com'
+
+    with pytest.raises(NotUniqueValue):
+        with pagination_repository.unit_of_work() as uow:
+            uow.add_users([{DBFields.username: 'uow_rollback', DBFields.email: 'uow_rollback@mail.com',
+                            DBFields.hashed_password: 'hash'}])
+            uow.add_users([{DBFields.username: 'uow_user', DBFields.email: 'uow_other@mail.com',
+                            DBFields.hashed_password: 'hash'}])
+
+    assert not pagination_repository.get_users_by_username(['uow_rollback']).content, 'Unit of work must be rolled back'
+
+
+@pytest.mark.f_data(params)
+def test_bulk_workspace_users(pagination_repository: DataRepository):
+    """Тест массового добавления и удаления участников РП: повторное добавление пропускается, удаляются и роли."""
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username().content]
+    workspace_id = pagination_repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0],
+                                                           DBFields.users: [user_ids[0]]}]).ids[0]
+    role_id = pagination_repository.add_ws_roles([{DBFields.name: 'role', DBFields.workspace_id: workspace_id}]).ids[0]
+
+    assert pagination_repository.add_workspace_users(workspace_id, user_ids[:10], role_id) == 9, 'Members must be skipped'
+    assert pagination_repository.add_workspace_users(workspace_id, user_ids[:10], role_id) == 0
+    assert len(pagination_repository.get_workspace_users(workspace_id).content) == 10
+    assert len(pagination_repository.get_roles_by_id([role_id]).content[0][DBFields.users]) == 10
+
+    assert pagination_repository.delete_workspace_users(workspace_id, user_ids[5:15]) == 5
+    assert len(pagination_repository.get_workspace_users(workspace_id).content) == 5
+    assert sorted(pagination_repository.get_roles_by_id([role_id]).content[0][DBFields.users]) == sorted(user_ids[:5])
+
+
+@pytest.mark.f_data(params)
+def test_tasks_analytics(pagination_repository: DataRepository):
+    """Тест агрегатов аналитики: учитываются задачи с исполнителем, в распределении - только участники."""
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username(limit=3).content]
+    with pagination_repository.unit_of_work() as uow:
+        workspace_id = uow.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0],
+                                            DBFields.users: user_ids[:2]}]).ids[0]
+        project_id = uow.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                        DBFields.creator_id: user_ids[0]}]).ids[0]
+        status_id = uow.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+        executors = [user_ids[0], user_ids[0], user_ids[1], user_ids[2]]  # user_ids[2] - не участник РП
+        uow.add_ws_tasks([{DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+                           DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0],
+                           DBFields.executor_id: executor_id, DBFields.status_id: status_id,
+                           DBFields.plan_deadline: get_datetime_now().isoformat()}
+                          for i, executor_id in enumerate(executors)])
+
+    analytics = pagination_repository.get_workspace_tasks_analytics(workspace_id)
+    emails = {user[DBFields.id]: user[DBFields.email] for user in pagination_repository.get_users_by_id(user_ids).content}
+
+    assert analytics.total_tasks == 4
+    assert analytics.members_num == 2
+    assert analytics.distribution == {emails[user_ids[0]]: 2, emails[user_ids[1]]: 1}
+    assert pagination_repository.get_project_tasks_analytics(project_id).members_num == 0
+    assert pagination_repository.get_workspace_stages_distribution(workspace_id) == {}
+
+    # Предрассчитанные счётчики поддерживаются при изменении и удалении задач и совпадают с пересчитанными
+    task_ids = [task[DBFields.id] for task in pagination_repository.get_ws_tasks([], workspace_id=workspace_id).content]
+    pagination_repository.update_ws_tasks([{DBFields.id: task_ids[0], DBFields.executor_id: user_ids[1]}])
+    pagination_repository.delete_ws_tasks_by_id([task_ids[3]])
+    assert pagination_repository.get_workspace_tasks_analytics(workspace_id).distribution == {
+        emails[user_ids[0]]: 1, emails[user_ids[1]]: 2}
+    assert pagination_repository.get_analytics_rollup(Rollup.project, project_id, Rollup.status) == {status_id: 3}
+
+    rollup = {(scope, dimension): pagination_repository.get_analytics_rollup(scope, scope_id, dimension)
+              for scope, scope_id in ((Rollup.workspace, workspace_id), (Rollup.project, project_id))
+              for dimension in (Rollup.executor, Rollup.status, Rollup.stage)}
+    pagination_repository.rebuild_analytics_rollup()
+    for (scope, dimension), counters in rollup.items():
+        scope_id = workspace_id if scope == Rollup.workspace else project_id
+        assert pagination_repository.get_analytics_rollup(scope, scope_id, dimension) == counters
+
+
+@pytest.mark.f_data(params)
+def test_compiled_serializers(pagination_repository: DataRepository):
+    """Тест скомпилированных сериализаторов: JSON результатов совпадает с сериализацией ORM-объектов схемами."""
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username().content]
+    workspace_id = pagination_repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0],
+                                                           DBFields.users: user_ids[::-3]}]).ids[0]
+    project_id = pagination_repository.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                                      DBFields.creator_id: user_ids[0],
+                                                      DBFields.users: user_ids[::-2]}]).ids[0]  # Не по порядку ID
+    status_id = pagination_repository.add_ws_task_statuses([{DBFields.name: 'status',
+                                                             DBFields.workspace_id: workspace_id}]).ids[0]
+    task_ids = pagination_repository.add_ws_tasks([
+        {DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+         DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[1], DBFields.executor_id: user_ids[i],
+         DBFields.status_id: status_id, DBFields.plan_deadline: get_datetime_now().isoformat()} for i in range(5)
+    ]).ids
+    pagination_repository.update_ws_tasks([{DBFields.id: task_id, DBFields.parent_task_id: task_ids[0]}
+                                           for task_id in task_ids[1:]])
+
+    for model, get_content in (
+            (User, lambda: pagination_repository.get_users_by_username()),
+            (User, lambda: pagination_repository.get_workspace_users(workspace_id, limit=3, offset=2)),
+            (Workspace, lambda: pagination_repository.get_workspaces([workspace_id])),
+            (Project, lambda: pagination_repository.get_projects_by_workspace_id(workspace_id)),
+            (WSTask, lambda: pagination_repository.get_ws_tasks([], workspace_id=workspace_id)),
+            (WSTask, lambda: pagination_repository.get_ws_tasks([], workspace_id=workspace_id, limit=2, after_id=0))
+    ):
+        content = get_content().content
+        assert content
+        with pagination_repository._session_maker() as session:
+            db_models = {db_model.id: db_model for db_model in session.execute(
+                select(model).where(model.id.in_([obj[DBFields.id] for obj in content]))).scalars().all()}
+            expected = [schemes_models[model].dump(obj=db_models[obj[DBFields.id]]) for obj in content]
+        assert json.dumps(content) == json.dumps(expected), f'Compiled serialization of {model.__name__} differs'
+
+
+@pytest.mark.f_data(params)
+def test_select_statements_num(pagination_repository: DataRepository):
+    """
+    Тест числа запросов получения данных: не зависит от размера страницы (отношения загружаются скомпилированными
+    сериализаторами одним запросом для страницы).
+    """
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username().content]
+    workspace_id = pagination_repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0],
+                                                           DBFields.users: user_ids}]).ids[0]
+    project_id = pagination_repository.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                                      DBFields.creator_id: user_ids[0], DBFields.users: user_ids}]).ids[0]
+    status_id = pagination_repository.add_ws_task_statuses([{DBFields.name: 'status',
+                                                             DBFields.workspace_id: workspace_id}]).ids[0]
+    pagination_repository.add_ws_tasks([
+        {DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+         DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0], DBFields.executor_id: user_id,
+         DBFields.status_id: status_id, DBFields.plan_deadline: get_datetime_now().isoformat()}
+        for i, user_id in enumerate(user_ids)
+    ])
+    getters = (  # Метод получения страницы размера limit, максимальное число запросов
+        (lambda limit: pagination_repository.get_users_by_username(limit=limit), 22),
+        (lambda limit: pagination_repository.get_workspace_users(workspace_id, limit=limit), 22),
+        (lambda limit: pagination_repository.get_workspaces(limit=limit), 13),
+        (lambda limit: pagination_repository.get_projects_by_workspace_id(workspace_id, limit=limit), 6),
+        (lambda limit: pagination_repository.get_ws_tasks([], workspace_id=workspace_id, limit=limit), 11)
+    )
+    full_content = [get_page(PAGINATION_USERS_NUM).content for get_page, _ in getters]
+
+    statements = []
+    engine = pagination_repository._session_maker.kw['bind']
+    count_statement = lambda *args: statements.append(args[2])
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    try:
+        for (get_page, max_statements), content in zip(getters, full_content):
+            for limit in (1, 5, PAGINATION_USERS_NUM):
+                statements.clear()
+                page = get_page(limit).content
+                assert len(statements) <= max_statements, f'Too many statements for page size {limit}: {statements}'
+                assert json.dumps(page) == json.dumps(content[:limit])
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+
+
+def test_init_db_schema(tmp_path: Path):
+    """
+    Тест схемы init_db: при импорте только db_utils создаются индексы поиска, версии таблиц и триггеры масок
+    разрешений - схема ревизии, которой отмечается БД. Выполняется в отдельном процессе, т.к. в тестах модули уже
+    импортированы.
+    """
+    path = tmp_path / 'database'
+    subprocess.run([sys.executable, '-c', f'from server.database.models.db_utils import init_db; init_db("sqlite:///{path}")'],
+                   cwd=project_root(), env={**os.environ, 'PYTHONPATH': str(project_root())}, check=True)
+
+    with sqlite3.connect(path) as connection:
+        names = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+        revision = connection.execute('SELECT version_num FROM alembic_version').fetchone()[0]
+    assert {USER_SEARCH, WORKSPACE_SEARCH, TABLE_VERSION} <= names
+    assert any(name.startswith(f'{TABLE_VERSION}_') for name in names)  # Триггеры версий
+    assert any(name.startswith(f'{PERMISSIONS_MASK}_') for name in names)
+    assert revision == '0006'
+
+
+@pytest.mark.parametrize('profile', DBProfiles.all)
+def test_db_profiles(tmp_path: Path, profile: str):
+    """Тест профилей соединений: PRAGMA профиля установлены для соединений движка, FK проверяются без PRAGMA в сессии."""
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', profile)
+    pragmas = DB_PROFILES[profile]
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('PRAGMA journal_mode').scalar() == pragmas['journal_mode'].lower()
+        assert connection.exec_driver_sql('PRAGMA foreign_keys').scalar() == 1
+        for name in ('cache_size', 'busy_timeout'):
+            assert connection.exec_driver_sql(f'PRAGMA {name}').scalar() == pragmas[name]
+
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    with pytest.raises(IncorrectLinkError):
+        repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: 1}])  # Пользователя нет
+    engine.dispose()
+
+
+def test_analytics_rollup_migration(tmp_path: Path):
+    """
+    Тест миграции 0006: в базе без analytics_rollup launch_db создаёт таблицу, заполняет её счётчиками по имеющимся
+    задачам и создаёт её версию.
+    """
+    path = f'sqlite:///{tmp_path / "database"}'
+    engine = init_db(path, DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    user_id = repository.add_users([{DBFields.username: 'user', DBFields.email: 'user@mail.com',
+                                     DBFields.hashed_password: 'hash'}]).ids[0]
+    workspace_id = repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_id,
+                                               DBFields.users: [user_id]}]).ids[0]
+    project_id = repository.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                           DBFields.creator_id: user_id}]).ids[0]
+    status_id = repository.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+    repository.add_ws_tasks([{DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id,
+                              DBFields.project_id: project_id, DBFields.creator_id: user_id,
+                              DBFields.entrusted_id: user_id, DBFields.executor_id: user_id,
+                              DBFields.status_id: status_id, DBFields.plan_deadline: get_datetime_now().isoformat()}
+                             for i in range(3)])
+    with engine.begin() as connection:  # База до ревизии 0006
+        for operation in ('insert', 'update', 'delete'):
+            connection.exec_driver_sql(f'DROP TRIGGER table_version_analytics_rollup_{operation}')
+        connection.exec_driver_sql("DELETE FROM table_version WHERE table_name = 'analytics_rollup'")
+        connection.exec_driver_sql('DROP TABLE analytics_rollup')
+        connection.exec_driver_sql("UPDATE alembic_version SET version_num = '0005'")
+    engine.dispose()
+
+    engine = launch_db(path, DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    assert repository.get_analytics_rollup(Rollup.workspace, workspace_id, Rollup.executor) == {user_id: 3}
+    assert repository.get_analytics_rollup(Rollup.project, project_id, Rollup.status) == {status_id: 3}
+    with engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT version_num FROM alembic_version').scalar() == '0006'
+        assert connection.exec_driver_sql("SELECT count(*) FROM sqlite_master WHERE type = 'trigger' "
+                                          "AND tbl_name = 'analytics_rollup'").scalar() == 3
+    engine.dispose()
+
+
+def test_write_dispatch(tmp_path: Path):
+    """
+    Тест очереди записи: записи, накопившиеся за время транзакции писателя, фиксируются одной транзакцией, ошибка
+    записи откатывает только её.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    session_maker = sqlalchemy.orm.session.sessionmaker(bind=engine)
+    dispatcher = WriteDispatcher(session_maker)
+    repository = DataRepository(session_maker, write_dispatcher=dispatcher)
+    commits = []
+    event.listen(engine, 'commit', lambda connection: commits.append(connection))
+
+    release = threading.Event()
+    blocking_write = dispatcher.submit(lambda session: release.wait(5))  # Писатель занят, записи копятся в очереди
+    usernames = [f'writer_{i}' for i in range(10)] + ['writer_0']
+    results = {}
+
+    def add_user(num: int):
+        try:
+            results[num] = repository.add_users([{DBFields.username: usernames[num], DBFields.email: f'{num}@mail.com',
+                                                  DBFields.hashed_password: 'hash'}]).ids[0]
+        except BaseRepoException as e:
+            results[num] = e
+
+    threads = [threading.Thread(target=add_user, args=[num]) for num in range(len(usernames))]
+    for thread in threads:
+        thread.start()
+    while dispatcher._queue.qsize() < len(usernames):
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert blocking_write.result()
+    assert len(commits) == 2, 'Queued writes must be committed in one transaction'
+    assert sum(isinstance(result, NotUniqueValue) for result in results.values()) == 1
+    ids = [result for result in results.values() if isinstance(result, int)]
+    assert len(set(ids)) == len(usernames) - 1
+    assert len(repository.get_users_by_id(ids).content) == len(ids)
+
+    with repository.unit_of_work() as uow:  # Единица работы выполняется в своей транзакции, без очереди
+        uow.update_users([{DBFields.id: ids[0], DBFields.email: 'updated@mail.com'}])
+    assert repository.get_users_by_id([ids[0]]).content[0][DBFields.email] == 'updated@mail.com'
+    dispatcher.close()
+    engine.dispose()
+
+
+def fill_workspaces(repository: DataRepository, workspaces_num: int = 3, tasks_num: int = 4
+                      ) -> tuple[list[int], list[int], list[int]]:
+    """Добавляет пользователей, РП с проектом и задачами. Возвращает ID пользователей, РП и задач."""
+    user_ids = repository.add_users([{DBFields.username: f'{TEST_LOGIN}_{i}', DBFields.email: f'{i}@mail.com',
+                                      DBFields.hashed_password: 'hash'} for i in range(3)]).ids
+    workspace_ids = repository.add_workspaces([
+        {DBFields.name: f'{TEST_WS_NAME}_{i}', DBFields.creator_id: user_ids[0], DBFields.users: user_ids}
+        for i in range(workspaces_num)
+    ]).ids
+    task_ids = []
+    for workspace_id in workspace_ids:
+        project_id = repository.add_projects([{DBFields.name: 'Ракета', DBFields.workspace_id: workspace_id,
+                                               DBFields.creator_id: user_ids[0]}]).ids[0]
+        status_id = repository.add_ws_task_statuses([{DBFields.name: 'status',
+                                                      DBFields.workspace_id: workspace_id}]).ids[0]
+        task_ids += repository.add_ws_tasks([
+            {DBFields.name: f'Задача ракеты {i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+             DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0],
+             DBFields.executor_id: user_ids[i % len(user_ids)], DBFields.status_id: status_id,
+             DBFields.plan_deadline: get_datetime_now().isoformat()} for i in range(tasks_num)
+        ]).ids
+    return user_ids, workspace_ids, task_ids
+
+
+def test_export_workspace(tmp_path: Path):
+    """
+    Тест выгрузки РП: объекты только выгружаемого РП, по разделам и по возрастанию ID в разделе; выгрузка с курсором
+    любой записи продолжается со следующей записи.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+
+    records = list(repository.export_workspace(workspace_ids[0], batch_size=2))
+    object_types = [object_type for object_type, _, _ in records]
+    assert object_types == sorted(object_types, key=EXPORT_SECTIONS.index)
+    assert [object_id for object_type, object_id, _ in records if object_type == WSTask.__tablename__] == task_ids[:4]
+    assert object_types.count(Project.__tablename__) == 1
+    members = [record for object_type, _, record in records if object_type == 'workspace_user']
+    assert [member[CommonStruct.user_id] for member in members] == user_ids
+    assert all(isinstance(member[DBFields.roles], list) for member in members)
+    for object_type, object_id, record in records:
+        if object_type != 'workspace_user':
+            assert record[DBFields.id] == object_id
+
+    for position in (0, 3, len(records) - 1):
+        assert list(repository.export_workspace(workspace_ids[0], records[position][:2], batch_size=3)) == \
+            records[position + 1:]
+    with pytest.raises(IncorrectParam):
+        repository.export_workspace(workspace_ids[0], (User.__tablename__, 1))
+
+    export = repository.export_workspace(workspace_ids[0], batch_size=1)  # Выгрузка читает один снимок БД
+    assert next(export)[0] == Project.__tablename__
+    with sqlite3.connect(tmp_path / 'database') as connection:
+        connection.execute("UPDATE ws_task SET name = 'changed' WHERE id = ?", (task_ids[0],))
+    connection.close()
+    assert list(export) == records[1:]
+    engine.dispose()
+
+
+def test_sharded_repository(tmp_path: Path):
+    """
+    Тест шардированной БД: объекты РП хранятся в шарде РП, вызовы направляются в шарды по ID РП и объектов, запросы
+    без РП выполняются во всех шардах с общей пагинацией.
+    """
+    shards_num = 3
+    global_engine, shard_engines = init_sharded_db(f'sqlite:///{tmp_path / "database"}', shards_num, DBProfiles.test)
+    repository = ShardedRepository(sqlalchemy.orm.session.sessionmaker(bind=global_engine),
+                                   [sqlalchemy.orm.session.sessionmaker(bind=engine) for engine in shard_engines])
+    not_routed = {name for name, _ in inspect.getmembers(DataRepository, inspect.isfunction)
+                  if not name.startswith('_')} - set(ROUTES) - GLOBAL_METHODS
+    assert not not_routed, f'Methods must be routed or marked as global: {not_routed}'
+
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+    for workspace_id in workspace_ids:  # Задачи РП - в шарде РП, ID определяет шард
+        shard = workspace_id % shards_num
+        tasks = repository.for_workspace(workspace_id).get_ws_tasks(None, workspace_id=workspace_id).content
+        assert len(tasks) == 4
+        assert all(task[DBFields.id] // ID_SPAN - 1 == shard for task in tasks)
+
+    assert len(repository.get_ws_tasks(task_ids).content) == len(task_ids)
+    executor_tasks = repository.get_ws_tasks(None, executor_id=user_ids[0]).content  # Во всех шардах
+    assert len(executor_tasks) == 2 * len(workspace_ids)
+    page = repository.get_ws_tasks(None, executor_id=user_ids[0], limit=2, offset=3)
+    assert [task[DBFields.id] for task in page.content] == sorted(
+        task[DBFields.id] for task in executor_tasks)[3:5]
+    assert (page.last_record_num, page.records_left) == (5, 1)
+
+    user = repository.get_users_by_id([user_ids[0]]).content[0]  # Связи пользователя - из всех шардов
+    assert len(user['created_ws_tasks']) == len(task_ids)
+    assert repository.search_workspace(workspace_ids[1], 'ракет').content
+
+    repository.update_ws_tasks([{DBFields.id: task_ids[0], DBFields.name: 'first'},
+                                {DBFields.id: task_ids[-1], DBFields.name: 'last'}])
+    assert {task[DBFields.id]: task[DBFields.name] for task in repository.get_ws_tasks(
+        [task_ids[0], task_ids[-1]]).content} == {task_ids[0]: 'first', task_ids[-1]: 'last'}
+    repository.delete_ws_tasks_by_id([task_ids[0], task_ids[-1]])
+    assert len(repository.get_ws_tasks(task_ids).content) == len(task_ids) - 2
+    assert repository.get_workspace_tasks_analytics(workspace_ids[0]).total_tasks == 3
+    for engine in [global_engine, *shard_engines]:
+        engine.dispose()
+
+
+def test_split_database(tmp_path: Path):
+    """Тест переноса нешардированной БД в шарды: объекты сохраняют ID, новые объекты получают ID диапазона шарда."""
+    source = f'sqlite:///{tmp_path / "database"}'
+    engine = init_db(source, DBProfiles.test)
+    user_ids, workspace_ids, task_ids = fill_workspaces(
+        DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine)))
+    engine.dispose()
+
+    split_database(source, f'{source}_sharded', 2, DBProfiles.test)
+    global_engine, shard_engines = launch_sharded_db(f'{source}_sharded', 2, DBProfiles.test)
+    repository = ShardedRepository(sqlalchemy.orm.session.sessionmaker(bind=global_engine),
+                                   [sqlalchemy.orm.session.sessionmaker(bind=engine) for engine in shard_engines])
+    assert [user[DBFields.id] for user in repository.get_users_by_id(user_ids).content] == user_ids
+    tasks = repository.get_ws_tasks(task_ids).content
+    assert [task[DBFields.id] for task in tasks] == task_ids
+    for workspace_id in workspace_ids:
+        assert len(repository.for_workspace(workspace_id).get_ws_tasks(None, workspace_id=workspace_id).content) == 4
+        assert repository.get_workspace_tasks_analytics(workspace_id).total_tasks == 4
+
+    task = tasks[0]
+    new_id = repository.add_ws_tasks([{**{key: task[key] for key in (DBFields.name, DBFields.plan_deadline)},
+                                       DBFields.workspace_id: workspace_ids[0], DBFields.project_id: task['project'],
+                                       DBFields.status_id: task['status'], DBFields.creator_id: user_ids[0],
+                                       DBFields.entrusted_id: user_ids[0], DBFields.executor_id: user_ids[0]}]).ids[0]
+    assert new_id // ID_SPAN - 1 == workspace_ids[0] % 2
+    assert len(repository.get_ws_tasks(None, workspace_id=workspace_ids[0]).content) == 5
+    for engine in [global_engine, *shard_engines]:
+        engine.dispose()
+
+
+@pytest.mark.f_data(params)
+def test_workspace_search(pagination_repository: DataRepository):
+    """
+    Тест поиска по РП: совпадения в названии ранжируются выше совпадений в тексте, поиск ограничен РП, индекс
+    синхронизируется с таблицами объектов при изменении и удалении.
+    """
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username().content]
+    workspace_id, other_workspace_id = pagination_repository.add_workspaces([
+        {DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0], DBFields.users: [user_ids[0]]},
+        {DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[1], DBFields.users: [user_ids[1]]}
+    ]).ids
+    project_id = pagination_repository.add_projects([
+        {DBFields.name: 'Двигатель', DBFields.workspace_id: workspace_id, DBFields.creator_id: user_ids[0],
+         'goal': 'Собрать ракетный двигатель'},
+        {DBFields.name: 'Ракета', DBFields.workspace_id: other_workspace_id, DBFields.creator_id: user_ids[1]}
+    ]).ids[0]
+    status_id = pagination_repository.add_ws_task_statuses([{DBFields.name: 'status',
+                                                             DBFields.workspace_id: workspace_id}]).ids[0]
+    task_ids = pagination_repository.add_ws_tasks([
+        {DBFields.name: name, DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+         DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0], DBFields.executor_id: user_ids[0],
+         DBFields.status_id: status_id, DBFields.plan_deadline: get_datetime_now().isoformat()}
+        for name in ('Топливо для ракеты', 'Испытания', 'Отчёт')
+    ]).ids
+
+    result = pagination_repository.search_workspace(workspace_id, 'РАКЕТ', limit=1)
+    assert [(hit[CommonStruct.object_type], hit[DBFields.id]) for hit in result.content] == [('ws_task', task_ids[0])]
+    assert result.content[0][CommonStruct.snippet] == 'Топливо для <b>ракет</b>ы'
+    assert result.records_left == 1
+    hits = pagination_repository.search_workspace(workspace_id, 'ракет').content
+    assert [(hit[CommonStruct.object_type], hit[DBFields.id]) for hit in hits] == [('ws_task', task_ids[0]),
+                                                                                  ('project', project_id)]
+    assert not pagination_repository.search_workspace(workspace_id, 'отсутствует').content  # Заглушки не индексируются
+
+    pagination_repository.update_ws_tasks([{DBFields.id: task_ids[1], DBFields.description: 'Запуск ракеты'}])
+    pagination_repository.delete_ws_tasks_by_id([task_ids[0]])
+    hits = pagination_repository.search_workspace(workspace_id, 'ракет').content
+    assert [hit[DBFields.id] for hit in hits if hit[CommonStruct.object_type] == 'ws_task'] == [task_ids[1]]
+
+    with pytest.raises(IncorrectParam):
+        pagination_repository.search_workspace(workspace_id, 'ра')
+    assert pagination_repository.is_workspace_member(workspace_id, user_ids[0])
+    assert not pagination_repository.is_workspace_member(workspace_id, user_ids[1])
+
+
+LARGE_TABLES = ('user', 'workspace', 'workspace_user', 'user_ws_role', 'ws_role', 'project', 'project_user',
+                'project_mentor', 'work_stage', 'ws_task', 'ws_task_event', 'responsible_task', 'tag_ws_task',
+                'ws_task_status', 'ws_task_tag', 'personal_task', 'personal_task_event', 'ws_daily_event',
+                'ws_daily_event_user', 'ws_many_days_event', 'ws_many_days_event_user', 'personal_daily_event',
+                'personal_many_days_event', 'personal_task_status', 'personal_task_tag', 'analytics_rollup')
+
+
+@pytest.mark.f_data(params)
+def test_query_plans(pagination_repository: DataRepository):
+    """
+    Тест планов запросов: запросы методов получения данных (вместе с запросами загрузки отношений) не сканируют
+    полностью большие таблицы (LARGE_TABLES), а используют индексы каталога (common_models.INDEXES).
+    """
+    user_ids = [user[DBFields.id] for user in pagination_repository.get_users_by_username().content]
+    workspace_id = pagination_repository.add_workspaces([{DBFields.name: TEST_WS_NAME, DBFields.creator_id: user_ids[0],
+                                                           DBFields.users: user_ids}]).ids[0]
+    project_id = pagination_repository.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                                      DBFields.creator_id: user_ids[0], DBFields.users: user_ids}]).ids[0]
+    status_id = pagination_repository.add_ws_task_statuses([{DBFields.name: 'status',
+                                                             DBFields.workspace_id: workspace_id}]).ids[0]
+    task_ids = pagination_repository.add_ws_tasks([
+        {DBFields.name: f'task_{i}', DBFields.workspace_id: workspace_id, DBFields.project_id: project_id,
+         DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0], DBFields.executor_id: user_id,
+         DBFields.status_id: status_id, DBFields.plan_deadline: get_datetime_now().isoformat()}
+        for i, user_id in enumerate(user_ids)
+    ]).ids
+    user_id = user_ids[1]
+    today = datetime.date.today()
+    repo = pagination_repository
+    getters = (
+        lambda: repo.get_users_by_username(['user_1', 'user_2']),
+        lambda: repo.get_users_by_email(['user_1@mail.com']),
+        lambda: repo.get_users_by_id(user_ids[:3]),
+        lambda: repo.search_users('ser_1', 'mail', limit=5),
+        lambda: repo.search_users(None, None, limit=5, text='user_1'),
+        lambda: repo.search_users('user_1', None, limit=5, prefix=True),
+        lambda: repo.search_users(None, None, limit=5, text='user_1', prefix=True),
+        lambda: repo.search_workspace(workspace_id, 'task', limit=5),
+        lambda: repo.is_workspace_member(workspace_id, user_id),
+        lambda: repo.get_user_hashed_password('user_1'),
+        lambda: repo.get_workspaces([workspace_id]),
+        lambda: repo.get_workspaces(creator_ids=[user_id]),
+        lambda: repo.get_workspaces(participant_id=user_id),
+        lambda: repo.get_workspace_users(workspace_id),
+        lambda: repo.get_workspace_default_role_id(workspace_id),
+        lambda: repo.get_role_by_user_id(workspace_id, user_id),
+        lambda: repo.get_ws_tasks(task_ids[:3]),
+        lambda: repo.get_ws_tasks([], workspace_id=workspace_id, limit=10, after_id=task_ids[0]),
+        lambda: repo.get_ws_tasks([], workspace_id=workspace_id, status_ids=[status_id]),
+        lambda: repo.get_ws_tasks([], executor_id=user_id),
+        lambda: repo.get_ws_tasks([], project_id=project_id),
+        lambda: repo.get_ws_tasks([], workspace_id=workspace_id, working_date=today),
+        lambda: repo.get_ws_task_events([], workspace_id=workspace_id, date=today),
+        lambda: repo.get_ws_task_events([], workspace_id=workspace_id, executor_id=user_id),
+        lambda: repo.get_ws_task_statuses_by_workspace(workspace_id),
+        lambda: repo.get_ws_task_tags_by_workspace(workspace_id),
+        lambda: repo.get_projects_by_workspace_id(workspace_id),
+        lambda: repo.get_projects(creator_ids=[user_id]),
+        lambda: repo.get_project_users(project_id),
+        lambda: repo.get_project_mentors(project_id),
+        lambda: repo.get_work_stages_by_project_id(project_id),
+        lambda: repo.get_ws_daily_events_by_id([], workspace_id=workspace_id, date=today),
+        lambda: repo.get_ws_daily_events_by_id([], notified_ids=[user_id]),
+        lambda: repo.get_ws_daily_event_by_notified_id(user_id),
+        lambda: repo.get_ws_many_days_events_by_id([], workspace_id=workspace_id, included_date=today),
+        lambda: repo.get_ws_many_days_events_by_id([], notified_ids=[user_id]),
+        lambda: repo.get_personal_tasks_by_id([], owner_id=user_id, working_date=today),
+        lambda: repo.get_personal_task_events_by_user([], user_id, date=today),
+        lambda: repo.get_personal_task_statuses_by_user(user_id),
+        lambda: repo.get_personal_task_tags_by_user(user_id),
+        lambda: repo.get_personal_daily_events_by_id([], owner_id=user_id, date=today),
+        lambda: repo.get_personal_many_days_events_by_id([], owner_id=user_id, included_date=today),
+        lambda: repo.get_agenda(user_id, today, today + datetime.timedelta(days=6)),
+        lambda: repo.get_task_permissions(task_ids[0], 1),
+        lambda: repo.get_workspace_tasks_analytics(workspace_id),
+        lambda: repo.get_project_tasks_analytics(project_id),
+        lambda: repo.get_workspace_stages_distribution(workspace_id)
+    )
+
+    statements = []
+    engine = pagination_repository._session_maker.kw['bind']
+    save_statement = lambda *args: statements.append((args[2], args[3]))
+    event.listen(engine, 'before_cursor_execute', save_statement)
+    try:
+        for get_data in getters:
+            get_data()
+    finally:
+        event.remove(engine, 'before_cursor_execute', save_statement)
+
+    with engine.connect() as connection:
+        for statement, parameters in statements:
+            if not statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+                continue
+            plan = [row[-1] for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+            scans = [step for step in plan if step.startswith('SCAN ') and step.split()[1] in LARGE_TABLES]
+            assert not scans, f'Full scan of a large table: {scans}. Statement: {statement}'
+
+
+def test_import_ws_tasks(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """
+    Тест массового добавления задач РП: ссылки строк получаются одним запросом, ошибочные строки не добавляются и не
+    мешают добавлению остальных, ID возвращаются в порядке строк. Задачи и счётчики аналитики фиксируются вместе.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository, tasks_num=1)
+    other_user_id = repository.add_users([{DBFields.username: 'other', DBFields.email: 'other@mail.com',
+                                           DBFields.hashed_password: 'hash'}]).ids[0]
+
+    references = repository.get_import_references(
+        workspace_ids[0], emails=['0@mail.com', 'other@mail.com'], project_names=['Ракета', 'Нет'],
+        status_names=['status']
+    )
+    assert references.users == {'0@mail.com': user_ids[0]}  # Только участники РП
+    assert list(references.projects) == ['Ракета'] and len(references.project_ids) == 1
+    assert list(references.statuses) == ['status']
+    project_id, status_id = references.projects['Ракета'], references.statuses['status']
+    assert not repository.get_import_references(workspace_ids[1], project_ids=[project_id]).project_ids
+
+    now = get_datetime_now()
+    task = {DBFields.name: 'Импорт', DBFields.workspace_id: workspace_ids[0], DBFields.project_id: project_id,
+            DBFields.creator_id: user_ids[0], DBFields.entrusted_id: user_ids[0], DBFields.executor_id: user_ids[1],
+            DBFields.status_id: status_id, DBFields.plan_deadline: now, DBFields.created_at: now,
+            DBFields.updated_at: now}
+    response = repository.import_ws_tasks([task, {**task, DBFields.executor_id: 10 ** 6},
+                                           {**task, DBFields.description: 'Описание'}])
+    assert response.ids[1] is None and list(response.errors) == [1]
+    assert all(response.ids[num] for num in (0, 2))
+    imported = repository.get_ws_tasks([response.ids[0], response.ids[2]]).content
+    assert [record[DBFields.description] for record in imported] == [DBStruct.default_description, 'Описание']
+    assert repository.get_workspace_tasks_analytics(workspace_ids[0]).total_tasks == 3
+
+    def fail(*args):
+        raise RuntimeError('rollup')
+
+    monkeypatch.setattr(DataRepository, '_apply_rollup_deltas', fail)
+    with pytest.raises(RuntimeError):
+        repository.import_ws_tasks([task])
+    assert len(repository.get_ws_tasks(None, workspace_ids[0]).content) == 3
+    engine.dispose()
+
+
+def test_query_cache(tmp_path: Path):
+    """
+    Тест кэша запросов: повторный запрос не выполняется в БД, запись в таблицу (в том числе другим соединением)
+    делает недействительными только результаты, полученные из неё, давно не использованные результаты вытесняются.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    cash_manager = CashManager(engine, max_size=3)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine), cash_manager=cash_manager)
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    tasks = repository.get_ws_tasks(None, workspace_ids[0])
+    assert repository.is_workspace_member(workspace_ids[0], user_ids[0])
+    statements.clear()
+    tasks.content[0][DBFields.name] = 'changed'  # Изменение результата не изменяет кэш
+    cached_tasks = repository.get_ws_tasks(None, workspace_id=workspace_ids[0])  # Тот же запрос
+    assert cached_tasks.content[0][DBFields.name] != 'changed'
+    assert repository.is_workspace_member(workspace_ids[0], user_ids[0])
+    assert not statements, 'Cached results must be returned without queries'
+    assert (cash_manager.stats().hits, cash_manager.stats().misses) == (2, 2)
+
+    repository.update_ws_tasks([{DBFields.id: task_ids[0], DBFields.name: 'updated'}])
+    assert repository.get_ws_tasks(None, workspace_ids[0]).content[0][DBFields.name] == 'updated'
+    statements.clear()
+    assert repository.is_workspace_member(workspace_ids[0], user_ids[0])  # workspace_user не изменялась
+    assert not statements
+
+    with sqlite3.connect(tmp_path / 'database') as connection:  # Другой процесс
+        connection.execute('UPDATE ws_task SET name = ? WHERE id = ?', ('external', task_ids[0]))
+    connection.close()
+    assert repository.get_ws_tasks(None, workspace_ids[0]).content[0][DBFields.name] == 'external'
+    assert cash_manager.stats().invalidations == 2
+
+    for workspace_id in workspace_ids:
+        repository.get_ws_task_statuses_by_workspace(workspace_id)
+    stats = cash_manager.stats()
+    assert stats.size == 3 and stats.evictions == 2
+    with repository.unit_of_work() as uow:  # В единице работы - без кэша
+        uow.get_ws_task_statuses_by_workspace(workspace_ids[-1])
+    assert cash_manager.stats().hits == stats.hits
+    cash_manager.close()
+    engine.dispose()
+
+
+def test_request_scope(tmp_path: Path):
+    """
+    Тест контекста запроса: методы выполняются в одной транзакции, которая фиксируется при закрытии контекста,
+    повторные чтения не выполняют запросов, ошибка изменяющего метода откатывает только его изменения.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    session_maker = sqlalchemy.orm.session.sessionmaker(bind=engine)
+    scopes: list[RequestScope] = []
+    repository = DataRepository(session_maker, request_scope_provider=lambda: scopes[-1] if scopes else None)
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+    transactions, statements = [], []
+    event.listen(engine, 'begin', lambda connection: transactions.append(connection))
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+
+    scopes.append(RequestScope())
+    for task_id in task_ids:
+        assert repository.is_workspace_member(workspace_ids[0], user_ids[0])
+        repository.get_ws_tasks([task_id])
+    statements.clear()
+    assert repository.is_workspace_member(workspace_ids[0], user_ids[0])
+    assert repository.get_ws_tasks([task_ids[0]]).content
+    assert not statements, 'Repeated reads in a request scope must be returned without queries'
+
+    repository.update_ws_tasks([{DBFields.id: task_ids[0], DBFields.name: 'updated'}])
+    with pytest.raises(NotUniqueValue):
+        repository.add_users([{DBFields.username: f'{TEST_LOGIN}_0', DBFields.email: 'new@mail.com',
+                               DBFields.hashed_password: 'hash'}])
+    assert repository.get_ws_tasks([task_ids[0]]).content[0][DBFields.name] == 'updated'  # Изменения запроса видны
+    with sqlite3.connect(tmp_path / 'database') as connection:  # До фиксации изменения не видны другим соединениям
+        assert connection.execute('SELECT name FROM ws_task WHERE id = ?', (task_ids[0],)).fetchone()[0] != 'updated'
+    connection.close()
+    assert scopes[-1].transactions == 1
+    scopes.pop().close()
+    assert len(transactions) == 1, f'Request must be executed in one transaction, executed: {len(transactions)}'
+    assert repository.get_ws_tasks([task_ids[0]]).content[0][DBFields.name] == 'updated'
+
+    scopes.append(RequestScope())
+    repository.update_ws_tasks([{DBFields.id: task_ids[1], DBFields.name: 'rolled back'}])
+    scopes.pop().close(commit=False)
+    assert repository.get_ws_tasks([task_ids[1]]).content[0][DBFields.name] != 'rolled back'
+
+    scopes.append(RequestScope())  # Транзакция чтения: чтения контекста видят один снимок БД
+    scopes[-1].begin_snapshot(session_maker)
+    assert repository.get_ws_tasks([task_ids[2]]).content[0][DBFields.name] != 'changed'
+    with sqlite3.connect(tmp_path / 'database') as connection:
+        connection.execute("UPDATE ws_task SET name = 'changed' WHERE id = ?", (task_ids[2],))
+    connection.close()
+    assert all(task[DBFields.name] != 'changed' for task in repository.get_ws_tasks(task_ids).content)
+    scopes.pop().close()
+    assert repository.get_ws_tasks([task_ids[2]]).content[0][DBFields.name] == 'changed'
+    engine.dispose()
+
+
+def test_agenda(tmp_path: Path):
+    """
+    Тест повестки пользователя: задачи и мероприятия пользователя на день или период, многодневные мероприятия -
+    пересекающиеся с периодом; повестка кэшируется до изменения любой из её таблиц.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    session_maker = sqlalchemy.orm.session.sessionmaker(bind=engine)
+    cash_manager = CashManager(engine)
+    repository = DataRepository(session_maker, cash_manager=cash_manager)
+    user_ids, workspace_ids, task_ids = fill_workspaces(repository)
+    day = datetime.date(2026, 10, 18)
+    next_day = day + datetime.timedelta(days=1)
+    with session_maker() as session, session.begin():  # task_ids[0], task_ids[3] - задачи user_ids[0]
+        session.add_all([WSTaskEvent(task_id=task_ids[0], date=day, time_start=datetime.time(10),
+                                     time_end=datetime.time(11)),
+                         WSTaskEvent(task_id=task_ids[3], date=next_day, time_start=datetime.time(10),
+                                     time_end=datetime.time(11)),
+                         WSTaskEvent(task_id=task_ids[1], date=day, time_start=datetime.time(10),
+                                     time_end=datetime.time(11))])
+    event_ids = repository.add_ws_daily_events([
+        {DBFields.name: f'event_{i}', DBFields.workspace_id: workspace_ids[0], DBFields.creator_id: user_ids[0],
+         DBFields.date: date.isoformat(), DBFields.time_start: '10:00:00', DBFields.time_end: '11:00:00',
+         DBFields.notified: notified} for i, (date, notified) in enumerate([(day, user_ids[:1]), (next_day, user_ids[:1]),
+                                                                           (day, user_ids[1:])])
+    ]).ids
+    many_days_event_ids = repository.add_personal_many_days_events([
+        {DBFields.name: f'event_{i}', DBFields.owner_id: user_ids[0], DBFields.datetime_start: start.isoformat(),
+         DBFields.datetime_end: end.isoformat()} for i, (start, end) in enumerate([
+            (datetime.datetime(2026, 10, 17, 12), datetime.datetime(2026, 10, 18, 9)),  # Заканчивается в день
+            (datetime.datetime(2026, 10, 19, 12), datetime.datetime(2026, 10, 21)),
+            (datetime.datetime(2026, 10, 10), datetime.datetime(2026, 10, 17, 23))
+        ])
+    ]).ids
+
+    def ids(agenda: dict, name: str) -> list[int]:
+        return sorted(record[DBFields.id] for record in agenda[name])
+
+    agenda = repository.get_agenda(user_ids[0], day)
+    assert set(agenda) == {CommonStruct.personal_tasks, CommonStruct.ws_tasks, CommonStruct.personal_daily_events,
+                           CommonStruct.personal_many_days_events, CommonStruct.ws_daily_events,
+                           CommonStruct.ws_many_days_events}
+    assert ids(agenda, CommonStruct.ws_tasks) == [task_ids[0]]
+    assert ids(agenda, CommonStruct.ws_daily_events) == [event_ids[0]]
+    assert ids(agenda, CommonStruct.personal_many_days_events) == [many_days_event_ids[0]]
+    agenda = repository.get_agenda(user_ids[0], day, next_day)
+    assert ids(agenda, CommonStruct.ws_tasks) == [task_ids[0], task_ids[3]]
+    assert ids(agenda, CommonStruct.ws_daily_events) == event_ids[:2]
+    assert ids(agenda, CommonStruct.personal_many_days_events) == many_days_event_ids[:2]
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    assert repository.get_agenda(user_ids[0], day, next_day) == agenda
+    assert not statements, 'Agenda must be cached'
+    repository.update_ws_daily_events([{DBFields.id: event_ids[0], DBFields.name: 'updated'}])
+    agenda = repository.get_agenda(user_ids[0], day, next_day)
+    assert {record[DBFields.name] for record in agenda[CommonStruct.ws_daily_events]} == {'updated', 'event_1'}
+    cash_manager.close()
+    engine.dispose()
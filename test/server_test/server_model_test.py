@@ -0,0 +1,125 @@
+"""Тест хранилища сервера (секрет и блеклист токенов)."""
+import datetime
+import shelve
+import time
+
+import jwt
+import pytest
+from pathlib import Path
+
+from server.storage.server_model import Model
+from server.data_const import DataStruct
+
+SECRET = 'secret'
+
+
+def create_token(lifetime: datetime.timedelta, sub: str = '1') -> str:
+    now = datetime.datetime.now(tz=datetime.timezone.utc)
+    return jwt.encode(payload={'sub': sub, 'exp': now + lifetime, 'iat': now}, key=SECRET, algorithm=DataStruct.jwt_alg)
+
+
+def get_log_path(storage_path: Path) -> Path:
+    return Path(f'{storage_path}_revoked.log')
+
+
+@pytest.fixture()
+def storage_path(tmp_path: Path) -> Path:
+    path = tmp_path / 'storage'
+    with shelve.open(path) as storage:
+        storage[DataStruct.secret] = SECRET
+    return path
+
+
+def test_secret(storage_path: Path):
+    assert Model(storage_path).get_secret() == SECRET
+
+
+def test_blacklist_persistence(storage_path: Path):
+    token_ = create_token(datetime.timedelta(minutes=5))
+    other_token = create_token(datetime.timedelta(minutes=5), sub='2')
+
+    model = Model(storage_path)
+    model.add_token_to_blacklist(token_)
+
+    assert model.check_token_in_blacklist(token_)
+    assert not model.check_token_in_blacklist(other_token)
+    assert Model(storage_path).check_token_in_blacklist(token_), 'Revoked token must be saved on disk'
+
+    model.delete_token_from_blacklist(token_)
+    assert not Model(storage_path).check_token_in_blacklist(token_)
+
+
+def test_expired_tokens_eviction(storage_path: Path):
+    expired_token = create_token(datetime.timedelta(seconds=-1))
+    live_token = create_token(datetime.timedelta(minutes=5))
+
+    model = Model(storage_path)
+    model.add_token_to_blacklist(expired_token)  # Истёкший токен не добавляется
+    model.add_token_to_blacklist(live_token)
+
+    assert model.check_token_in_blacklist(live_token)
+    assert not model.check_token_in_blacklist(expired_token)
+    assert len(get_log_path(storage_path).read_text().splitlines()) == 1
+
+
+def test_log_compaction(storage_path: Path):
+    live_tokens = [create_token(datetime.timedelta(minutes=5), sub=str(i)) for i in range(3)]
+    short_tokens = [create_token(datetime.timedelta(seconds=1), sub=str(i)) for i in range(5)]
+
+    model = Model(storage_path)
+    for token_ in live_tokens + short_tokens:
+        model.add_token_to_blacklist(token_)
+    model.delete_token_from_blacklist(live_tokens[0])
+    assert len(get_log_path(storage_path).read_text().splitlines()) == 9  # 8 добавлений и 1 удаление
+
+    time.sleep(2)
+    model.update_blacklist()
+
+    assert len(get_log_path(storage_path).read_text().splitlines()) == 2, 'Only live tokens must remain in log'
+    assert not model.check_token_in_blacklist(live_tokens[0])
+    for token_ in live_tokens[1:]:
+        assert model.check_token_in_blacklist(token_)
+
+    model.add_token_to_blacklist(live_tokens[0])  # Журнал открыт на запись после компактизации
+    restored = Model(storage_path)
+    for token_ in live_tokens:
+        assert restored.check_token_in_blacklist(token_)
+    for token_ in short_tokens:
+        assert not restored.check_token_in_blacklist(token_)
+
+
+def test_legacy_blacklist_conversion(storage_path: Path):
+    live_token = create_token(datetime.timedelta(minutes=5))
+    expired_token = create_token(datetime.timedelta(seconds=-1))
+    with shelve.open(storage_path) as storage:
+        storage[DataStruct.blacklist] = [live_token, expired_token, 'not a token']
+
+    model = Model(storage_path)
+
+    assert model.check_token_in_blacklist(live_token)
+    assert len(get_log_path(storage_path).read_text().splitlines()) == 1
+    with shelve.open(storage_path) as storage:
+        assert DataStruct.blacklist not in storage
+
+
+def test_blacklist_shared_between_processes(storage_path: Path):
+    """Экземпляры Model на одном хранилище (рабочие процессы сервера) видят изменения блеклиста друг друга."""
+    token_ = create_token(datetime.timedelta(minutes=5))
+    short_token = create_token(datetime.timedelta(seconds=1), sub='2')
+    first, second = Model(storage_path), Model(storage_path)
+
+    first.add_token_to_blacklist(token_)
+    assert second.check_token_in_blacklist(token_)
+    second.delete_token_from_blacklist(token_)
+    assert not first.check_token_in_blacklist(token_)
+
+    first.add_token_to_blacklist(token_)
+    first.add_token_to_blacklist(short_token)
+    time.sleep(2)
+    second.update_blacklist()  # Журнал заменён компактизацией другого экземпляра
+    assert len(get_log_path(storage_path).read_text().splitlines()) == 1
+    assert first.check_token_in_blacklist(token_)
+
+    first.delete_token_from_blacklist(token_)  # Запись в новый файл журнала
+    assert not second.check_token_in_blacklist(token_)
+    assert not Model(storage_path).check_token_in_blacklist(token_)
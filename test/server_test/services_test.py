@@ -1,10 +1,19 @@
+import io
+import sqlite3
+from pathlib import Path
+
 import pytest
 import sqlalchemy.orm.session
 
-from server.services.services import WorkspaceService
+from server.services.services import WorkspaceService, ImportService, ProjectService, WSTaskService
 from server.database.repository import DataRepository
+from server.database.models.db_utils import init_db
+from server.database.sharding import init_sharded_db, ShardedRepository, get_shard_url
+from server.data_const import DataStruct, DBProfiles, Permissions
+from server.auth.auth_module import Authorizer
+from server.utils.api_utils import read_csv_rows, read_ndjson_rows, parse_batch_items, BatchItem
 from test.server_test.utils.test_database.base import DatabaseManager
-from common.base import DBFields
+from common.base import CommonStruct, DBFields
 import server.services.exceptions as err
 from test.conftest import test_db_path
 
@@ -93,3 +102,161 @@ def test_normal_deleting_users(workspace_with_users_id: tuple[int, tuple[int, ..
     assert all([user not in users for user in workspace_users])
     assert workspace_id not in linked_workspace  # ToDo: падают 2 теста из-за default_role_id = None. Почему так, неясно
 
+
+def test_import_objects(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """
+    Тест импорта: строки CSV и NDJSON проверяются и добавляются пачками, ссылки на участников, проекты и статусы
+    получаются по названиям, ошибочные строки попадают в отчёт с номерами, не прерывая импорт.
+    """
+    monkeypatch.setattr(DataStruct, 'import_chunk_size', 2)
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    authorizer = Authorizer(repository, DataStruct(), Permissions, enforce=False)
+    user_id = repository.add_users([{DBFields.username: 'username', DBFields.email: 'user@mail.com',
+                                     DBFields.hashed_password: 'hash'}]).ids[0]
+    workspace_id = repository.add_workspaces([{DBFields.name: 'workspace', DBFields.creator_id: user_id,
+                                               DBFields.users: [user_id]}]).ids[0]
+    project_id = repository.add_projects([{DBFields.name: 'project', DBFields.workspace_id: workspace_id,
+                                           DBFields.creator_id: user_id}]).ids[0]
+    status_id = repository.add_ws_task_statuses([{DBFields.name: 'status', DBFields.workspace_id: workspace_id}]).ids[0]
+
+    csv_body = (
+        'name,plan_deadline,executor_email,project,status,description\n'
+        'task_1,2026-01-01T10:00:00,user@mail.com,project,status,\n'
+        'task_2,not a date,user@mail.com,project,status,\n'
+        'task_3,2026-01-02T10:00:00,other@mail.com,project,status,\n'
+        'task_4,2026-01-03T10:00:00,user@mail.com,unknown,status,\n'
+        'task_5,2026-01-04T10:00:00,user@mail.com,project,status,description\n'
+        'task_6,2026-01-05T10:00:00,user@mail.com,project,status,,extra\n'
+    )
+    report = ImportService.import_objects(read_csv_rows(io.BytesIO(csv_body.encode())), 'ws_task', workspace_id,
+                                          user_id, repository, authorizer)
+    assert (report[CommonStruct.imported], report[CommonStruct.failed]) == (2, 4)
+    assert [error[CommonStruct.row] for error in report[CommonStruct.errors]] == [2, 3, 4, 6]
+    tasks = repository.get_ws_tasks(None, workspace_id).content
+    assert sorted(task[DBFields.name] for task in tasks) == ['task_1', 'task_5']
+    assert all(task[DBFields.executor] == user_id for task in tasks)
+    assert all(task[DBFields.status] == status_id for task in tasks)
+
+    task = ('"name": "task", "plan_deadline": "2026-01-01T10:00:00", "executor_email": "user@mail.com", '
+            '"status": "status"')
+    ndjson_body = '\n'.join(f'{{{task}, "project_id": {value}}}'
+                            for value in (project_id, f'"{project_id}"', f'{project_id}.5', 'true', -project_id))
+    report = ImportService.import_objects(read_ndjson_rows(io.BytesIO(ndjson_body.encode())), 'ws_task', workspace_id,
+                                          user_id, repository, authorizer)
+    assert (report[CommonStruct.imported], report[CommonStruct.failed]) == (2, 3)  # Дробные и логические ID - ошибки
+    assert [error[CommonStruct.row] for error in report[CommonStruct.errors]] == [3, 4, 5]
+
+    ndjson_body = (
+        '{"name": "event", "date": "2026-01-01", "time_start": "10:00:00", "time_end": "11:00:00"}\n'
+        '\n'
+        '{"name": "event", "date": "2026-01-01"}\n'
+        '{"name": \n'
+        '{"name": "event", "date": "2026-01-02", "time_start": "10:00", "time_end": "11:00", "unknown": 1}\n'
+    )
+    report = ImportService.import_objects(read_ndjson_rows(io.BytesIO(ndjson_body.encode())), 'ws_daily_event',
+                                          workspace_id, user_id, repository, authorizer)
+    assert (report[CommonStruct.imported], report[CommonStruct.failed]) == (1, 3)
+    assert [error[CommonStruct.row] for error in report[CommonStruct.errors]] == [2, 3, 4]
+
+    with pytest.raises(err.IncorrectParamError):
+        ImportService.import_objects([], 'workspace', workspace_id, user_id, repository, authorizer)
+    engine.dispose()
+
+
+@pytest.mark.parametrize('enforce', [True, False])
+def test_permissions_check(tmp_path: Path, enforce: bool):
+    """
+    Тест проверки разрешений в сервисах: разрешения проверяются в РП объекта операции, создатель РП может всё,
+    участнику со стандартной ролью (без разрешений) операции запрещены. Без проверки (enforce=False) разрешено всё.
+    """
+    engine = init_db(f'sqlite:///{tmp_path / "database"}', DBProfiles.test)
+    repository = DataRepository(sqlalchemy.orm.session.sessionmaker(bind=engine))
+    authorizer = Authorizer(repository, DataStruct(), Permissions, enforce=enforce)
+    creator_id, member_id, other_id = repository.add_users([
+        {DBFields.username: f'username_{i}', DBFields.email: f'{i}@mail.com', DBFields.hashed_password: 'hash'}
+        for i in range(3)
+    ]).ids
+    workspace_id = WorkspaceService.create({DBFields.name: 'workspace'}, creator_id, repository, authorizer)
+    WorkspaceService.invite_users((member_id,), workspace_id, repository, authorizer, creator_id)
+    project_id = ProjectService.create({DBFields.name: 'project'}, workspace_id, creator_id, repository, authorizer)
+    task = {DBFields.name: 'task', DBFields.project_id: project_id, DBFields.executor_email: '1@mail.com',
+            DBFields.plan_deadline: '2026-01-01T10:00:00'}
+    WSTaskService.create((task,), project_id, creator_id, repository, authorizer)
+    task_id = repository.get_ws_tasks(None, workspace_id).content[0][DBFields.id]
+
+    operations = (
+        lambda: WorkspaceService.invite_users((other_id,), workspace_id, repository, authorizer, member_id),
+        lambda: ProjectService.create({DBFields.name: 'project'}, workspace_id, member_id, repository, authorizer),
+        lambda: ProjectService.update({DBFields.id: project_id, DBFields.name: 'renamed'}, member_id, repository,
+                                      authorizer),
+        lambda: WSTaskService.delete((task_id,), member_id, repository, authorizer),
+        lambda: ProjectService.delete((project_id,), member_id, repository, authorizer)
+    )
+    for operation in operations:
+        if enforce:
+            with pytest.raises(err.AccessDenied):
+                operation()
+        else:
+            operation()
+    assert bool(repository.get_projects([project_id]).content) == enforce
+    engine.dispose()
+
+
+def test_sharded_unit_of_work(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    """
+    Тест сервисов в шардированной БД: изменения глобальной БД и шарда РП в единице работы фиксируются вместе,
+    ошибка откатывает изменения обеих БД.
+    """
+    shards_num = 2
+    database_path = tmp_path / 'database'
+    global_engine, shard_engines = init_sharded_db(f'sqlite:///{database_path}', shards_num, DBProfiles.test)
+    repository = ShardedRepository(sqlalchemy.orm.session.sessionmaker(bind=global_engine),
+                                   [sqlalchemy.orm.session.sessionmaker(bind=engine) for engine in shard_engines])
+    user_ids = repository.add_users([{DBFields.username: f'username_{i}', DBFields.email: f'{i}@mail.com',
+                                      DBFields.hashed_password: 'hash'} for i in range(3)]).ids
+
+    def count_rows(path: Path, table: str) -> int:
+        with sqlite3.connect(path) as connection:
+            count = connection.execute(f'SELECT count(*) FROM {table}').fetchone()[0]
+        connection.close()
+        return count
+
+    workspace_id = WorkspaceService.create({DBFields.name: 'workspace'}, user_ids[0], repository, None)
+    default_role_id = repository.get_workspace_default_role_id(workspace_id)
+    assert repository.get_roles_by_id([default_role_id]).content[0][DBFields.workspace] == workspace_id
+    assert repository.get_ws_task_statuses_by_workspace(workspace_id).content
+
+    def fail(*args, **kwargs):
+        raise err.IncorrectParamError('ws_task_status', 'Failed')
+
+    monkeypatch.setattr(ShardedRepository, 'add_ws_task_statuses', fail)
+    with pytest.raises(err.IncorrectParamError):  # Роли добавлены в шард, РП - в глобальную БД: откатываются обе
+        WorkspaceService.create({DBFields.name: 'failed'}, user_ids[0], repository, None)
+    monkeypatch.undo()
+    assert count_rows(database_path, 'workspace') == 1
+    assert sum(count_rows(Path(get_shard_url(str(database_path), shard)), 'ws_role')
+               for shard in range(shards_num)) == 2
+
+    WorkspaceService.add_users(tuple(user_ids[1:]), workspace_id, repository)
+    assert WorkspaceService.delete_users(workspace_id, (user_ids[1],), repository) == 1
+    assert {user[DBFields.id] for user in repository.get_workspace_users(workspace_id).content} == {
+        user_ids[0], user_ids[2]}
+    assert not repository.get_role_by_user_id(workspace_id, user_ids[1]).content
+    for engine in [global_engine, *shard_engines]:
+        engine.dispose()
+
+
+def test_parse_batch_items():
+    items = parse_batch_items({CommonStruct.requests: [
+        {CommonStruct.method: 'get', CommonStruct.path: '/users', CommonStruct.query: 'ids=1&ids=2'},
+        {CommonStruct.method: 'PUT', CommonStruct.path: '/ws_tasks', CommonStruct.body: {'name': 'task'}}
+    ]}, CommonStruct.max_batch_requests)
+    assert items == [BatchItem('GET', '/users', 'ids=1&ids=2'), BatchItem('PUT', '/ws_tasks', None, {'name': 'task'})]
+
+    for data in (None, {CommonStruct.requests: []}, {CommonStruct.requests: [{CommonStruct.path: '/users'}]},
+                 {CommonStruct.requests: [{CommonStruct.method: 'PATCH', CommonStruct.path: '/users'}]},
+                 {CommonStruct.requests: [{CommonStruct.method: 'GET', CommonStruct.path: 'users'}]},
+                 {CommonStruct.requests: [{CommonStruct.method: 'GET', CommonStruct.path: '/users'}] * 3}):
+        with pytest.raises(ValueError):
+            parse_batch_items(data, 2)
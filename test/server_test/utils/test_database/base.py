@@ -10,6 +10,7 @@ from server.auth.auth_module import hash_password
 from server.database.models.db_utils import init_db
 import server.database.models.common_models as cm
 from common.base import DBFields
+from server.data_const import DBProfiles
 
 
 class DatabaseManager:
@@ -23,7 +24,7 @@ class DatabaseManager:
     def __init__(self, path: str):
         self._database_path = path
         self._faker = Faker()
-        engine = init_db(path)
+        engine = init_db(path, DBProfiles.test)
         self.session_maker = sessionmaker(bind=engine)
 
     def _set_getting_config_personal_tasks(self):